@@ -0,0 +1,49 @@
+"""
+Proceso de archivo de ventas de períodos cerrados
+Mueve por bloques las ventas con más de ARCHIVE_AFTER_MONTHS meses (por defecto 12) a las tablas
+de archivo y conserva sus totales mensuales en sales_period_summary.
+Usar --before AAAA-MM-DD para indicar otro corte (se redondea al inicio del mes).
+Ejecutar: python archive_sales.py [--before AAAA-MM-DD]
+"""
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from db.database import SessionLocal, Base, engine
+from crud.archive import archive_closed_periods
+
+
+def main():
+    args = sys.argv[1:]
+    before = None
+    if "--before" in args:
+        try:
+            before = date.fromisoformat(args[args.index("--before") + 1])
+        except (IndexError, ValueError):
+            print("❌ ERROR: --before requiere una fecha AAAA-MM-DD")
+            return False
+
+    # Crear las tablas de archivo si aún no existen
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        result = archive_closed_periods(db, before=before)
+        print(f"✓ Ventas anteriores a {result['before']} archivadas: {result['sales']} ventas, "
+              f"{result['details']} detalles ({time.perf_counter() - start:.1f} s)")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"❌ ERROR: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,118 @@
+"""
+Prueba de carga del control de admisión: latencia de las ventas durante una tormenta de exportaciones
+Una app FastAPI con las mismas rutas que la API (POST /sales/, GET /reports/sales/export, GET /dashboard/)
+y rutas síncronas que simulan su trabajo (espera de la BD con sleep + algo de CPU), servida en el
+mismo proceso con httpx.ASGITransport y el threadpool real de Starlette (40 hilos):
+- exportaciones: muchos clientes pidiendo PDF sin parar (ante un 503 esperan 100 ms y reintentan)
+- tablero:       pantallas refrescando el tablero cada 200 ms
+- ventas:        cajeros registrando ventas una tras otra; se mide su latencia
+Se compara sin middleware (todas compiten por el threadpool) y con AdmissionMiddleware (utils.admission).
+Ejecutar: python benchmarks/bench_admission.py [segundos] [clientes_exportando] [cajeros]
+"""
+import os
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import httpx
+from fastapi import FastAPI
+
+from utils.admission import AdmissionController, AdmissionClass, AdmissionMiddleware, CLASS_DEFAULTS
+
+# Trabajo simulado por ruta: (segundos esperando a la BD, segundos de CPU)
+SALE_WORK = (0.004, 0.001)
+EXPORT_WORK = (0.4, 0.02)
+DASHBOARD_WORK = (0.05, 0.002)
+
+
+def work(wait: float, cpu: float):
+    time.sleep(wait)
+    end = time.perf_counter() + cpu
+    while time.perf_counter() < end:
+        pass
+
+
+def create_app(admission: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/sales/")
+    def create_sale():
+        work(*SALE_WORK)
+        return {"id": 1}
+
+    @app.get("/reports/sales/export")
+    def export_sales():
+        work(*EXPORT_WORK)
+        return {"pdf": True}
+
+    @app.get("/dashboard/")
+    def dashboard():
+        work(*DASHBOARD_WORK)
+        return {"sales": 1}
+
+    if admission:
+        app.add_middleware(AdmissionMiddleware, admission=AdmissionController(
+            [AdmissionClass(name, *defaults) for name, defaults in CLASS_DEFAULTS.items()], 40
+        ))
+    return app
+
+
+async def storm(client, method: str, path: str, stop: asyncio.Event, pause: float, counts: dict):
+    while not stop.is_set():
+        response = await client.request(method, path)
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        await asyncio.sleep(0.1 if response.status_code == 503 else pause)
+
+
+async def cashier(client, stop: asyncio.Event, latencies: list, counts: dict):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post("/sales/")
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def run(admission: bool, seconds: float, exporters: int, cashiers: int):
+    app = create_app(admission)
+    stop = asyncio.Event()
+    latencies, sale_counts, export_counts, dashboard_counts = [], {}, {}, {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        tasks = [asyncio.create_task(storm(client, "GET", "/reports/sales/export", stop, 0, export_counts))
+                 for _ in range(exporters)]
+        tasks += [asyncio.create_task(storm(client, "GET", "/dashboard/", stop, 0.2, dashboard_counts))
+                  for _ in range(20)]
+        tasks += [asyncio.create_task(cashier(client, stop, latencies, sale_counts)) for _ in range(cashiers)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    name = "con admisión" if admission else "sin admisión"
+    print(f"{name:<13} ventas {len(latencies):>6}  p50 {percentile(latencies, 0.5) * 1000:>7.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:>7.1f} ms  ventas 503 {sale_counts.get(503, 0):>4}  "
+          f"exportaciones ok/503 {export_counts.get(200, 0):>5}/{export_counts.get(503, 0):<6} "
+          f"tablero ok/503 {dashboard_counts.get(200, 0):>5}/{dashboard_counts.get(503, 0)}")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    exporters = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    cashiers = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    print(f"{exporters} clientes exportando, 20 pantallas de tablero, {cashiers} cajeros, {seconds:.0f} s por modo "
+          f"(CPU: {os.cpu_count()})")
+    for admission in (False, True):
+        asyncio.run(run(admission, seconds, exporters, cashiers))
+
+
+if __name__ == "__main__":
+    main()
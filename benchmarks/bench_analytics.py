@@ -0,0 +1,137 @@
+"""
+Benchmark de la analítica columnar (crud/analytics.py)
+Compara los mismos agregados (serie diaria, ingresos por producto y tamaño de canasta)
+calculados recorriendo objetos del ORM con Decimal, como en crud/reports.py, contra las
+proyecciones a arreglos NumPy, usando una base SQLite temporal.
+Ejecutar: python benchmarks/bench_analytics.py [filas_de_detalle]
+"""
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker, joinedload
+from db.database import Base
+from db.models import Category, Product, MedicineBatch, Client, User, Role, Sale, SalesDetail
+from crud.analytics import get_sales_series, get_product_revenue, get_basket_distribution
+from utils.bulk import chunked
+
+PRODUCTS = 2000
+DAYS = 730
+LINES_PER_SALE = 2.5
+
+
+def new_session(detail_rows: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    db.add_all([
+        User(role_id=role.id, first_name="Bench", last_name="User", username="bench", email="bench@local"),
+        Client(first_name="Cliente", last_name="Bench", status=1),
+        Category(name="Bench")
+    ])
+    db.flush()
+    db.execute(insert(Product.__table__), [
+        {"name": f"Producto {i}", "category_id": 1, "presentation": "Caja", "concentration": "1mg", "status": 1}
+        for i in range(PRODUCTS)
+    ])
+    db.execute(insert(MedicineBatch.__table__), [
+        {"product_id": i + 1, "stock": 1000, "sale_price": 10, "status": 1} for i in range(PRODUCTS)
+    ])
+
+    start = datetime.now() - timedelta(days=DAYS)
+    sales_count = int(detail_rows / LINES_PER_SALE)
+    sales, details = [], []
+    for sale_id in range(1, sales_count + 1):
+        lines = random.randint(1, 4)
+        total = Decimal("0.00")
+        for _ in range(lines):
+            quantity = random.randint(1, 5)
+            price = Decimal(random.randint(100, 5000)) / 100
+            total += price * quantity
+            details.append({
+                "sale_id": sale_id,
+                "batch_id": random.randint(1, PRODUCTS),
+                "quantity": quantity,
+                "unit_price": price,
+                "subtotal": price * quantity
+            })
+        sales.append({
+            "client_id": 1,
+            "user_id": 1,
+            "sale_date": start + timedelta(seconds=random.randint(0, DAYS * 86400)),
+            "payment_method": "efectivo",
+            "total": total
+        })
+    for chunk in chunked(sales, 20_000):
+        db.execute(insert(Sale.__table__), chunk)
+    for chunk in chunked(details[:detail_rows], 20_000):
+        db.execute(insert(SalesDetail.__table__), chunk)
+    db.commit()
+    return db
+
+
+def orm_loops(db):
+    """Mismos agregados al estilo de crud/reports.py: objetos del ORM y Decimal"""
+    sales = db.query(Sale).options(
+        joinedload(Sale.details).joinedload(SalesDetail.batch)
+    ).all()
+    daily = {}
+    revenue = {}
+    basket_units = []
+    for sale in sales:
+        key = sale.sale_date.date().isoformat()
+        daily.setdefault(key, {"count": 0, "total": Decimal("0.00")})
+        daily[key]["count"] += 1
+        daily[key]["total"] += sale.total
+        units = 0
+        for detail in sale.details:
+            product_id = detail.batch.product_id
+            revenue[product_id] = revenue.get(product_id, Decimal("0.00")) + detail.subtotal
+            units += detail.quantity
+        basket_units.append(units)
+    top = sorted(revenue.items(), key=lambda item: item[1], reverse=True)[:20]
+    return len(daily), top, sum(basket_units) / len(basket_units)
+
+
+def columnar(db):
+    get_sales_series(db, period="day")
+    get_product_revenue(db, limit=20)
+    get_basket_distribution(db)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random.seed(3)
+    start = time.perf_counter()
+    db = new_session(rows)
+    print(f"Datos: {rows:,} detalles de venta (carga {time.perf_counter() - start:.1f} s)")
+
+    timings = {}
+    for name, compute in (("ORM + Decimal", orm_loops), ("NumPy columnar", columnar)):
+        db.expunge_all()
+        start = time.perf_counter()
+        compute(db)
+        timings[name] = time.perf_counter() - start
+
+    for name, seconds in timings.items():
+        print(f"{name:>15}: {seconds:8.2f} s")
+    print(f"Aceleración: {timings['ORM + Decimal'] / timings['NumPy columnar']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
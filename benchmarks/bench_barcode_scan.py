@@ -0,0 +1,134 @@
+"""
+Benchmark de la búsqueda por escaneo: get_products(search=...) contra el índice de códigos de barras
+Sobre una base SQLite temporal con P productos (3 lotes y 1-2 códigos cada uno) se buscan N códigos
+al azar de tres formas y se mide el tiempo por búsqueda:
+- LIKE (antes):      get_products(db, search=<nombre>), LIKE '%...%' sobre cuatro columnas
+- SQL con índice:    código -> producto por el índice único y carga del producto con sus lotes
+- índice en memoria: crud.barcodes.index.lookup (lo que usa GET /products/scan/{code})
+Después registra una venta y mide cuánto tarda el índice en reflejar el stock nuevo (recarga en
+segundo plano disparada por el commit).
+Ejecutar: python benchmarks/bench_barcode_scan.py [productos] [búsquedas]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from db import database
+from db.database import Base
+from db.models import Category, Product, MedicineBatch, ProductStock, ProductBarcode, Client, User, Role
+from db.schemas import SaleCreate
+from crud.products import get_products
+from crud.sales import create_sale
+from crud import barcodes
+
+
+def gtin13(number: int) -> str:
+    digits = f"750{number:09d}"
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(digits)))
+    return digits + str((10 - total % 10) % 10)
+
+
+def create_database(path: str, products: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    db.add_all([
+        User(role_id=role.id, first_name="Bench", last_name="User", username="bench", email="bench@local"),
+        Client(first_name="Cliente", last_name="Bench", status=1),
+        Category(name="Bench")
+    ])
+    db.flush()
+    db.execute(insert(Product.__table__), [
+        {"name": f"Producto {i}", "category_id": 1, "presentation": "Caja", "concentration": "500 mg",
+         "description": "Producto de prueba para el benchmark", "status": 1} for i in range(products)
+    ])
+    db.execute(insert(MedicineBatch.__table__), [
+        {"product_id": i % products + 1, "stock": 100, "sale_price": random.randint(1, 90),
+         "purchase_price": 1, "status": 1} for i in range(products * 3)
+    ])
+    db.execute(insert(ProductStock.__table__), [{"product_id": i + 1, "stock": 300} for i in range(products)])
+    codes = [{"code": barcodes.normalize_code(gtin13(i)), "product_id": i + 1} for i in range(products)]
+    codes += [{"code": f"INT{i}", "product_id": i + 1} for i in range(0, products, 2)]
+    db.execute(insert(ProductBarcode.__table__), codes)
+    db.commit()
+    db.close()
+    return codes
+
+
+def sql_lookup(db, code: str):
+    product_id = db.query(ProductBarcode.product_id).filter(ProductBarcode.code == code).scalar()
+    return barcodes._load_entries(db, [product_id]).get(product_id)
+
+
+def per_lookup_ms(function, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) / len(items) * 1000
+
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    random.seed(11)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-barcodes-"), "bench.db")
+    codes = create_database(path, products)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(bind=engine)
+    # La recarga en segundo plano del índice usa el pool de tareas
+    database.JobsSessionLocal.configure(bind=engine)
+
+    sample = random.sample(codes, min(lookups, len(codes)))
+    db = Session()
+    start = time.perf_counter()
+    barcodes.index.refresh(db)
+    load_ms = (time.perf_counter() - start) * 1000
+    stats = barcodes.index.snapshot()
+    print(f"{products:,} productos, {stats['codes']:,} códigos; carga inicial del índice: {load_ms:.0f} ms")
+
+    like = per_lookup_ms(lambda row: get_products(db, search=f"Producto {row['product_id'] - 1}"), sample[:200])
+    sql = per_lookup_ms(lambda row: sql_lookup(db, row["code"]), sample)
+    memory = per_lookup_ms(lambda row: barcodes.index.lookup(db, row["code"]), sample)
+    print(f"{'búsqueda':<36} {'ms por búsqueda':>16}")
+    print(f"{'LIKE en 4 columnas (get_products)':<36} {like:>16.3f}")
+    print(f"{'SQL por índice único + lotes':<36} {sql:>16.3f}")
+    print(f"{'índice en memoria':<36} {memory:>16.4f}")
+
+    # Una venta: el commit programa la recarga del producto en segundo plano
+    code, product_id = sample[0]["code"], sample[0]["product_id"]
+    batch_id = barcodes.index.lookup(db, code)["batches"][0]["id"]
+    create_sale(Session(), SaleCreate(client_id=1, payment_method="efectivo", details=[
+        {"batch_id": batch_id, "quantity": 7, "unit_price": 1, "subtotal": 7}
+    ]), user_id=1)
+    start = time.perf_counter()
+    while True:
+        entry = barcodes.index.lookup(db, code)
+        stock = next(batch["stock"] for batch in entry["batches"] if batch["id"] == batch_id)
+        if stock == 93 or time.perf_counter() - start > 5:
+            break
+        time.sleep(0.001)
+    print(f"stock del lote {batch_id} en el índice tras la venta: {stock} "
+          f"(en {(time.perf_counter() - start) * 1000:.1f} ms, {barcodes.index.snapshot()['delta_loads']} recargas parciales)")
+    db.close()
+    if stock != 93:
+        sys.exit("El índice no reflejó la venta")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark de la recepción de compras
+Compara el flujo anterior línea por línea (SELECT del producto, INSERT/commit del producto
+y flush del lote por cada línea) contra create_purchase con resolución masiva de productos,
+usando una base SQLite temporal.
+Ejecutar: python benchmarks/bench_bulk_receiving.py [lineas_por_nota]
+"""
+import os
+import sys
+import time
+import random
+from datetime import date, timedelta, datetime
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+from db.models import Category, Product, MedicineBatch, Supplier, User, Role, Purchase, PurchaseDetail
+from db.schemas import PurchaseCreate, PurchaseDetailCreate
+from crud.purchases import create_purchase
+
+NOTES = 10
+EXISTING_PRODUCTS = 2000
+
+
+def new_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    role = Role(name="Farmacéutico")
+    db.add(role)
+    db.flush()
+    db.add_all([
+        User(role_id=role.id, first_name="Bench", last_name="User", username="bench", email="bench@local"),
+        Supplier(name="Proveedor", phone="1", email="p@local", address="-", city="-"),
+        Category(name="Bench")
+    ])
+    db.flush()
+    db.add_all([
+        Product(name=f"Producto {i}", category_id=1, presentation="Caja", concentration="1mg", status=1)
+        for i in range(EXISTING_PRODUCTS)
+    ])
+    db.commit()
+    return db
+
+
+def build_note(lines: int) -> PurchaseCreate:
+    details = []
+    for _ in range(lines):
+        # Mitad productos existentes, mitad nuevos
+        number = random.randint(0, EXISTING_PRODUCTS * 2)
+        quantity = random.randint(10, 100)
+        details.append(PurchaseDetailCreate(
+            product_name=f"Producto {number}",
+            category_id=1,
+            presentation="Caja",
+            concentration="1mg",
+            expiration_date=date.today() + timedelta(days=365),
+            unit_price=Decimal("5.00"),
+            quantity=quantity,
+            subtotal=Decimal("5.00") * quantity
+        ))
+    return PurchaseCreate(supplier_id=1, payment_method="transferencia", details=details)
+
+
+def receive_per_line(db, data: PurchaseCreate, user_id: int):
+    """Flujo anterior: una consulta por línea y commits intermedios al crear productos"""
+    total = Decimal("0.00")
+    rows = []
+    for detail in data.details:
+        product = db.query(Product).filter(
+            Product.name == detail.product_name,
+            Product.presentation == detail.presentation,
+            Product.concentration == detail.concentration,
+            Product.status == 1
+        ).first()
+        if not product:
+            product = Product(
+                name=detail.product_name, category_id=detail.category_id,
+                presentation=detail.presentation, concentration=detail.concentration, status=1
+            )
+            db.add(product)
+            db.commit()
+            db.refresh(product)
+        batch = MedicineBatch(
+            product_id=product.id, expiration_date=detail.expiration_date, stock=detail.quantity,
+            purchase_price=detail.unit_price, sale_price=detail.unit_price, status=1
+        )
+        db.add(batch)
+        db.flush()
+        subtotal = detail.unit_price * detail.quantity
+        total += subtotal
+        rows.append((batch.id, detail, subtotal))
+    purchase = Purchase(user_id=user_id, supplier_id=data.supplier_id, purchase_date=datetime.now(),
+                        payment_method=data.payment_method, total=total)
+    db.add(purchase)
+    db.flush()
+    for batch_id, detail, subtotal in rows:
+        db.add(PurchaseDetail(purchase_id=purchase.id, batch_id=batch_id, quantity=detail.quantity,
+                              unit_price=detail.unit_price, subtotal=subtotal))
+    db.commit()
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    random.seed(7)
+    notes = [build_note(lines) for _ in range(NOTES)]
+
+    timings = {}
+    for name, receive in (("línea por línea", receive_per_line), ("masiva", create_purchase)):
+        db = new_session()
+        start = time.perf_counter()
+        for note in notes:
+            receive(db, note, 1)
+        timings[name] = (time.perf_counter() - start) / NOTES
+        db.close()
+
+    print(f"Notas de entrega: {NOTES} x {lines} líneas")
+    for name, seconds in timings.items():
+        print(f"{name:>16}: {seconds * 1000:8.1f} ms/nota")
+
+
+if __name__ == "__main__":
+    main()
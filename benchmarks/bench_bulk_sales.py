@@ -0,0 +1,111 @@
+"""
+Benchmark de la carga masiva de ventas (POST /sales/bulk)
+Compara registrar N ventas una por una con create_sale contra create_sales_bulk,
+usando una base SQLite temporal.
+Ejecutar: python benchmarks/bench_bulk_sales.py [cantidad_de_ventas]
+"""
+import os
+import sys
+import time
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+from db.models import Category, Product, MedicineBatch, Client, User, Role
+from db.schemas import SaleCreate
+from crud.sales import create_sale, create_sales_bulk
+
+PRODUCTS = 200
+LOTS_PER_PRODUCT = 5
+
+
+def new_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    user = User(role_id=role.id, first_name="Bench", last_name="User", username="bench", email="bench@local")
+    category = Category(name="Bench")
+    db.add_all([user, category])
+    db.flush()
+    db.add_all([Client(first_name=f"Cliente{i}", last_name="Bench", status=1) for i in range(50)])
+
+    products = [
+        Product(name=f"Producto {i}", category_id=category.id, presentation="Caja", concentration="1mg", status=1)
+        for i in range(PRODUCTS)
+    ]
+    db.add_all(products)
+    db.flush()
+    today = date.today()
+    db.add_all([
+        MedicineBatch(
+            product_id=product.id,
+            expiration_date=today + timedelta(days=random.randint(30, 720)),
+            stock=1_000_000,
+            sale_price=10,
+            status=1
+        )
+        for product in products
+        for _ in range(LOTS_PER_PRODUCT)
+    ])
+    db.commit()
+    return db, user.id
+
+
+def build_sales(count: int):
+    sales = []
+    for _ in range(count):
+        details = []
+        for _ in range(random.randint(1, 4)):
+            quantity = random.randint(1, 3)
+            details.append({
+                "product_id": random.randint(1, PRODUCTS),
+                "quantity": quantity,
+                "unit_price": 10,
+                "subtotal": 10 * quantity
+            })
+        sales.append(SaleCreate(client_id=random.randint(1, 50), payment_method="efectivo", details=details))
+    return sales
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    random.seed(42)
+    sales = build_sales(count)
+
+    # Una por una (mismo camino que POST /sales/ sin factura): se mide una muestra y se extrapola
+    sample = sales[:min(count, 500)]
+    db, user_id = new_session()
+    start = time.perf_counter()
+    for sale in sample:
+        create_sale(db, sale, user_id)
+    single = (time.perf_counter() - start) / len(sample)
+    db.close()
+
+    db, user_id = new_session()
+    start = time.perf_counter()
+    results = create_sales_bulk(db, sales, user_id)
+    bulk = time.perf_counter() - start
+    created = sum(1 for r in results if r["status"] == "created")
+    db.close()
+
+    print(f"Ventas: {count}")
+    print(f"Una por una: {single * 1000:.2f} ms/venta -> {single * count:.1f} s estimados")
+    print(f"Carga masiva: {bulk:.2f} s ({created} registradas, {count / bulk:,.0f} ventas/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark de la sincronización incremental del catálogo de las terminales
+Sobre una base SQLite temporal con P productos (3 lotes cada uno) y las rutas reales con TestClient:
+- descarga completa actual: GET /products/all + GET /batches/all (lo que cada terminal pide hoy)
+- carga inicial:            GET /sync/catalog/snapshot (formato de columnas)
+- después de V ventas y un lote dado de baja: GET /sync/catalog?since=<seq del snapshot>
+- sondeo sin cambios:       GET /sync/catalog?since=<seq actual> (sin consultas)
+Se comparan bytes y sentencias SQL, y se comprueba que el delta trae el stock nuevo de los lotes
+vendidos y el tombstone del lote dado de baja.
+Ejecutar: python benchmarks/bench_catalog_sync.py [productos] [ventas]
+"""
+import os
+import sys
+import random
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+# Sin escrituras concurrentes: cada secuencia del registro de cambios se da por completa al confirmarse
+os.environ.setdefault("CATALOG_CHANGES_GRACE_SECONDS", "0")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from db.database import Base, get_db
+from db.models import Category, Product, MedicineBatch, ProductStock, Client, User, Role
+from db.schemas import SaleCreate
+from crud.sales import create_sale
+from crud.batches import delete_batch
+from routers.products import routerProduct
+from routers.batches import routerBatch
+from routers.sync import routerSync
+
+
+def create_database(path: str, products: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    db.add_all([
+        User(role_id=role.id, first_name="Bench", last_name="User", username="bench", email="bench@local"),
+        Client(first_name="Cliente", last_name="Bench", status=1),
+        Category(name="Bench")
+    ])
+    db.flush()
+    db.execute(insert(Product.__table__), [
+        {"name": f"Producto {i}", "category_id": 1, "presentation": "Caja", "concentration": "500 mg",
+         "description": "Producto de prueba para el benchmark", "status": 1} for i in range(products)
+    ])
+    db.execute(insert(MedicineBatch.__table__), [
+        {"product_id": i % products + 1, "stock": 100, "sale_price": random.randint(1, 90),
+         "purchase_price": 1, "status": 1} for i in range(products * 3)
+    ])
+    db.execute(insert(ProductStock.__table__), [
+        {"product_id": i + 1, "stock": 300} for i in range(products)
+    ])
+    db.commit()
+    db.close()
+
+
+class Counter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = 0
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self.count)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, "before_cursor_execute", self.count)
+
+    def count(self, *args):
+        self.statements += 1
+
+
+def fetch(client, engine, *requests):
+    with Counter(engine) as counter:
+        responses = [client.get(path, params=params) for path, params in requests]
+    return responses, sum(len(response.content) for response in responses), counter.statements
+
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    sales = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    random.seed(7)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-sync-"), "bench.db")
+    create_database(path, products)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(bind=engine)
+
+    def bench_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    for router in (routerProduct, routerBatch, routerSync):
+        app.include_router(router)
+    app.dependency_overrides[get_db] = bench_db
+    client = TestClient(app)
+
+    print(f"{products:,} productos, {products * 3:,} lotes, {sales} ventas entre la carga inicial y el delta")
+    print(f"{'petición':<44} {'bytes':>12} {'sentencias SQL':>15}")
+    _, full_bytes, full_statements = fetch(client, engine, ("/products/all", {}), ("/batches/all", {}))
+    print(f"{'/products/all + /batches/all':<44} {full_bytes:>12,} {full_statements:>15,}")
+    (snapshot,), snapshot_bytes, snapshot_statements = fetch(client, engine, ("/sync/catalog/snapshot", {}))
+    seq = snapshot.json()["seq"]
+    print(f"{'/sync/catalog/snapshot':<44} {snapshot_bytes:>12,} {snapshot_statements:>15,}")
+
+    db = Session()
+    sold = {}
+    for _ in range(sales):
+        batch_id = random.randint(1, products * 3)
+        create_sale(db, SaleCreate(client_id=1, payment_method="efectivo", details=[
+            {"batch_id": batch_id, "quantity": 1, "unit_price": 1, "subtotal": 1}
+        ]), user_id=1)
+        sold[batch_id] = sold.get(batch_id, 0) + 1
+    removed = next(batch_id for batch_id in range(1, products * 3 + 1) if batch_id not in sold)
+    delete_batch(db, removed, user_id=1)
+    db.close()
+
+    (delta,), delta_bytes, delta_statements = fetch(client, engine, ("/sync/catalog", {"since": seq}))
+    changes = delta.json()
+    print(f"{f'/sync/catalog?since={seq}':<44} {delta_bytes:>12,} {delta_statements:>15,}")
+    (_,), poll_bytes, poll_statements = fetch(client, engine, ("/sync/catalog", {"since": changes["seq"]}))
+    print(f"{'/sync/catalog (sin cambios)':<44} {poll_bytes:>12,} {poll_statements:>15,}")
+    print(f"delta: {len(changes['products']['rows'])} productos, {len(changes['batches']['rows'])} lotes, "
+          f"tombstones {changes['deleted']}")
+
+    stock = {row[0]: row[3] for row in changes["batches"]["rows"]}
+    if any(stock.get(batch_id) != 100 - quantity for batch_id, quantity in sold.items()) \
+            or changes["deleted"]["batches"] != [removed]:
+        sys.exit("El delta no coincide con los cambios hechos")
+
+
+if __name__ == "__main__":
+    main()
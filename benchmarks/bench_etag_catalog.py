@@ -0,0 +1,123 @@
+"""
+Benchmark de la caché HTTP con ETag de los catálogos: peticiones repetidas a GET /products/all
+Sobre una base SQLite temporal, la ruta real (routers.products) se llama N veces con TestClient, como
+N terminales abriendo la pantalla de productos sin que el catálogo cambie:
+- sin caché:        cada petición consulta la BD y serializa el listado completo
+- caché en memoria: 200 con el cuerpo guardado (sin consultas; las versiones se releen cada segundo)
+- If-None-Match:    el cliente envía el ETag que ya tiene y recibe 304 sin cuerpo
+Se cuentan las sentencias SQL (evento before_cursor_execute) y los bytes enviados. Al final se cambia
+un precio y se comprueba que el ETag cambia y que el listado trae el precio nuevo.
+Ejecutar: python benchmarks/bench_etag_catalog.py [peticiones] [productos]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from db.database import Base, get_db
+from db.models import Category, Product, MedicineBatch, ProductStock
+from crud.products import update_product_price
+from routers.products import routerProduct
+from utils import http_cache
+
+
+def create_database(path: str, products: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Category(name="Bench"))
+    db.flush()
+    db.execute(insert(Product.__table__), [
+        {"name": f"Producto {i}", "category_id": 1, "presentation": "Caja", "concentration": "500 mg",
+         "description": "Producto de prueba para el benchmark", "status": 1} for i in range(products)
+    ])
+    db.execute(insert(MedicineBatch.__table__), [
+        {"product_id": i % products + 1, "stock": random.randint(0, 50), "sale_price": random.randint(1, 90),
+         "status": 1} for i in range(products * 3)
+    ])
+    db.execute(insert(ProductStock.__table__), [
+        {"product_id": i + 1, "stock": random.randint(0, 150)} for i in range(products)
+    ])
+    db.commit()
+    db.close()
+
+
+def run(client, engine, requests: int, etag: str = None):
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    headers = {"If-None-Match": etag} if etag else {}
+    sent = 0
+    event.listen(engine, "before_cursor_execute", count)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get("/products/all", headers=headers)
+        sent += len(response.content)
+    elapsed = time.perf_counter() - start
+    event.remove(engine, "before_cursor_execute", count)
+    return response.status_code, statements[0], sent, elapsed
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    products = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    random.seed(5)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-etag-"), "bench.db")
+    create_database(path, products)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(bind=engine)
+
+    def bench_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(routerProduct)
+    app.dependency_overrides[get_db] = bench_db
+    client = TestClient(app)
+
+    etag = client.get("/products/all").headers["ETag"]
+    max_bytes = http_cache.cache.max_bytes
+    print(f"{requests} peticiones a GET /products/all, {products:,} productos")
+    print(f"{'modo':<18} {'estado':>6} {'sentencias SQL':>15} {'bytes enviados':>15} {'tiempo/petición':>16}")
+    for mode, cache_bytes, if_none_match in (("sin caché", 0, None),
+                                             ("caché en memoria", max_bytes, None),
+                                             ("If-None-Match", max_bytes, etag)):
+        http_cache.cache.max_bytes = cache_bytes
+        http_cache.cache.clear()
+        status, statements, sent, elapsed = run(client, engine, requests, if_none_match)
+        print(f"{mode:<18} {status:>6} {statements:>15,} {sent:>15,} {elapsed / requests * 1000:>13.2f} ms")
+
+    # Un cambio en el catálogo (misma transacción que el precio) invalida el ETag
+    db = Session()
+    update_product_price(db, 1, 123.45)
+    db.close()
+    response = client.get("/products/all", headers={"If-None-Match": etag})
+    price = next(item["sale_price"] for item in response.json() if item["id"] == 1)
+    print(f"tras cambiar un precio: estado {response.status_code}, ETag nuevo {response.headers['ETag'] != etag}, "
+          f"precio {price}")
+    if response.status_code != 200 or price != 123.45:
+        sys.exit("El cambio de precio no invalidó el ETag")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark de la asignación FEFO de lotes en ventas
+Mide el costo de asignar una línea de venta según la cantidad de lotes activos del producto
+(consulta indexada + reparto en memoria) usando una base SQLite temporal.
+Ejecutar: python benchmarks/bench_fefo_allocation.py
+"""
+import os
+import sys
+import time
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+from db.models import Category, Product, MedicineBatch
+from db.schemas import SaleCreate
+from crud.sales import _allocate_fefo, _lock_batches_for_sale
+
+LOT_COUNTS = [1, 10, 100, 500, 1000]
+ITERATIONS = 200
+
+
+def seed(db, lots: int) -> int:
+    category = Category(name="Bench")
+    db.add(category)
+    db.flush()
+    product = Product(name=f"Producto {lots}", category_id=category.id, presentation="Caja", concentration="1mg", status=1)
+    db.add(product)
+    db.flush()
+    today = date.today()
+    db.add_all([
+        MedicineBatch(
+            product_id=product.id,
+            expiration_date=today + timedelta(days=random.randint(1, 720)),
+            stock=random.randint(1, 20),
+            sale_price=10,
+            status=1
+        )
+        for _ in range(lots)
+    ])
+    db.commit()
+    return product.id
+
+
+def main():
+    print(f"{'lotes':>8} {'consulta (ms)':>14} {'reparto (us)':>13} {'lotes usados':>13}")
+    for lots in LOT_COUNTS:
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        product_id = seed(db, lots)
+
+        data = SaleCreate(
+            client_id=1,
+            payment_method="efectivo",
+            details=[{"product_id": product_id, "quantity": 25, "unit_price": 10, "subtotal": 250}]
+        )
+
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            batches_by_id, fefo_batches = _lock_batches_for_sale(db, data.details)
+            db.rollback()
+        query_ms = (time.perf_counter() - start) / ITERATIONS * 1000
+
+        batches_by_id, fefo_batches = _lock_batches_for_sale(db, data.details)
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            available = {}
+            allocations, _ = _allocate_fefo(fefo_batches[product_id], 25, available)
+        alloc_us = (time.perf_counter() - start) / ITERATIONS * 1_000_000
+
+        print(f"{lots:>8} {query_ms:>14.3f} {alloc_us:>13.1f} {len(allocations):>13}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
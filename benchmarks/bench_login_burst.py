@@ -0,0 +1,152 @@
+"""
+Benchmark de latencia de ventas durante una ráfaga de inicios de sesión
+Mientras N clientes hacen login al mismo tiempo, una terminal registra ventas (POST /sales/)
+una tras otra y se mide su latencia. Se compara:
+- inline: el login anterior (ruta sync con bcrypt en el threadpool de peticiones)
+- pool:   POST /token actual (bcrypt en el pool acotado de utils.login; los 503 se reintentan)
+Usa una base SQLite temporal y la app completa en el mismo proceso.
+Ejecutar: python benchmarks/bench_login_burst.py [cantidad_de_logins]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import statistics
+from datetime import date, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+import httpx
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+WORKDIR = tempfile.mkdtemp(prefix="bench-login-")
+os.chdir(WORKDIR)
+os.makedirs("uploads", exist_ok=True)
+
+import db.database as database
+engine = create_engine(f"sqlite:///{WORKDIR}/bench.db", connect_args={"check_same_thread": False})
+database.engine = engine
+database.SessionLocal.configure(bind=engine)
+
+from db.database import Base, SessionLocal, get_db
+from db.models import Category, Product, MedicineBatch, Client, User, Role
+from utils.auth import get_current_user
+from utils.security import get_password_hash, verify_password, BCRYPT_ROUNDS
+import main
+
+PASSWORD = "clave-de-prueba"
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    password = get_password_hash(PASSWORD)
+    db.add_all([
+        User(role_id=role.id, first_name="Cajero", last_name=str(i), username=f"cajero{i}",
+             email=f"cajero{i}@local", password=password)
+        for i in range(20)
+    ])
+    category = Category(name="Bench")
+    db.add_all([category, Client(first_name="Cliente", last_name="Bench", status=1)])
+    db.flush()
+    product = Product(name="Producto", category_id=category.id, presentation="Caja", concentration="1mg", status=1)
+    db.add(product)
+    db.flush()
+    db.add(MedicineBatch(product_id=product.id, expiration_date=date.today() + timedelta(days=365),
+                         stock=1_000_000, sale_price=10, status=1))
+    product_id = product.id
+    db.commit()
+    cashier = db.query(User).first()
+    db.expunge(cashier)
+    db.close()
+    return cashier, product_id
+
+
+@main.app.post("/token-inline")
+def login_inline(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    """Login anterior: bcrypt dentro de la ruta sync (ocupa un hilo del threadpool de peticiones)"""
+    user = db.query(User).filter(User.username == form_data.username).first()
+    if not user or not verify_password(form_data.password, user.password):
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+    return {"id": user.id}
+
+
+async def login(client: httpx.AsyncClient, path: str, index: int, rejected: list):
+    while True:
+        response = await client.post(path, data={"username": f"cajero{index % 20}", "password": PASSWORD})
+        if response.status_code != 503:
+            assert response.status_code == 200, response.text
+            return
+        rejected.append(1)
+        await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+
+
+async def checkout_loop(client: httpx.AsyncClient, product_id: int, stop: asyncio.Event, latencies: list):
+    sale = {
+        "client_id": 1,
+        "payment_method": "efectivo",
+        "details": [{"product_id": product_id, "quantity": 1, "unit_price": 10, "subtotal": 10}]
+    }
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post("/sales/", json=sale)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+        await asyncio.sleep(0.01)
+
+
+async def run(product_id: int, path: str = None, logins: int = 0, idle_seconds: float = 3.0):
+    """Latencias de venta durante la ráfaga (o durante idle_seconds si no hay logins)"""
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        stop = asyncio.Event()
+        latencies = []
+        rejected = []
+        checkout = asyncio.create_task(checkout_loop(client, product_id, stop, latencies))
+        start = time.perf_counter()
+        if path:
+            await asyncio.gather(*(login(client, path, i, rejected) for i in range(logins)))
+        else:
+            await asyncio.sleep(idle_seconds)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await checkout
+    return latencies, elapsed, len(rejected)
+
+
+def describe(latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f"{len(ordered):4d} ventas  p50 {statistics.median(ordered) * 1000:7.1f} ms  "
+            f"p95 {p95 * 1000:7.1f} ms  máx {ordered[-1] * 1000:7.1f} ms")
+
+
+def main_benchmark():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    cashier, product_id = seed()
+    main.app.dependency_overrides[get_current_user] = lambda: cashier
+
+    print(f"Logins simultáneos: {logins} (BCRYPT_ROUNDS={BCRYPT_ROUNDS}, CPUs={os.cpu_count()})")
+    latencies, _, _ = asyncio.run(run(product_id))
+    print(f"Sin logins:      {describe(latencies)}")
+    latencies, elapsed, _ = asyncio.run(run(product_id, "/token-inline", logins))
+    print(f"Login inline:    {describe(latencies)}  (ráfaga {elapsed:.1f} s)")
+    latencies, elapsed, rejected = asyncio.run(run(product_id, "/token", logins))
+    print(f"Login con pool:  {describe(latencies)}  (ráfaga {elapsed:.1f} s, {rejected} respuestas 503 reintentadas)")
+
+
+if __name__ == "__main__":
+    main_benchmark()
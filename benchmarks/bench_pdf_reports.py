@@ -0,0 +1,156 @@
+"""
+Benchmark del PDF del reporte de ventas completo (páginas por segundo y memoria)
+Cada medición corre en un intérprete nuevo sobre una base SQLite temporal y registra tiempo,
+páginas y memoria máxima del proceso (RSS, Linux):
+- tabla única: get_sales_report (todas las ventas como objetos del ORM) y una sola Table con
+  todas las filas y repeatRows, que ReportLab divide página por página
+- streamed:    get_sales_report_summary + iter_sales_report_rows (cursor por bloques) dibujados
+  con StreamedTable y escritos directo a un archivo temporal
+La tabla única se mide con menos filas: el costo de dividir una tabla gigante crece con su tamaño.
+Ejecutar: python benchmarks/bench_pdf_reports.py [ventas] [ventas_tabla_unica]
+"""
+import os
+import sys
+import json
+import random
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+CHILD = """
+import os, sys, time, json
+sys.path.insert(0, {base_dir!r})
+for key, value in {{"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}}.items():
+    os.environ.setdefault(key, value)
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+engine = create_engine("sqlite:///{database}")
+db = sessionmaker(bind=engine)()
+start_date = datetime.fromisoformat({start_date!r})
+def peak_rss():
+    # VmHWM se reinicia con exec (ru_maxrss hereda el máximo del proceso padre)
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+rss_before = peak_rss()
+start = time.perf_counter()
+if {streamed}:
+    from crud.reports import get_sales_report_summary, iter_sales_report_rows
+    from utils.pdf_generator import write_sales_report_pdf
+    summary = get_sales_report_summary(db, start_date=start_date)
+    with open({output!r}, "wb") as output:
+        pages = write_sales_report_pdf(output, summary, iter_sales_report_rows(db, start_date=start_date))
+else:
+    from io import BytesIO
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table
+    from crud.reports import get_sales_report
+    from utils.pdf_generator import _list_style
+    report = get_sales_report(db, start_date=start_date)
+    data = [['ID', 'FECHA', 'CLIENTE', 'MÉTODO', 'ITEMS', 'TOTAL']] + [
+        [str(s['id']), s['date'].split('T')[0], (s['client_name'] or '')[:20], s['payment_method'],
+         str(s['items_count']), f"${{s['total']:,.2f}}"]
+        for s in report['sales']
+    ]
+    table = Table(data, colWidths=[0.7*inch, 1*inch, 1.6*inch, 1*inch, 0.7*inch, 1*inch], repeatRows=1)
+    table.setStyle(_list_style('#7030A0', '#E7E6E6'))
+    doc = SimpleDocTemplate(BytesIO(), pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    doc.build([table])
+    pages = doc.page
+elapsed = time.perf_counter() - start
+peak = peak_rss()
+print(json.dumps({{"seconds": elapsed, "pages": pages, "rss_mb": peak / 1024, "growth_mb": (peak - rss_before) / 1024}}))
+"""
+
+
+def create_database(path: str, sales_count: int):
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+    from db.database import Base
+    from db.models import Category, Product, MedicineBatch, Client, User, Role, Sale, SalesDetail
+    from utils.bulk import chunked
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    db.add_all([
+        User(role_id=role.id, first_name="Bench", last_name="User", username="bench", email="bench@local"),
+        Category(name="Bench")
+    ])
+    db.flush()
+    db.execute(insert(Client.__table__), [
+        {"first_name": f"Cliente {i}", "last_name": "Bench", "status": 1} for i in range(500)
+    ])
+    db.execute(insert(Product.__table__), [
+        {"name": f"Producto {i}", "category_id": 1, "presentation": "Caja", "status": 1} for i in range(200)
+    ])
+    db.execute(insert(MedicineBatch.__table__), [
+        {"product_id": i + 1, "stock": 1000, "sale_price": 10, "status": 1} for i in range(200)
+    ])
+
+    start = datetime(2024, 1, 1)
+    sales, details = [], []
+    for sale_id in range(1, sales_count + 1):
+        price = Decimal(random.randint(100, 5000)) / 100
+        sales.append({
+            "client_id": random.randint(1, 500), "user_id": 1,
+            "sale_date": start + timedelta(minutes=sale_id * 5),
+            "payment_method": random.choice(("efectivo", "tarjeta", "transferencia")),
+            "total": price * 2
+        })
+        for _ in range(2):
+            details.append({"sale_id": sale_id, "batch_id": random.randint(1, 200), "quantity": 1,
+                            "unit_price": price, "subtotal": price})
+    for chunk in chunked(sales, 20_000):
+        db.execute(insert(Sale.__table__), chunk)
+    for chunk in chunked(details, 20_000):
+        db.execute(insert(SalesDetail.__table__), chunk)
+    db.commit()
+    db.close()
+
+
+def run_child(database: str, streamed: bool, start_date: datetime, workdir: str):
+    code = CHILD.format(base_dir=str(BASE_DIR), database=database, streamed=streamed,
+                        start_date=start_date.isoformat(), output=os.path.join(workdir, "reporte.pdf"))
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    sales_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    single_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    random.seed(5)
+    workdir = tempfile.mkdtemp(prefix="bench-pdf-")
+    database = os.path.join(workdir, "bench.db")
+    create_database(database, sales_count)
+
+    # Las ventas son cada 5 minutos desde 2024-01-01: el rango elige las últimas N
+    last_sale = datetime(2024, 1, 1) + timedelta(minutes=sales_count * 5)
+    runs = [("tabla única", False, single_count), ("streamed", True, single_count), ("streamed", True, sales_count)]
+
+    print(f"{'modo':<12} {'ventas':>8} {'páginas':>8} {'tiempo':>9} {'págs/s':>8} {'RSS máx':>9} {'aumento':>9}")
+    for name, streamed, count in runs:
+        start_date = last_sale - timedelta(minutes=(count - 1) * 5)
+        result = run_child(database, streamed, start_date, workdir)
+        print(f"{name:<12} {count:>8,} {result['pages']:>8} {result['seconds']:>7.1f} s "
+              f"{result['pages'] / result['seconds']:>8.1f} {result['rss_mb']:>6.0f} MB {result['growth_mb']:>6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
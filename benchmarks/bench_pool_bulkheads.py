@@ -0,0 +1,130 @@
+"""
+Benchmark de pools separados (bulkheads): latencia de las ventas con reportes saturando la base de datos
+Sobre una base SQLite temporal corren en paralelo, durante unos segundos:
+- reportes: muchos hilos que toman una conexión y la retienen (consulta lenta simulada con sleep),
+  como varios gerentes exportando reportes grandes o un tablero refrescándose en muchas pantallas
+- ventas:   un hilo que registra una venta (INSERT + COMMIT) cada pocos milisegundos
+Se compara:
+- pool único:  reportes y ventas comparten un pool (10 + 20 de desborde), como antes
+- bulkheads:   ventas en el pool 'transactional' (10 + 20) y reportes en 'reporting' (4 + 2),
+  como get_db / get_report_db
+Para las ventas se mide la latencia (espera del pool + transacción) y las que fallan por pool_timeout;
+para cada pool, las métricas de db.pools (espera p95 y conexiones en uso).
+Ejecutar: python benchmarks/bench_pool_bulkheads.py [segundos] [hilos_de_reportes] [ms_por_reporte]
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from db.database import POOL_DEFAULTS
+from db.pools import MeteredQueuePool, get_pool_metrics
+
+# Espera máxima por conexión de las ventas en este benchmark (30 s alargaría demasiado la medición);
+# el pool de reportes usa su valor real (10 s)
+POOL_TIMEOUT = 2
+
+
+def create_pool(path: str, name: str, pool: str):
+    defaults = POOL_DEFAULTS[pool]
+    return create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+        poolclass=MeteredQueuePool,
+        pool_logging_name=name,
+        pool_size=defaults["size"],
+        max_overflow=defaults["overflow"],
+        pool_timeout=POOL_TIMEOUT if pool == "transactional" else defaults["timeout"]
+    )
+
+
+def report_worker(engine, stop: threading.Event, hold_seconds: float, failures: list):
+    while not stop.is_set():
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT COUNT(*) FROM sales")).scalar()
+                time.sleep(hold_seconds)
+        except PoolTimeoutError:
+            failures.append(1)
+
+
+def sales_worker(engine, stop: threading.Event, latencies: list, failures: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                connection.execute(text("INSERT INTO sales (total) VALUES (10)"))
+            latencies.append(time.perf_counter() - start)
+        except PoolTimeoutError:
+            failures.append(time.perf_counter() - start)
+        time.sleep(0.02)
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run(mode: str, path: str, seconds: float, report_threads: int, hold_seconds: float):
+    if mode == "pool único":
+        sales_engine = report_engine = create_pool(path, "unico", "transactional")
+        pools = ["unico"]
+    else:
+        sales_engine = create_pool(path, "transactional", "transactional")
+        report_engine = create_pool(path, "reporting", "reporting")
+        pools = ["transactional", "reporting"]
+
+    stop = threading.Event()
+    latencies, sales_failures, report_failures = [], [], []
+    threads = [threading.Thread(target=report_worker, args=(report_engine, stop, hold_seconds, report_failures))
+               for _ in range(report_threads)]
+    threads.append(threading.Thread(target=sales_worker, args=(sales_engine, stop, latencies, sales_failures)))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{mode:<11} ventas {len(latencies):>5}  p50 {percentile(latencies, 0.5) * 1000:>7.1f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:>7.1f} ms  máx {max(latencies, default=0) * 1000:>7.1f} ms  "
+          f"fallidas {len(sales_failures):>3}  reportes fallidos {len(report_failures):>3}")
+    for name in pools:
+        snapshot = get_pool_metrics(name).snapshot()
+        print(f"  pool {name:<13} espera p95 {snapshot['wait_p95_ms']:>7.1f} ms  timeouts {snapshot['timeouts']:>3}  "
+              f"máx en uso {snapshot['max_checked_out']:>2}/{snapshot['pool_size'] + snapshot['max_overflow']}")
+    sales_engine.dispose()
+    report_engine.dispose()
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    report_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    hold_seconds = (float(sys.argv[3]) if len(sys.argv) > 3 else 500) / 1000
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-pools-"), "bench.db")
+    setup = create_engine(f"sqlite:///{path}")
+    with setup.begin() as connection:
+        connection.execute(text("PRAGMA journal_mode=WAL"))
+        connection.execute(text("CREATE TABLE sales (id INTEGER PRIMARY KEY, total NUMERIC)"))
+    setup.dispose()
+
+    print(f"{report_threads} hilos de reportes reteniendo la conexión {hold_seconds * 1000:.0f} ms, "
+          f"{seconds:.0f} s por modo, pool_timeout de ventas {POOL_TIMEOUT} s")
+    for mode in ("pool único", "bulkheads"):
+        run(mode, path, seconds, report_threads, hold_seconds)
+
+
+if __name__ == "__main__":
+    main()
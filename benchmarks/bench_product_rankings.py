@@ -0,0 +1,139 @@
+"""
+Benchmark de los rankings de productos (más vendidos / ingresos por producto)
+Compara la consulta anterior (products ⋈ medicine_batches ⋈ sales_detail ⋈ sales agrupando
+todo el historial) contra get_product_ranking sobre product_daily_sales, para todo el
+historial y para los últimos 30 días, usando una base SQLite temporal.
+Ejecutar: python benchmarks/bench_product_rankings.py [filas_de_detalle]
+"""
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine, insert, func, text
+from sqlalchemy.orm import sessionmaker
+from db.database import Base
+from db.models import Category, Product, MedicineBatch, Client, User, Role, Sale, SalesDetail
+from crud.product_sales import get_product_ranking, rebuild_product_daily_sales
+from utils.bulk import chunked
+
+PRODUCTS = 2000
+DAYS = 730
+REPEAT = 5
+
+
+def new_session(detail_rows: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    db.add_all([
+        User(role_id=role.id, first_name="Bench", last_name="User", username="bench", email="bench@local"),
+        Client(first_name="Cliente", last_name="Bench", status=1),
+        Category(name="Bench")
+    ])
+    db.flush()
+    db.execute(insert(Product.__table__), [
+        {"name": f"Producto {i}", "category_id": 1, "presentation": "Caja", "concentration": "1mg", "status": 1}
+        for i in range(PRODUCTS)
+    ])
+    db.execute(insert(MedicineBatch.__table__), [
+        {"product_id": i + 1, "stock": 1000, "sale_price": 10, "status": 1} for i in range(PRODUCTS)
+    ])
+
+    start = datetime.now() - timedelta(days=DAYS)
+    sales_count = detail_rows // 2
+    sales, details = [], []
+    for sale_id in range(1, sales_count + 1):
+        total = Decimal("0.00")
+        for _ in range(2):
+            quantity = random.randint(1, 5)
+            price = Decimal(random.randint(100, 5000)) / 100
+            total += price * quantity
+            details.append({
+                "sale_id": sale_id,
+                "batch_id": random.randint(1, PRODUCTS),
+                "quantity": quantity,
+                "unit_price": price,
+                "subtotal": price * quantity
+            })
+        sales.append({
+            "client_id": 1,
+            "user_id": 1,
+            "sale_date": start + timedelta(seconds=random.randint(0, DAYS * 86400)),
+            "payment_method": "efectivo",
+            "total": total
+        })
+    for chunk in chunked(sales, 20_000):
+        db.execute(insert(Sale.__table__), chunk)
+    for chunk in chunked(details, 20_000):
+        db.execute(insert(SalesDetail.__table__), chunk)
+    db.commit()
+    return db
+
+
+def join_ranking(db, start_date=None, limit=10):
+    """Consulta anterior: agrupa todos los detalles de venta del rango"""
+    query = db.query(
+        Product.id, Product.name, func.sum(SalesDetail.quantity).label("total_quantity")
+    ).join(
+        MedicineBatch, Product.id == MedicineBatch.product_id
+    ).join(
+        SalesDetail, MedicineBatch.id == SalesDetail.batch_id
+    ).join(
+        Sale, SalesDetail.sale_id == Sale.id
+    )
+    if start_date:
+        query = query.filter(Sale.sale_date >= start_date)
+    return query.group_by(Product.id, Product.name).order_by(func.sum(SalesDetail.quantity).desc()).limit(limit).all()
+
+
+def measure(function):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    random.seed(11)
+    start = time.perf_counter()
+    db = new_session(rows)
+    print(f"Datos: {rows:,} detalles de venta, {PRODUCTS} productos, {DAYS} días (carga {time.perf_counter() - start:.1f} s)")
+
+    start = time.perf_counter()
+    rebuild_product_daily_sales(db)
+    print(f"rebuild de product_daily_sales: {time.perf_counter() - start:.2f} s")
+    # Estadísticas para el planificador (MySQL las mantiene solo; SQLite sin ellas no usa el rango de la clave)
+    db.execute(text("ANALYZE"))
+
+    # Rango por días completos, como get_product_ranking
+    last_30 = datetime.combine(datetime.now().date() - timedelta(days=29), datetime.min.time())
+    for label, start_date in (("todo el historial", None), ("últimos 30 días", last_30)):
+        expected = [row.id for row in join_ranking(db, start_date)]
+        got = [row["product_id"] for row in get_product_ranking(db, start_date=start_date)]
+        check = "✓" if expected == got else "❌ distinto"
+        join_time = measure(lambda: join_ranking(db, start_date))
+        daily_time = measure(lambda: get_product_ranking(db, start_date=start_date))
+        print(f"{label:>18}: join {join_time * 1000:8.1f} ms | product_daily_sales {daily_time * 1000:7.1f} ms "
+              f"| {join_time / daily_time:5.1f}x {check}")
+
+
+if __name__ == "__main__":
+    main()
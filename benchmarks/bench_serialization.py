@@ -0,0 +1,177 @@
+"""
+Benchmark de serialización de respuestas por endpoint (payloads de N filas, 10 000 por defecto)
+Para cada listado compara, sin base de datos, el tiempo desde los datos ya consultados hasta
+los bytes de la respuesta:
+- antes:  ruta de FastAPI (validación con response_model o jsonable_encoder) + JSONResponse
+- ahora:  FastJSONResponse de utils.serialization en una sola pasada
+Las ventas y compras se arman como objetos del ORM sin sesión e incluyen enrich_*_response.
+También verifica que ambos caminos produzcan el mismo JSON.
+Ejecutar: python benchmarks/bench_serialization.py [filas]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from db.models import (
+    Product, MedicineBatch, Client, User, Supplier, Sale, SalesDetail, Purchase, PurchaseDetail
+)
+from db.schemas import ProductResponse, MedicineBatchResponse
+from routers.products import routerProduct
+from routers.batches import routerBatch
+from routers.sales import enrich_sale_response
+from routers.purchases import enrich_purchase_response
+from utils.serialization import FastJSONResponse, orjson
+
+REPEAT = 3
+
+
+def response_field(router, path: str):
+    for route in router.routes:
+        if route.path == path and "GET" in route.methods:
+            return route.response_field
+    raise LookupError(path)
+
+
+def price() -> Decimal:
+    return Decimal(random.randint(100, 5000)) / 100
+
+
+def product_rows(count: int):
+    return [
+        {
+            "id": i, "name": f"Producto {i}", "description": "Descripción de prueba", "category_id": 1,
+            "presentation": "Caja", "concentration": "500mg", "image": f"uploads/products/{i}.jpg",
+            "image_url": f"http://127.0.0.1:8000/uploads/products/{i}.jpg",
+            "thumbnail_url": f"http://127.0.0.1:8000/uploads/products/thumbs/{i}.webp",
+            "status": 1, "total_stock": random.randint(0, 500), "sale_price": float(price())
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def batch_rows(count: int):
+    return [
+        {
+            "id": i, "product_id": i, "expiration_date": date.today() + timedelta(days=i % 700),
+            "stock": random.randint(0, 500), "purchase_price": float(price()), "sale_price": float(price()),
+            "status": 1, "product_name": f"Producto {i}", "product_presentation": "Caja"
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def catalog():
+    products = [Product(id=i, name=f"Producto {i}", presentation="Caja", concentration="500mg",
+                        image=f"uploads/products/{i}.jpg") for i in range(1, 201)]
+    return [
+        MedicineBatch(id=i, product=products[i % 200], stock=100, purchase_price=price(), sale_price=price(),
+                      expiration_date=date.today() + timedelta(days=i))
+        for i in range(1, 501)
+    ]
+
+
+def sale_objects(count: int, batches):
+    client = Client(id=1, first_name="Cliente", last_name="Bench", email="cliente@local")
+    user = User(id=1, first_name="Cajero", last_name="Bench", email="cajero@local")
+    start = datetime.now() - timedelta(days=365)
+    sales = []
+    for i in range(1, count + 1):
+        details = [
+            SalesDetail(id=i * 3 + n, batch_id=batch.id, batch=batch, quantity=2,
+                        unit_price=batch.sale_price, subtotal=batch.sale_price * 2)
+            for n, batch in enumerate(random.sample(batches, 2))
+        ]
+        sales.append(Sale(id=i, client_id=1, user_id=1, client=client, user=user, details=details,
+                          sale_date=start + timedelta(minutes=i), payment_method="efectivo",
+                          total=sum(detail.subtotal for detail in details)))
+    return sales
+
+
+def purchase_objects(count: int, batches):
+    supplier = Supplier(id=1, name="Proveedor", email="proveedor@local")
+    user = User(id=1, first_name="Compras", last_name="Bench", email="compras@local")
+    start = datetime.now() - timedelta(days=365)
+    purchases = []
+    for i in range(1, count + 1):
+        details = [
+            PurchaseDetail(id=i * 3 + n, batch_id=batch.id, batch=batch, quantity=10,
+                           unit_price=batch.purchase_price, subtotal=batch.purchase_price * 10)
+            for n, batch in enumerate(random.sample(batches, 2))
+        ]
+        purchases.append(Purchase(id=i, user_id=1, supplier_id=1, supplier=supplier, user=user,
+                                  details=details, purchase_date=start + timedelta(minutes=i),
+                                  payment_method="transferencia",
+                                  total=sum(detail.subtotal for detail in details)))
+    return purchases
+
+
+def measure(function):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        body = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    random.seed(7)
+    batches = catalog()
+    products = product_rows(rows)
+    batch_list = batch_rows(rows)
+    sales = sale_objects(rows, batches)
+    purchases = purchase_objects(rows, batches)
+    products_field = response_field(routerProduct, "/products/all")
+    batches_field = response_field(routerBatch, "/batches/all")
+
+    def validated(field, content):
+        return JSONResponse(asyncio.run(serialize_response(field=field, response_content=content))).body
+
+    endpoints = [
+        ("GET /products/all",
+         lambda: validated(products_field, [ProductResponse(**p) for p in products]),
+         lambda: FastJSONResponse(products).body),
+        ("GET /batches/all",
+         lambda: validated(batches_field, [MedicineBatchResponse(**b) for b in batch_list]),
+         lambda: FastJSONResponse(batch_list).body),
+        ("GET /sales/",
+         lambda: JSONResponse(jsonable_encoder([enrich_sale_response(s) for s in sales])).body,
+         lambda: FastJSONResponse([enrich_sale_response(s) for s in sales]).body),
+        ("GET /purchases/",
+         lambda: JSONResponse(jsonable_encoder([enrich_purchase_response(p) for p in purchases])).body,
+         lambda: FastJSONResponse([enrich_purchase_response(p) for p in purchases]).body),
+    ]
+
+    print(f"Filas por respuesta: {rows:,} (serializador: {'orjson' if orjson else 'json'}, mejor de {REPEAT})")
+    print(f"{'endpoint':<18} {'antes':>10} {'ahora':>10} {'aceleración':>12} {'tamaño':>10}")
+    for name, before, after in endpoints:
+        before_time, before_body = measure(before)
+        after_time, after_body = measure(after)
+        if json.loads(before_body) != json.loads(after_body):
+            print(f"❌ {name}: las respuestas no coinciden")
+            return False
+        print(f"{name:<18} {before_time * 1000:8.1f} ms {after_time * 1000:8.1f} ms "
+              f"{before_time / after_time:11.1f}x {len(after_body) / 1024:7.0f} KB")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
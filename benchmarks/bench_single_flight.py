@@ -0,0 +1,153 @@
+"""
+Benchmark de single-flight: 100 llamadas simultáneas e idénticas al tablero y a un reporte
+Sobre una base SQLite temporal, N hilos (cada uno con su propia sesión, como N pestañas abiertas)
+llaman a la vez a get_all_dashboard_data y a get_report("sales", último día). Se cuentan las sentencias SQL
+ejecutadas (evento before_cursor_execute del engine) y se comparan con las de una sola llamada:
+- sin single-flight: cada llamada ejecuta todas las consultas
+- con single-flight: las consultas se ejecutan una vez y las demás llamadas reciben el mismo resultado
+El programa termina con error si con single-flight se ejecutan más sentencias que en una sola llamada.
+Ejecutar: python benchmarks/bench_single_flight.py [llamadas] [ventas]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from db.database import Base
+from db.models import Category, Product, MedicineBatch, Client, User, Role, Sale, SalesDetail
+from utils import single_flight
+from utils.bulk import chunked
+
+
+def create_database(path: str, sales_count: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    db.add_all([
+        User(role_id=role.id, first_name="Bench", last_name="User", username="bench", email="bench@local"),
+        Category(name="Bench")
+    ])
+    db.flush()
+    db.execute(insert(Client.__table__), [
+        {"first_name": f"Cliente {i}", "last_name": "Bench", "status": 1} for i in range(200)
+    ])
+    db.execute(insert(Product.__table__), [
+        {"name": f"Producto {i}", "category_id": 1, "presentation": "Caja", "status": 1} for i in range(100)
+    ])
+    db.execute(insert(MedicineBatch.__table__), [
+        {"product_id": i + 1, "stock": random.randint(0, 50), "sale_price": 10, "status": 1} for i in range(100)
+    ])
+    start = datetime.now() - timedelta(days=30)
+    sales, details = [], []
+    for sale_id in range(1, sales_count + 1):
+        price = Decimal(random.randint(100, 5000)) / 100
+        sales.append({
+            "client_id": random.randint(1, 200), "user_id": 1,
+            "sale_date": start + timedelta(seconds=sale_id * 30 * 86400 // sales_count),
+            "payment_method": random.choice(("efectivo", "tarjeta")), "total": price
+        })
+        details.append({"sale_id": sale_id, "batch_id": random.randint(1, 100), "quantity": 1,
+                        "unit_price": price, "subtotal": price})
+    for chunk in chunked(sales, 20_000):
+        db.execute(insert(Sale.__table__), chunk)
+    for chunk in chunked(details, 20_000):
+        db.execute(insert(SalesDetail.__table__), chunk)
+    db.commit()
+    db.close()
+
+
+def run(engine, calls: int, function, setup, enabled: bool):
+    single_flight.SINGLE_FLIGHT_ENABLED = enabled
+    setup()
+    Session = sessionmaker(bind=engine)
+    statements = [0]
+    lock = threading.Lock()
+
+    def count(*args):
+        with lock:
+            statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    barrier = threading.Barrier(calls)
+    results, errors = [], []
+
+    def worker():
+        db = Session()
+        try:
+            barrier.wait()
+            results.append(function(db))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(calls)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    event.remove(engine, "before_cursor_execute", count)
+    if errors:
+        raise errors[0]
+    return len(results), statements[0], elapsed
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    sales_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    random.seed(3)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-single-flight-"), "bench.db")
+    create_database(path, sales_count)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                           pool_size=calls, max_overflow=0)
+
+    from crud.dashboard import get_all_dashboard_data
+    from utils.report_jobs import get_report, report_params, cache
+
+    def clear_cache():
+        # Sin resultados guardados: se mide el cálculo, no la lectura de la caché
+        cache.clear()
+
+    # Último día: sin single-flight cada llamada carga sus ventas en memoria (100 reportes completos no caben)
+    last_day = datetime.now() - timedelta(days=1)
+
+    def sales_report(db):
+        return get_report(db, "sales", report_params("sales", start_date=last_day))
+
+    print(f"{calls} llamadas simultáneas, {sales_count:,} ventas")
+    print(f"{'función':<34} {'modo':<18} {'llamadas':>8} {'sentencias SQL':>15} {'tiempo':>10}")
+    failed = False
+    for name, function in (("tablero (get_all_dashboard_data)", get_all_dashboard_data),
+                           ("reporte de ventas (get_report)", sales_report)):
+        _, single, _ = run(engine, 1, function, clear_cache, enabled=False)
+        for mode, enabled in (("sin single-flight", False), ("con single-flight", True)):
+            results, statements, elapsed = run(engine, calls, function, clear_cache, enabled)
+            print(f"{name:<34} {mode:<18} {results:>8} {statements:>15,} {elapsed * 1000:>7.0f} ms")
+        print(f"{'':<34} {'una sola llamada':<18} {1:>8} {single:>15,}")
+        failed = failed or statements > single
+    if failed:
+        sys.exit("Con single-flight las consultas se ejecutaron más de una vez")
+
+
+if __name__ == "__main__":
+    main()
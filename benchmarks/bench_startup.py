@@ -0,0 +1,99 @@
+"""
+Benchmark de arranque de la API
+Cada medición corre en un intérprete nuevo y registra:
+- importación de main.py
+- arranque (lifespan) hasta aceptar peticiones
+- primera petición (GET /products/all) y primera exportación PDF (GET /reports/sales/export)
+Se comparan dos modos:
+- eager: como antes, con ReportLab/NumPy/requests importados y create_all al importar main.py
+- lazy:  el arranque actual (módulos pesados al primer uso, esquema con manage_db.py)
+Usa una base SQLite temporal, así que no incluye la reflexión de tablas contra MySQL que
+create_all hacía en cada arranque.
+Ejecutar: python benchmarks/bench_startup.py [repeticiones]
+"""
+import os
+import sys
+import json
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import os, sys, time, json, asyncio
+start = time.perf_counter()
+sys.path.insert(0, {base_dir!r})
+for key, value in {{"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}}.items():
+    os.environ.setdefault(key, value)
+from sqlalchemy import create_engine
+import db.database as database
+engine = create_engine("sqlite:///{workdir}/bench.db", connect_args={{"check_same_thread": False}})
+database.engine = engine
+database.SessionLocal.configure(bind=engine)
+if {eager}:
+    from utils.startup import HEAVY_MODULES, create_schema
+    import importlib
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    create_schema()
+import main
+imported = time.perf_counter()
+
+import httpx
+from utils.auth import get_current_user_optional
+main.app.dependency_overrides[get_current_user_optional] = lambda: object()
+
+async def run():
+    timings = {{}}
+    async with main.app.router.lifespan_context(main.app):
+        timings["startup"] = time.perf_counter() - imported
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            first = time.perf_counter()
+            response = await client.get("/products/all")
+            assert response.status_code == 200, response.text
+            timings["first_request"] = time.perf_counter() - first
+            first = time.perf_counter()
+            response = await client.get("/reports/sales/export")
+            assert response.status_code == 200, response.text
+            timings["first_pdf"] = time.perf_counter() - first
+    return timings
+
+timings = asyncio.run(run())
+timings["import"] = imported - start
+print(json.dumps(timings))
+"""
+
+
+def run_child(workdir: str, eager: bool):
+    code = CHILD.format(base_dir=str(BASE_DIR), workdir=workdir, eager=eager)
+    # La precarga en segundo plano compite con la primera petición: se mide sin ella
+    env = {**os.environ, "WARMUP_PRELOAD": "0"}
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    os.makedirs(os.path.join(workdir, "uploads"), exist_ok=True)
+
+    # Esquema creado una vez, como haría manage_db.py create en el despliegue
+    run_child(workdir, eager=True)
+
+    print(f"Mediana de {repeat} arranques (ms)")
+    print(f"{'modo':<6} {'import':>8} {'arranque':>9} {'1ª petición':>12} {'import+1ª':>10} {'1er PDF':>8}")
+    for name, eager in (("eager", True), ("lazy", False)):
+        runs = [run_child(workdir, eager) for _ in range(repeat)]
+        median = {key: statistics.median(run[key] for run in runs) * 1000 for key in runs[0]}
+        ready = median["import"] + median["startup"] + median["first_request"]
+        print(f"{name:<6} {median['import']:8.0f} {median['startup']:9.0f} {median['first_request']:12.0f} "
+              f"{ready:10.0f} {median['first_pdf']:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
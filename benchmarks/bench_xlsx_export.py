@@ -0,0 +1,152 @@
+"""
+Benchmark de la exportación XLSX del reporte de ventas (tamaño, tiempo y memoria)
+Cada medición corre en un intérprete nuevo sobre una base SQLite temporal y registra tiempo,
+filas por segundo, tamaño del archivo y memoria máxima del proceso (RSS, Linux):
+- libro normal: get_sales_report (todas las ventas como objetos del ORM) y un Workbook de openpyxl
+  que guarda todas las celdas en memoria hasta save()
+- write_only:   write_sales_report_xlsx con iter_sales_rows (cursor por bloques), como
+  /reports/sales/export.xlsx
+El libro normal se mide con menos filas: su memoria crece con cada celda.
+Ejecutar: python benchmarks/bench_xlsx_export.py [ventas] [ventas_libro_normal]
+"""
+import os
+import sys
+import json
+import random
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque el benchmark no use MySQL
+for key, value in {"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+CHILD = """
+import os, sys, time, json
+sys.path.insert(0, {base_dir!r})
+for key, value in {{"MYSQL_USER": "bench", "MYSQL_HOST": "localhost", "MYSQL_DB": "bench"}}.items():
+    os.environ.setdefault(key, value)
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+engine = create_engine("sqlite:///{database}")
+db = sessionmaker(bind=engine)()
+start_date = datetime.fromisoformat({start_date!r})
+def peak_rss():
+    # VmHWM se reinicia con exec (ru_maxrss hereda el máximo del proceso padre)
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+import openpyxl
+rss_before = peak_rss()
+start = time.perf_counter()
+if {streamed}:
+    from crud.reports import get_sales_report_summary, iter_sales_rows
+    from utils.xlsx_export import write_sales_report_xlsx
+    summary = get_sales_report_summary(db, start_date=start_date)
+    rows = write_sales_report_xlsx({output!r}, summary, iter_sales_rows(db, start_date=start_date))
+else:
+    from crud.reports import get_sales_report
+    report = get_sales_report(db, start_date=start_date)
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["ID", "Fecha", "Cliente", "Usuario", "Método", "Items", "Total"])
+    for sale in report["sales"]:
+        sheet.append([sale["id"], datetime.fromisoformat(sale["date"]), sale["client_name"], sale["user_name"],
+                      sale["payment_method"], sale["items_count"], sale["total"]])
+    workbook.save({output!r})
+    rows = len(report["sales"])
+elapsed = time.perf_counter() - start
+peak = peak_rss()
+print(json.dumps({{"seconds": elapsed, "rows": rows, "size_mb": os.path.getsize({output!r}) / 1024 / 1024,
+                  "rss_mb": peak / 1024, "growth_mb": (peak - rss_before) / 1024}}))
+"""
+
+
+def create_database(path: str, sales_count: int):
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+    from db.database import Base
+    from db.models import Category, Product, MedicineBatch, Client, User, Role, Sale, SalesDetail
+    from utils.bulk import chunked
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    db.add_all([
+        User(role_id=role.id, first_name="Bench", last_name="User", username="bench", email="bench@local"),
+        Category(name="Bench")
+    ])
+    db.flush()
+    db.execute(insert(Client.__table__), [
+        {"first_name": f"Cliente {i}", "last_name": "Bench", "status": 1} for i in range(500)
+    ])
+    db.execute(insert(Product.__table__), [
+        {"name": f"Producto {i}", "category_id": 1, "presentation": "Caja", "status": 1} for i in range(200)
+    ])
+    db.execute(insert(MedicineBatch.__table__), [
+        {"product_id": i + 1, "stock": 1000, "sale_price": 10, "status": 1} for i in range(200)
+    ])
+    db.flush()
+
+    start = datetime(2020, 1, 1)
+    for first in range(1, sales_count + 1, 50_000):
+        ids = range(first, min(first + 50_000, sales_count + 1))
+        prices = {sale_id: Decimal(random.randint(100, 5000)) / 100 for sale_id in ids}
+        sales = [{
+            "id": sale_id, "client_id": random.randint(1, 500), "user_id": 1,
+            "sale_date": start + timedelta(minutes=sale_id * 5),
+            "payment_method": random.choice(("efectivo", "tarjeta", "transferencia")),
+            "total": prices[sale_id] * 2
+        } for sale_id in ids]
+        details = [{
+            "sale_id": sale_id, "batch_id": random.randint(1, 200), "quantity": 1,
+            "unit_price": prices[sale_id], "subtotal": prices[sale_id]
+        } for sale_id in ids for _ in range(2)]
+        for chunk in chunked(sales, 20_000):
+            db.execute(insert(Sale.__table__), chunk)
+        for chunk in chunked(details, 20_000):
+            db.execute(insert(SalesDetail.__table__), chunk)
+    db.commit()
+    db.close()
+
+
+def run_child(database: str, streamed: bool, start_date: datetime, workdir: str):
+    code = CHILD.format(base_dir=str(BASE_DIR), database=database, streamed=streamed,
+                        start_date=start_date.isoformat(), output=os.path.join(workdir, "reporte.xlsx"))
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    sales_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    normal_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    random.seed(9)
+    workdir = tempfile.mkdtemp(prefix="bench-xlsx-")
+    database = os.path.join(workdir, "bench.db")
+    create_database(database, sales_count)
+
+    # Las ventas son cada 5 minutos desde 2020-01-01: el rango elige las últimas N
+    last_sale = datetime(2020, 1, 1) + timedelta(minutes=sales_count * 5)
+    runs = [("libro normal", False, normal_count), ("write_only", True, normal_count), ("write_only", True, sales_count)]
+
+    print(f"{'modo':<13} {'filas':>8} {'tiempo':>9} {'filas/s':>9} {'tamaño':>9} {'RSS máx':>9} {'aumento':>9}")
+    for name, streamed, count in runs:
+        start_date = last_sale - timedelta(minutes=(count - 1) * 5)
+        result = run_child(database, streamed, start_date, workdir)
+        print(f"{name:<13} {result['rows']:>8,} {result['seconds']:>7.1f} s {result['rows'] / result['seconds']:>9,.0f} "
+              f"{result['size_mb']:>6.1f} MB {result['rss_mb']:>6.0f} MB {result['growth_mb']:>6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
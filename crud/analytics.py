@@ -0,0 +1,225 @@
+"""
+Analítica de ventas sobre arreglos columnares (NumPy)
+Se proyectan solo las columnas necesarias (fecha como datetime64, montos en centavos enteros,
+producto y cantidad) y los agregados se calculan con operaciones vectorizadas en lugar de
+recorrer objetos del ORM con Decimal.
+"""
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, cast, Integer, BigInteger
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from datetime import datetime
+from typing import Dict, Any, List
+from db.models import MedicineBatch, Product
+from crud.archive import sales_source, details_source
+
+PERIODS = ("day", "week", "month")
+
+# 1970-01-01 fue jueves: desplazamiento para que las semanas empiecen el lunes
+_WEEK_OFFSET = 3
+
+
+class epoch_seconds(FunctionElement):
+    """Segundos desde 1970-01-01 de un DATETIME, calculados en la BD (sin zona horaria)"""
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(epoch_seconds)
+def _epoch_seconds_mysql(element, compiler, **kw):
+    return "TIMESTAMPDIFF(SECOND, '1970-01-01', %s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(epoch_seconds, "sqlite")
+def _epoch_seconds_sqlite(element, compiler, **kw):
+    return "CAST(strftime('%%s', %s) AS INTEGER)" % compiler.process(element.clauses, **kw)
+
+
+def _cents(column):
+    """Monto DECIMAL(10,2) como centavos enteros (sin Decimal en Python)"""
+    return cast(func.round(column * 100), Integer)
+
+
+def load_sales_columns(db: Session, start_date: datetime = None, end_date: datetime = None) -> Dict[str, np.ndarray]:
+    """Columnas de la cabecera de venta: sale_id, sale_date (datetime64[s] desde epoch int64) y total (centavos int64)"""
+    # Ventas activas y, si el rango lo requiere, archivadas
+    sales = sales_source(db, start_date, end_date)
+    statement = select(sales.c.id, epoch_seconds(sales.c.sale_date), _cents(sales.c.total)).where(
+        sales.c.sale_date.isnot(None)
+    )
+    # Ejecutar por la conexión (Core): evita la capa de resultados del ORM
+    rows = db.connection().execute(statement).fetchall()
+    ids, dates, totals = zip(*rows) if rows else ((), (), ())
+    return {
+        "sale_id": np.fromiter(ids, dtype=np.int64, count=len(ids)),
+        "sale_date": np.fromiter(dates, dtype=np.int64, count=len(dates)).astype("datetime64[s]"),
+        "total": np.fromiter((t or 0 for t in totals), dtype=np.int64, count=len(totals))
+    }
+
+
+def load_detail_columns(db: Session, start_date: datetime = None, end_date: datetime = None) -> Dict[str, np.ndarray]:
+    """Columnas de los detalles: sale_id, product_id, quantity y subtotal (centavos int64)"""
+    details = details_source(db, start_date, end_date)
+    statement = select(
+        details.c.sale_id, MedicineBatch.product_id, details.c.quantity, _cents(details.c.subtotal)
+    ).join(MedicineBatch, details.c.batch_id == MedicineBatch.id)
+    # Ejecutar por la conexión (Core): evita la capa de resultados del ORM
+    rows = db.connection().execute(statement).fetchall()
+    sale_ids, product_ids, quantities, subtotals = zip(*rows) if rows else ((), (), (), ())
+    count = len(sale_ids)
+    return {
+        "sale_id": np.fromiter(sale_ids, dtype=np.int64, count=count),
+        "product_id": np.fromiter(product_ids, dtype=np.int64, count=count),
+        "quantity": np.fromiter((q or 0 for q in quantities), dtype=np.int64, count=count),
+        "subtotal": np.fromiter((s or 0 for s in subtotals), dtype=np.int64, count=count)
+    }
+
+
+def _bucket(dates: np.ndarray, period: str) -> np.ndarray:
+    """Inicio del período (día, semana que empieza en lunes, o mes) como datetime64[D]"""
+    days = dates.astype("datetime64[D]")
+    if period == "day":
+        return days
+    if period == "week":
+        number = days.astype(np.int64)
+        return (number - (number + _WEEK_OFFSET) % 7).astype("datetime64[D]")
+    return days.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def _all_buckets(first: np.datetime64, last: np.datetime64, period: str) -> np.ndarray:
+    """Todos los períodos del rango, incluidos los que no tuvieron ventas"""
+    if period == "day":
+        return np.arange(first, last + np.timedelta64(1, "D"), dtype="datetime64[D]")
+    if period == "week":
+        return np.arange(first, last + np.timedelta64(7, "D"), np.timedelta64(7, "D"), dtype="datetime64[D]")
+    months = np.arange(first.astype("datetime64[M]"), last.astype("datetime64[M]") + 1, dtype="datetime64[M]")
+    return months.astype("datetime64[D]")
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """Media móvil simple; los primeros window-1 puntos promedian lo disponible"""
+    window = max(1, window)
+    cumulative = np.cumsum(values, dtype=np.float64)
+    sums = cumulative.copy()
+    sums[window:] = cumulative[window:] - cumulative[:-window]
+    return sums / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+def get_sales_series(db: Session, start_date: datetime = None, end_date: datetime = None,
+                     period: str = "day", window: int = 7) -> Dict[str, Any]:
+    """Serie de ventas por día/semana/mes con conteo, total y media móvil del total"""
+    if period not in PERIODS:
+        raise ValueError(f"Período inválido: {period}. Use uno de: {', '.join(PERIODS)}")
+
+    columns = load_sales_columns(db, start_date, end_date)
+    series = []
+    if len(columns["sale_id"]):
+        buckets = _bucket(columns["sale_date"], period)
+        periods = _all_buckets(buckets.min(), buckets.max(), period)
+        index = np.searchsorted(periods, buckets)
+        counts = np.bincount(index, minlength=len(periods))
+        totals = np.bincount(index, weights=columns["total"], minlength=len(periods))
+        averages = moving_average(totals, window)
+        series = [
+            {
+                "period": str(p),
+                "count": int(c),
+                "total": round(t / 100, 2),
+                "moving_average": round(a / 100, 2)
+            }
+            for p, c, t, a in zip(periods, counts.tolist(), totals.tolist(), averages.tolist())
+        ]
+
+    return {
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": end_date.isoformat() if end_date else None,
+        "period": period,
+        "window": window,
+        "total_sales": int(len(columns["sale_id"])),
+        "total_amount": round(int(columns["total"].sum()) / 100, 2),
+        "series": series
+    }
+
+
+def get_product_revenue(db: Session, start_date: datetime = None, end_date: datetime = None,
+                        limit: int = 20) -> Dict[str, Any]:
+    """Ingresos, unidades y número de ventas por producto, ordenados por ingresos"""
+    columns = load_detail_columns(db, start_date, end_date)
+    products: List[Dict[str, Any]] = []
+    if len(columns["product_id"]):
+        product_ids, index = np.unique(columns["product_id"], return_inverse=True)
+        revenue = np.bincount(index, weights=columns["subtotal"])
+        quantity = np.bincount(index, weights=columns["quantity"])
+        # Ventas distintas por producto: pares (producto, venta) únicos codificados en un int64
+        base = int(columns["sale_id"].max()) + 1
+        pairs = np.unique(index.astype(np.int64) * base + columns["sale_id"])
+        sales_count = np.bincount(pairs // base, minlength=len(product_ids))
+
+        order = np.argsort(-revenue, kind="stable")[:limit]
+        top_ids = product_ids[order].tolist()
+        names = {
+            row.id: row for row in db.query(Product.id, Product.name, Product.presentation).filter(
+                Product.id.in_(top_ids)
+            ).all()
+        }
+        total_revenue = revenue.sum()
+        for position in order.tolist():
+            product_id = int(product_ids[position])
+            product = names.get(product_id)
+            products.append({
+                "product_id": product_id,
+                "product_name": product.name if product else None,
+                "presentation": product.presentation if product else None,
+                "total_revenue": round(float(revenue[position]) / 100, 2),
+                "total_quantity": int(quantity[position]),
+                "sales_count": int(sales_count[position]),
+                "revenue_share": round(float(revenue[position] / total_revenue), 4) if total_revenue else 0
+            })
+
+    return {
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": end_date.isoformat() if end_date else None,
+        "limit": limit,
+        "products": products
+    }
+
+
+def get_basket_distribution(db: Session, start_date: datetime = None, end_date: datetime = None,
+                            max_size: int = 20) -> Dict[str, Any]:
+    """Distribución del tamaño de la canasta (unidades y líneas por venta) y del monto por venta"""
+    columns = load_detail_columns(db, start_date, end_date)
+    if not len(columns["sale_id"]):
+        return {"total_sales": 0, "units": {}, "lines": {}, "amount": {}}
+
+    _, index = np.unique(columns["sale_id"], return_inverse=True)
+    units = np.bincount(index, weights=columns["quantity"]).astype(np.int64)
+    lines = np.bincount(index)
+    amounts = np.bincount(index, weights=columns["subtotal"]) / 100
+
+    def describe(values: np.ndarray, histogram: bool = True) -> Dict[str, Any]:
+        p50, p90, p99 = np.percentile(values, [50, 90, 99]).tolist()
+        result = {
+            "mean": round(float(values.mean()), 2),
+            "p50": round(p50, 2),
+            "p90": round(p90, 2),
+            "p99": round(p99, 2),
+            "max": round(float(values.max()), 2)
+        }
+        if histogram:
+            # Las canastas mayores a max_size se acumulan en la última posición ("max_size+")
+            counts = np.bincount(np.minimum(values, max_size), minlength=max_size + 1)
+            result["histogram"] = {
+                (f"{size}+" if size == max_size else str(size)): int(count)
+                for size, count in enumerate(counts.tolist()) if count
+            }
+        return result
+
+    return {
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": end_date.isoformat() if end_date else None,
+        "total_sales": int(len(lines)),
+        "units": describe(units),
+        "lines": describe(lines),
+        "amount": describe(amounts, histogram=False)
+    }
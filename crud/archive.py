@@ -0,0 +1,215 @@
+"""
+Archivo de ventas de períodos cerrados
+- archive_closed_periods mueve por bloques las ventas anteriores al corte (meses completos)
+  de 'sales'/'sales_detail' a 'sales_archive'/'sales_detail_archive', conservando los IDs
+- Los totales de cada mes archivado quedan en sales_period_summary, así las cifras históricas
+  se leen sin recorrer el archivo
+- Las consultas usan sale_models / sales_source / details_source: solo incluyen el archivo
+  cuando el rango pedido empieza antes del último mes archivado
+"""
+import os
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, delete, func, union_all
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+from db.models import Sale, SalesDetail, SaleArchive, SalesDetailArchive, SalesPeriodSummary
+
+# Meses que permanecen en las tablas activas (el mes en curso no cuenta)
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "12"))
+ARCHIVE_CHUNK_SIZE = 1000
+
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def archive_cutoff(today: date = None) -> date:
+    """Primer día del mes más antiguo que se mantiene en las tablas activas"""
+    return _add_months(_month_start(today or date.today()), -ARCHIVE_AFTER_MONTHS)
+
+
+def archived_before(db: Session) -> Optional[date]:
+    """
+    Límite del archivo: ninguna venta archivada es de esta fecha o posterior.
+    None si todavía no se archivó nada.
+    """
+    last_period = db.query(func.max(SalesPeriodSummary.period_start)).scalar()
+    if last_period is None:
+        return None
+    if isinstance(last_period, str):  # SQLite
+        last_period = date.fromisoformat(last_period)
+    return _add_months(last_period, 1)
+
+
+def needs_archive(db: Session, start_date: datetime = None) -> bool:
+    """True si el rango que empieza en start_date (None = desde siempre) incluye ventas archivadas"""
+    boundary = archived_before(db)
+    if boundary is None:
+        return False
+    return start_date is None or start_date < datetime.combine(boundary, datetime.min.time())
+
+
+def sale_models(db: Session, start_date: datetime = None) -> List[Tuple[Any, Any]]:
+    """Pares (modelo de venta, modelo de detalle) a consultar para un rango que empieza en start_date"""
+    models = [(Sale, SalesDetail)]
+    if needs_archive(db, start_date):
+        models.append((SaleArchive, SalesDetailArchive))
+    return models
+
+
+def _date_range(statement, sale_model, start_date: datetime = None, end_date: datetime = None):
+    if start_date:
+        statement = statement.where(sale_model.sale_date >= start_date)
+    if end_date:
+        statement = statement.where(sale_model.sale_date <= end_date)
+    return statement
+
+
+def sales_source(db: Session, start_date: datetime = None, end_date: datetime = None):
+    """
+    Subconsulta 'sales_all' con las cabeceras de venta del rango (activas + archivadas si hace falta).
+    Columnas: id, client_id, user_id, sale_date, total, payment_method
+    """
+    statements = [
+        _date_range(
+            select(
+                sale_model.id, sale_model.client_id, sale_model.user_id,
+                sale_model.sale_date, sale_model.total, sale_model.payment_method
+            ),
+            sale_model, start_date, end_date
+        )
+        for sale_model, _ in sale_models(db, start_date)
+    ]
+    statement = union_all(*statements) if len(statements) > 1 else statements[0]
+    return statement.subquery("sales_all")
+
+
+def details_source(db: Session, start_date: datetime = None, end_date: datetime = None):
+    """
+    Subconsulta 'sales_detail_all' con los detalles de las ventas del rango y la fecha de su venta.
+    Columnas: id, sale_id, batch_id, quantity, unit_price, subtotal, sale_date
+    """
+    statements = [
+        _date_range(
+            select(
+                detail_model.id, detail_model.sale_id, detail_model.batch_id, detail_model.quantity,
+                detail_model.unit_price, detail_model.subtotal, sale_model.sale_date
+            ).join(sale_model, detail_model.sale_id == sale_model.id),
+            sale_model, start_date, end_date
+        )
+        for sale_model, detail_model in sale_models(db, start_date)
+    ]
+    statement = union_all(*statements) if len(statements) > 1 else statements[0]
+    return statement.subquery("sales_detail_all")
+
+
+def get_archived_totals(db: Session) -> Dict[str, Any]:
+    """Totales de todas las ventas archivadas, desde las filas de resumen"""
+    row = db.query(
+        func.coalesce(func.sum(SalesPeriodSummary.sales_count), 0),
+        func.coalesce(func.sum(SalesPeriodSummary.total_amount), 0)
+    ).one()
+    return {"sales_count": int(row[0]), "total_amount": Decimal(str(row[1] or 0))}
+
+
+def get_archived_payment_methods(db: Session) -> Dict[Optional[str], Dict[str, Any]]:
+    """Cantidad y total de las ventas archivadas por método de pago"""
+    rows = db.query(
+        SalesPeriodSummary.payment_method,
+        func.sum(SalesPeriodSummary.sales_count),
+        func.sum(SalesPeriodSummary.total_amount)
+    ).group_by(SalesPeriodSummary.payment_method).all()
+    return {
+        method: {"count": int(count or 0), "total": Decimal(str(total or 0))}
+        for method, count, total in rows
+    }
+
+
+def _add_to_summary(db: Session, sales: List[Any], items: Dict[int, Tuple[int, int]]):
+    """Suma las ventas del bloque a las filas de resumen de su mes y método de pago"""
+    increments = {}
+    for sale in sales:
+        key = (_month_start(sale.sale_date), sale.payment_method)
+        count, amount, lines, units = increments.get(key, (0, Decimal("0.00"), 0, 0))
+        sale_lines, sale_units = items.get(sale.id, (0, 0))
+        increments[key] = (count + 1, amount + (sale.total or 0), lines + sale_lines, units + sale_units)
+
+    periods = {period for period, _ in increments}
+    existing = {
+        (row.period_start if isinstance(row.period_start, date) else date.fromisoformat(row.period_start),
+         row.payment_method): row
+        for row in db.query(SalesPeriodSummary).filter(
+            SalesPeriodSummary.period_start.in_(periods)
+        ).with_for_update().all()
+    }
+    now = datetime.now()
+    for key, (count, amount, lines, units) in increments.items():
+        summary = existing.get(key)
+        if summary is None:
+            summary = SalesPeriodSummary(
+                period_start=key[0], payment_method=key[1],
+                sales_count=0, total_amount=0, items_count=0, units=0
+            )
+            db.add(summary)
+        summary.sales_count += count
+        summary.total_amount = Decimal(str(summary.total_amount or 0)) + amount
+        summary.items_count += lines
+        summary.units += units
+        summary.updated_at = now
+
+
+def archive_closed_periods(db: Session, before: date = None, chunk_size: int = ARCHIVE_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Mueve las ventas anteriores a 'before' (por defecto archive_cutoff()) al archivo.
+    Cada bloque se copia con INSERT ... SELECT, se suma a los resúmenes y se borra de las tablas
+    activas en una misma transacción; si el proceso se interrumpe, se retoma desde donde quedó.
+    """
+    before = _month_start(before) if before else archive_cutoff()
+    cutoff = datetime.combine(before, datetime.min.time())
+    sale_columns = [column.name for column in SaleArchive.__table__.columns]
+    detail_columns = [column.name for column in SalesDetailArchive.__table__.columns]
+    sales_table = Sale.__table__
+    details_table = SalesDetail.__table__
+
+    archived_sales = 0
+    archived_details = 0
+    while True:
+        ids = [
+            row.id for row in db.query(Sale.id).filter(
+                Sale.sale_date < cutoff
+            ).order_by(Sale.id).limit(chunk_size).with_for_update().all()
+        ]
+        if not ids:
+            break
+
+        sales = db.query(Sale.id, Sale.sale_date, Sale.payment_method, Sale.total).filter(Sale.id.in_(ids)).all()
+        items = {
+            sale_id: (int(lines), int(units or 0))
+            for sale_id, lines, units in db.query(
+                SalesDetail.sale_id, func.count(SalesDetail.id), func.sum(SalesDetail.quantity)
+            ).filter(SalesDetail.sale_id.in_(ids)).group_by(SalesDetail.sale_id).all()
+        }
+
+        db.execute(insert(SaleArchive.__table__).from_select(
+            sale_columns,
+            select(*[sales_table.c[name] for name in sale_columns]).where(sales_table.c.id.in_(ids))
+        ))
+        db.execute(insert(SalesDetailArchive.__table__).from_select(
+            detail_columns,
+            select(*[details_table.c[name] for name in detail_columns]).where(details_table.c.sale_id.in_(ids))
+        ))
+        _add_to_summary(db, sales, items)
+        db.execute(delete(details_table).where(details_table.c.sale_id.in_(ids)))
+        db.execute(delete(sales_table).where(sales_table.c.id.in_(ids)))
+        db.commit()
+
+        archived_sales += len(ids)
+        archived_details += sum(lines for lines, _ in items.values())
+
+    return {"before": before.isoformat(), "sales": archived_sales, "details": archived_details}
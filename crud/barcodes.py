@@ -0,0 +1,342 @@
+"""
+Códigos de barras de los productos y búsqueda por escaneo
+- Los códigos se guardan normalizados (normalize_code): los GTIN (8, 12, 13 o 14 dígitos) se validan con
+  su dígito verificador y se completan con ceros a 14 dígitos, así el UPC-A 012345678905 y el EAN-13
+  0012345678905 son el mismo código; los códigos internos se guardan en mayúsculas, sin espacios ni guiones
+- product_barcodes tiene un índice único por código: un código pertenece a un solo producto
+- BarcodeIndex: mapa en memoria código -> producto con sus lotes vendibles (activos, con stock, en orden
+  FEFO). Se carga al iniciar (utils/startup.py) y se mantiene al día con la secuencia del catálogo
+  (crud/versions.py): después de cada commit de este proceso se recargan en segundo plano solo los
+  productos cambiados; los cambios de otros procesos se aplican en el siguiente escaneo (como máximo
+  TABLE_VERSIONS_POLL_SECONDS después). Si cambia product_barcodes se recarga el mapa completo.
+  Mientras haya cambios más nuevos que la secuencia completa (complete_sequence) se vuelven a revisar
+  cada TABLE_VERSIONS_POLL_SECONDS: una transacción puede confirmar una secuencia menor más tarde
+- El vencimiento se evalúa al escanear: un lote que vence deja de ofrecerse sin escribir en la BD
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from db import database
+from db.models import Product, MedicineBatch, ProductBarcode, CatalogChange
+from crud.products import latest_sale_prices
+from crud.versions import (
+    CATALOG_SEQUENCE,
+    TABLE_VERSIONS_POLL_SECONDS,
+    complete_sequence,
+    get_table_versions,
+    on_versions_commit
+)
+from utils.bulk import chunked
+from utils.images import build_image_url, build_thumbnail_url
+
+GTIN_LENGTHS = (8, 12, 13, 14)
+MAX_CODE_LENGTH = 32
+
+# Cambios del catálogo a partir de los cuales el índice se recarga completo en lugar de por producto
+BARCODE_INDEX_MAX_DELTA = int(os.getenv("BARCODE_INDEX_MAX_DELTA", "5000"))
+
+
+# ========================
+# NORMALIZACIÓN
+# ========================
+def _valid_check_digit(digits: str) -> bool:
+    # Pesos 3 y 1 alternados desde el dígito anterior al verificador (GS1)
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(digits[:-1])))
+    return (10 - total % 10) % 10 == int(digits[-1])
+
+
+def normalize_code(code: str) -> str:
+    """Forma guardada de un código escaneado o importado (ValueError si es un GTIN inválido)"""
+    code = "".join(str(code).split()).replace("-", "").upper()
+    if not code:
+        raise ValueError("El código de barras está vacío")
+    if len(code) > MAX_CODE_LENGTH:
+        raise ValueError(f"El código de barras no puede tener más de {MAX_CODE_LENGTH} caracteres")
+    if code.isascii() and code.isdigit() and len(code) in GTIN_LENGTHS:
+        if not _valid_check_digit(code):
+            raise ValueError(f"El código {code} no tiene un dígito verificador GTIN válido")
+        return code.zfill(14)
+    return code
+
+
+# ========================
+# CRUD
+# ========================
+def get_product_barcodes(db: Session, product_id: int) -> List[str]:
+    return [
+        row.code for row in db.query(ProductBarcode.code)
+        .filter(ProductBarcode.product_id == product_id)
+        .order_by(ProductBarcode.id).all()
+    ]
+
+
+def delete_barcode(db: Session, code: str) -> bool:
+    barcode = db.query(ProductBarcode).filter(ProductBarcode.code == normalize_code(code)).first()
+    if not barcode:
+        return False
+    db.delete(barcode)
+    db.commit()
+    return True
+
+
+def import_barcodes(db: Session, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Importación masiva de códigos (filas con product_id y code) en una sola transacción.
+    Cada fila se informa por separado: created, existing (ya era de ese producto) o error
+    (código inválido, producto inexistente o código de otro producto); los errores no impiden
+    registrar las demás filas.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+    parsed: List[Tuple[int, str, int]] = []
+    for index, row in enumerate(rows):
+        try:
+            parsed.append((index, normalize_code(row["code"]), int(row["product_id"])))
+        except (KeyError, TypeError, ValueError) as e:
+            message = f"Falta la columna {e}" if isinstance(e, KeyError) else str(e)
+            results[index] = {"index": index, "status": "error", "error": message}
+
+    product_ids = {product_id for _, _, product_id in parsed}
+    codes = {code for _, code, _ in parsed}
+    found_products = set()
+    owners: Dict[str, int] = {}
+    for chunk in chunked(sorted(product_ids)):
+        found_products.update(row.id for row in db.query(Product.id).filter(Product.id.in_(chunk)).all())
+    for chunk in chunked(sorted(codes)):
+        owners.update(db.query(ProductBarcode.code, ProductBarcode.product_id).filter(
+            ProductBarcode.code.in_(chunk)
+        ).all())
+
+    now = datetime.now()
+    new_rows = []
+    for index, code, product_id in parsed:
+        owner = owners.get(code)
+        if product_id not in found_products:
+            results[index] = {"index": index, "status": "error", "code": code,
+                              "error": f"El producto con ID {product_id} no existe"}
+        elif owner is not None and owner != product_id:
+            results[index] = {"index": index, "status": "error", "code": code,
+                              "error": f"El código {code} ya pertenece al producto {owner}"}
+        elif owner == product_id:
+            results[index] = {"index": index, "status": "existing", "code": code, "product_id": product_id}
+        else:
+            # Si el código se repite más abajo en el archivo, esa fila sale como existing o error
+            owners[code] = product_id
+            new_rows.append({"code": code, "product_id": product_id, "created_at": now})
+            results[index] = {"index": index, "status": "created", "code": code, "product_id": product_id}
+
+    try:
+        for chunk in chunked(new_rows):
+            db.execute(insert(ProductBarcode.__table__), chunk)
+        db.commit()
+    except IntegrityError:
+        # Otra importación registró alguno de estos códigos al mismo tiempo (índice único)
+        db.rollback()
+        raise ValueError("Otro usuario registró algunos de estos códigos al mismo tiempo. Reintente la importación.")
+
+    return {
+        "total": len(rows),
+        "created": sum(1 for result in results if result["status"] == "created"),
+        "existing": sum(1 for result in results if result["status"] == "existing"),
+        "failed": sum(1 for result in results if result["status"] == "error"),
+        "results": results,
+    }
+
+
+# ========================
+# ÍNDICE EN MEMORIA
+# ========================
+def _load_entries(db: Session, product_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """Productos activos con sus lotes vendibles (sin contar el vencimiento), listos para escanear"""
+    entries = {}
+    for chunk in chunked(sorted(product_ids)):
+        products = db.query(
+            Product.id, Product.name, Product.presentation, Product.concentration,
+            Product.category_id, Product.image
+        ).filter(Product.id.in_(chunk), Product.status == 1).all()
+        prices = latest_sale_prices(db, chunk)
+        for product in products:
+            entries[product.id] = {
+                "product": {
+                    "id": product.id,
+                    "name": product.name,
+                    "presentation": product.presentation,
+                    "concentration": product.concentration,
+                    "category_id": product.category_id,
+                    "image_url": build_image_url(product.image),
+                    "thumbnail_url": build_thumbnail_url(product.image),
+                    "sale_price": prices.get(product.id),
+                },
+                "batches": [],
+            }
+        batches = db.query(
+            MedicineBatch.id, MedicineBatch.product_id, MedicineBatch.expiration_date,
+            MedicineBatch.stock, MedicineBatch.sale_price
+        ).filter(
+            MedicineBatch.product_id.in_(chunk),
+            MedicineBatch.status == 1,
+            MedicineBatch.stock > 0
+        ).order_by(
+            MedicineBatch.product_id,
+            MedicineBatch.expiration_date.is_(None),
+            MedicineBatch.expiration_date,
+            MedicineBatch.id
+        ).all()
+        for batch in batches:
+            entry = entries.get(batch.product_id)
+            if entry is not None:
+                price = float(batch.sale_price) if batch.sale_price is not None else None
+                entry["batches"].append((batch.id, batch.expiration_date, batch.stock, price))
+    return entries
+
+
+class BarcodeIndex:
+    """Código normalizado -> producto con sus lotes vendibles (seguro entre hilos)"""
+
+    def __init__(self):
+        # (códigos, productos) en una sola tupla: una recarga completa los reemplaza a la vez
+        self._state: Tuple[Dict[str, int], Dict[int, Dict[str, Any]]] = ({}, {})
+        self._versions: Optional[Tuple[int, ...]] = None
+        # Secuencia hasta la que el índice tiene todos los cambios y momento de la última revisión
+        self._since = 0
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._pending = False
+        self._pending_lock = threading.Lock()
+        self.full_loads = 0
+        self.delta_loads = 0
+
+    def _stale(self, versions: Tuple[int, ...]) -> bool:
+        if versions != self._versions:
+            return True
+        # Hay cambios recientes por debajo de los cuales todavía puede confirmarse otro
+        return self._since < versions[0] and time.monotonic() - self._checked_at >= TABLE_VERSIONS_POLL_SECONDS
+
+    def refresh(self, db: Session, force: bool = False):
+        """Aplica los cambios del catálogo desde la última carga (o carga todo la primera vez)"""
+        with self._refresh_lock:
+            versions = get_table_versions(db, (CATALOG_SEQUENCE, ProductBarcode.__tablename__))
+            if not force and not self._stale(versions):
+                return
+            # Se lee antes que los cambios: todo lo anterior a 'complete' ya está confirmado
+            complete = complete_sequence(db)
+            if self._versions is None or versions[1] != self._versions[1] \
+                    or not self._apply_changes(db, self._since, versions[0]):
+                self._load_all(db)
+            self._versions = versions
+            self._since = max(self._since, complete)
+            self._checked_at = time.monotonic()
+
+    def _load_all(self, db: Session):
+        codes = dict(db.query(ProductBarcode.code, ProductBarcode.product_id).all())
+        self._state = (codes, _load_entries(db, set(codes.values())))
+        self.full_loads += 1
+
+    def _apply_changes(self, db: Session, since: int, upto: int) -> bool:
+        """Recarga los productos con código que cambiaron entre dos secuencias (False si son demasiados)"""
+        changes = CatalogChange.__table__
+        rows = db.execute(
+            select(changes.c.entity, changes.c.entity_id)
+            .where(changes.c.seq > since, changes.c.seq <= upto)
+            .limit(BARCODE_INDEX_MAX_DELTA + 1)
+        ).all()
+        if len(rows) > BARCODE_INDEX_MAX_DELTA:
+            return False
+        product_ids = {row.entity_id for row in rows if row.entity == "products"}
+        batch_ids = [row.entity_id for row in rows if row.entity == "medicine_batches"]
+        for chunk in chunked(sorted(batch_ids)):
+            product_ids.update(db.execute(
+                select(MedicineBatch.product_id).where(MedicineBatch.id.in_(chunk))
+            ).scalars().all())
+
+        codes, entries = self._state
+        product_ids &= set(codes.values())
+        loaded = _load_entries(db, product_ids)
+        for product_id in product_ids:
+            if product_id in loaded:
+                entries[product_id] = loaded[product_id]
+            else:
+                # Producto desactivado: sus códigos dejan de encontrarse
+                entries.pop(product_id, None)
+        self.delta_loads += 1
+        return True
+
+    def lookup(self, db: Session, code: str) -> Optional[Dict[str, Any]]:
+        """Producto del código escaneado con sus lotes vendibles hoy (None si no existe o está inactivo)"""
+        code = normalize_code(code)
+        if self._stale(get_table_versions(db, (CATALOG_SEQUENCE, ProductBarcode.__tablename__))):
+            self.refresh(db)
+        codes, entries = self._state
+        entry = entries.get(codes.get(code))
+        if entry is None:
+            return None
+
+        today = date.today()
+        batches = [
+            {"id": batch_id, "expiration_date": expiration, "stock": stock, "sale_price": price}
+            for batch_id, expiration, stock, price in entry["batches"]
+            if expiration is None or expiration >= today
+        ]
+        return {
+            **entry["product"],
+            "code": code,
+            "total_stock": sum(batch["stock"] for batch in batches),
+            "batches": batches,
+        }
+
+    def schedule_refresh(self):
+        """Después de un commit: recarga en segundo plano (una sola pendiente a la vez)"""
+        with self._pending_lock:
+            # Sin cargar todavía: lo carga el primer escaneo o el arranque
+            if self._pending or self._versions is None:
+                return
+            self._pending = True
+        _executor.submit(self._refresh_in_background)
+
+    def _refresh_in_background(self):
+        with self._pending_lock:
+            self._pending = False
+        db = database.JobsSessionLocal()
+        try:
+            # El commit de este proceso pudo confirmar una secuencia menor que la última ya vista
+            self.refresh(db, force=True)
+        except Exception as e:
+            print(f"Advertencia: No se pudo actualizar el índice de códigos de barras: {e}")
+        finally:
+            db.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        codes, entries = self._state
+        return {
+            "codes": len(codes),
+            "products": len(entries),
+            "versions": self._versions,
+            "full_loads": self.full_loads,
+            "delta_loads": self.delta_loads,
+        }
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="barcode-index")
+
+index = BarcodeIndex()
+on_versions_commit(index.schedule_refresh)
+
+
+def scan_product(db: Session, code: str) -> Optional[Dict[str, Any]]:
+    return index.lookup(db, code)
+
+
+def warm_barcode_index():
+    """Carga el índice al iniciar para que el primer escaneo no espere la consulta"""
+    db = database.JobsSessionLocal()
+    try:
+        index.refresh(db)
+    finally:
+        db.close()
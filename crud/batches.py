@@ -1,9 +1,10 @@
 from sqlalchemy.orm import Session, joinedload
 from db.models import MedicineBatch, Product
 from db.schemas import MedicineBatchCreate, MedicineBatchUpdate
+from crud.stock import record_stock_movements, batch_movement, active_stock
 
 
-def create_batch(db: Session, data: MedicineBatchCreate):
+def create_batch(db: Session, data: MedicineBatchCreate, user_id: int = None):
     # Verificar que el producto existe
     product = db.query(Product).filter(Product.id == data.product_id).first()
     if not product:
@@ -17,6 +18,10 @@ def create_batch(db: Session, data: MedicineBatchCreate):
         sale_price=data.sale_price
     )
     db.add(batch)
+    db.flush()
+    record_stock_movements(db, [
+        batch_movement(batch.id, batch.product_id, active_stock(batch.stock, batch.status), "lote", "batch", batch.id)
+    ], user_id)
     db.commit()
     db.refresh(batch)
     # Cargar relación con producto
@@ -90,15 +95,25 @@ def get_batch(db: Session, batch_id: int):
     }
 
 
-def update_batch(db: Session, batch_id: int, data: MedicineBatchUpdate):
+def update_batch(db: Session, batch_id: int, data: MedicineBatchUpdate, user_id: int = None):
     """Actualizar un lote"""
-    batch = db.query(MedicineBatch).filter(MedicineBatch.id == batch_id).first()
+    batch = db.query(MedicineBatch).filter(MedicineBatch.id == batch_id).with_for_update().first()
     if not batch:
         return None
 
+    previous_product_id = batch.product_id
+    previous_stock = active_stock(batch.stock, batch.status)
+
     for field, value in data.dict(exclude_unset=True).items():
         setattr(batch, field, value)
 
+    # Cambios de stock, estado o producto del lote quedan en el libro de stock
+    record_stock_movements(db, [
+        batch_movement(batch.id, previous_product_id, -previous_stock, "lote", "batch", batch.id),
+        batch_movement(batch.id, batch.product_id, active_stock(batch.stock, batch.status), "lote", "batch", batch.id)
+    ] if previous_product_id != batch.product_id else [
+        batch_movement(batch.id, batch.product_id, active_stock(batch.stock, batch.status) - previous_stock, "lote", "batch", batch.id)
+    ], user_id)
     db.commit()
     db.refresh(batch)
     
@@ -106,11 +121,15 @@ def update_batch(db: Session, batch_id: int, data: MedicineBatchUpdate):
     return get_batch(db, batch_id)
 
 
-def delete_batch(db: Session, batch_id: int) -> bool:
-    batch = get_batch(db, batch_id)
+def delete_batch(db: Session, batch_id: int, user_id: int = None) -> bool:
+    batch = db.query(MedicineBatch).filter(MedicineBatch.id == batch_id).with_for_update().first()
     if not batch:
         return False
 
+    previous_stock = active_stock(batch.stock, batch.status)
     batch.status = 0
+    record_stock_movements(db, [
+        batch_movement(batch.id, batch.product_id, -previous_stock, "lote", "batch", batch.id)
+    ], user_id)
     db.commit()
     return True
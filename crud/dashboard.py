@@ -1,13 +1,21 @@
 """
 Funciones CRUD para el dashboard
+Las llamadas simultáneas e idénticas comparten una sola ejecución de las consultas (utils.single_flight):
+todas las pestañas del tablero que se refrescan después de una venta esperan al mismo cálculo.
 """
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_
 from datetime import datetime, timedelta
+from decimal import Decimal
 from typing import Dict, Any, List
 from db.models import Sale, SalesDetail, Product, MedicineBatch, Client, Alert, Purchase
+from crud.archive import get_archived_totals, get_archived_payment_methods
+from crud.finance import get_financial_totals
+from crud.product_sales import get_product_ranking
+from utils.single_flight import coalesce
 
 
+@coalesce("dashboard.week_sales")
 def get_week_sales(db: Session) -> Dict[str, Any]:
     """Obtiene las ventas de la semana actual"""
     today = datetime.now().date()
@@ -30,16 +38,19 @@ def get_week_sales(db: Session) -> Dict[str, Any]:
     }
 
 
+@coalesce("dashboard.active_clients_count")
 def get_active_clients_count(db: Session) -> int:
     """Obtiene el número de clientes activos"""
     return db.query(Client).filter(Client.status == 1).count()
 
 
+@coalesce("dashboard.products_in_stock_count")
 def get_products_in_stock_count(db: Session) -> int:
     """Obtiene el número de productos en stock"""
     return db.query(Product).filter(Product.status == 1).count()
 
 
+@coalesce("dashboard.low_stock_count")
 def get_low_stock_count(db: Session) -> int:
     """Obtiene el número de productos con stock bajo"""
     # El modelo Alert no tiene status, solo filtramos por tipo
@@ -48,6 +59,7 @@ def get_low_stock_count(db: Session) -> int:
     ).count()
 
 
+@coalesce("dashboard.recent_sales")
 def get_recent_sales(db: Session, limit: int = 10) -> List[Dict[str, Any]]:
     """Obtiene las ventas recientes"""
     from sqlalchemy.orm import joinedload
@@ -85,38 +97,37 @@ def get_recent_sales(db: Session, limit: int = 10) -> List[Dict[str, Any]]:
     return result
 
 
+@coalesce("dashboard.popular_products")
 def get_popular_products(db: Session, limit: int = 5) -> List[Dict[str, Any]]:
-    """Obtiene los productos más vendidos"""
-    products = db.query(
-        Product.id,
-        Product.name,
-        Product.presentation,
-        func.sum(SalesDetail.quantity).label('total_quantity')
-    ).join(
-        MedicineBatch, Product.id == MedicineBatch.product_id
-    ).join(
-        SalesDetail, MedicineBatch.id == SalesDetail.batch_id
-    ).group_by(
-        Product.id, Product.name, Product.presentation
-    ).order_by(
-        func.sum(SalesDetail.quantity).desc()
-    ).limit(limit).all()
+    """Obtiene los productos más vendidos (product_daily_sales, incluye ventas archivadas)"""
+    products = get_product_ranking(db, order_by="quantity", limit=limit)
     
     return [
         {
-            "id": p.id,
-            "name": p.name,
-            "presentation": p.presentation or "",
-            "total_quantity": int(p.total_quantity) if p.total_quantity else 0
+            "id": p["product_id"],
+            "name": p["name"],
+            "presentation": p["presentation"] or "",
+            "total_quantity": p["quantity"]
         }
         for p in products
     ]
 
 
+@coalesce("dashboard.financial_summary")
 def get_financial_summary(db: Session) -> Dict[str, Any]:
-    """Obtiene el resumen financiero"""
-    # Total de ingresos (ventas)
+    """Obtiene el resumen financiero (una fila de financial_totals)"""
+    totals = get_financial_totals(db)
+    if totals is not None:
+        return {
+            "total_income": totals["total_income"],
+            "total_expenses": totals["total_expenses"],
+            "net_result": totals["net_result"]
+        }
+    
+    # financial_totals aún no inicializada (ver financial_totals.py): calcular desde las tablas
+    # Total de ingresos: ventas activas + filas de resumen de los meses archivados
     total_income = db.query(func.sum(Sale.total)).scalar() or 0.0
+    total_income = float(total_income) + float(get_archived_totals(db)["total_amount"])
     
     # Total de gastos (compras)
     total_expenses = db.query(func.sum(Purchase.total)).scalar() or 0.0
@@ -130,6 +141,7 @@ def get_financial_summary(db: Session) -> Dict[str, Any]:
     }
 
 
+@coalesce("dashboard.last_7_days_sales")
 def get_last_7_days_sales(db: Session) -> List[Dict[str, Any]]:
     """Obtiene las ventas de los últimos 7 días"""
     today = datetime.now().date()
@@ -168,36 +180,24 @@ def get_last_7_days_sales(db: Session) -> List[Dict[str, Any]]:
     return list(result.values())
 
 
+@coalesce("dashboard.income_by_product_top")
 def get_income_by_product_top(db: Session, limit: int = 5) -> List[Dict[str, Any]]:
-    """Obtiene los productos con mayor ingreso"""
-    products = db.query(
-        Product.id.label('product_id'),
-        Product.name.label('product_name'),
-        func.sum(SalesDetail.subtotal).label('total_revenue')
-    ).join(
-        MedicineBatch, Product.id == MedicineBatch.product_id
-    ).join(
-        SalesDetail, MedicineBatch.id == SalesDetail.batch_id
-    ).group_by(
-        Product.id, Product.name
-    ).order_by(
-        func.sum(SalesDetail.subtotal).desc()
-    ).limit(limit).all()
+    """Obtiene los productos con mayor ingreso (product_daily_sales, incluye ventas archivadas)"""
+    products = get_product_ranking(db, order_by="revenue", limit=limit)
     
     return [
         {
-            "product_id": p.product_id,
-            "product_name": p.product_name,
-            "total_revenue": float(p.total_revenue) if p.total_revenue else 0.0
+            "product_id": p["product_id"],
+            "product_name": p["name"],
+            "total_revenue": float(p["revenue"])
         }
         for p in products
     ]
 
 
+@coalesce("dashboard.order_status_distribution")
 def get_order_status_distribution(db: Session) -> Dict[str, Any]:
     """Obtiene la distribución de métodos de pago"""
-    from db.models import Sale
-    
     results = db.query(
         Sale.payment_method,
         func.count(Sale.id).label('count'),
@@ -206,17 +206,23 @@ def get_order_status_distribution(db: Session) -> Dict[str, Any]:
         Sale.payment_method
     ).all()
     
-    total_count = sum(r.count for r in results)
-    total_amount = sum(float(r.total) if r.total else 0.0 for r in results)
+    # Ventas activas + filas de resumen de los meses archivados
+    methods = get_archived_payment_methods(db)
+    for r in results:
+        method = methods.setdefault(r.payment_method, {"count": 0, "total": Decimal("0.00")})
+        method["count"] += int(r.count)
+        method["total"] += Decimal(str(r.total or 0))
+    
+    total_count = sum(m["count"] for m in methods.values())
     
     distribution = [
         {
-            "status": r.payment_method or "N/A",
-            "count": int(r.count),
-            "total": float(r.total) if r.total else 0.0,
-            "percentage": (float(r.count) / total_count * 100) if total_count > 0 else 0.0
+            "status": payment_method or "N/A",
+            "count": m["count"],
+            "total": float(m["total"]),
+            "percentage": (float(m["count"]) / total_count * 100) if total_count > 0 else 0.0
         }
-        for r in results
+        for payment_method, m in methods.items()
     ]
     
     return {
@@ -225,6 +231,7 @@ def get_order_status_distribution(db: Session) -> Dict[str, Any]:
     }
 
 
+@coalesce("dashboard.all_dashboard_data")
 def get_all_dashboard_data(db: Session) -> Dict[str, Any]:
     """Obtiene todos los datos del dashboard en una sola llamada"""
     return {
@@ -0,0 +1,327 @@
+"""
+Totales financieros acumulados (financial_totals)
+- create_sale / create_sales_bulk / create_purchase suman cada operación a la fila global,
+  a la del mes y a la del día, en la misma transacción
+- El resumen del dashboard lee una sola fila y los reportes por período leen las filas del rango
+- rebuild_financial_totals recalcula todo desde ventas (activas y archivadas) y compras,
+  e informa las diferencias encontradas
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, delete, func, case
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+from db.models import FinancialTotal, Purchase
+from crud.archive import sales_source
+
+TOTAL_PERIOD = "total"
+PERIOD_TYPES = ("day", "month")
+AMOUNT_FIELDS = ("income", "expenses")
+COUNT_FIELDS = ("sales_count", "purchases_count")
+FIELDS = AMOUNT_FIELDS + COUNT_FIELDS
+
+
+def sale_entry(sale_date: datetime, total) -> Dict[str, Any]:
+    """Arma el movimiento de una venta para record_financial_totals"""
+    return {"date": sale_date, "income": total, "expenses": 0, "sales_count": 1, "purchases_count": 0}
+
+
+def purchase_entry(purchase_date: datetime, total) -> Dict[str, Any]:
+    """Arma el movimiento de una compra para record_financial_totals"""
+    return {"date": purchase_date, "income": 0, "expenses": total, "sales_count": 0, "purchases_count": 1}
+
+
+def _as_date(value) -> Optional[date]:
+    """func.date() retorna date en MySQL y texto en SQLite"""
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _periods(day: Optional[date]):
+    """Filas afectadas por una operación del día indicado: (period, period_type, period_start)"""
+    periods = [(TOTAL_PERIOD, TOTAL_PERIOD, None)]
+    if day is not None:
+        month = day.replace(day=1)
+        periods.append((month.strftime("%Y-%m"), "month", month))
+        periods.append((day.isoformat(), "day", day))
+    return periods
+
+
+def _empty_row(period_type: str, period_start: Optional[date]) -> Dict[str, Any]:
+    return {
+        "period_type": period_type,
+        "period_start": period_start,
+        "income": Decimal("0.00"),
+        "expenses": Decimal("0.00"),
+        "sales_count": 0,
+        "purchases_count": 0
+    }
+
+
+def _accumulate(rows: Dict[str, Dict[str, Any]], day: Optional[date], values: Dict[str, Any]):
+    for period, period_type, period_start in _periods(day):
+        row = rows.setdefault(period, _empty_row(period_type, period_start))
+        for field in AMOUNT_FIELDS:
+            row[field] += Decimal(str(values.get(field) or 0))
+        for field in COUNT_FIELDS:
+            row[field] += int(values.get(field) or 0)
+
+
+_warned_not_initialized = False
+
+
+def _warn_not_initialized():
+    global _warned_not_initialized
+    if not _warned_not_initialized:
+        _warned_not_initialized = True
+        print("Advertencia: financial_totals no tenía la fila global; se creó vacía. "
+              "Cargue el historial con 'python financial_totals.py rebuild'")
+
+
+def _lock_total(db: Session) -> bool:
+    """Bloquea la fila global hasta el commit; False si todavía no existe"""
+    table = FinancialTotal.__table__
+    return db.execute(
+        select(table.c.period).where(table.c.period == TOTAL_PERIOD).with_for_update()
+    ).first() is not None
+
+
+def _insert_missing(db: Session, rows: Dict[str, Dict[str, Any]], now: datetime):
+    """Crea filas vacías; otra transacción puede crear la misma fila al mismo tiempo: se ignora el duplicado"""
+    table = FinancialTotal.__table__
+    for period, row in rows.items():
+        try:
+            with db.begin_nested():
+                db.execute(insert(table), [{
+                    **_empty_row(row["period_type"], row["period_start"]), "period": period, "updated_at": now
+                }])
+        except IntegrityError:
+            pass
+
+
+def record_financial_totals(db: Session, entries: List[Dict[str, Any]]):
+    """
+    Suma ventas/compras a financial_totals sin confirmar la transacción.
+    Debe llamarse después de insertar la venta o compra, dentro de la misma transacción.
+    Primero se bloquea la fila global (igual que rebuild_financial_totals, así un rebuild en línea
+    no se cruza con una venta). Si falta (tabla sin inicializar), se crea vacía y se avisa: el
+    historial se carga con 'python manage_db.py create' o 'python financial_totals.py rebuild',
+    nunca dentro de una venta.
+    """
+    if not entries:
+        return
+
+    deltas: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        _accumulate(deltas, entry["date"].date() if entry["date"] else None, entry)
+
+    db.flush()
+    table = FinancialTotal.__table__
+    now = datetime.now()
+    if not _lock_total(db):
+        _warn_not_initialized()
+        _insert_missing(db, {TOTAL_PERIOD: deltas[TOTAL_PERIOD]}, now)
+        _lock_total(db)
+
+    existing = set(db.execute(
+        select(table.c.period).where(table.c.period.in_(deltas.keys()))
+    ).scalars().all())
+    _insert_missing(db, {period: row for period, row in deltas.items() if period not in existing}, now)
+
+    # Un UPDATE por bloque: bloquea las filas y suma los deltas (col = col + CASE period ...)
+    values = {
+        field: table.c[field] + case(
+            {period: row[field] for period, row in deltas.items()}, value=table.c.period, else_=0
+        )
+        for field in FIELDS
+    }
+    db.execute(
+        update(table).where(table.c.period.in_(deltas.keys()))
+        .values(**values, version=table.c.version + 1, updated_at=now)
+    )
+
+
+def _compute_totals(db: Session) -> Dict[str, Dict[str, Any]]:
+    """Totales esperados recalculados desde ventas (activas + archivadas) y compras"""
+    rows: Dict[str, Dict[str, Any]] = {}
+    sales = sales_source(db)
+    sale_day = func.date(sales.c.sale_date)
+    for day, count, total in db.execute(
+        select(sale_day, func.count(sales.c.id), func.sum(sales.c.total)).group_by(sale_day)
+    ).all():
+        _accumulate(rows, _as_date(day), {"income": total, "sales_count": count})
+
+    purchase_day = func.date(Purchase.purchase_date)
+    for day, count, total in db.query(
+        purchase_day, func.count(Purchase.id), func.sum(Purchase.total)
+    ).group_by(purchase_day).all():
+        _accumulate(rows, _as_date(day), {"expenses": total, "purchases_count": count})
+
+    rows.setdefault(TOTAL_PERIOD, _empty_row(TOTAL_PERIOD, None))
+    return rows
+
+
+def _stored_values(row) -> Dict[str, Any]:
+    values = {field: Decimal(str(getattr(row, field) or 0)) for field in AMOUNT_FIELDS}
+    values.update({field: int(getattr(row, field) or 0) for field in COUNT_FIELDS})
+    return values
+
+
+def _write_totals(db: Session, expected: Dict[str, Dict[str, Any]], stored: Dict[str, Dict[str, Any]]):
+    """Deja financial_totals igual a 'expected' tocando solo las filas distintas"""
+    table = FinancialTotal.__table__
+    now = datetime.now()
+    new_rows = [
+        {**row, "period": period, "version": 1, "updated_at": now}
+        for period, row in expected.items() if period not in stored
+    ]
+    if new_rows:
+        db.execute(insert(table), new_rows)
+    for period, row in expected.items():
+        if period in stored and stored[period] != {field: row[field] for field in FIELDS}:
+            db.execute(
+                update(table).where(table.c.period == period)
+                .values(**{field: row[field] for field in FIELDS}, version=table.c.version + 1, updated_at=now)
+            )
+    stale = [period for period in stored if period not in expected]
+    if stale:
+        db.execute(delete(table).where(table.c.period.in_(stale)))
+
+
+def rebuild_financial_totals(db: Session, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    Recalcula financial_totals desde cero y retorna las diferencias con lo guardado
+    (una por período y campo). Con dry_run=True solo verifica, sin escribir.
+    Se puede ejecutar con la API en marcha: la fila global se crea (y se confirma) si falta, así
+    las ventas siguientes ya suman sus deltas; luego se bloquea antes de leer ventas y compras.
+    Las ventas en curso terminan antes de la lectura y las nuevas esperan al commit del rebuild,
+    que solo escribe las diferencias.
+    """
+    if not dry_run:
+        _insert_missing(db, {TOTAL_PERIOD: _empty_row(TOTAL_PERIOD, None)}, datetime.now())
+        db.commit()
+    _lock_total(db)
+    stored = {
+        row.period: _stored_values(row)
+        for row in db.query(FinancialTotal).with_for_update().all()
+    }
+    expected = _compute_totals(db)
+
+    differences = []
+    for period in sorted(set(stored) | set(expected)):
+        current = stored.get(period)
+        row = expected.get(period)
+        for field in FIELDS:
+            stored_value = current[field] if current else None
+            expected_value = row[field] if row else None
+            if stored_value != expected_value:
+                differences.append({
+                    "period": period,
+                    "field": field,
+                    "stored": stored_value,
+                    "expected": expected_value
+                })
+
+    if dry_run:
+        db.rollback()
+        return differences
+
+    _write_totals(db, expected, stored)
+    db.commit()
+    return differences
+
+
+def get_financial_totals(db: Session) -> Optional[Dict[str, Any]]:
+    """Totales globales (una fila); None si la tabla todavía no se inicializó"""
+    row = db.query(FinancialTotal).filter(FinancialTotal.period == TOTAL_PERIOD).first()
+    if row is None:
+        return None
+    values = _stored_values(row)
+    return {
+        "total_income": float(values["income"]),
+        "total_expenses": float(values["expenses"]),
+        "net_result": float(values["income"] - values["expenses"]),
+        "sales_count": values["sales_count"],
+        "purchases_count": values["purchases_count"]
+    }
+
+
+def _month_aligned(start_date: Optional[date], end_date: Optional[date]) -> bool:
+    """True si el rango cubre meses completos (se pueden leer las filas mensuales)"""
+    if start_date and start_date.day != 1:
+        return False
+    if end_date:
+        next_day = date.fromordinal(end_date.toordinal() + 1)
+        return next_day.day == 1
+    return True
+
+
+def get_financial_report(db: Session, start_date: date = None, end_date: date = None,
+                         group_by: str = "day") -> Dict[str, Any]:
+    """
+    Ingresos, gastos y resultado neto por día o por mes en el rango indicado (fechas incluidas).
+    Se leen las filas precalculadas; por mes se usan las filas mensuales si el rango
+    cubre meses completos y, si no, se agrupan las filas diarias.
+    """
+    if group_by not in PERIOD_TYPES:
+        raise ValueError(f"Agrupación inválida: {group_by}. Use una de: {', '.join(PERIOD_TYPES)}")
+
+    period_type = "month" if group_by == "month" and _month_aligned(start_date, end_date) else "day"
+    query = db.query(FinancialTotal).filter(FinancialTotal.period_type == period_type)
+    if start_date:
+        query = query.filter(FinancialTotal.period_start >= start_date)
+    if end_date:
+        query = query.filter(FinancialTotal.period_start <= end_date)
+
+    periods: Dict[str, Dict[str, Any]] = {}
+    for row in query.order_by(FinancialTotal.period_start).all():
+        key = row.period[:7] if group_by == "month" else row.period
+        values = _stored_values(row)
+        period = periods.setdefault(key, {field: 0 for field in FIELDS})
+        for field in FIELDS:
+            period[field] += values[field]
+
+    income = sum((p["income"] for p in periods.values()), Decimal("0.00"))
+    expenses = sum((p["expenses"] for p in periods.values()), Decimal("0.00"))
+    return {
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": end_date.isoformat() if end_date else None,
+        "group_by": group_by,
+        "total_income": float(income),
+        "total_expenses": float(expenses),
+        "net_result": float(income - expenses),
+        "sales_count": sum(p["sales_count"] for p in periods.values()),
+        "purchases_count": sum(p["purchases_count"] for p in periods.values()),
+        "periods": [
+            {
+                "period": key,
+                "income": float(p["income"]),
+                "expenses": float(p["expenses"]),
+                "net": float(p["income"] - p["expenses"]),
+                "sales_count": p["sales_count"],
+                "purchases_count": p["purchases_count"]
+            }
+            for key, p in periods.items()
+        ]
+    }
+
+
+def get_period_watermark(db: Session, start_date: date = None, end_date: date = None) -> Optional[Tuple[int, int]]:
+    """
+    Marca de escritura de un rango de días (fechas incluidas): cantidad de filas diarias y suma de
+    sus versiones. Toda venta/compra con fecha en el rango (o un rebuild que corrija esos días)
+    aumenta la versión de su fila en la misma transacción, así la marca siempre cambia.
+    None si financial_totals no está inicializada (sin fila global): no sirve como marca.
+    """
+    table = FinancialTotal.__table__
+    if db.execute(select(table.c.period).where(table.c.period == TOTAL_PERIOD)).first() is None:
+        return None
+    query = select(func.count(), func.coalesce(func.sum(table.c.version), 0)).where(table.c.period_type == "day")
+    if start_date:
+        query = query.where(table.c.period_start >= start_date)
+    if end_date:
+        query = query.where(table.c.period_start <= end_date)
+    count, versions = db.execute(query).one()
+    return int(count or 0), int(versions or 0)
@@ -0,0 +1,264 @@
+"""
+Pronóstico de demanda y puntos de reorden por producto
+- La demanda diaria se suaviza exponencialmente (media y varianza) a partir de SalesDetail
+- El proceso nocturno solo incorpora los días nuevos desde 'demand_through' de cada producto
+- Las alertas de reorden y la orden de compra sugerida leen los valores precalculados
+  y el stock actual de product_stock, sin recalcular nada por petición
+"""
+import os
+import math
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional
+from db.models import (
+    ProductForecast, Product, MedicineBatch, Sale, SalesDetail,
+    Purchase, PurchaseDetail, Supplier
+)
+from crud.stock import get_product_stock
+
+# Días de historial para inicializar un producto sin pronóstico
+HISTORY_DAYS = 90
+# Span del suavizado exponencial (en días): alpha = 2 / (span + 1)
+SMOOTHING_SPAN_DAYS = int(os.getenv("FORECAST_SPAN_DAYS", "28"))
+ALPHA = 2 / (SMOOTHING_SPAN_DAYS + 1)
+# Primeros días del historial usados como valor inicial (media y varianza simples); el suavizado
+# arranca después, así ningún día se cuenta dos veces
+SEED_DAYS = min(SMOOTHING_SPAN_DAYS, HISTORY_DAYS // 2)
+# Días entre el pedido y la recepción
+LEAD_TIME_DAYS = int(os.getenv("FORECAST_LEAD_TIME_DAYS", "7"))
+# Días entre revisiones de pedidos (el pedido cubre lead time + revisión)
+REVIEW_DAYS = int(os.getenv("FORECAST_REVIEW_DAYS", "7"))
+# Factor de nivel de servicio (1.65 ≈ 95%)
+SERVICE_Z = float(os.getenv("FORECAST_SERVICE_Z", "1.65"))
+# Historial de compras considerado para elegir proveedor
+SUPPLIER_HISTORY_DAYS = 365
+
+
+def _as_date(value) -> date:
+    """func.date() retorna date en MySQL y texto en SQLite"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _daily_demand(db: Session, product_ids: List[int], start: date, end: date) -> np.ndarray:
+    """Matriz productos x días con las unidades vendidas por día (una consulta agrupada)"""
+    days = (end - start).days + 1
+    demand = np.zeros((len(product_ids), max(days, 0)), dtype=np.float64)
+    if days <= 0 or not product_ids:
+        return demand
+    position = {product_id: i for i, product_id in enumerate(product_ids)}
+    sale_day = func.date(Sale.sale_date)
+    rows = db.query(
+        MedicineBatch.product_id,
+        sale_day,
+        func.sum(SalesDetail.quantity)
+    ).join(
+        SalesDetail, SalesDetail.batch_id == MedicineBatch.id
+    ).join(
+        Sale, SalesDetail.sale_id == Sale.id
+    ).filter(
+        Sale.sale_date >= datetime.combine(start, datetime.min.time()),
+        Sale.sale_date < datetime.combine(end + timedelta(days=1), datetime.min.time())
+    ).group_by(MedicineBatch.product_id, sale_day).all()
+    for product_id, day, quantity in rows:
+        if product_id in position:
+            demand[position[product_id], (_as_date(day) - start).days] = quantity or 0
+    return demand
+
+
+def _last_suppliers(db: Session, today: date) -> Dict[int, Any]:
+    """Último proveedor y precio unitario de compra por producto"""
+    rows = db.query(
+        MedicineBatch.product_id,
+        Purchase.supplier_id,
+        PurchaseDetail.unit_price
+    ).join(
+        PurchaseDetail, PurchaseDetail.batch_id == MedicineBatch.id
+    ).join(
+        Purchase, PurchaseDetail.purchase_id == Purchase.id
+    ).filter(
+        Purchase.purchase_date >= datetime.combine(today - timedelta(days=SUPPLIER_HISTORY_DAYS), datetime.min.time())
+    ).order_by(Purchase.purchase_date, Purchase.id).all()
+    # Ordenado por fecha: el último que se asigna es la compra más reciente
+    return {product_id: (supplier_id, unit_price) for product_id, supplier_id, unit_price in rows}
+
+
+def update_forecasts(db: Session, today: date = None, full: bool = False) -> Dict[str, int]:
+    """
+    Proceso nocturno: incorpora los días completos de ventas desde el último cálculo.
+    - Productos sin pronóstico (o full=True): se inicializan con los últimos HISTORY_DAYS días
+      (media y varianza de los primeros SEED_DAYS, luego suavizado de los días restantes)
+    - Resto: solo se procesan los días posteriores a 'demand_through'
+    El suavizado se aplica día por día pero vectorizado sobre todos los productos.
+    """
+    today = today or date.today()
+    last_day = today - timedelta(days=1)
+
+    product_ids = [row.id for row in db.query(Product.id).filter(Product.status == 1).order_by(Product.id).all()]
+    if not product_ids:
+        return {"products": 0, "days": 0}
+    forecasts = {
+        f.product_id: f for f in db.query(ProductForecast).filter(ProductForecast.product_id.in_(product_ids)).all()
+    }
+
+    count = len(product_ids)
+    mean = np.zeros(count)
+    variance = np.zeros(count)
+    through = np.empty(count, dtype=np.int64)  # Último día ya incorporado (ordinal)
+    seed = np.zeros(count, dtype=bool)
+    history_start = last_day - timedelta(days=HISTORY_DAYS - 1)
+    seed_end = history_start + timedelta(days=SEED_DAYS - 1)
+    for i, product_id in enumerate(product_ids):
+        forecast = forecasts.get(product_id)
+        if forecast is None or full:
+            seed[i] = True
+            through[i] = seed_end.toordinal()
+        else:
+            mean[i] = forecast.daily_demand
+            variance[i] = forecast.demand_std ** 2
+            through[i] = forecast.demand_through.toordinal()
+
+    start = date.fromordinal(int(through.min()) + 1)
+    if seed.any():
+        start = min(start, history_start)
+    demand = _daily_demand(db, product_ids, start, last_day)
+
+    # Productos nuevos: arrancar desde la media y varianza de la ventana inicial; el suavizado
+    # solo recorre los días posteriores (ordinal > through)
+    if seed.any():
+        offset = (history_start - start).days
+        window = demand[seed, offset:offset + SEED_DAYS]
+        mean[seed] = window.mean(axis=1)
+        variance[seed] = window.var(axis=1)
+
+    for j in range(demand.shape[1]):
+        ordinal = start.toordinal() + j
+        active = ordinal > through
+        diff = demand[:, j] - mean
+        increment = ALPHA * diff
+        mean = np.where(active, mean + increment, mean)
+        variance = np.where(active, (1 - ALPHA) * (variance + diff * increment), variance)
+
+    stock = get_product_stock(db, product_ids)
+    suppliers = _last_suppliers(db, today)
+    now = datetime.now()
+    std = np.sqrt(np.maximum(variance, 0))
+    safety = SERVICE_Z * std * math.sqrt(LEAD_TIME_DAYS)
+    reorder_point = np.ceil(mean * LEAD_TIME_DAYS + safety)
+    order_up_to = np.ceil(mean * (LEAD_TIME_DAYS + REVIEW_DAYS) + safety)
+
+    for i, product_id in enumerate(product_ids):
+        forecast = forecasts.get(product_id)
+        if forecast is None:
+            forecast = ProductForecast(product_id=product_id)
+            db.add(forecast)
+        current_stock = stock.get(product_id, 0)
+        supplier_id, unit_price = suppliers.get(product_id, (forecast.supplier_id, forecast.last_unit_price))
+        forecast.daily_demand = round(float(mean[i]), 4)
+        forecast.demand_std = round(float(std[i]), 4)
+        forecast.lead_time_days = LEAD_TIME_DAYS
+        forecast.safety_stock = int(math.ceil(safety[i]))
+        forecast.reorder_point = int(reorder_point[i])
+        forecast.order_up_to = int(order_up_to[i])
+        forecast.stock = current_stock
+        forecast.days_of_cover = round(current_stock / mean[i], 1) if mean[i] > 0 else None
+        forecast.supplier_id = supplier_id
+        forecast.last_unit_price = unit_price
+        forecast.demand_through = last_day
+        forecast.updated_at = now
+
+    db.commit()
+    return {"products": count, "days": int(demand.shape[1]), "initialized": int(seed.sum())}
+
+
+def get_reorder_alerts(db: Session, supplier_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Productos cuyo stock actual está en o bajo su punto de reorden (con demanda > 0).
+    Los días de cobertura se recalculan con el stock actual; ordenados por urgencia.
+    """
+    query = db.query(ProductForecast, Product.name, Product.presentation).join(
+        Product, ProductForecast.product_id == Product.id
+    ).filter(
+        Product.status == 1,
+        ProductForecast.daily_demand > 0
+    )
+    if supplier_id is not None:
+        query = query.filter(ProductForecast.supplier_id == supplier_id)
+    rows = query.all()
+    stock = get_product_stock(db, [forecast.product_id for forecast, _, _ in rows])
+
+    alerts = []
+    for forecast, name, presentation in rows:
+        current_stock = stock.get(forecast.product_id, 0)
+        if current_stock > forecast.reorder_point:
+            continue
+        days_of_cover = round(current_stock / forecast.daily_demand, 1)
+        suggested = max(forecast.order_up_to - current_stock, 0)
+        alerts.append({
+            "product_id": forecast.product_id,
+            "product_name": name,
+            "product_presentation": presentation,
+            "stock": current_stock,
+            "daily_demand": forecast.daily_demand,
+            "days_of_cover": days_of_cover,
+            "reorder_point": forecast.reorder_point,
+            "safety_stock": forecast.safety_stock,
+            "suggested_quantity": suggested,
+            "supplier_id": forecast.supplier_id,
+            "last_unit_price": float(forecast.last_unit_price) if forecast.last_unit_price is not None else None,
+            "forecast_date": forecast.demand_through.isoformat(),
+            "message": (
+                f"'{name}' tiene {current_stock} unidades (~{days_of_cover} días de cobertura), "
+                f"punto de reorden {forecast.reorder_point}. Pedir {suggested} unidades."
+            ),
+            "alert_type": "reorder"
+        })
+    alerts.sort(key=lambda a: a["days_of_cover"])
+    return alerts
+
+
+def get_suggested_purchase_orders(db: Session) -> Dict[str, Any]:
+    """Orden de compra sugerida: alertas de reorden agrupadas por último proveedor"""
+    alerts = get_reorder_alerts(db)
+    supplier_ids = {a["supplier_id"] for a in alerts if a["supplier_id"] is not None}
+    suppliers = {
+        s.id: s for s in db.query(Supplier).filter(Supplier.id.in_(supplier_ids)).all()
+    } if supplier_ids else {}
+
+    orders = {}
+    for alert in alerts:
+        if alert["suggested_quantity"] <= 0:
+            continue
+        key = alert["supplier_id"]
+        if key not in orders:
+            supplier = suppliers.get(key)
+            orders[key] = {
+                "supplier_id": key,
+                "supplier_name": supplier.name if supplier else None,
+                "supplier_phone": supplier.phone if supplier else None,
+                "supplier_email": supplier.email if supplier else None,
+                "items": [],
+                "estimated_total": 0.0
+            }
+        line_total = (alert["last_unit_price"] or 0) * alert["suggested_quantity"]
+        orders[key]["items"].append({
+            "product_id": alert["product_id"],
+            "product_name": alert["product_name"],
+            "product_presentation": alert["product_presentation"],
+            "quantity": alert["suggested_quantity"],
+            "unit_price": alert["last_unit_price"],
+            "subtotal": round(line_total, 2),
+            "stock": alert["stock"],
+            "days_of_cover": alert["days_of_cover"]
+        })
+        orders[key]["estimated_total"] = round(orders[key]["estimated_total"] + line_total, 2)
+
+    # Productos sin historial de compras quedan en un grupo sin proveedor al final
+    grouped = sorted(orders.values(), key=lambda o: (o["supplier_id"] is None, -o["estimated_total"]))
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "total_orders": len(grouped),
+        "estimated_total": round(sum(o["estimated_total"] for o in grouped), 2),
+        "orders": grouped
+    }
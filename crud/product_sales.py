@@ -0,0 +1,219 @@
+"""
+Ventas diarias por producto (product_daily_sales)
+- create_sale / create_sales_bulk suman cada línea vendida a la fila (producto, día)
+  en la misma transacción
+- Los rankings (productos más vendidos, populares e ingresos por producto) agrupan solo
+  las filas de los días del rango: O(productos x días) en lugar de recorrer todos los detalles
+- rebuild_product_daily_sales recalcula la tabla desde los detalles de venta (activos y archivados)
+  e informa las diferencias encontradas
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, delete, func, case, desc
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Tuple
+from db.models import ProductDailySales, Product, MedicineBatch
+from crud.archive import details_source
+from utils.bulk import chunked
+
+FIELDS = ("quantity", "revenue", "lines")
+RANKING_ORDERS = ("quantity", "revenue")
+
+Key = Tuple[int, date]
+
+
+def product_sale_entry(sale_date: datetime, product_id: int, quantity: int, subtotal) -> Dict[str, Any]:
+    """Arma una línea vendida para record_product_sales"""
+    return {"date": sale_date, "product_id": product_id, "quantity": quantity, "revenue": subtotal}
+
+
+def _as_date(value) -> date:
+    """func.date() retorna date en MySQL y texto en SQLite"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _empty_row() -> Dict[str, Any]:
+    return {"quantity": 0, "revenue": Decimal("0.00"), "lines": 0}
+
+
+def record_product_sales(db: Session, entries: List[Dict[str, Any]]):
+    """
+    Suma las líneas vendidas a product_daily_sales sin confirmar la transacción.
+    Debe llamarse después de insertar los detalles de venta, dentro de la misma transacción.
+    Solo suma los deltas: el historial se carga al desplegar con 'python product_daily_sales.py rebuild'
+    (nunca dentro de una venta).
+    """
+    if not entries:
+        return
+
+    deltas: Dict[Key, Dict[str, Any]] = {}
+    for entry in entries:
+        row = deltas.setdefault((entry["product_id"], _as_date(entry["date"])), _empty_row())
+        row["quantity"] += int(entry["quantity"])
+        row["revenue"] += Decimal(str(entry["revenue"]))
+        row["lines"] += 1
+
+    db.flush()
+    table = ProductDailySales.__table__
+    by_day: Dict[date, Dict[int, Dict[str, Any]]] = {}
+    for (product_id, day), row in deltas.items():
+        by_day.setdefault(day, {})[product_id] = row
+
+    for day, rows in by_day.items():
+        existing = set(db.execute(
+            select(table.c.product_id).where(table.c.day == day, table.c.product_id.in_(rows.keys()))
+        ).scalars().all())
+        for product_id in rows:
+            if product_id in existing:
+                continue
+            # Otra venta del mismo día puede crear la fila al mismo tiempo: se ignora el duplicado
+            try:
+                with db.begin_nested():
+                    db.execute(insert(table), [{"product_id": product_id, "day": day, **_empty_row()}])
+            except IntegrityError:
+                pass
+
+        # Un UPDATE por día: col = col + CASE product_id ...
+        values = {
+            field: table.c[field] + case(
+                {product_id: row[field] for product_id, row in rows.items()},
+                value=table.c.product_id, else_=0
+            )
+            for field in FIELDS
+        }
+        db.execute(
+            update(table).where(table.c.day == day, table.c.product_id.in_(rows.keys())).values(**values)
+        )
+
+
+def _compute_rows(db: Session) -> Dict[Key, Dict[str, Any]]:
+    """Filas esperadas recalculadas desde los detalles de venta (activos + archivados)"""
+    details = details_source(db)
+    day = func.date(details.c.sale_date)
+    rows = {}
+    for product_id, sale_day, quantity, revenue, lines in db.execute(
+        select(
+            MedicineBatch.product_id, day,
+            func.sum(details.c.quantity), func.sum(details.c.subtotal), func.count(details.c.id)
+        ).join(MedicineBatch, MedicineBatch.id == details.c.batch_id)
+        .group_by(MedicineBatch.product_id, day)
+    ).all():
+        rows[(product_id, _as_date(sale_day))] = {
+            "quantity": int(quantity or 0),
+            "revenue": Decimal(str(revenue or 0)),
+            "lines": int(lines)
+        }
+    return rows
+
+
+def _stored_values(row) -> Dict[str, Any]:
+    return {
+        "quantity": int(row.quantity or 0),
+        "revenue": Decimal(str(row.revenue or 0)),
+        "lines": int(row.lines or 0)
+    }
+
+
+def _write_rows(db: Session, expected: Dict[Key, Dict[str, Any]], stored: Dict[Key, Dict[str, Any]]):
+    """Deja product_daily_sales igual a 'expected' tocando solo las filas distintas"""
+    table = ProductDailySales.__table__
+    new_rows = [
+        {"product_id": product_id, "day": day, **row}
+        for (product_id, day), row in expected.items() if (product_id, day) not in stored
+    ]
+    for chunk in chunked(new_rows):
+        db.execute(insert(table), chunk)
+    for (product_id, day), row in expected.items():
+        if (product_id, day) in stored and stored[(product_id, day)] != row:
+            db.execute(
+                update(table).where(table.c.product_id == product_id, table.c.day == day).values(**row)
+            )
+    for product_id, day in stored:
+        if (product_id, day) not in expected:
+            db.execute(delete(table).where(table.c.product_id == product_id, table.c.day == day))
+
+
+def rebuild_product_daily_sales(db: Session, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    Recalcula product_daily_sales desde cero y retorna las diferencias con lo guardado
+    (una por producto, día y campo). Con dry_run=True solo verifica, sin escribir.
+    """
+    stored = {
+        (row.product_id, _as_date(row.day)): _stored_values(row)
+        for row in db.query(ProductDailySales).with_for_update().all()
+    }
+    expected = _compute_rows(db)
+
+    differences = []
+    for product_id, day in sorted(set(stored) | set(expected)):
+        current = stored.get((product_id, day))
+        row = expected.get((product_id, day))
+        for field in FIELDS:
+            stored_value = current[field] if current else None
+            expected_value = row[field] if row else None
+            if stored_value != expected_value:
+                differences.append({
+                    "product_id": product_id,
+                    "day": day.isoformat(),
+                    "field": field,
+                    "stored": stored_value,
+                    "expected": expected_value
+                })
+
+    if dry_run:
+        db.rollback()
+        return differences
+
+    _write_rows(db, expected, stored)
+    db.commit()
+    return differences
+
+
+def get_product_ranking(db: Session, start_date: datetime = None, end_date: datetime = None,
+                        order_by: str = "quantity", limit: int = 10,
+                        active_only: bool = False) -> List[Dict[str, Any]]:
+    """
+    Productos ordenados por unidades o ingresos en el rango (días completos, fechas incluidas).
+    Agrupa las filas diarias del rango y la base de datos retorna solo los primeros 'limit'.
+    """
+    if order_by not in RANKING_ORDERS:
+        raise ValueError(f"Orden inválido: {order_by}. Use uno de: {', '.join(RANKING_ORDERS)}")
+
+    table = ProductDailySales.__table__
+    totals = select(
+        table.c.product_id,
+        func.sum(table.c.quantity).label("quantity"),
+        func.sum(table.c.revenue).label("revenue"),
+        func.sum(table.c.lines).label("lines")
+    )
+    if start_date:
+        totals = totals.where(table.c.day >= _as_date(start_date))
+    if end_date:
+        totals = totals.where(table.c.day <= _as_date(end_date))
+    totals = totals.group_by(table.c.product_id).subquery("product_totals")
+
+    query = db.query(
+        Product.id, Product.name, Product.presentation, Product.concentration,
+        totals.c.quantity, totals.c.revenue, totals.c.lines
+    ).join(totals, totals.c.product_id == Product.id)
+    if active_only:
+        query = query.filter(Product.status == 1)
+
+    results = query.order_by(desc(totals.c[order_by]), Product.id).limit(limit).all()
+    return [
+        {
+            "product_id": row.id,
+            "name": row.name,
+            "presentation": row.presentation,
+            "concentration": row.concentration,
+            "quantity": int(row.quantity or 0),
+            "revenue": Decimal(str(row.revenue or 0)),
+            "lines": int(row.lines or 0)
+        }
+        for row in results
+    ]
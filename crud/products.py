@@ -3,6 +3,8 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func
 from db.models import Product, Category, MedicineBatch
 from db.schemas import ProductCreate, ProductUpdate
+from utils.images import build_image_url, build_thumbnail_url
+from crud.stock import record_stock_movements, batch_movement, get_product_stock
 
 
 def create_product(db: Session, data: ProductCreate):
@@ -33,6 +35,24 @@ def create_product(db: Session, data: ProductCreate):
         raise ValueError(f"Error de integridad: {error_msg}")
 
 
+def latest_sale_prices(db: Session, product_ids):
+    """Precio de venta del lote activo más reciente (mayor ID) con precio, por producto"""
+    if not product_ids:
+        return {}
+    latest = db.query(
+        MedicineBatch.product_id,
+        func.max(MedicineBatch.id).label("batch_id")
+    ).filter(
+        MedicineBatch.product_id.in_(product_ids),
+        MedicineBatch.status == 1,
+        MedicineBatch.sale_price.isnot(None)
+    ).group_by(MedicineBatch.product_id).subquery()
+    rows = db.query(MedicineBatch.product_id, MedicineBatch.sale_price).join(
+        latest, MedicineBatch.id == latest.c.batch_id
+    ).all()
+    return {product_id: float(price) for product_id, price in rows}
+
+
 def get_products(db: Session, search: str = None, category_id: int = None, status: int = None):
     """
     Obtener productos con búsqueda y filtros mejorados
@@ -40,8 +60,8 @@ def get_products(db: Session, search: str = None, category_id: int = None, statu
     """
     from sqlalchemy import or_, func
     
-    # Query con joinedload para cargar lotes eficientemente
-    query = db.query(Product).options(joinedload(Product.batches))
+    # Solo productos: el stock sale de product_stock y el precio de una consulta agrupada
+    query = db.query(Product)
     
     # Filtro por status (por defecto solo activos)
     if status is not None:
@@ -65,37 +85,18 @@ def get_products(db: Session, search: str = None, category_id: int = None, statu
         query = query.filter(or_(*conditions))
     
     products = query.all()
+    product_ids = [product.id for product in products]
+    
+    # Stock total de los lotes activos: una fila por producto en product_stock
+    stock_by_product = get_product_stock(db, product_ids)
+    # Precio de venta del lote activo más reciente con precio
+    prices = latest_sale_prices(db, product_ids)
     
     # Enriquecer productos con stock total y precio
     enriched_products = []
     for product in products:
-        # Calcular stock total de todos los lotes activos
-        total_stock = sum(batch.stock for batch in product.batches if batch.status == 1 and batch.stock is not None)
-        
-        # Obtener precio de venta (del lote más reciente con precio, o promedio)
-        sale_price = None
-        if product.batches:
-            # Buscar lotes activos con precio
-            batches_with_price = [b for b in product.batches if b.status == 1 and b.sale_price is not None]
-            if batches_with_price:
-                # Usar el precio del lote más reciente
-                latest_batch = max(batches_with_price, key=lambda b: b.id)
-                sale_price = float(latest_batch.sale_price)
-        
-        # Construir URL completa de la imagen
-        image_url = None
-        if product.image:
-            # Si la imagen ya tiene http://, usarla tal cual
-            if product.image.startswith('http://') or product.image.startswith('https://'):
-                image_url = product.image
-            else:
-                # Construir URL completa desde la ruta relativa
-                # Base URL del servidor (puede configurarse desde variable de entorno)
-                import os
-                base_url = os.getenv('API_BASE_URL', 'http://127.0.0.1:8000')
-                # Asegurar que la ruta no tenga barras duplicadas
-                image_path = product.image.lstrip('/')
-                image_url = f"{base_url}/{image_path}"
+        total_stock = stock_by_product.get(product.id, 0)
+        sale_price = prices.get(product.id)
         
         # Agregar stock y precio al producto (usando atributos dinámicos)
         product_dict = {
@@ -106,7 +107,8 @@ def get_products(db: Session, search: str = None, category_id: int = None, statu
             'presentation': product.presentation,
             'concentration': product.concentration,
             'image': product.image,  # Ruta relativa (mantener para compatibilidad)
-            'image_url': image_url,  # URL completa
+            'image_url': build_image_url(product.image),  # URL completa
+            'thumbnail_url': build_thumbnail_url(product.image),  # Miniatura para listados
             'status': product.status,
             'total_stock': total_stock,
             'sale_price': sale_price
@@ -146,7 +148,7 @@ def delete_product(db: Session, product_id: int) -> bool:
     return True
 
 
-def update_product_stock(db: Session, product_id: int, new_stock: int):
+def update_product_stock(db: Session, product_id: int, new_stock: int, user_id: int = None):
     """
     Actualiza el stock total de un producto.
     Establece el stock total del producto poniendo todo el stock en el lote más reciente
@@ -172,6 +174,9 @@ def update_product_stock(db: Session, product_id: int, new_stock: int):
         # Guardar el precio actual para no perderlo
         current_price = latest_batch.sale_price
         
+        # Stock previo de cada lote para registrar el ajuste en el libro de stock
+        previous = {batch.id: batch.stock or 0 for batch in active_batches}
+        
         # Poner todo el stock nuevo en el lote más reciente
         # SOLO modificar el stock, mantener el precio intacto
         latest_batch.stock = new_stock
@@ -181,6 +186,10 @@ def update_product_stock(db: Session, product_id: int, new_stock: int):
         for batch in active_batches[1:]:
             batch.stock = 0
         
+        record_stock_movements(db, [
+            batch_movement(batch.id, product_id, batch.stock - previous[batch.id], "ajuste", "product", product_id)
+            for batch in active_batches
+        ], user_id)
         db.commit()
         db.refresh(latest_batch)
         return latest_batch
@@ -194,6 +203,10 @@ def update_product_stock(db: Session, product_id: int, new_stock: int):
             sale_price=None  # Precio se establece por separado
         )
         db.add(new_batch)
+        db.flush()
+        record_stock_movements(db, [
+            batch_movement(new_batch.id, product_id, new_stock, "ajuste", "product", product_id)
+        ], user_id)
         db.commit()
         db.refresh(new_batch)
         return new_batch
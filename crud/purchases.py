@@ -1,51 +1,98 @@
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import tuple_, insert, update, case
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date
 from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
 from db.models import Purchase, PurchaseDetail, MedicineBatch, Supplier, User, Product, Category
-from db.schemas import PurchaseCreate
-from crud.products import create_product
+from db.schemas import PurchaseCreate, PurchaseDetailCreate
+from utils.bulk import chunked, insert_returning_ids
+from crud.stock import record_stock_movements, batch_movement
+from crud.finance import record_financial_totals, purchase_entry
+from crud.versions import record_changed_rows
 
 
-def find_or_create_product(db: Session, product_name: str, category_id: int, presentation: str, concentration: str, description: str = None, image_path: str = None):
+def _product_key(name: str, presentation: str, concentration: str) -> Tuple[str, str, str]:
+    """Clave natural del producto (MySQL compara sin distinguir mayúsculas ni espacios finales)"""
+    return tuple((value or "").strip().lower() for value in (name, presentation, concentration))
+
+
+def resolve_products(db: Session, details: List[PurchaseDetailCreate]) -> Dict[Tuple[str, str, str], int]:
     """
-    Busca un producto existente o crea uno nuevo
-    Busca por nombre, presentación y concentración
-    Si el producto existe pero no tiene imagen y se proporciona una, actualiza la imagen
-    Si el producto existe y tiene imagen pero se proporciona una nueva, también la actualiza
+    Busca o crea los productos de todas las líneas de una compra sin confirmar la transacción
+    - Una sola consulta por (nombre, presentación, concentración) para los productos existentes
+    - Una sola consulta para validar las categorías de los productos nuevos
+    - INSERT masivo de los productos que faltan
+    Si una línea trae imagen, se actualiza la imagen del producto (incluso si ya tenía una).
+    Retorna {clave del producto: product_id}
     """
-    # Buscar producto existente
-    product = db.query(Product).filter(
-        Product.name == product_name,
-        Product.presentation == presentation,
-        Product.concentration == concentration,
+    lines = {}
+    for detail in details:
+        key = _product_key(detail.product_name, detail.presentation, detail.concentration)
+        # Si el producto se repite, la última línea con imagen define la imagen
+        if key not in lines or detail.product_image:
+            lines[key] = detail
+    if not lines:
+        return {}
+
+    raw_keys = {(d.product_name, d.presentation, d.concentration) for d in details}
+    existing = db.query(Product.id, Product.name, Product.presentation, Product.concentration).filter(
+        tuple_(Product.name, Product.presentation, Product.concentration).in_(raw_keys),
         Product.status == 1
-    ).first()
-    
-    if product:
-        # Si se proporciona una imagen, actualizarla (incluso si ya tiene una)
-        if image_path:
-            product.image = image_path
-            db.commit()
-            db.refresh(product)
-        return product
-    
-    # Si no existe, crear nuevo producto
-    from db.schemas import ProductCreate
-    product_data = ProductCreate(
-        name=product_name,
-        description=description,
-        category_id=category_id,
-        presentation=presentation,
-        concentration=concentration,
-        image=image_path
-    )
-    
-    product = create_product(db, product_data)
-    return product
+    ).order_by(Product.id).all()
+
+    product_ids = {}
+    for row in existing:
+        product_ids.setdefault(_product_key(row.name, row.presentation, row.concentration), row.id)
+
+    missing = [detail for key, detail in lines.items() if key not in product_ids]
+    if missing:
+        category_ids = {detail.category_id for detail in missing}
+        found = {row.id for row in db.query(Category.id).filter(Category.id.in_(category_ids)).all()}
+        for detail in missing:
+            if detail.category_id not in found:
+                raise ValueError(f"La categoría con ID {detail.category_id} no existe")
 
+        new_ids = insert_returning_ids(db, Product.__table__, [
+            {
+                "name": detail.product_name,
+                "description": detail.product_description,
+                "category_id": detail.category_id,
+                "presentation": detail.presentation,
+                "concentration": detail.concentration,
+                "image": detail.product_image,
+                "status": 1
+            }
+            for detail in missing
+        ], verify_columns=("name", "category_id"))
+        record_changed_rows(db, "products", new_ids)
+        for detail, product_id in zip(missing, new_ids):
+            product_ids[_product_key(detail.product_name, detail.presentation, detail.concentration)] = product_id
+
+    # Actualizar imágenes de productos existentes (sin commit intermedio)
+    new_keys = {_product_key(d.product_name, d.presentation, d.concentration) for d in missing}
+    for key, detail in lines.items():
+        if detail.product_image and key not in new_keys:
+            db.execute(
+                update(Product.__table__)
+                .where(Product.__table__.c.id == product_ids[key])
+                .values(image=detail.product_image)
+            )
+            record_changed_rows(db, "products", [product_ids[key]])
 
-def create_purchase(db: Session, data: PurchaseCreate, user_id: int):
+    return product_ids
+
+
+def _load_purchase(db: Session, purchase_id: int) -> Purchase:
+    """Compra con sus detalles, lotes, productos, proveedor y usuario para la respuesta"""
+    return db.query(Purchase).options(
+        joinedload(Purchase.details).joinedload(PurchaseDetail.batch).joinedload(MedicineBatch.product),
+        joinedload(Purchase.supplier),
+        joinedload(Purchase.user)
+    ).populate_existing().filter(Purchase.id == purchase_id).first()
+
+
+def create_purchase(db: Session, data: PurchaseCreate, user_id: int, before_commit: Optional[Callable[[Purchase], None]] = None):
     """
     RF18: Registrar compras a proveedores
     RF19: Aumentar stock automáticamente al registrar una compra
@@ -53,6 +100,13 @@ def create_purchase(db: Session, data: PurchaseCreate, user_id: int):
     Ahora permite crear productos nuevos durante la compra:
     - Si se proporciona product_name, category_id, presentation, concentration: crea producto y lote nuevos
     - Si se proporciona batch_id: usa el lote existente (compatibilidad hacia atrás)
+    
+    Todo se registra en una sola transacción y con operaciones por conjunto
+    (una consulta para todos los productos, INSERT masivos de productos, lotes y detalles),
+    así las notas de entrega con cientos de líneas no hacen un viaje a la BD por línea.
+    
+    'before_commit' recibe la compra ya cargada justo antes del commit, dentro de la misma
+    transacción (lo usa Idempotency-Key para guardar la respuesta junto con la compra).
     """
     # Verificar que el proveedor existe
     supplier = db.query(Supplier).filter(Supplier.id == data.supplier_id).first()
@@ -64,99 +118,118 @@ def create_purchase(db: Session, data: PurchaseCreate, user_id: int):
     if not user:
         raise ValueError(f"El usuario con ID {user_id} no existe")
     
-    # Calcular totales y procesar detalles
-    total = Decimal('0.00')
-    purchase_details = []
-    
+    product_lines = []
+    batch_lines = []
     for detail in data.details:
-        batch = None
-        
         # Opción 1: Si se proporciona información del producto, crear/buscar producto y lote
         if detail.product_name and detail.category_id and detail.presentation and detail.concentration:
-            # Obtener la ruta de la imagen (ya guardada desde el router)
-            image_path = detail.product_image if hasattr(detail, 'product_image') and detail.product_image else None
-            
-            # Buscar o crear producto (con imagen si se proporciona)
-            product = find_or_create_product(
-                db=db,
-                product_name=detail.product_name,
-                category_id=detail.category_id,
-                presentation=detail.presentation,
-                concentration=detail.concentration,
-                description=detail.product_description,
-                image_path=image_path  # Ruta de la imagen guardada
-            )
-            
-            # Crear nuevo lote para este producto
-            batch = MedicineBatch(
-                product_id=product.id,
-                expiration_date=detail.expiration_date,
-                stock=detail.quantity,  # Stock inicial = cantidad comprada
-                purchase_price=detail.purchase_price or detail.unit_price,
-                sale_price=detail.sale_price or detail.unit_price,
-                status=1
-            )
-            db.add(batch)
-            db.flush()  # Para obtener el ID del lote
-            
+            product_lines.append(detail)
         # Opción 2: Si se proporciona batch_id, usar lote existente (compatibilidad)
         elif detail.batch_id:
-            batch = db.query(MedicineBatch).filter(MedicineBatch.id == detail.batch_id).first()
-            if not batch:
-                raise ValueError(f"El lote con ID {detail.batch_id} no existe")
-            # Aumentar stock del lote existente
-            batch.stock += detail.quantity
+            batch_lines.append(detail)
         else:
             raise ValueError("Debe proporcionar información del producto (product_name, category_id, presentation, concentration) o batch_id")
+    
+    try:
+        # Lotes existentes: una sola consulta, bloqueados hasta el commit
+        existing_batches = {}
+        if batch_lines:
+            batch_ids = {detail.batch_id for detail in batch_lines}
+            existing_batches = {
+                batch.id: batch for batch in db.query(MedicineBatch).filter(
+                    MedicineBatch.id.in_(batch_ids)
+                ).with_for_update().all()
+            }
+            for detail in batch_lines:
+                if detail.batch_id not in existing_batches:
+                    raise ValueError(f"El lote con ID {detail.batch_id} no existe")
         
-        # Calcular subtotal
-        subtotal = Decimal(str(detail.unit_price)) * detail.quantity
-        total += subtotal
+        # Productos nuevos o existentes y sus lotes nuevos (stock inicial = cantidad comprada)
+        product_ids = resolve_products(db, product_lines)
+        new_batch_ids = insert_returning_ids(db, MedicineBatch.__table__, [
+            {
+                "product_id": product_ids[_product_key(d.product_name, d.presentation, d.concentration)],
+                "expiration_date": d.expiration_date,
+                "stock": d.quantity,
+                "purchase_price": d.purchase_price or d.unit_price,
+                "sale_price": d.sale_price or d.unit_price,
+                "status": 1
+            }
+            for d in product_lines
+        ], verify_columns=("product_id", "stock"))
+        record_changed_rows(db, "medicine_batches", new_batch_ids)
+        batch_for_line = {id(d): batch_id for d, batch_id in zip(product_lines, new_batch_ids)}
+        batch_for_line.update({id(d): d.batch_id for d in batch_lines})
         
-        purchase_details.append({
-            'batch_id': batch.id,
-            'quantity': detail.quantity,
-            'unit_price': detail.unit_price,
-            'subtotal': subtotal
-        })
-    
-    # Crear la compra
-    purchase = Purchase(
-        user_id=user_id,
-        supplier_id=data.supplier_id,
-        purchase_date=data.purchase_date or datetime.now(),
-        payment_method=data.payment_method,
-        total=total
-    )
-    db.add(purchase)
-    db.flush()  # Para obtener el ID de la compra
-    
-    # Crear los detalles de la compra
-    for detail_data in purchase_details:
-        purchase_detail = PurchaseDetail(
-            purchase_id=purchase.id,
-            batch_id=detail_data['batch_id'],
-            quantity=detail_data['quantity'],
-            unit_price=detail_data['unit_price'],
-            subtotal=detail_data['subtotal']
+        # Aumentar stock de los lotes existentes con un UPDATE agregado
+        increments = {}
+        for detail in batch_lines:
+            increments[detail.batch_id] = increments.get(detail.batch_id, 0) + detail.quantity
+        batches_table = MedicineBatch.__table__
+        for chunk in chunked(list(increments.items())):
+            db.execute(
+                update(batches_table)
+                .where(batches_table.c.id.in_([batch_id for batch_id, _ in chunk]))
+                .values(stock=batches_table.c.stock + case(dict(chunk), value=batches_table.c.id))
+            )
+        record_changed_rows(db, "medicine_batches", increments.keys())
+        
+        # Calcular totales y procesar detalles
+        total = Decimal('0.00')
+        purchase_details = []
+        for detail in data.details:
+            batch_id = batch_for_line[id(detail)]
+            # Calcular subtotal
+            subtotal = Decimal(str(detail.unit_price)) * detail.quantity
+            total += subtotal
+            purchase_details.append({
+                'batch_id': batch_id,
+                'quantity': detail.quantity,
+                'unit_price': detail.unit_price,
+                'subtotal': subtotal
+            })
+        
+        # Crear la compra
+        purchase = Purchase(
+            user_id=user_id,
+            supplier_id=data.supplier_id,
+            purchase_date=data.purchase_date or datetime.now(),
+            payment_method=data.payment_method,
+            total=total
         )
-        db.add(purchase_detail)
-    
-    try:
+        db.add(purchase)
+        db.flush()  # Para obtener el ID de la compra
+        
+        # Crear los detalles de la compra
+        for chunk in chunked(purchase_details):
+            db.execute(insert(PurchaseDetail.__table__), [{'purchase_id': purchase.id, **row} for row in chunk])
+        
+        # Registrar las entradas en el libro de stock (lotes inactivos no suman stock vendible)
+        movements = [
+            batch_movement(batch_id, product_ids[_product_key(d.product_name, d.presentation, d.concentration)],
+                           d.quantity, "compra", "purchase", purchase.id)
+            for d, batch_id in zip(product_lines, new_batch_ids)
+        ]
+        movements.extend(
+            batch_movement(d.batch_id, existing_batches[d.batch_id].product_id, d.quantity, "compra", "purchase", purchase.id)
+            for d in batch_lines if existing_batches[d.batch_id].status == 1
+        )
+        record_stock_movements(db, movements, user_id)
+        record_financial_totals(db, [purchase_entry(purchase.purchase_date, total)])
+        
+        if before_commit:
+            before_commit(_load_purchase(db, purchase.id))
         db.commit()
-        # Recargar la compra con todas las relaciones
-        db.refresh(purchase)
-        # Cargar relaciones para la respuesta
-        purchase = db.query(Purchase).options(
-            joinedload(Purchase.details).joinedload(PurchaseDetail.batch).joinedload(MedicineBatch.product),
-            joinedload(Purchase.supplier),
-            joinedload(Purchase.user)
-        ).filter(Purchase.id == purchase.id).first()
-        return purchase
     except IntegrityError as e:
         db.rollback()
         error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
         raise ValueError(f"Error al crear la compra: {error_msg}")
+    except Exception:
+        db.rollback()
+        raise
+    
+    # Recargar la compra con todas las relaciones para la respuesta
+    return _load_purchase(db, purchase.id)
 
 
 def get_purchases(db: Session, supplier_id: int = None, user_id: int = None, start_date: datetime = None, end_date: datetime = None):
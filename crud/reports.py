@@ -1,8 +1,14 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, desc
-from datetime import datetime
+from sqlalchemy import select, func
+from datetime import date, datetime
 from decimal import Decimal
-from db.models import Sale, SalesDetail, Product, MedicineBatch
+from typing import Dict, Any, Iterator
+from db.models import MedicineBatch, Client, User
+from crud.archive import sale_models, sales_source, details_source
+from crud.product_sales import get_product_ranking
+
+# Filas que se leen del cursor por vez al recorrer las ventas de un reporte largo
+REPORT_STREAM_BATCH = 1000
 
 
 def get_sales_report(db: Session, start_date: datetime = None, end_date: datetime = None):
@@ -10,19 +16,25 @@ def get_sales_report(db: Session, start_date: datetime = None, end_date: datetim
     RF23: Reporte de ventas por fechas
     Retorna resumen de ventas en el rango de fechas especificado
     """
-    query = db.query(Sale).options(
-        joinedload(Sale.details).joinedload(SalesDetail.batch).joinedload(MedicineBatch.product),
-        joinedload(Sale.client),
-        joinedload(Sale.user)
-    )
-    
-    if start_date:
-        query = query.filter(Sale.sale_date >= start_date)
-    
-    if end_date:
-        query = query.filter(Sale.sale_date <= end_date)
-    
-    sales = query.order_by(Sale.sale_date.desc()).all()
+    models = sale_models(db, start_date)
+    sales = []
+    for sale_model, detail_model in models:
+        query = db.query(sale_model).options(
+            joinedload(sale_model.details).joinedload(detail_model.batch).joinedload(MedicineBatch.product),
+            joinedload(sale_model.client),
+            joinedload(sale_model.user)
+        )
+        
+        if start_date:
+            query = query.filter(sale_model.sale_date >= start_date)
+        
+        if end_date:
+            query = query.filter(sale_model.sale_date <= end_date)
+        
+        sales.extend(query.order_by(sale_model.sale_date.desc()).all())
+    
+    if len(models) > 1:
+        sales.sort(key=lambda sale: sale.sale_date or datetime.min, reverse=True)
     
     # Calcular estadísticas
     total_sales = len(sales)
@@ -72,140 +84,103 @@ def get_sales_report(db: Session, start_date: datetime = None, end_date: datetim
     }
 
 
-def get_top_products_report(db: Session, start_date: datetime = None, end_date: datetime = None, limit: int = 10):
+def get_sales_report_summary(db: Session, start_date: datetime = None, end_date: datetime = None) -> Dict[str, Any]:
     """
-    RF24: Reporte de productos más vendidos
-    Retorna los productos más vendidos en el rango de fechas especificado
+    Resumen del reporte de ventas (mismos campos que get_sales_report, sin la lista de ventas)
+    calculado con agregados en la base de datos. Se usa con iter_sales_report_rows para los PDF largos.
     """
-    query = db.query(
-        Product.id,
-        Product.name,
-        Product.presentation,
-        Product.concentration,
-        func.sum(SalesDetail.quantity).label('total_quantity'),
-        func.sum(SalesDetail.subtotal).label('total_revenue'),
-        func.count(SalesDetail.id).label('sales_count')
-    ).join(
-        MedicineBatch, Product.id == MedicineBatch.product_id
-    ).join(
-        SalesDetail, MedicineBatch.id == SalesDetail.batch_id
-    ).join(
-        Sale, SalesDetail.sale_id == Sale.id
-    )
-    
-    if start_date:
-        query = query.filter(Sale.sale_date >= start_date)
-    
-    if end_date:
-        query = query.filter(Sale.sale_date <= end_date)
-    
-    query = query.filter(
-        Product.status == 1,
-        Sale.id.isnot(None)
-    ).group_by(
-        Product.id,
-        Product.name,
-        Product.presentation,
-        Product.concentration
-    ).order_by(
-        desc('total_quantity')
-    ).limit(limit)
-    
-    results = query.all()
+    sales = sales_source(db, start_date, end_date)
+    details = details_source(db, start_date, end_date)
+    
+    total_sales, total_amount = db.execute(
+        select(func.count(), func.coalesce(func.sum(sales.c.total), 0))
+    ).one()
+    total_items = db.execute(select(func.count()).select_from(details)).scalar() or 0
+    total_amount = Decimal(str(total_amount or 0))
+    
+    payment_methods = {
+        method: {"count": int(count), "total": float(total or 0)}
+        for method, count, total in db.execute(
+            select(sales.c.payment_method, func.count(), func.sum(sales.c.total))
+            .group_by(sales.c.payment_method)
+        ).all()
+    }
     
-    products = []
-    for result in results:
-        products.append({
-            "product_id": result.id,
-            "product_name": result.name,
-            "presentation": result.presentation,
-            "concentration": result.concentration,
-            "total_quantity_sold": int(result.total_quantity),
-            "total_revenue": float(result.total_revenue),
-            "sales_count": int(result.sales_count),
-            "average_per_sale": float(result.total_revenue / result.sales_count) if result.sales_count > 0 else 0
-        })
+    # Días más recientes primero, como el detalle
+    day = func.date(sales.c.sale_date)
+    daily_sales = {
+        # func.date() retorna date en MySQL y texto en SQLite
+        date.fromisoformat(str(sale_day)[:10]).isoformat(): {"count": int(count), "total": float(total or 0)}
+        for sale_day, count, total in db.execute(
+            select(day, func.count(), func.sum(sales.c.total)).group_by(day).order_by(day.desc())
+        ).all()
+        if sale_day is not None
+    }
     
     return {
         "start_date": start_date.isoformat() if start_date else None,
         "end_date": end_date.isoformat() if end_date else None,
-        "limit": limit,
-        "total_products": len(products),
-        "products": products
+        "total_sales": int(total_sales),
+        "total_amount": float(total_amount),
+        "total_items": int(total_items),
+        "average_sale": float(total_amount / total_sales) if total_sales > 0 else 0,
+        "payment_methods": payment_methods,
+        "daily_sales": daily_sales
     }
 
 
-from sqlalchemy import func, desc
-from datetime import datetime
-from decimal import Decimal
-from db.models import Sale, SalesDetail, Product, MedicineBatch
-
-
-def get_sales_report(db: Session, start_date: datetime = None, end_date: datetime = None):
+def iter_sales_rows(db: Session, start_date: datetime = None, end_date: datetime = None,
+                    batch_size: int = REPORT_STREAM_BATCH) -> Iterator[Dict[str, Any]]:
     """
-    RF23: Reporte de ventas por fechas
-    Retorna resumen de ventas en el rango de fechas especificado
+    Ventas del rango (mismos filtros que get_sales_report) leídas del cursor por bloques, sin cargar
+    objetos del ORM ni la lista completa en memoria. Conserva los tipos: sale_date datetime y total Decimal.
     """
-    query = db.query(Sale).options(
-        joinedload(Sale.details).joinedload(SalesDetail.batch).joinedload(MedicineBatch.product),
-        joinedload(Sale.client),
-        joinedload(Sale.user)
-    )
-    
-    if start_date:
-        query = query.filter(Sale.sale_date >= start_date)
-    
-    if end_date:
-        query = query.filter(Sale.sale_date <= end_date)
-    
-    sales = query.order_by(Sale.sale_date.desc()).all()
-    
-    # Calcular estadísticas
-    total_sales = len(sales)
-    total_amount = sum(float(sale.total) for sale in sales)
-    total_items = sum(len(sale.details) for sale in sales)
-    
-    # Agrupar por método de pago
-    payment_methods = {}
-    for sale in sales:
-        method = sale.payment_method
-        if method not in payment_methods:
-            payment_methods[method] = {"count": 0, "total": Decimal('0.00')}
-        payment_methods[method]["count"] += 1
-        payment_methods[method]["total"] += sale.total
-    
-    # Agrupar por día
-    daily_sales = {}
-    for sale in sales:
-        date_key = sale.sale_date.date().isoformat() if sale.sale_date else None
-        if date_key:
-            if date_key not in daily_sales:
-                daily_sales[date_key] = {"count": 0, "total": Decimal('0.00')}
-            daily_sales[date_key]["count"] += 1
-            daily_sales[date_key]["total"] += sale.total
-    
-    return {
-        "start_date": start_date.isoformat() if start_date else None,
-        "end_date": end_date.isoformat() if end_date else None,
-        "total_sales": total_sales,
-        "total_amount": float(total_amount),
-        "total_items": total_items,
-        "average_sale": float(total_amount / total_sales) if total_sales > 0 else 0,
-        "payment_methods": {k: {"count": v["count"], "total": float(v["total"])} for k, v in payment_methods.items()},
-        "daily_sales": {k: {"count": v["count"], "total": float(v["total"])} for k, v in daily_sales.items()},
-        "sales": [
-            {
-                "id": sale.id,
-                "date": sale.sale_date.isoformat() if sale.sale_date else None,
-                "client_name": f"{sale.client.first_name} {sale.client.last_name}" if sale.client else None,
-                "user_name": f"{sale.user.first_name} {sale.user.last_name}" if sale.user else None,
-                "payment_method": sale.payment_method,
-                "total": float(sale.total),
-                "items_count": len(sale.details)
-            }
-            for sale in sales
-        ]
-    }
+    sales = sales_source(db, start_date, end_date)
+    details = details_source(db, start_date, end_date)
+    items = select(
+        details.c.sale_id, func.count().label("items_count")
+    ).group_by(details.c.sale_id).subquery("sale_items")
+    
+    statement = select(
+        sales.c.id, sales.c.sale_date, sales.c.payment_method, sales.c.total,
+        Client.first_name, Client.last_name, User.first_name, User.last_name,
+        func.coalesce(items.c.items_count, 0)
+    ).outerjoin(
+        Client, Client.id == sales.c.client_id
+    ).outerjoin(
+        User, User.id == sales.c.user_id
+    ).outerjoin(
+        items, items.c.sale_id == sales.c.id
+    ).order_by(sales.c.sale_date.desc(), sales.c.id.desc())
+    
+    result = db.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+    for (sale_id, sale_date, payment_method, total, client_first, client_last,
+         user_first, user_last, items_count) in result:
+        yield {
+            "id": sale_id,
+            "sale_date": sale_date,
+            "client_name": f"{client_first} {client_last}" if client_first is not None else None,
+            "user_name": f"{user_first} {user_last}" if user_first is not None else None,
+            "payment_method": payment_method,
+            "total": Decimal(str(total or 0)),
+            "items_count": int(items_count)
+        }
+
+
+def iter_sales_report_rows(db: Session, start_date: datetime = None, end_date: datetime = None,
+                           batch_size: int = REPORT_STREAM_BATCH) -> Iterator[Dict[str, Any]]:
+    """Ventas de iter_sales_rows con el mismo formato que get_sales_report()["sales"]"""
+    for sale in iter_sales_rows(db, start_date, end_date, batch_size):
+        sale_date = sale.pop("sale_date")
+        yield {
+            "id": sale["id"],
+            "date": sale_date.isoformat() if isinstance(sale_date, datetime) else sale_date,
+            "client_name": sale["client_name"],
+            "user_name": sale["user_name"],
+            "payment_method": sale["payment_method"],
+            "total": float(sale["total"]),
+            "items_count": sale["items_count"]
+        }
 
 
 def get_top_products_report(db: Session, start_date: datetime = None, end_date: datetime = None, limit: int = 10):
@@ -213,53 +188,22 @@ def get_top_products_report(db: Session, start_date: datetime = None, end_date:
     RF24: Reporte de productos más vendidos
     Retorna los productos más vendidos en el rango de fechas especificado
     """
-    query = db.query(
-        Product.id,
-        Product.name,
-        Product.presentation,
-        Product.concentration,
-        func.sum(SalesDetail.quantity).label('total_quantity'),
-        func.sum(SalesDetail.subtotal).label('total_revenue'),
-        func.count(SalesDetail.id).label('sales_count')
-    ).join(
-        MedicineBatch, Product.id == MedicineBatch.product_id
-    ).join(
-        SalesDetail, MedicineBatch.id == SalesDetail.batch_id
-    ).join(
-        Sale, SalesDetail.sale_id == Sale.id
+    # Filas diarias de product_daily_sales (incluye ventas archivadas); el rango se toma por días completos
+    results = get_product_ranking(
+        db, start_date=start_date, end_date=end_date, order_by="quantity", limit=limit, active_only=True
     )
     
-    if start_date:
-        query = query.filter(Sale.sale_date >= start_date)
-    
-    if end_date:
-        query = query.filter(Sale.sale_date <= end_date)
-    
-    query = query.filter(
-        Product.status == 1,
-        Sale.id.isnot(None)
-    ).group_by(
-        Product.id,
-        Product.name,
-        Product.presentation,
-        Product.concentration
-    ).order_by(
-        desc('total_quantity')
-    ).limit(limit)
-    
-    results = query.all()
-    
     products = []
     for result in results:
         products.append({
-            "product_id": result.id,
-            "product_name": result.name,
-            "presentation": result.presentation,
-            "concentration": result.concentration,
-            "total_quantity_sold": int(result.total_quantity),
-            "total_revenue": float(result.total_revenue),
-            "sales_count": int(result.sales_count),
-            "average_per_sale": float(result.total_revenue / result.sales_count) if result.sales_count > 0 else 0
+            "product_id": result["product_id"],
+            "product_name": result["name"],
+            "presentation": result["presentation"],
+            "concentration": result["concentration"],
+            "total_quantity_sold": result["quantity"],
+            "total_revenue": float(result["revenue"]),
+            "sales_count": result["lines"],
+            "average_per_sale": float(result["revenue"] / result["lines"]) if result["lines"] > 0 else 0
         })
     
     return {
@@ -269,5 +213,3 @@ def get_top_products_report(db: Session, start_date: datetime = None, end_date:
         "total_products": len(products),
         "products": products
     }
-
-
@@ -1,47 +1,124 @@
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_, insert, update, case
 from sqlalchemy.exc import IntegrityError
-from datetime import datetime
+from datetime import datetime, date
+from collections import ChainMap
 from decimal import Decimal
-from db.models import Sale, SalesDetail, MedicineBatch, Client, User, Product
+from typing import Any, Callable, Dict, List, Optional
+from db.models import Sale, SalesDetail, SaleArchive, SalesDetailArchive, MedicineBatch, Client, User, Product
 from db.schemas import SaleCreate, SaleResponse
+from utils.bulk import chunked, insert_returning_ids
+from crud.stock import record_stock_movements, batch_movement
+from crud.archive import sale_models, archived_before
+from crud.finance import record_financial_totals, sale_entry
+from crud.product_sales import record_product_sales, product_sale_entry
+from crud.versions import record_changed_rows
 
 
-def create_sale(db: Session, data: SaleCreate, user_id: int):
+def _allocate_fefo(batches, quantity: int, available: dict):
     """
-    Crear una venta con sus detalles
-    RF14: Registrar una venta
-    RF15: Calcular automáticamente subtotales
-    RF16: Controlar el stock después de cada venta
+    Reparte 'quantity' entre los lotes recibidos (ya ordenados por vencimiento).
+    'available' lleva el stock restante por lote dentro de la misma venta y se descuenta aquí;
+    solo se recorren los lotes necesarios, así el costo no depende de cuántos lotes tenga el producto.
+    Retorna la lista de (lote, cantidad) asignada y la cantidad que quedó sin cubrir.
     """
-    # Verificar que el cliente existe
-    client = db.query(Client).filter(Client.id == data.client_id).first()
-    if not client:
-        raise ValueError(f"El cliente con ID {data.client_id} no existe")
-    
-    # Verificar que el usuario existe
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise ValueError(f"El usuario con ID {user_id} no existe")
+    allocations = []
+    remaining = quantity
+    for batch in batches:
+        if remaining <= 0:
+            break
+        stock = available.get(batch.id, batch.stock or 0)
+        if stock <= 0:
+            continue
+        take = min(stock, remaining)
+        available[batch.id] = stock - take
+        allocations.append((batch, take))
+        remaining -= take
+    return allocations, remaining
+
+
+def _fefo_order(batch):
+    """Vencimiento más próximo primero; los lotes sin fecha de vencimiento al final"""
+    return (batch.expiration_date is None, batch.expiration_date or date.max, batch.id)
+
+
+def _lock_batches_for_sale(db: Session, details):
+    """
+    Carga y bloquea (SELECT ... FOR UPDATE) los lotes que necesitan los detalles recibidos, en una
+    sola consulta ordenada por ID: todas las ventas toman los bloqueos en el mismo orden y no se
+    cruzan (sin interbloqueos entre una venta por lote y otra por producto).
+    - Lotes pedidos por batch_id: por clave primaria
+    - Productos en modo FEFO: lotes activos con stock y sin vencer, por el índice
+      (product_id, status, expiration_date); el orden FEFO se arma después en Python
+    Retorna (lotes por ID, lotes FEFO agrupados por producto)
+    """
+    batch_ids = {d.batch_id for d in details if d.batch_id is not None}
+    product_ids = {d.product_id for d in details if d.batch_id is None}
+
+    today = date.today()
+    conditions = []
+    if batch_ids:
+        conditions.append(MedicineBatch.id.in_(batch_ids))
+    if product_ids:
+        conditions.append(and_(
+            MedicineBatch.product_id.in_(product_ids),
+            MedicineBatch.stock > 0,
+            or_(MedicineBatch.expiration_date.is_(None), MedicineBatch.expiration_date >= today)
+        ))
+
+    batches = db.query(MedicineBatch).filter(
+        MedicineBatch.status == 1,
+        or_(*conditions)
+    ).order_by(MedicineBatch.id).with_for_update().all() if conditions else []
+
+    batches_by_id = {batch.id: batch for batch in batches}
+    fefo_batches = {product_id: [] for product_id in product_ids}
+    for batch in sorted(batches, key=_fefo_order):
+        # Un lote pedido por ID puede estar vencido o sin stock: no entra en el reparto FEFO
+        if batch.product_id in fefo_batches and (batch.stock or 0) > 0 and (
+            batch.expiration_date is None or batch.expiration_date >= today
+        ):
+            fefo_batches[batch.product_id].append(batch)
+
+    return batches_by_id, fefo_batches
+
+
+def _plan_sale_details(details, batches_by_id: dict, fefo_batches: dict, available: dict):
+    """
+    Valida el stock de los detalles de una venta y arma las filas de SalesDetail.
+    'available' es el stock restante por lote (compartido entre líneas y, en la carga masiva, entre ventas);
+    solo se actualiza si toda la venta es válida.
+    Retorna (filas de detalle, total)
+    """
+    # Los cambios de esta venta se acumulan aparte hasta validar todas sus líneas
+    pending = ChainMap({}, available)
     
     # Validar stock y calcular totales
     total = Decimal('0.00')
     sale_details = []
     
-    for detail in data.details:
-        # Verificar que el batch existe y tiene stock suficiente
-        batch = db.query(MedicineBatch).filter(
-            MedicineBatch.id == detail.batch_id,
-            MedicineBatch.status == 1
-        ).first()
-        
-        if not batch:
-            raise ValueError(f"El lote con ID {detail.batch_id} no existe o está inactivo")
-        
-        if batch.stock < detail.quantity:
-            raise ValueError(
-                f"Stock insuficiente para el lote {detail.batch_id}. "
-                f"Stock disponible: {batch.stock}, solicitado: {detail.quantity}"
-            )
+    for detail in details:
+        if detail.batch_id is not None:
+            # Verificar que el batch existe y tiene stock suficiente
+            batch = batches_by_id.get(detail.batch_id)
+            if not batch:
+                raise ValueError(f"El lote con ID {detail.batch_id} no existe o está inactivo")
+            stock = pending.get(batch.id, batch.stock or 0)
+            
+            if stock < detail.quantity:
+                raise ValueError(
+                    f"Stock insuficiente para el lote {detail.batch_id}. "
+                    f"Stock disponible: {stock}, solicitado: {detail.quantity}"
+                )
+            pending[batch.id] = stock - detail.quantity
+            allocations = [(batch, detail.quantity)]
+        else:
+            allocations, missing = _allocate_fefo(fefo_batches.get(detail.product_id, []), detail.quantity, pending)
+            if missing > 0:
+                raise ValueError(
+                    f"Stock insuficiente para el producto {detail.product_id}. "
+                    f"Stock disponible: {detail.quantity - missing}, solicitado: {detail.quantity}"
+                )
         
         # RF15: Calcular subtotal automáticamente (ignorar el valor enviado por el frontend)
         # El subtotal se calcula siempre como: unit_price * quantity
@@ -53,12 +130,55 @@ def create_sale(db: Session, data: SaleCreate, user_id: int):
             # Si hay diferencia significativa, usar el calculado
             print(f"Advertencia: Subtotal enviado ({detail.subtotal}) no coincide con el calculado ({calculated_subtotal}). Usando el calculado.")
         
-        sale_details.append({
-            'batch_id': detail.batch_id,
-            'quantity': detail.quantity,
-            'unit_price': detail.unit_price,
-            'subtotal': calculated_subtotal  # Usar el subtotal calculado automáticamente
-        })
+        for batch, quantity in allocations:
+            sale_details.append({
+                'batch_id': batch.id,
+                'quantity': quantity,
+                'unit_price': detail.unit_price,
+                'subtotal': Decimal(str(detail.unit_price)) * quantity  # Usar el subtotal calculado automáticamente
+            })
+    
+    available.update(pending.maps[0])
+    return sale_details, total
+
+
+def _load_sale(db: Session, sale_id: int) -> Sale:
+    """Venta con sus detalles, lotes, productos, cliente y usuario para la respuesta"""
+    return db.query(Sale).options(
+        joinedload(Sale.details).joinedload(SalesDetail.batch).joinedload(MedicineBatch.product),
+        joinedload(Sale.client),
+        joinedload(Sale.user)
+    ).populate_existing().filter(Sale.id == sale_id).first()
+
+
+def create_sale(db: Session, data: SaleCreate, user_id: int, before_commit: Optional[Callable[[Sale], None]] = None):
+    """
+    Crear una venta con sus detalles
+    RF14: Registrar una venta
+    RF15: Calcular automáticamente subtotales
+    RF16: Controlar el stock después de cada venta
+    
+    Cada detalle puede indicar el lote exacto (batch_id) o solo el producto (product_id).
+    En el segundo caso se asignan los lotes por FEFO (primero en vencer, primero en salir)
+    y la línea se divide en varios detalles si abarca más de un lote.
+    
+    'before_commit' recibe la venta ya cargada justo antes del commit, dentro de la misma
+    transacción (lo usa Idempotency-Key para guardar la respuesta junto con la venta).
+    """
+    # Verificar que el cliente existe
+    client = db.query(Client).filter(Client.id == data.client_id).first()
+    if not client:
+        raise ValueError(f"El cliente con ID {data.client_id} no existe")
+    
+    # Verificar que el usuario existe
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise ValueError(f"El usuario con ID {user_id} no existe")
+    
+    batches_by_id, fefo_batches = _lock_batches_for_sale(db, data.details)
+    # Stock restante por lote durante la venta (varias líneas pueden tocar el mismo lote)
+    available = {}
+    sale_details, total = _plan_sale_details(data.details, batches_by_id, fefo_batches, available)
     
     # Crear la venta
     sale = Sale(
@@ -71,7 +191,7 @@ def create_sale(db: Session, data: SaleCreate, user_id: int):
     db.add(sale)
     db.flush()  # Para obtener el ID de la venta
     
-    # Crear los detalles y actualizar stock (RF16)
+    # Crear los detalles
     for detail_data in sale_details:
         sale_detail = SalesDetail(
             sale_id=sale.id,
@@ -81,62 +201,186 @@ def create_sale(db: Session, data: SaleCreate, user_id: int):
             subtotal=detail_data['subtotal']
         )
         db.add(sale_detail)
-        
-        # Reducir stock del batch
-        batch = db.query(MedicineBatch).filter(MedicineBatch.id == detail_data['batch_id']).first()
-        batch.stock -= detail_data['quantity']
+    
+    # Reducir stock de los lotes usados (RF16); ya están bloqueados por la consulta inicial
+    for detail_data in sale_details:
+        batch = batches_by_id[detail_data['batch_id']]
+        batch.stock = available[batch.id]
     
     try:
+        # Registrar las salidas en el libro de stock (misma transacción)
+        record_stock_movements(db, [
+            batch_movement(d['batch_id'], batches_by_id[d['batch_id']].product_id, -d['quantity'], "venta", "sale", sale.id)
+            for d in sale_details
+        ], user_id)
+        record_financial_totals(db, [sale_entry(sale.sale_date, total)])
+        record_product_sales(db, [
+            product_sale_entry(sale.sale_date, batches_by_id[d['batch_id']].product_id, d['quantity'], d['subtotal'])
+            for d in sale_details
+        ])
+        if before_commit:
+            before_commit(_load_sale(db, sale.id))
         db.commit()
-        # Recargar la venta con todas las relaciones
-        db.refresh(sale)
-        # Cargar relaciones para la respuesta
-        sale = db.query(Sale).options(
-            joinedload(Sale.details).joinedload(SalesDetail.batch).joinedload(MedicineBatch.product),
-            joinedload(Sale.client),
-            joinedload(Sale.user)
-        ).filter(Sale.id == sale.id).first()
-        return sale
+        # Recargar la venta con todas las relaciones para la respuesta
+        return _load_sale(db, sale.id)
     except IntegrityError as e:
         db.rollback()
         error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
         raise ValueError(f"Error al crear la venta: {error_msg}")
 
 
-def get_sales(db: Session, client_id: int = None, user_id: int = None, start_date: datetime = None, end_date: datetime = None):
+def create_sales_bulk(
+    db: Session,
+    sales: List[SaleCreate],
+    user_id: int,
+    before_commit: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+) -> List[Dict[str, Any]]:
     """
-    RF17: Mostrar historial de ventas con filtros
-    Incluye información relacionada: cliente, usuario, detalles, lotes y productos
+    Carga masiva de ventas (terminales que estuvieron sin conexión)
+    - Valida clientes y lotes con consultas por conjunto (IN) en lugar de una por venta
+    - Inserta ventas y detalles en bloques con INSERT ... VALUES (...), (...) a nivel Core (sin unit of work)
+    - Descuenta el stock con un UPDATE agregado por bloque de lotes
+    Las ventas inválidas se informan y no se registran; las válidas se confirman en una sola transacción.
+    Retorna un resultado por venta, en el mismo orden recibido.
+    
+    'before_commit' recibe esos resultados justo antes del commit, dentro de la misma transacción
+    (lo usa Idempotency-Key para guardar la respuesta junto con las ventas).
     """
-    query = db.query(Sale).options(
-        joinedload(Sale.details).joinedload(SalesDetail.batch).joinedload(MedicineBatch.product),
-        joinedload(Sale.client),
-        joinedload(Sale.user)
-    )
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise ValueError(f"El usuario con ID {user_id} no existe")
     
-    if client_id:
-        query = query.filter(Sale.client_id == client_id)
+    client_ids = {sale.client_id for sale in sales}
+    existing_clients = {
+        row.id for row in db.query(Client.id).filter(Client.id.in_(client_ids)).all()
+    } if client_ids else set()
     
-    if user_id:
-        query = query.filter(Sale.user_id == user_id)
+    all_details = [detail for sale in sales for detail in sale.details]
+    batches_by_id, fefo_batches = _lock_batches_for_sale(db, all_details)
+    available = {}
     
-    if start_date:
-        query = query.filter(Sale.sale_date >= start_date)
+    results = []
+    valid = []  # (índice en results, fila de venta, filas de detalle)
+    now = datetime.now()
+    for index, sale in enumerate(sales):
+        if sale.client_id not in existing_clients:
+            results.append({"index": index, "status": "error", "error": f"El cliente con ID {sale.client_id} no existe"})
+            continue
+        try:
+            sale_details, total = _plan_sale_details(sale.details, batches_by_id, fefo_batches, available)
+        except ValueError as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+            continue
+        results.append({"index": index, "status": "created", "sale_id": None, "total": float(total)})
+        valid.append((index, {
+            "client_id": sale.client_id,
+            "user_id": user_id,
+            "sale_date": sale.sale_date or now,
+            "payment_method": sale.payment_method,
+            "total": total
+        }, sale_details))
     
-    if end_date:
-        query = query.filter(Sale.sale_date <= end_date)
+    try:
+        sale_ids = insert_returning_ids(
+            db, Sale.__table__, [sale_row for _, sale_row, _ in valid], verify_columns=("client_id", "user_id")
+        )
+        detail_rows = []
+        product_entries = []
+        for sale_id, (index, sale_row, sale_details) in zip(sale_ids, valid):
+            results[index]["sale_id"] = sale_id
+            for detail in sale_details:
+                detail_rows.append({"sale_id": sale_id, **detail})
+                product_entries.append(product_sale_entry(
+                    sale_row["sale_date"], batches_by_id[detail["batch_id"]].product_id,
+                    detail["quantity"], detail["subtotal"]
+                ))
+        
+        # executemany sobre un INSERT ya compilado: PyMySQL lo reescribe como INSERT de varias filas
+        for chunk in chunked(detail_rows):
+            db.execute(insert(SalesDetail.__table__), chunk)
+        
+        # Descuento de stock agregado: un UPDATE ... CASE por bloque de lotes
+        decrements = {
+            batch_id: (batches_by_id[batch_id].stock or 0) - stock
+            for batch_id, stock in available.items()
+            if (batches_by_id[batch_id].stock or 0) != stock
+        }
+        for chunk in chunked(list(decrements.items())):
+            batches_table = MedicineBatch.__table__
+            db.execute(
+                update(batches_table)
+                .where(batches_table.c.id.in_([batch_id for batch_id, _ in chunk]))
+                .values(stock=batches_table.c.stock - case(dict(chunk), value=batches_table.c.id))
+            )
+        record_changed_rows(db, "medicine_batches", decrements.keys())
+        record_stock_movements(db, [
+            batch_movement(row["batch_id"], batches_by_id[row["batch_id"]].product_id, -row["quantity"], "venta", "sale", row["sale_id"])
+            for row in detail_rows
+        ], user_id)
+        record_financial_totals(db, [sale_entry(sale_row["sale_date"], sale_row["total"]) for _, sale_row, _ in valid])
+        record_product_sales(db, product_entries)
+        
+        if before_commit:
+            before_commit(results)
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
+        raise ValueError(f"Error al registrar las ventas: {error_msg}")
+    except Exception:
+        db.rollback()
+        raise
     
-    return query.order_by(Sale.sale_date.desc()).all()
+    return results
+
+
+def _sales_query(db: Session, sale_model, detail_model):
+    """Consulta de ventas (activas o archivadas) con cliente, usuario, detalles, lotes y productos"""
+    return db.query(sale_model).options(
+        joinedload(sale_model.details).joinedload(detail_model.batch).joinedload(MedicineBatch.product),
+        joinedload(sale_model.client),
+        joinedload(sale_model.user)
+    )
+
+
+def get_sales(db: Session, client_id: int = None, user_id: int = None, start_date: datetime = None, end_date: datetime = None):
+    """
+    RF17: Mostrar historial de ventas con filtros
+    Incluye información relacionada: cliente, usuario, detalles, lotes y productos
+    Las ventas archivadas se incluyen solo si el rango empieza antes del último mes archivado
+    """
+    models = sale_models(db, start_date)
+    sales = []
+    for sale_model, detail_model in models:
+        query = _sales_query(db, sale_model, detail_model)
+        
+        if client_id:
+            query = query.filter(sale_model.client_id == client_id)
+        
+        if user_id:
+            query = query.filter(sale_model.user_id == user_id)
+        
+        if start_date:
+            query = query.filter(sale_model.sale_date >= start_date)
+        
+        if end_date:
+            query = query.filter(sale_model.sale_date <= end_date)
+        
+        sales.extend(query.order_by(sale_model.sale_date.desc()).all())
+    
+    if len(models) > 1:
+        # Puede haber ventas activas con fecha anterior al corte (cargadas después del archivo)
+        sales.sort(key=lambda sale: sale.sale_date or datetime.min, reverse=True)
+    return sales
 
 
 def get_sale(db: Session, sale_id: int):
     """
     Obtener una venta por ID con toda la información relacionada
     Incluye: cliente, usuario, detalles, lotes y productos
+    Si la venta ya no está en las tablas activas, se busca en el archivo
     """
-    return db.query(Sale).options(
-        joinedload(Sale.details).joinedload(SalesDetail.batch).joinedload(MedicineBatch.product),
-        joinedload(Sale.client),
-        joinedload(Sale.user)
-    ).filter(Sale.id == sale_id).first()
-
+    sale = _sales_query(db, Sale, SalesDetail).filter(Sale.id == sale_id).first()
+    if sale is None and archived_before(db) is not None:
+        sale = _sales_query(db, SaleArchive, SalesDetailArchive).filter(SaleArchive.id == sale_id).first()
+    return sale
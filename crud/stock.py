@@ -0,0 +1,284 @@
+"""
+Libro de movimientos de stock (stock_movements) y stock actual por producto (product_stock)
+- Todo cambio del stock vendible (lotes activos) registra sus movimientos en la misma transacción
+- product_stock se actualiza con la suma de los movimientos, así el catálogo lee una fila por producto
+- El stock a una fecha parte del último checkpoint y solo suma los movimientos posteriores
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, update, case, and_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Iterable, Optional
+from db.models import StockMovement, ProductStock, StockCheckpoint, MedicineBatch, Product
+from utils.bulk import chunked
+from crud.versions import record_changed_rows
+
+# Los checkpoints excluyen los últimos minutos para no dejar fuera movimientos
+# de transacciones que todavía no confirmaron
+CHECKPOINT_MARGIN = timedelta(minutes=5)
+
+
+def active_stock(stock: Optional[int], status: Optional[int]) -> int:
+    """Stock vendible de un lote: solo cuentan los lotes activos"""
+    return (stock or 0) if status == 1 else 0
+
+
+def batch_movement(batch_id: int, product_id: int, quantity: int, movement_type: str,
+                   reference_type: str = None, reference_id: int = None) -> Dict[str, Any]:
+    """Arma un movimiento para record_stock_movements"""
+    return {
+        "product_id": product_id,
+        "batch_id": batch_id,
+        "quantity": quantity,
+        "movement_type": movement_type,
+        "reference_type": reference_type,
+        "reference_id": reference_id
+    }
+
+
+def _current_batch_stock(db: Session, product_ids: Iterable[int]) -> Dict[int, int]:
+    """Suma del stock de los lotes activos por producto (lo que mostraba el catálogo)"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    rows = db.query(
+        MedicineBatch.product_id,
+        func.coalesce(func.sum(MedicineBatch.stock), 0)
+    ).filter(
+        MedicineBatch.product_id.in_(product_ids),
+        MedicineBatch.status == 1
+    ).group_by(MedicineBatch.product_id).all()
+    return {product_id: int(stock) for product_id, stock in rows}
+
+
+def _open_product_stock(db: Session, openings: Dict[int, int], user_id: int, now: datetime):
+    """
+    Crea las filas de product_stock que faltan con su stock de apertura (y el movimiento de 'apertura').
+    Otra transacción puede crear la misma fila al mismo tiempo (primera venta concurrente del producto):
+    se intenta un INSERT por bloque y, si choca, fila por fila ignorando las que ya existen.
+    """
+    def insert_rows(product_ids):
+        db.execute(insert(ProductStock.__table__), [
+            {"product_id": product_id, "stock": openings[product_id], "updated_at": now} for product_id in product_ids
+        ])
+        opening_rows = [
+            {**batch_movement(None, product_id, openings[product_id], "apertura"), "user_id": user_id, "created_at": now}
+            for product_id in product_ids if openings[product_id]
+        ]
+        if opening_rows:
+            db.execute(insert(StockMovement.__table__), opening_rows)
+
+    try:
+        with db.begin_nested():
+            insert_rows(list(openings))
+        return
+    except IntegrityError:
+        pass
+    for product_id in openings:
+        try:
+            with db.begin_nested():
+                insert_rows([product_id])
+        except IntegrityError:
+            pass
+
+
+def record_stock_movements(db: Session, movements: List[Dict[str, Any]], user_id: int = None):
+    """
+    Registra los movimientos y actualiza product_stock sin confirmar la transacción.
+    Debe llamarse después de modificar medicine_batches.stock, dentro de la misma transacción.
+    Si un producto aún no tiene fila en product_stock, se inicializa desde sus lotes
+    con un movimiento de 'apertura' para que el libro cuadre con el stock.
+    """
+    movements = [m for m in movements if m["quantity"]]
+    if not movements:
+        return
+
+    now = datetime.now()
+    deltas = {}
+    for movement in movements:
+        deltas[movement["product_id"]] = deltas.get(movement["product_id"], 0) + movement["quantity"]
+
+    # Los cambios de lotes hechos con el ORM deben estar en la BD antes de leer/actualizar el stock
+    db.flush()
+    existing = {
+        row.product_id for row in db.query(ProductStock.product_id).filter(
+            ProductStock.product_id.in_(deltas.keys())
+        ).with_for_update().all()
+    }
+
+    missing = [product_id for product_id in deltas if product_id not in existing]
+    if missing:
+        current = _current_batch_stock(db, missing)
+        # El stock de los lotes ya incluye este cambio: la apertura es lo que había antes
+        _open_product_stock(db, {
+            product_id: current.get(product_id, 0) - deltas[product_id] for product_id in missing
+        }, user_id, now)
+        # Bloquear también las filas recién creadas (por esta transacción o por otra que ganó el INSERT)
+        db.query(ProductStock.product_id).filter(ProductStock.product_id.in_(missing)).with_for_update().all()
+
+    rows = [{**movement, "user_id": user_id, "created_at": now} for movement in movements]
+    for chunk in chunked(rows):
+        db.execute(insert(StockMovement.__table__), chunk)
+
+    stock_table = ProductStock.__table__
+    changes = list(deltas.items())
+    for chunk in chunked(changes):
+        db.execute(
+            update(stock_table)
+            .where(stock_table.c.product_id.in_([product_id for product_id, _ in chunk]))
+            .values(
+                stock=stock_table.c.stock + case(dict(chunk), value=stock_table.c.product_id),
+                updated_at=now
+            )
+        )
+
+
+def get_product_stock(db: Session, product_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Stock actual por producto desde product_stock (una fila por producto).
+    Los productos que aún no tienen fila se calculan desde sus lotes.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    stock = dict(db.query(ProductStock.product_id, ProductStock.stock).filter(
+        ProductStock.product_id.in_(product_ids)
+    ).all())
+    missing = [product_id for product_id in product_ids if product_id not in stock]
+    if missing:
+        current = _current_batch_stock(db, missing)
+        stock.update({product_id: current.get(product_id, 0) for product_id in missing})
+    return stock
+
+
+def get_stock_at(db: Session, product_id: int, at: datetime) -> int:
+    """Stock vendible de un producto a una fecha: último checkpoint + movimientos posteriores"""
+    checkpoint = db.query(StockCheckpoint).filter(
+        StockCheckpoint.product_id == product_id,
+        StockCheckpoint.checkpoint_at <= at
+    ).order_by(StockCheckpoint.checkpoint_at.desc()).first()
+
+    query = db.query(func.coalesce(func.sum(StockMovement.quantity), 0)).filter(
+        StockMovement.product_id == product_id,
+        StockMovement.created_at <= at
+    )
+    base = 0
+    if checkpoint:
+        query = query.filter(StockMovement.created_at > checkpoint.checkpoint_at)
+        base = checkpoint.stock
+    return base + int(query.scalar())
+
+
+def get_stock_movements(db: Session, product_id: int, start_date: datetime = None, end_date: datetime = None):
+    """Movimientos de un producto (auditoría), del más reciente al más antiguo"""
+    query = db.query(StockMovement).filter(StockMovement.product_id == product_id)
+    if start_date:
+        query = query.filter(StockMovement.created_at >= start_date)
+    if end_date:
+        query = query.filter(StockMovement.created_at <= end_date)
+    return query.order_by(StockMovement.created_at.desc(), StockMovement.id.desc()).all()
+
+
+def create_stock_checkpoints(db: Session, cutoff: datetime = None) -> int:
+    """
+    Guarda el stock de cada producto con movimientos nuevos a la fecha 'cutoff'
+    (por defecto, ahora menos CHECKPOINT_MARGIN). Pensado para ejecutarse a diario.
+    Retorna la cantidad de checkpoints creados.
+    """
+    cutoff = cutoff or datetime.now() - CHECKPOINT_MARGIN
+
+    latest = db.query(
+        StockCheckpoint.product_id,
+        func.max(StockCheckpoint.checkpoint_at).label("checkpoint_at")
+    ).filter(StockCheckpoint.checkpoint_at <= cutoff).group_by(StockCheckpoint.product_id).subquery()
+    previous = {
+        row.product_id: row.stock for row in db.query(StockCheckpoint.product_id, StockCheckpoint.stock).join(
+            latest, and_(
+                StockCheckpoint.product_id == latest.c.product_id,
+                StockCheckpoint.checkpoint_at == latest.c.checkpoint_at
+            )
+        ).all()
+    }
+
+    # Movimientos posteriores al último checkpoint de cada producto, hasta 'cutoff'
+    sums = db.query(
+        StockMovement.product_id,
+        func.sum(StockMovement.quantity)
+    ).outerjoin(
+        latest, StockMovement.product_id == latest.c.product_id
+    ).filter(
+        StockMovement.created_at <= cutoff,
+        (latest.c.checkpoint_at.is_(None)) | (StockMovement.created_at > latest.c.checkpoint_at)
+    ).group_by(StockMovement.product_id).all()
+
+    rows = [
+        {"product_id": product_id, "checkpoint_at": cutoff, "stock": previous.get(product_id, 0) + int(quantity)}
+        for product_id, quantity in sums
+    ]
+    for chunk in chunked(rows):
+        db.execute(insert(StockCheckpoint.__table__), chunk)
+    db.commit()
+    return len(rows)
+
+
+def rebuild_product_stock(db: Session, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    Recalcula product_stock desde los lotes. Las diferencias se registran como movimientos
+    de 'apertura' (producto sin historial) o 'ajuste', para que el libro siga cuadrando.
+    Con dry_run=True solo retorna las diferencias encontradas, sin escribir.
+    """
+    product_ids = [row.id for row in db.query(Product.id).all()]
+    current = _current_batch_stock(db, product_ids)
+    snapshot = dict(db.query(ProductStock.product_id, ProductStock.stock).with_for_update().all())
+    ledger = dict(db.query(StockMovement.product_id, func.sum(StockMovement.quantity)).group_by(
+        StockMovement.product_id
+    ).all())
+
+    now = datetime.now()
+    differences = []
+    movements = []
+    for product_id in product_ids:
+        expected = current.get(product_id, 0)
+        recorded = int(ledger.get(product_id) or 0)
+        if expected != recorded:
+            movement_type = "apertura" if product_id not in ledger else "ajuste"
+            movements.append({
+                **batch_movement(None, product_id, expected - recorded, movement_type, "rebuild"),
+                "user_id": None,
+                "created_at": now
+            })
+        if snapshot.get(product_id) != expected or expected != recorded:
+            differences.append({
+                "product_id": product_id,
+                "batches": expected,
+                "snapshot": snapshot.get(product_id),
+                "ledger": recorded
+            })
+
+    if dry_run:
+        db.rollback()
+        return differences
+
+    for chunk in chunked(movements):
+        db.execute(insert(StockMovement.__table__), chunk)
+    stock_table = ProductStock.__table__
+    new_rows = [
+        {"product_id": product_id, "stock": current.get(product_id, 0), "updated_at": now}
+        for product_id in product_ids if product_id not in snapshot
+    ]
+    for chunk in chunked(new_rows):
+        db.execute(insert(stock_table), chunk)
+    changed = [
+        (product_id, current.get(product_id, 0)) for product_id in product_ids
+        if product_id in snapshot and snapshot[product_id] != current.get(product_id, 0)
+    ]
+    for chunk in chunked(changed):
+        db.execute(
+            update(stock_table)
+            .where(stock_table.c.product_id.in_([product_id for product_id, _ in chunk]))
+            .values(stock=case(dict(chunk), value=stock_table.c.product_id), updated_at=now)
+        )
+    # El stock total de estos productos cambió sin tocar sus lotes: las terminales deben recibirlos
+    record_changed_rows(db, "products", [product_id for product_id, _ in changed])
+    db.commit()
+    return differences
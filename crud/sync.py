@@ -0,0 +1,156 @@
+"""
+Sincronización del catálogo local de las terminales de venta
+- Carga inicial (get_catalog_snapshot): todos los productos y lotes activos con la secuencia actual
+  del catálogo, en formato de columnas {"columns": [...], "rows": [[...], ...]} (los nombres de los
+  campos no se repiten en cada fila)
+- Después (get_catalog_changes): solo los productos y lotes cambiados desde 'since' según
+  catalog_change_log (crud/versions.py), con su stock y precio actuales, y los IDs desactivados
+  (status=0) en 'deleted' para que la terminal los quite
+- Un producto se envía también cuando cambia uno de sus lotes: su stock total y su precio salen de ellos
+- La secuencia se lee antes que los datos: lo que cambie durante la lectura vuelve a llegar en el
+  siguiente delta (aplicar dos veces el mismo cambio no altera el catálogo local)
+- La secuencia que se devuelve es la completa (complete_sequence): los cambios de los últimos segundos
+  se envían, pero la terminal los vuelve a pedir hasta que ya no pueda confirmarse otro por debajo
+"""
+import os
+from typing import Any, Dict, Iterable, List, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db.models import Product, MedicineBatch, CatalogChange
+from crud.products import latest_sale_prices
+from crud.stock import get_product_stock
+from crud.versions import CATALOG_SEQUENCE, complete_sequence, get_table_versions, latest_sequence
+from utils.bulk import chunked
+from utils.images import build_image_url, build_thumbnail_url
+
+# Máximo de cambios por respuesta del delta: con has_more=true la terminal vuelve a pedir desde 'seq'
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "5000"))
+
+PRODUCT_COLUMNS = (
+    "id", "name", "description", "category_id", "presentation", "concentration",
+    "image_url", "thumbnail_url", "total_stock", "sale_price"
+)
+BATCH_COLUMNS = ("id", "product_id", "expiration_date", "stock", "sale_price")
+
+_PRODUCT_FIELDS = (
+    Product.id, Product.name, Product.description, Product.category_id, Product.presentation,
+    Product.concentration, Product.image, Product.status
+)
+_BATCH_FIELDS = (
+    MedicineBatch.id, MedicineBatch.product_id, MedicineBatch.expiration_date, MedicineBatch.stock,
+    MedicineBatch.sale_price, MedicineBatch.status
+)
+
+
+def _columns(columns: Sequence[str], rows: List[list]) -> Dict[str, Any]:
+    return {"columns": list(columns), "rows": rows}
+
+
+def _product_rows(db: Session, products: List[Any]) -> List[list]:
+    stock, prices = {}, {}
+    for chunk in chunked([product.id for product in products]):
+        stock.update(get_product_stock(db, chunk))
+        prices.update(latest_sale_prices(db, chunk))
+    return [
+        [
+            product.id, product.name, product.description, product.category_id, product.presentation,
+            product.concentration, build_image_url(product.image), build_thumbnail_url(product.image),
+            stock.get(product.id, 0), prices.get(product.id)
+        ]
+        for product in products
+    ]
+
+
+def _batch_rows(batches: List[Any]) -> List[list]:
+    return [[batch.id, batch.product_id, batch.expiration_date, batch.stock, batch.sale_price] for batch in batches]
+
+
+def _load(db: Session, fields: Sequence, ids: Iterable[int]) -> List[Any]:
+    id_column = fields[0]
+    rows = []
+    for chunk in chunked(sorted(ids)):
+        rows.extend(db.query(*fields).filter(id_column.in_(chunk)).all())
+    return rows
+
+
+def get_catalog_snapshot(db: Session) -> Dict[str, Any]:
+    """Catálogo completo para la carga inicial: productos y lotes activos y la secuencia a partir de la cual pedir cambios"""
+    seq = complete_sequence(db)
+    products = db.query(*_PRODUCT_FIELDS).filter(Product.status == 1).order_by(Product.id).all()
+    batches = db.query(*_BATCH_FIELDS).filter(MedicineBatch.status == 1).order_by(MedicineBatch.id).all()
+    return {
+        "seq": seq,
+        "products": _columns(PRODUCT_COLUMNS, _product_rows(db, products)),
+        "batches": _columns(BATCH_COLUMNS, _batch_rows(batches)),
+    }
+
+
+def _empty_changes(since: int) -> Dict[str, Any]:
+    return {
+        "since": since,
+        "seq": since,
+        "has_more": False,
+        "products": _columns(PRODUCT_COLUMNS, []),
+        "batches": _columns(BATCH_COLUMNS, []),
+        "deleted": {"products": [], "batches": []},
+    }
+
+
+def get_catalog_changes(db: Session, since: int, limit: int = SYNC_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Productos y lotes cambiados después de la secuencia 'since' (como máximo 'limit' cambios).
+    La terminal aplica el resultado y guarda 'seq' para la siguiente llamada; con has_more=true
+    vuelve a pedir de inmediato.
+    """
+    if since < 0:
+        raise ValueError("La secuencia debe ser mayor o igual a 0")
+    # La secuencia en memoria no avanzó: no hay nada nuevo y no se consulta la BD
+    if get_table_versions(db, (CATALOG_SEQUENCE,))[0] == since:
+        return _empty_changes(since)
+
+    complete = complete_sequence(db)
+    seq = latest_sequence(db)
+    if since > seq:
+        raise ValueError(
+            f"La secuencia {since} es posterior a la del catálogo ({seq}): cargue el snapshot de nuevo"
+        )
+
+    changes = CatalogChange.__table__
+    query = select(changes.c.entity, changes.c.entity_id, changes.c.seq)
+    rows = db.execute(
+        query.where(changes.c.seq > since, changes.c.seq <= seq).order_by(changes.c.seq).limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    if has_more:
+        # Los cambios de una misma secuencia (una transacción) no se reparten entre dos respuestas
+        cut = rows[limit].seq
+        rows = [row for row in rows[:limit] if row.seq < cut]
+        if not rows:
+            rows = db.execute(query.where(changes.c.seq == cut)).all()
+    upto = rows[-1].seq if has_more else seq
+    # La terminal avanza solo hasta la secuencia completa; si la página entera es más reciente,
+    # la pide de nuevo en la siguiente sincronización y no de inmediato
+    cursor = max(since, min(upto, complete))
+    has_more = has_more and cursor > since
+
+    batch_ids = {row.entity_id for row in rows if row.entity == "medicine_batches"}
+    batches = _load(db, _BATCH_FIELDS, batch_ids)
+    product_ids = {row.entity_id for row in rows if row.entity == "products"}
+    product_ids.update(batch.product_id for batch in batches)
+    products = _load(db, _PRODUCT_FIELDS, product_ids)
+
+    active_products = [product for product in products if product.status == 1]
+    active_batches = [batch for batch in batches if batch.status == 1]
+    return {
+        "since": since,
+        "seq": cursor,
+        "has_more": has_more,
+        "products": _columns(PRODUCT_COLUMNS, _product_rows(db, active_products)),
+        "batches": _columns(BATCH_COLUMNS, _batch_rows(active_batches)),
+        "deleted": {
+            "products": [product.id for product in products if product.status != 1],
+            "batches": [batch.id for batch in batches if batch.status != 1],
+        },
+    }
@@ -3,6 +3,10 @@ from sqlalchemy.exc import IntegrityError
 from db.models import User, Role
 from db.schemas import UserCreate, UserUpdate
 from utils.security import get_password_hash
+from utils.tokens import revoke_user_tokens
+
+# Cambios que cierran las sesiones abiertas del usuario (sus tokens dejan de valer)
+SESSION_FIELDS = ("username", "password", "role_id", "status")
 
 
 def create_user(db: Session, data: UserCreate):
@@ -95,8 +99,14 @@ def update_user(db: Session, user_id: int, data: UserUpdate):
     
     try:
         # Actualizar solo los campos proporcionados
+        changed_session = any(
+            field in SESSION_FIELDS and getattr(user, field) != value
+            for field, value in update_data.items()
+        )
         for field, value in update_data.items():
             setattr(user, field, value)
+        if changed_session:
+            revoke_user_tokens(db, user_id)
 
         db.commit()
         db.refresh(user)
@@ -122,6 +132,7 @@ def delete_user(db: Session, user_id: int) -> bool:
         return False
 
     user.status = 0
+    revoke_user_tokens(db, user_id)
     db.commit()
     return True
 
@@ -129,5 +140,3 @@ def get_user_by_username(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
 
 
-    return db.query(User).filter(User.username == username).first()
-
@@ -0,0 +1,324 @@
+"""
+Versiones por tabla (table_versions) para la caché HTTP de los catálogos
+- Cada transacción que escribe en una tabla seguida (TRACKED_TABLES) incrementa su versión después de
+  confirmar, en una transacción corta aparte (VersionBumper): la venta no retiene la fila de la versión
+  durante su commit, así las ventas concurrentes no se serializan en esas filas, y si la escritura se
+  revierte la versión no cambia. Un solo hilo por proceso aplica los incrementos pendientes y agrupa
+  los de varios commits en un UPDATE. Si el proceso cae entre los dos commits, la versión de esa tabla
+  se corrige en su siguiente escritura
+- Se detectan las escrituras del ORM (flush) y las sentencias insert/update/delete ejecutadas con la
+  sesión (utils.bulk, update(...) de crud/stock.py, query.update()); no las de text("UPDATE ...")
+- Las versiones se leen de memoria: se vuelven a consultar después de un commit de este proceso que
+  las cambió (esperando a que se apliquen sus incrementos) y, para ver los cambios de otros procesos,
+  como máximo cada TABLE_VERSIONS_POLL_SECONDS
+- Además, los IDs de productos y lotes cambiados (ROW_TRACKED_TABLES) se insertan en catalog_change_log
+  dentro de la transacción que los escribió, con una secuencia autoincremental (sincronización de
+  terminales, crud/sync.py, e índice de códigos de barras). El flush los registra solo; las sentencias
+  del core deben informarlos con record_changed_rows()
+- La secuencia se asigna al insertar y no al confirmar: una transacción puede confirmar la secuencia N
+  después de que otra confirmó N+1. complete_sequence() da la secuencia hasta la que el registro ya no
+  puede recibir filas (CATALOG_CHANGES_GRACE_SECONDS); quien lee los cambios avanza solo hasta ella
+Los eventos se registran para todas las sesiones al importar este módulo (lo importan crud.stock,
+crud.sales, crud.purchases y utils.http_cache).
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from db.models import TableVersion, CatalogChange
+from utils.bulk import chunked
+
+# Tablas con versión: ETag de los listados y recarga del índice de códigos de barras (crud/barcodes.py)
+TRACKED_TABLES = frozenset({
+    "categories", "products", "suppliers", "medicine_batches", "product_stock", "product_barcodes"
+})
+
+# Segundos máximos sin volver a leer las versiones (cambios hechos por otros procesos)
+TABLE_VERSIONS_POLL_SECONDS = float(os.getenv("TABLE_VERSIONS_POLL_SECONDS", "1"))
+
+# Tablas con registro por fila en catalog_change_log y nombre con el que get_table_versions retorna
+# su última secuencia
+ROW_TRACKED_TABLES = frozenset({"products", "medicine_batches"})
+CATALOG_SEQUENCE = "catalog_sequence"
+
+# Las filas de catalog_change_log se insertan justo antes del commit: pasado este margen (mayor que la
+# diferencia entre los relojes de los servidores) una secuencia menor ya no puede estar sin confirmar
+CATALOG_CHANGES_GRACE_SECONDS = float(os.getenv("CATALOG_CHANGES_GRACE_SECONDS", "5"))
+
+# Espera máxima de una lectura de versiones a que se apliquen los incrementos de este proceso
+BUMP_WAIT_SECONDS = 1
+
+_CHANGED_KEY = "changed_tables"
+_ROWS_KEY = "changed_rows"
+_BUMP_KEY = "bump_tables"
+
+
+# ========================
+# REGISTRO DE ESCRITURAS
+# ========================
+def _record(session: Session, table_name: str):
+    if table_name in TRACKED_TABLES:
+        session.info.setdefault(_CHANGED_KEY, set()).add(table_name)
+
+
+def record_changed_rows(db: Session, table_name: str, ids: Iterable[int]):
+    """Registra filas escritas con sentencias del core (insert/update por ID), que el flush no ve"""
+    if table_name in ROW_TRACKED_TABLES:
+        db.info.setdefault(_ROWS_KEY, {}).setdefault(table_name, set()).update(ids)
+
+
+def _record_object(session: Session, obj):
+    state = inspect(obj)
+    table_name = state.mapper.local_table.name
+    _record(session, table_name)
+    if table_name in ROW_TRACKED_TABLES:
+        # En after_flush los objetos nuevos ya tienen su ID pero todavía no su identity key
+        record_changed_rows(session, table_name, state.mapper.primary_key_from_instance(obj)[:1])
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session: Session, flush_context):
+    for obj in chain(session.new, session.deleted):
+        _record_object(session, obj)
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            _record_object(session, obj)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _record(orm_execute_state.session, table.name)
+
+
+@event.listens_for(Session, "before_commit")
+def _stamp_on_commit(session: Session):
+    # commit() vuelve a hacer flush después de este evento: se hace antes para registrar todo
+    session.flush()
+    rows = session.info.pop(_ROWS_KEY, None)
+    if rows:
+        stamp_changed_rows(session, rows)
+    tables = session.info.pop(_CHANGED_KEY, None)
+    if tables or rows:
+        # Las versiones se incrementan después del commit (_bump_after_commit)
+        session.info[_BUMP_KEY] = set(tables or ())
+
+
+# Funciones sin argumentos llamadas después de cada commit que cambió versiones (deben ser rápidas)
+_commit_hooks: List[Callable[[], None]] = []
+
+
+def on_versions_commit(hook: Callable[[], None]) -> Callable[[], None]:
+    """Registra 'hook' para después de cada commit de este proceso que cambió el catálogo"""
+    _commit_hooks.append(hook)
+    return hook
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session: Session):
+    tables = session.info.pop(_BUMP_KEY, None)
+    if tables is not None:
+        # La sesión todavía retiene su conexión: el incremento lo hace otro hilo con otra conexión
+        bumper.schedule(session.get_bind().engine, tables)
+        snapshot.invalidate()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_on_end(session: Session, transaction):
+    # Solo al terminar la transacción principal: revertir un savepoint no descarta escrituras anteriores
+    if transaction.parent is None:
+        session.info.pop(_CHANGED_KEY, None)
+        session.info.pop(_ROWS_KEY, None)
+        session.info.pop(_BUMP_KEY, None)
+
+
+def bump_versions(db, tables: Iterable[str]):
+    """
+    Incrementa la versión de las tablas sin confirmar la transacción (crea las filas que falten).
+    'db' es una Session o una Connection.
+    """
+    names = sorted(set(tables))
+    table = TableVersion.__table__
+    now = datetime.now()
+    # Orden fijo de las filas: dos transacciones no se bloquean en orden inverso
+    result = db.execute(
+        update(table).where(table.c.table_name.in_(names)).values(version=table.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == len(names):
+        return
+
+    existing = set(db.execute(select(table.c.table_name).where(table.c.table_name.in_(names))).scalars().all())
+    for name in names:
+        if name in existing:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(table), [{"table_name": name, "version": 1, "updated_at": now}])
+        except IntegrityError:
+            # Otra transacción creó la fila al mismo tiempo: se incrementa la suya
+            db.execute(
+                update(table).where(table.c.table_name == name).values(version=table.c.version + 1, updated_at=now)
+            )
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="table-versions")
+
+
+class VersionBumper:
+    """
+    Aplica en segundo plano los incrementos de versión pendientes, cada uno en una transacción corta.
+    Un solo hilo por proceso: los commits que llegan mientras se aplica un incremento se agrupan en
+    el siguiente UPDATE.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Engine, Set[str]] = {}
+        self._running = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._thread: Optional[int] = None
+        self.bumps = 0
+
+    def schedule(self, engine: Engine, tables: Iterable[str]):
+        with self._lock:
+            self._pending.setdefault(engine, set()).update(tables)
+            if self._running:
+                return
+            self._running = True
+        _executor.submit(self._run)
+
+    def _run(self):
+        self._thread = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    self._idle.notify_all()
+                    return
+                pending, self._pending = self._pending, {}
+            for engine, tables in pending.items():
+                if not tables:
+                    continue
+                try:
+                    with engine.begin() as connection:
+                        bump_versions(connection, tables)
+                    self.bumps += 1
+                except Exception as e:
+                    print(f"Advertencia: No se pudieron incrementar las versiones de {', '.join(sorted(tables))}: {e}")
+            snapshot.invalidate()
+            for hook in _commit_hooks:
+                try:
+                    hook()
+                except Exception as e:
+                    print(f"Advertencia: Falló una tarea posterior al cambio del catálogo: {e}")
+
+    def wait(self, timeout: float = BUMP_WAIT_SECONDS) -> bool:
+        """Espera a que no queden incrementos pendientes; False si venció 'timeout'"""
+        if threading.get_ident() == self._thread:
+            # Llamada desde un hook del propio hilo: esperar sería esperarse a sí mismo
+            return False
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._running, timeout)
+
+
+bumper = VersionBumper()
+
+
+def stamp_changed_rows(db: Session, rows: Dict[str, Iterable[int]]):
+    """
+    Inserta en catalog_change_log una fila por producto o lote cambiado y borra la anterior de cada uno.
+    La secuencia es la columna autoincremental: no hay una fila compartida que quede bloqueada hasta el
+    commit, así las transacciones que cambian el catálogo no se serializan entre sí.
+    """
+    changes = CatalogChange.__table__
+    now = datetime.now()
+    for entity in sorted(rows):
+        for chunk in chunked(sorted(rows[entity])):
+            previous = db.execute(
+                select(changes.c.seq).where(changes.c.entity == entity, changes.c.entity_id.in_(chunk))
+            ).scalars().all()
+            db.execute(insert(changes), [
+                {"entity": entity, "entity_id": entity_id, "changed_at": now} for entity_id in chunk
+            ])
+            if previous:
+                # Por clave primaria: sin bloquear rangos del índice (entity, entity_id)
+                db.execute(delete(changes).where(changes.c.seq.in_(previous)))
+
+
+def latest_sequence(db: Session) -> int:
+    """Mayor secuencia confirmada en catalog_change_log (0 si todavía no hubo cambios)"""
+    return db.execute(select(func.max(CatalogChange.seq))).scalar() or 0
+
+
+def complete_sequence(db: Session) -> int:
+    """
+    Secuencia hasta la que catalog_change_log está completo: la mayor de las filas escritas hace más de
+    CATALOG_CHANGES_GRACE_SECONDS. Las filas posteriores pueden tener por debajo secuencias todavía sin
+    confirmar: se entregan igual, pero quien lee los cambios vuelve a pedirlas desde esta secuencia.
+    """
+    changes = CatalogChange.__table__
+    cutoff = datetime.now() - timedelta(seconds=CATALOG_CHANGES_GRACE_SECONDS)
+    # Recorre la clave primaria hacia atrás: solo lee las filas del margen
+    return db.execute(
+        select(changes.c.seq).where(changes.c.changed_at < cutoff).order_by(changes.c.seq.desc()).limit(1)
+    ).scalar() or 0
+
+
+# ========================
+# LECTURA (EN MEMORIA)
+# ========================
+class VersionSnapshot:
+    """Versiones de todas las tablas seguidas, leídas de la BD como máximo cada poll_seconds"""
+
+    def __init__(self, poll_seconds: float = TABLE_VERSIONS_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._versions: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        # Cada invalidación cambia la generación: una lectura que empezó antes no se da por vigente
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = None
+
+    def get(self, db: Session, tables: Iterable[str]) -> Tuple[int, ...]:
+        """Versiones de 'tables' en ese orden (0 si la tabla aún no tiene cambios registrados)"""
+        now = time.monotonic()
+        with self._lock:
+            fresh = self._loaded_at is not None and now - self._loaded_at < self.poll_seconds
+            versions = self._versions
+            generation = self._generation
+        if not fresh:
+            # Los incrementos de los commits de este proceso se aplican antes de leer
+            bumper.wait()
+            with self._lock:
+                generation = self._generation
+            versions = dict(db.execute(select(TableVersion.table_name, TableVersion.version)).all())
+            versions[CATALOG_SEQUENCE] = latest_sequence(db)
+            with self._lock:
+                self._versions = versions
+                self.refreshes += 1
+                if self._generation == generation:
+                    self._loaded_at = now
+        return tuple(versions.get(name, 0) for name in tables)
+
+
+snapshot = VersionSnapshot()
+
+
+def get_table_versions(db: Session, tables: Iterable[str]) -> Tuple[int, ...]:
+    return snapshot.get(db, tables)
@@ -5,6 +5,8 @@ from urllib.parse import quote_plus
 import os
 from pathlib import Path
 
+from db.pools import MeteredQueuePool
+
 # Obtener el directorio del proyecto
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,22 +50,48 @@ else:
     encoded_db = quote_plus(str(MYSQL_DB))
     DATABASE_URL = f"mysql+pymysql://{encoded_user}@{MYSQL_HOST}:{MYSQL_PORT}/{encoded_db}"
 
-# OBJETO QUE MANEJA LA CONEXION
-# Configuración del pool de conexiones para manejar reconexiones automáticas
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Verifica conexiones antes de usarlas
-    pool_recycle=3600,   # Recicla conexiones cada hora
-    pool_size=10,         # Tamaño del pool de conexiones
-    max_overflow=20,      # Conexiones adicionales permitidas
-    echo=False            # No mostrar SQL en consola
-)
-
-# Se crea una fábrica de sesiones de base de datos.
+# POOLS DE CONEXIONES (BULKHEADS)
+# Cada tipo de carga usa su propio pool, con tamaño y espera independientes (db/pools.py):
+# - transactional: ventas, compras, inventario, login y el resto de la API (get_db)
+# - reporting:     reportes, tablero y analítica (get_report_db)
+# - jobs:          trabajos en segundo plano, como los reportes encolados (JobsSessionLocal)
+# Los límites se ajustan con DB_<POOL>_POOL_SIZE, DB_<POOL>_MAX_OVERFLOW y DB_<POOL>_POOL_TIMEOUT
+POOL_DEFAULTS = {
+    "transactional": {"size": 10, "overflow": 20, "timeout": 30},
+    "reporting": {"size": 4, "overflow": 2, "timeout": 10},
+    "jobs": {"size": 2, "overflow": 0, "timeout": 30},
+}
+
+
+def _pool_setting(name: str, key: str, default):
+    return type(default)(os.getenv(f"DB_{name.upper()}_{key}", default))
+
+
+def _create_pool_engine(name: str, defaults: dict):
+    return create_engine(
+        DATABASE_URL,
+        poolclass=MeteredQueuePool,
+        pool_logging_name=name,  # Nombre de las métricas del pool
+        pool_pre_ping=True,  # Verifica conexiones antes de usarlas
+        pool_recycle=3600,   # Recicla conexiones cada hora
+        pool_size=_pool_setting(name, "POOL_SIZE", defaults["size"]),          # Conexiones que se mantienen abiertas
+        max_overflow=_pool_setting(name, "MAX_OVERFLOW", defaults["overflow"]),  # Conexiones adicionales permitidas
+        pool_timeout=_pool_setting(name, "POOL_TIMEOUT", defaults["timeout"]),   # Segundos de espera por una conexión
+        echo=False            # No mostrar SQL en consola
+    )
+
+
+# OBJETOS QUE MANEJAN LA CONEXION
+engines = {name: _create_pool_engine(name, defaults) for name, defaults in POOL_DEFAULTS.items()}
+engine = engines["transactional"]
+
+# Se crea una fábrica de sesiones de base de datos por pool.
 # - autocommit=False → las transacciones no se confirman automáticamente.
 # - autoflush=False → evita que los cambios se sincronicen automáticamente con la base de datos.
 # - bind=engine → vincula la sesión al motor de base de datos creado antes.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReportSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engines["reporting"])
+JobsSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engines["jobs"])
 
 # Se crea la clase "Base" para declarar los modelos de la base de datos (tablas)
 Base = declarative_base()
@@ -80,4 +108,14 @@ def get_db():
         db.close()
 
 
-
+def get_report_db():
+    """
+    Sesión del pool de reportes. La conexión se toma al inicio: si el pool está saturado la petición
+    espera (o falla con 503 al vencer DB_REPORTING_POOL_TIMEOUT) antes de empezar a calcular.
+    """
+    db = ReportSessionLocal()
+    try:
+        db.connection()
+        yield db
+    finally:
+        db.close()
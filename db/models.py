@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Date, DateTime, DECIMAL
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Date, DateTime, DECIMAL, Float, Index, UniqueConstraint
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
 from sqlalchemy.orm import relationship
 from db.database import Base
 
@@ -110,6 +111,26 @@ class Product(Base):
 
     category = relationship("Category", back_populates="products")
     batches = relationship("MedicineBatch", back_populates="product")
+    barcodes = relationship("ProductBarcode", back_populates="product")
+
+
+# ========================
+# PRODUCT BARCODES
+# ========================
+class ProductBarcode(Base):
+    """Códigos de barras de un producto (GTIN/EAN/UPC o internos); un producto puede tener varios"""
+    __tablename__ = "product_barcodes"
+    __table_args__ = (
+        # Un código pertenece a un solo producto (guardado normalizado, crud/barcodes.py)
+        UniqueConstraint("code", name="uq_product_barcodes_code"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(32), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    created_at = Column(DateTime)
+
+    product = relationship("Product", back_populates="barcodes")
 
 
 # ========================
@@ -117,6 +138,10 @@ class Product(Base):
 # ========================
 class MedicineBatch(Base):
     __tablename__ = "medicine_batches"
+    __table_args__ = (
+        # Índice para la asignación FEFO: lotes activos de un producto ordenados por vencimiento
+        Index("ix_medicine_batches_fefo", "product_id", "status", "expiration_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
@@ -231,3 +256,258 @@ class PurchaseDetail(Base):
 
     purchase = relationship("Purchase", back_populates="details")
     batch = relationship("MedicineBatch", back_populates="purchase_detail")
+
+
+# ========================
+# IDEMPOTENCY KEYS
+# ========================
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("endpoint", "idempotency_key", name="uq_idempotency_endpoint_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    endpoint = Column(String(100), nullable=False)
+    idempotency_key = Column(String(255), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    request_hash = Column(String(64), nullable=False)
+    state = Column(String(20), nullable=False, default="processing")  # processing | completed
+    status_code = Column(Integer)
+    # MEDIUMTEXT en MySQL: la respuesta de POST /sales/bulk supera los 64 KB de TEXT
+    response_body = Column(Text().with_variant(MEDIUMTEXT(), "mysql"))
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+# ========================
+# STOCK MOVEMENTS (LEDGER)
+# ========================
+class StockMovement(Base):
+    """
+    Libro de movimientos de stock (solo inserción). Cada cambio del stock vendible (lotes activos)
+    se registra aquí en la misma transacción que modifica medicine_batches.stock.
+    """
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        # Consultas de stock a una fecha: movimientos de un producto por fecha
+        Index("ix_stock_movements_product_created", "product_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    batch_id = Column(Integer, ForeignKey("medicine_batches.id"))
+    quantity = Column(Integer, nullable=False)  # Positivo = entrada, negativo = salida
+    movement_type = Column(String(30), nullable=False)  # venta | compra | ajuste | lote | apertura
+    reference_type = Column(String(30))  # sale | purchase | batch | product
+    reference_id = Column(Integer)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, nullable=False)
+
+
+# ========================
+# PRODUCT STOCK (SNAPSHOT)
+# ========================
+class ProductStock(Base):
+    """Stock vendible actual por producto, mantenido junto con stock_movements"""
+    __tablename__ = "product_stock"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    stock = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+
+# ========================
+# STOCK CHECKPOINTS
+# ========================
+class StockCheckpoint(Base):
+    """Stock de un producto a una fecha; acota la cantidad de movimientos a sumar en consultas históricas"""
+    __tablename__ = "stock_checkpoints"
+    __table_args__ = (
+        UniqueConstraint("product_id", "checkpoint_at", name="uq_stock_checkpoint_product_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    checkpoint_at = Column(DateTime, nullable=False)
+    stock = Column(Integer, nullable=False)
+
+
+# ========================
+# PRODUCT FORECASTS
+# ========================
+class ProductForecast(Base):
+    """
+    Demanda diaria suavizada y punto de reorden por producto.
+    Se recalcula de forma incremental en el proceso nocturno (forecast_demand.py).
+    """
+    __tablename__ = "product_forecasts"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    daily_demand = Column(Float, nullable=False, default=0)  # Unidades/día (suavizado exponencial)
+    demand_std = Column(Float, nullable=False, default=0)  # Desviación estándar diaria (suavizada)
+    lead_time_days = Column(Integer, nullable=False)
+    safety_stock = Column(Integer, nullable=False, default=0)
+    reorder_point = Column(Integer, nullable=False, default=0)
+    order_up_to = Column(Integer, nullable=False, default=0)  # Nivel objetivo al reponer
+    stock = Column(Integer, nullable=False, default=0)  # Stock al momento del cálculo
+    days_of_cover = Column(Float)  # None si no hay demanda
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"))  # Último proveedor según compras
+    last_unit_price = Column(DECIMAL(10, 2))
+    demand_through = Column(Date, nullable=False)  # Último día de ventas incorporado
+    updated_at = Column(DateTime)
+
+
+# ========================
+# SALES ARCHIVE
+# ========================
+class SaleArchive(Base):
+    """
+    Ventas de períodos cerrados movidas por archive_sales.py (mismas columnas e IDs que 'sales').
+    Se usan relaciones de solo lectura para que los reportes las traten igual que una Sale.
+    """
+    __tablename__ = "sales_archive"
+    __table_args__ = (
+        Index("ix_sales_archive_sale_date", "sale_date"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    client_id = Column(Integer, ForeignKey("clients.id"))
+    user_id = Column(Integer, ForeignKey("users.id"))
+    sale_date = Column(DateTime)
+    total = Column(DECIMAL(10, 2))
+    payment_method = Column(String(100))
+
+    client = relationship("Client", viewonly=True)
+    user = relationship("User", viewonly=True)
+    details = relationship("SalesDetailArchive", back_populates="sale", viewonly=True)
+
+
+class SalesDetailArchive(Base):
+    __tablename__ = "sales_detail_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    sale_id = Column(Integer, ForeignKey("sales_archive.id"), index=True)
+    batch_id = Column(Integer, ForeignKey("medicine_batches.id"))
+    quantity = Column(Integer)
+    unit_price = Column(DECIMAL(10, 2))
+    subtotal = Column(DECIMAL(10, 2))
+
+    sale = relationship("SaleArchive", back_populates="details", viewonly=True)
+    batch = relationship("MedicineBatch", viewonly=True)
+
+
+class SalesPeriodSummary(Base):
+    """Totales por mes y método de pago de las ventas archivadas (se conservan para cifras históricas)"""
+    __tablename__ = "sales_period_summary"
+    __table_args__ = (
+        UniqueConstraint("period_start", "payment_method", name="uq_sales_period_summary"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    period_start = Column(Date, nullable=False)  # Primer día del mes
+    payment_method = Column(String(100))
+    sales_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(DECIMAL(14, 2), nullable=False, default=0)
+    items_count = Column(Integer, nullable=False, default=0)  # Líneas de detalle
+    units = Column(Integer, nullable=False, default=0)  # Unidades vendidas
+    updated_at = Column(DateTime)
+
+
+# ========================
+# FINANCIAL TOTALS
+# ========================
+class FinancialTotal(Base):
+    """
+    Totales acumulados de ingresos (ventas) y gastos (compras), actualizados en la misma
+    transacción que cada venta/compra. Una fila global ('total'), una por mes y una por día.
+    """
+    __tablename__ = "financial_totals"
+    __table_args__ = (
+        Index("ix_financial_totals_type_start", "period_type", "period_start"),
+    )
+
+    period = Column(String(10), primary_key=True)  # "total", "AAAA-MM" o "AAAA-MM-DD"
+    period_type = Column(String(10), nullable=False)  # total, month, day
+    period_start = Column(Date)  # NULL en la fila global
+    income = Column(DECIMAL(14, 2), nullable=False, default=0)
+    expenses = Column(DECIMAL(14, 2), nullable=False, default=0)
+    sales_count = Column(Integer, nullable=False, default=0)
+    purchases_count = Column(Integer, nullable=False, default=0)
+    # Aumenta en cada escritura de la fila (venta, compra o rebuild): invalida los reportes en caché
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+
+# ========================
+# PRODUCT DAILY SALES
+# ========================
+class ProductDailySales(Base):
+    """
+    Ventas por producto y día (unidades, ingresos y líneas de detalle), actualizadas en la misma
+    transacción que cada venta. Los rankings de productos leen solo los días del rango.
+    """
+    __tablename__ = "product_daily_sales"
+    __table_args__ = (
+        Index("ix_product_daily_sales_product", "product_id"),
+    )
+
+    # Clave (day, product_id): un rango de fechas es un rango contiguo de la clave primaria
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+    lines = Column(Integer, nullable=False, default=0)
+
+
+# ========================
+# REFRESH TOKENS
+# ========================
+class RefreshToken(Base):
+    """
+    Tokens de refresco (se guarda solo el hash SHA-256). Cada uso entrega uno nuevo de la misma
+    familia; si se reutiliza uno ya usado, se revoca toda la familia (posible robo del token).
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    family = Column(String(32), nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime)
+    revoked_at = Column(DateTime)
+
+
+# ========================
+# TABLE VERSIONS
+# ========================
+class TableVersion(Base):
+    """
+    Contador de cambios por tabla del catálogo, incrementado en una transacción corta después del
+    commit de cada escritura (crud/versions.py). Las versiones forman los ETag de los listados /all.
+    """
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+
+class CatalogChange(Base):
+    """
+    Registro de cambios de productos y lotes con secuencia autoincremental (crud/versions.py): cada
+    transacción inserta una fila por producto o lote escrito, sin actualizar filas compartidas, y borra
+    la fila anterior de esa misma entidad, así queda el último cambio de cada una. Es la base de
+    GET /sync/catalog?since= (crud/sync.py); los desactivados (status=0) se envían como tombstones.
+    """
+    __tablename__ = "catalog_change_log"
+    __table_args__ = (
+        Index("ix_catalog_change_log_entity", "entity", "entity_id"),
+    )
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(32), nullable=False)  # products | medicine_batches
+    entity_id = Column(Integer, nullable=False)
+    changed_at = Column(DateTime, nullable=False)
@@ -0,0 +1,132 @@
+"""
+Pools de conexiones por tipo de carga (bulkheads)
+- Cada pool tiene su propio tamaño, desborde y tiempo de espera: una ráfaga de reportes o un tablero
+  que se refresca en muchas pantallas agota su pool, no el de las ventas
+- MeteredQueuePool mide cuánto espera cada petición para obtener una conexión, cuántas se rinden
+  por pool_timeout y qué parte del pool está en uso
+- Las métricas se identifican por el nombre del pool (pool_logging_name del engine), así siguen
+  siendo las mismas si SQLAlchemy recrea el pool tras una desconexión
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Esperas recientes usadas para los percentiles de cada pool
+WAIT_SAMPLES = 1000
+
+
+class PoolMetrics:
+    """Espera para obtener conexión y saturación de un pool (seguro entre hilos)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool: Optional[QueuePool] = None
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.max_checked_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def start_wait(self):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def end_wait(self, seconds: float, outcome: str = "ok"):
+        """outcome: 'ok' (conexión obtenida), 'timeout' (venció pool_timeout) o 'error' (falló la conexión)"""
+        with self._lock:
+            self.waiting -= 1
+            if outcome == "timeout":
+                self.timeouts += 1
+            if outcome != "ok":
+                return
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            self._waits.append(seconds)
+            if self.pool is not None:
+                self.max_checked_out = max(self.max_checked_out, self.pool.checkedout())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            data = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "max_checked_out": self.max_checked_out,
+                "wait_avg_ms": round(self.total_wait / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                "wait_p50_ms": round(_percentile(waits, 0.50) * 1000, 2),
+                "wait_p95_ms": round(_percentile(waits, 0.95) * 1000, 2),
+                "wait_max_ms": round(self.max_wait * 1000, 2),
+            }
+        pool = self.pool
+        if pool is not None:
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            checked_out = pool.checkedout()
+            data.update({
+                "pool_size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "timeout_seconds": pool.timeout(),
+                "checked_out": checked_out,
+                "idle": pool.checkedin(),
+                "saturation": round(checked_out / capacity, 3) if capacity > 0 else 0.0,
+            })
+        return data
+
+
+def _percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def get_pool_metrics(name: str) -> PoolMetrics:
+    with _metrics_lock:
+        metrics = _metrics.get(name)
+        if metrics is None:
+            metrics = _metrics[name] = PoolMetrics(name)
+        return metrics
+
+
+def pools_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Métricas de todos los pools con nombre"""
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    return {item.name: item.snapshot() for item in metrics}
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool que registra la espera de cada checkout en las métricas de su nombre"""
+
+    def __init__(self, *args, logging_name: Optional[str] = None, **kw):
+        super().__init__(*args, logging_name=logging_name, **kw)
+        self.metrics = get_pool_metrics(logging_name or "default")
+        self.metrics.pool = self
+
+    def connect(self):
+        self.metrics.start_wait()
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.metrics.end_wait(time.perf_counter() - start, "timeout")
+            raise
+        except BaseException:
+            self.metrics.end_wait(time.perf_counter() - start, "error")
+            raise
+        self.metrics.end_wait(time.perf_counter() - start)
+        return connection
@@ -165,6 +165,7 @@ class ProductResponse(BaseModel):
     concentration: Optional[str]
     image: Optional[str]  # Ruta relativa: "uploads/products/uuid.jpg"
     image_url: Optional[str] = None  # URL completa: "http://127.0.0.1:8000/uploads/products/uuid.jpg"
+    thumbnail_url: Optional[str] = None  # Miniatura WebP para listados (o la imagen original si aún no existe)
     status: int
     total_stock: Optional[int] = None  # Stock total de todos los lotes
     sale_price: Optional[float] = None  # Precio de venta del lote más reciente
@@ -253,7 +254,16 @@ class SalesDetailBase(BaseModel):
 
 
 class SalesDetailCreate(SalesDetailBase):
-    pass
+    # Modo FEFO: si se envía product_id sin batch_id, el sistema asigna los lotes
+    # que vencen primero y puede dividir la línea en varios detalles
+    batch_id: Optional[int] = None
+    product_id: Optional[int] = None
+
+    @validator('product_id', always=True)
+    def validate_batch_or_product(cls, v, values):
+        if v is None and values.get('batch_id') is None:
+            raise ValueError('Debe proporcionar batch_id o product_id')
+        return v
 
 
 class SalesDetailResponse(SalesDetailBase):
@@ -421,86 +431,18 @@ class PermissionResponse(BaseModel):
         from_attributes = True
 
 
-
-class PurchaseCreate(PurchaseBase):
-    purchase_date: Optional[datetime] = None  # Opcional, se usa datetime.now() si no se proporciona
-    details: List[PurchaseDetailCreate]  # detalles incluidos en la creación
-
-
-class PurchaseResponse(BaseModel):
-    id: int
-    user_id: int
-    supplier_id: int
-    purchase_date: datetime
-    payment_method: str
-    total: Decimal
-    details: List[PurchaseDetailResponse]
-
-    class Config:
-        from_attributes = True
-
-
-# ========================
-# ALERTS SCHEMAS
-# ========================
-class AlertCreate(BaseModel):
-    alert_type: str
-    batch_id: int
-    message: str
-
-
-class AlertResponse(BaseModel):
-    id: int
-    alert_type: str
-    batch_id: int
-    message: str
-
-    class Config:
-        from_attributes = True
-
-
 # ========================
-# ROLES
+# TOKENS
 # ========================
-class RoleCreate(BaseModel):
-    name: str = Field(..., min_length=2, max_length=100)
-
-
-class RoleUpdate(BaseModel):
-    name: Optional[str] = Field(None, min_length=2, max_length=100)
-    status: Optional[int]
-
-
-class RoleResponse(BaseModel):
-    id: int
-    name: str
-    status: int
-
-    class Config:
-        from_attributes = True
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 
 # ========================
-# PERMISSIONS
+# REPORT JOBS
 # ========================
-class PermissionCreate(BaseModel):
-    name: str = Field(..., min_length=2, max_length=150)
-    description: Optional[str] = None
-
-
-class PermissionUpdate(BaseModel):
-    name: Optional[str] = Field(None, min_length=2, max_length=150)
-    description: Optional[str] = None
-    status: Optional[int]
-
-
-class PermissionResponse(BaseModel):
-    id: int
-    name: str
-    description: Optional[str] = None
-    status: int
-
-    class Config:
-        from_attributes = True
-
-
+class ReportJobRequest(BaseModel):
+    type: str  # sales, top-products, sales-pdf, top-products-pdf, sales-xlsx, top-products-xlsx
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    limit: int = 10  # solo top-products
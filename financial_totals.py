@@ -0,0 +1,52 @@
+"""
+Mantenimiento de los totales financieros (financial_totals)
+- verify: recalcula ingresos y gastos desde ventas y compras y muestra las diferencias, sin modificar nada
+- rebuild: recalcula y corrige las filas con diferencias (también inicializa la tabla; 'python manage_db.py create'
+  lo hace si falta la fila global). Se puede ejecutar con la API en marcha
+Ejecutar: python financial_totals.py [verify|rebuild]
+"""
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from db.database import SessionLocal, Base, engine
+from crud.finance import rebuild_financial_totals
+
+
+def print_differences(differences):
+    if not differences:
+        print("✓ financial_totals coincide con las ventas y compras registradas")
+        return
+    print(f"⚠ {len(differences)} diferencias:")
+    for d in differences:
+        print(f"  {d['period']} {d['field']}: guardado={d['stored']} esperado={d['expected']}")
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command not in ("verify", "rebuild"):
+        print(__doc__)
+        return False
+
+    # Crear la tabla de totales si aún no existe
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        differences = rebuild_financial_totals(db, dry_run=command == "verify")
+        print_differences(differences)
+        if command == "rebuild" and differences:
+            print("✓ financial_totals recalculada")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"❌ ERROR: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
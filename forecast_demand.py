@@ -0,0 +1,41 @@
+"""
+Proceso nocturno de pronóstico de demanda y puntos de reorden
+Incorpora las ventas de los días completos desde el último cálculo de cada producto.
+Usar --full para reinicializar todos los productos con el historial reciente.
+Ejecutar: python forecast_demand.py [--full]
+"""
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from db.database import SessionLocal, Base, engine
+from crud.forecast import update_forecasts
+
+
+def main():
+    full = "--full" in sys.argv[1:]
+
+    # Crear la tabla de pronósticos si aún no existe
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        result = update_forecasts(db, full=full)
+        print(f"✓ Pronósticos actualizados: {result['products']} productos, "
+              f"{result['days']} días procesados, {result.get('initialized', 0)} inicializados "
+              f"({time.perf_counter() - start:.1f} s)")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"❌ ERROR: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -1,19 +1,28 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from utils.auth import get_current_user, oauth2_scheme, SECRET_KEY, ALGORITHM
-from fastapi.staticfiles import StaticFiles
+from utils.auth import get_current_user, oauth2_scheme
+from utils.tokens import issue_tokens, rotate_refresh_token, revoke_refresh_token, TokenError
+from utils.static_files import CachedStaticFiles
+from utils.serialization import FastJSONResponse
+from utils.admission import AdmissionMiddleware, controller as admission_controller
+from utils.single_flight import flights
+from utils.http_cache import cache as http_cache
+from crud.versions import snapshot as table_versions
+from crud.barcodes import index as barcode_index
+from utils.startup import lifespan
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError, IntegrityError
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from utils.security import verify_password, get_password_hash
+from sqlalchemy.exc import OperationalError, IntegrityError, TimeoutError as PoolTimeoutError
+from utils.login import login_throttle, check_password, rehash_if_needed, LoginBusy
+from starlette.concurrency import run_in_threadpool
 import pymysql
 
 import os
 
-from db.database import Base, engine, get_db
+from db.database import get_db
+from db.pools import pools_snapshot
+from db.schemas import RefreshTokenRequest
 from routers.users import routerUser
 from routers.categories import routerCategory
 from routers.clients import routerClient
@@ -26,18 +35,21 @@ from routers.alerts import routerAlert
 from routers.reports import routerReport
 from routers.dashboard import routerDashboard
 from routers.invoices import routerInvoice
+from routers.analytics import routerAnalytics
+from routers.sync import routerSync
 
 
 
-# ========================
-# CONFIG
-# ========================
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
-
 # ========================
 # INIT APP
 # ========================
-app = FastAPI(title="Farmacia API")
+# Las respuestas se serializan con orjson (utils.serialization)
+# Las tablas se crean con: python manage_db.py create (el arranque no modifica el esquema)
+app = FastAPI(title="Farmacia API", default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# Control de admisión por prioridad (utils.admission): ventas > consultas > tablero > exportaciones.
+# Se agrega antes que CORS para que los 503 por sobrecarga también lleven los encabezados CORS
+app.add_middleware(AdmissionMiddleware)
 
 # Permitir CORS
 app.add_middleware(
@@ -48,15 +60,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Crear tablas (con manejo de errores)
-try:
-    Base.metadata.create_all(bind=engine)
-except Exception as e:
-    print(f"Advertencia: No se pudieron crear las tablas automáticamente: {e}")
-    print("Asegúrate de que MySQL esté corriendo y que la base de datos exista.")
-
-# Servir archivos estáticos (imágenes)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Servir archivos estáticos (imágenes) con caché HTTP: URLs versionadas inmutables, ETag y 304
+app.mount("/uploads", CachedStaticFiles(directory="uploads"), name="uploads")
 
 # ========================
 # EXCEPTION HANDLERS
@@ -155,6 +160,21 @@ async def integrity_error_handler(request: Request, exc: IntegrityError):
         }
     )
 
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    """
+    Ninguna conexión libre en el pool de la ruta dentro de su pool_timeout (db/pools.py).
+    Solo afecta a ese pool: un pico de reportes no bloquea las ventas.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={
+            "detail": "Servicio ocupado",
+            "message": "Todas las conexiones a la base de datos para esta operación están en uso. Intente nuevamente en unos segundos."
+        },
+        headers={"Retry-After": "5"}
+    )
+
 # ========================
 # ROOT ROUTE
 # ========================
@@ -167,53 +187,144 @@ def root():
         "status": "running"
     }
 
+@app.get("/metrics/db-pools")
+def db_pool_metrics(current_user=Depends(get_current_user)):
+    """
+    Métricas de cada pool de conexiones (transactional, reporting, jobs): espera para obtener conexión
+    (promedio, p50, p95, máximo), checkouts, esperas vencidas (timeouts), peticiones esperando y
+    saturación (conexiones en uso / pool_size + max_overflow)
+    """
+    return pools_snapshot()
+
+
+@app.get("/metrics/admission")
+async def admission_metrics(current_user=Depends(get_current_user)):
+    """
+    Métricas del control de admisión por clase (checkout, lookups, dashboards, exports): peticiones en
+    curso y en cola, admitidas, rechazadas por cola llena (shed), vencidas en cola y espera p99
+    """
+    return admission_controller.snapshot()
+
+
+@app.get("/metrics/single-flight")
+def single_flight_metrics(current_user=Depends(get_current_user)):
+    """
+    Llamadas del tablero y de reportes coalescidas (utils.single_flight): llamadas, cálculos ejecutados
+    y llamadas que esperaron el resultado de otra (shared)
+    """
+    return flights.snapshot()
+
+
+@app.get("/metrics/http-cache")
+def http_cache_metrics(current_user=Depends(get_current_user)):
+    """
+    Caché de los listados de catálogo con ETag (utils.http_cache): respuestas 304, cuerpos servidos
+    desde memoria (hits), calculados (misses), bytes guardados y lecturas de table_versions
+    """
+    return {**http_cache.snapshot(), "version_refreshes": table_versions.refreshes}
+
+
+@app.get("/metrics/barcode-index")
+def barcode_index_metrics(current_user=Depends(get_current_user)):
+    """Índice de códigos de barras en memoria (crud/barcodes.py): códigos, productos y recargas"""
+    return barcode_index.snapshot()
+
 # ========================
 # AUTH
 # ========================
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+def _token_response(user, tokens: dict):
+    role = tokens.pop("role")
+    return {
+        **tokens,
+        "user": {
+            "id": user.id,
+            "username": user.username,
+            "role": role,
+            "role_id": user.role_id
+        }
+    }
 
 # ========================
 # LOGIN ROUTE
 # ========================
 @app.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    from crud import users
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    """
+    La ruta es async: la consulta a la BD va al threadpool y bcrypt al pool dedicado de utils.login,
+    así una ráfaga de logins no deja sin hilos al resto de la API.
+    """
     from db.models import User
     from sqlalchemy.orm import joinedload
 
-    user = db.query(User).options(joinedload(User.role)).filter(
-        User.username == form_data.username
-    ).first()
+    client_ip = request.client.host if request.client else None
+    retry_after = login_throttle.retry_after(form_data.username, client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos fallidos. Intente nuevamente más tarde.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    def load_user():
+        user = db.query(User).options(joinedload(User.role)).filter(
+            User.username == form_data.username
+        ).first()
+        # Devolver la conexión al pool antes de bcrypt: los atributos ya cargados siguen disponibles
+        db.close()
+        return user
+
+    user = await run_in_threadpool(load_user)
     
-    if not user or not verify_password(form_data.password, user.password):
+    try:
+        valid = await check_password(form_data.password, user.password if user else None)
+    except LoginBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio de inicio de sesión ocupado. Intente nuevamente en unos segundos.",
+            headers={"Retry-After": "1"}
+        )
+    if not valid:
+        login_throttle.failure(form_data.username, client_ip)
         raise HTTPException(status_code=400, detail="Incorrect username or password")
+    login_throttle.success(form_data.username)
 
-    # Obtener nombre del rol
-    role_name = user.role.name if user.role else None
-    
-    # Convertir user.id a string porque JWT requiere que 'sub' sea string
-    # Incluir rol en el token para verificación rápida
-    access_token = create_access_token(data={
-        "sub": str(user.id),
-        "role": role_name,
-        "role_id": user.role_id
-    })
+    # Token de acceso corto (con rol y versión de permisos) + token de refresco rotativo
+    tokens = await run_in_threadpool(issue_tokens, db, user)
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "role": role_name,
-            "role_id": user.role_id
-        }
-    }
+    # Regenerar el hash si cambió el costo de bcrypt (BCRYPT_ROUNDS)
+    new_hash = await rehash_if_needed(form_data.password, user.password)
+    if new_hash:
+        def save_hash():
+            db.query(User).filter(User.id == user.id).update({User.password: new_hash}, synchronize_session=False)
+            db.commit()
+        await run_in_threadpool(save_hash)
+
+    return _token_response(user, tokens)
+
+
+@app.post("/token/refresh")
+def refresh_token(data: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """
+    Cambia el token de refresco por un par nuevo (sin bcrypt). El token usado deja de servir;
+    si se vuelve a presentar, se cierra toda la sesión.
+    """
+    try:
+        user, tokens = rotate_refresh_token(db, data.refresh_token)
+    except TokenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return _token_response(user, tokens)
+
+
+@app.post("/token/revoke")
+def revoke_token(data: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Cierra la sesión: el token de refresco y los que se obtuvieron con él dejan de servir"""
+    revoke_refresh_token(db, data.refresh_token)
+    return {"message": "Sesión cerrada"}
 
 # ========================
 # INCLUDE ROUTERS
@@ -230,3 +341,5 @@ app.include_router(routerAlert)
 app.include_router(routerReport)
 app.include_router(routerDashboard)
 app.include_router(routerInvoice)
+app.include_router(routerAnalytics)
+app.include_router(routerSync)
@@ -0,0 +1,68 @@
+"""
+Esquema de la base de datos (paso explícito de despliegue; main.py ya no crea tablas al importarse)
+- create: crea las tablas que faltan (no modifica las existentes) e inicializa financial_totals
+  desde las ventas y compras si aún no tiene la fila global
+- check: lista las tablas de los modelos que no existen en la base de datos, sin modificar nada
+Ejecutar: python manage_db.py [create|check]
+"""
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from sqlalchemy import inspect
+from db.database import Base, engine, SessionLocal
+from crud.finance import get_financial_totals, rebuild_financial_totals
+from utils.startup import create_schema
+import db.models  # Registra todos los modelos en Base.metadata
+
+
+def missing_tables():
+    existing = set(inspect(engine).get_table_names())
+    return [name for name in Base.metadata.tables if name not in existing]
+
+
+def initialize_financial_totals() -> bool:
+    """Carga financial_totals si todavía no tiene la fila global; True si se inicializó ahora"""
+    db = SessionLocal()
+    try:
+        if get_financial_totals(db) is not None:
+            return False
+        rebuild_financial_totals(db)
+        return True
+    finally:
+        db.close()
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    if command not in ("create", "check"):
+        print(__doc__)
+        return False
+
+    try:
+        missing = missing_tables()
+        if command == "check":
+            if not missing:
+                print(f"✓ Las {len(Base.metadata.tables)} tablas existen")
+                return True
+            print(f"⚠ Faltan {len(missing)} tablas: {', '.join(missing)}")
+            print("  Crear con: python manage_db.py create")
+            return False
+
+        create_schema()
+        if missing:
+            print(f"✓ Tablas creadas: {', '.join(missing)}")
+        else:
+            print("✓ El esquema ya estaba completo")
+        if initialize_financial_totals():
+            print("✓ financial_totals inicializada desde las ventas y compras")
+        return True
+    except Exception as e:
+        print(f"❌ ERROR: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,58 @@
+"""
+Mantenimiento de las ventas diarias por producto (product_daily_sales)
+- verify: recalcula unidades, ingresos y líneas desde los detalles de venta y muestra las diferencias,
+  sin modificar nada
+- rebuild: recalcula y corrige las filas con diferencias. Paso obligatorio del despliegue para cargar
+  el historial (con la API detenida): las ventas solo suman sus propias líneas
+Ejecutar: python product_daily_sales.py [verify|rebuild]
+"""
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from db.database import SessionLocal, Base, engine
+from crud.product_sales import rebuild_product_daily_sales
+
+# Diferencias que se muestran en detalle
+SHOW_DIFFERENCES = 20
+
+
+def print_differences(differences):
+    if not differences:
+        print("✓ product_daily_sales coincide con los detalles de venta registrados")
+        return
+    print(f"⚠ {len(differences)} diferencias:")
+    for d in differences[:SHOW_DIFFERENCES]:
+        print(f"  producto {d['product_id']} {d['day']} {d['field']}: guardado={d['stored']} esperado={d['expected']}")
+    if len(differences) > SHOW_DIFFERENCES:
+        print(f"  ... y {len(differences) - SHOW_DIFFERENCES} más")
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command not in ("verify", "rebuild"):
+        print(__doc__)
+        return False
+
+    # Crear la tabla si aún no existe
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        differences = rebuild_product_daily_sales(db, dry_run=command == "verify")
+        print_differences(differences)
+        if command == "rebuild" and differences:
+            print("✓ product_daily_sales recalculada")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"❌ ERROR: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
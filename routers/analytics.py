@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from db.database import get_report_db
+from utils.auth import get_current_user_optional
+from db.models import User
+
+routerAnalytics = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+
+def require_user(current_user: Optional[User]):
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Se requiere autenticación para ver analítica"
+        )
+
+
+@routerAnalytics.get("/sales-series")
+def sales_series(
+    start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
+    end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
+    period: str = Query("day", description="Agrupación: day, week o month"),
+    window: int = Query(7, ge=1, le=365, description="Períodos de la media móvil"),
+    db: Session = Depends(get_report_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """
+    Serie de ventas por día, semana (desde el lunes) o mes, con conteo, total y media móvil.
+    Los períodos sin ventas se incluyen con total 0.
+    """
+    require_user(current_user)
+    # NumPy se importa con el primer uso (crud.analytics)
+    from crud.analytics import get_sales_series
+    
+    try:
+        return get_sales_series(db, start_date=start_date, end_date=end_date, period=period, window=window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular la serie de ventas: {str(e)}")
+
+
+@routerAnalytics.get("/product-revenue")
+def product_revenue(
+    start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
+    end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
+    limit: int = Query(20, ge=1, le=500, description="Número de productos"),
+    db: Session = Depends(get_report_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Ingresos, unidades, número de ventas y participación por producto"""
+    require_user(current_user)
+    from crud.analytics import get_product_revenue
+    
+    try:
+        return get_product_revenue(db, start_date=start_date, end_date=end_date, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular ingresos por producto: {str(e)}")
+
+
+@routerAnalytics.get("/basket-size")
+def basket_size(
+    start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
+    end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
+    max_size: int = Query(20, ge=1, le=200, description="Tamaño a partir del cual se agrupan las canastas"),
+    db: Session = Depends(get_report_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Distribución de unidades y líneas por venta (media, percentiles e histograma) y del monto por venta"""
+    require_user(current_user)
+    from crud.analytics import get_basket_distribution
+    
+    try:
+        return get_basket_distribution(db, start_date=start_date, end_date=end_date, max_size=max_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular la distribución de canastas: {str(e)}")
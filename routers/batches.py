@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from db.database import get_db
 from db.schemas import MedicineBatchCreate, MedicineBatchUpdate, MedicineBatchResponse
+from utils.http_cache import versioned_json_response
 from crud.batches import (
     create_batch,
     get_batches,
@@ -20,14 +21,18 @@ def create(data: MedicineBatchCreate, db: Session = Depends(get_db)):
 
 @routerBatch.get("/all", response_model=list[MedicineBatchResponse])
 def list_all(
+    request: Request,
     product_id: int = None,
     stock_min: int = None,
     db: Session = Depends(get_db)
 ):
-    """Listar lotes con filtros opcionales y información del producto"""
-    batches = get_batches(db, product_id=product_id, stock_min=stock_min)
-    # Convertir diccionarios a objetos MedicineBatchResponse
-    return [MedicineBatchResponse(**batch) for batch in batches]
+    """Listar lotes con filtros opcionales e información del producto (ETag: If-None-Match -> 304)"""
+    # Los diccionarios ya tienen los campos de MedicineBatchResponse: se serializan una sola vez
+    return versioned_json_response(
+        request, db, "batches.all", {"product_id": product_id, "stock_min": stock_min},
+        ("medicine_batches", "products"),
+        lambda: get_batches(db, product_id=product_id, stock_min=stock_min)
+    )
 
 
 @routerBatch.get("/", response_model=MedicineBatchResponse)
@@ -52,10 +57,3 @@ def delete(batch_id: int, db: Session = Depends(get_db)):
     if not deleted:
         raise HTTPException(404, "Batch not found")
     return {"message": "Batch deleted successfully"}
-
-@routerBatch.delete("/")
-def delete(batch_id: int, db: Session = Depends(get_db)):
-    deleted = delete_batch(db, batch_id)
-    if not deleted:
-        raise HTTPException(404, "Batch not found")
-    return {"message": "Batch deleted successfully"}
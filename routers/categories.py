@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from db.database import get_db
 from db.schemas import CategoryCreate, CategoryUpdate, CategoryResponse
+from utils.http_cache import versioned_json_response
 from crud.categories import (
     create_category,
     get_categories,
@@ -19,9 +20,13 @@ def create(data: CategoryCreate, db: Session = Depends(get_db)):
 
 
 @routerCategory.get("/all", response_model=list[CategoryResponse])
-def list_all(db: Session = Depends(get_db)):
+def list_all(request: Request, db: Session = Depends(get_db)):
+    """Listar categorías (ETag por versión de la tabla: If-None-Match -> 304)"""
     try:
-        return get_categories(db)
+        return versioned_json_response(
+            request, db, "categories.all", {}, ("categories",),
+            lambda: [CategoryResponse.model_validate(c).model_dump() for c in get_categories(db)]
+        )
     except Exception as e:
         from sqlalchemy.exc import OperationalError
         if isinstance(e, OperationalError) or "Can't connect" in str(e) or "Lost connection" in str(e):
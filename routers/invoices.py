@@ -8,7 +8,6 @@ from typing import Optional
 from db.database import get_db
 from crud.sales import get_sale
 from utils.auth import get_current_user_optional
-from utils.invoice_generator import generate_invoice_pdf
 from db.models import User, Client
 
 routerInvoice = APIRouter(prefix="/invoices", tags=["Invoices"])
@@ -78,7 +77,8 @@ def get_invoice_pdf(
             "logo_path": None
         }
         
-        # Generar PDF
+        # Generar PDF (ReportLab se importa con la primera factura)
+        from utils.invoice_generator import generate_invoice_pdf
         pdf_bytes = generate_invoice_pdf(invoice_data, pharmacy_info)
         
         filename = f"factura_FAC-{sale.id:04d}.pdf"
@@ -1,5 +1,6 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
 from sqlalchemy.orm import Session
 from db.database import get_db
 from crud.products import (
@@ -8,11 +9,17 @@ from crud.products import (
 )
 from utils.auth import get_current_user
 from utils.permissions import check_permission
+from utils.images import save_upload, build_image_url, build_thumbnail_url
+from utils.http_cache import versioned_json_response
+from crud.stock import get_stock_at, get_stock_movements
+from crud.barcodes import scan_product, import_barcodes, get_product_barcodes, delete_barcode
+from utils.serialization import FastJSONResponse
 from db.models import User, Product
 import shutil
 import uuid
-import os
-import time
+import csv
+import io
+import json
 
 from db.schemas import ProductCreate, ProductResponse, ProductUpdate, ProductStockUpdate, ProductPriceUpdate
 
@@ -25,6 +32,7 @@ routerProduct = APIRouter(prefix="/products", tags=["Products"])
 
 @routerProduct.get("/all", response_model=list[ProductResponse])
 def list_all(
+    request: Request,
     search: Optional[str] = None,
     category_id: Optional[int] = None,
     status: Optional[int] = None,
@@ -41,11 +49,17 @@ def list_all(
     Retorna productos con:
     - total_stock: Stock total de todos los lotes activos
     - sale_price: Precio de venta del lote más reciente
+
+    ETag por versión de products, product_stock y medicine_batches: con If-None-Match vigente
+    responde 304 sin consultar la BD
     """
     try:
-        products = get_products(db, search=search, category_id=category_id, status=status)
-        # Convertir diccionarios a ProductResponse
-        return [ProductResponse(**p) for p in products]
+        # Los diccionarios ya tienen los campos de ProductResponse: se serializan una sola vez
+        return versioned_json_response(
+            request, db, "products.all", {"search": search, "category_id": category_id, "status": status},
+            ("products", "product_stock", "medicine_batches"),
+            lambda: get_products(db, search=search, category_id=category_id, status=status)
+        )
     except Exception as e:
         from sqlalchemy.exc import OperationalError
         if isinstance(e, OperationalError) or "Can't connect" in str(e) or "Lost connection" in str(e):
@@ -56,6 +70,81 @@ def list_all(
         raise HTTPException(status_code=500, detail=f"Error al obtener productos: {str(e)}")
 
 
+@routerProduct.get("/scan/{code}")
+def scan(code: str, db: Session = Depends(get_db)):
+    """
+    Producto de un código de barras escaneado con sus lotes vendibles (activos, con stock y sin
+    vencer, en orden FEFO). Se responde desde el índice en memoria (crud/barcodes.py), sin consultar la BD.
+    """
+    try:
+        product = scan_product(db, code)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if product is None:
+        raise HTTPException(404, "Código de barras no registrado")
+    return FastJSONResponse(product)
+
+
+def parse_barcode_file(filename: str, content: bytes):
+    """Lee un archivo de códigos en CSV (columnas product_id, code) o JSON (arreglo de objetos)"""
+    text = content.decode('utf-8-sig')
+    if filename.lower().endswith('.json') or text.lstrip().startswith('['):
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError("El archivo JSON debe contener un arreglo de códigos")
+        return rows
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+@routerProduct.post("/barcodes/import")
+def import_barcode_file(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Importación masiva de códigos de barras (CSV o JSON con product_id y code).
+    Un producto puede tener varios códigos; los GTIN se validan con su dígito verificador.
+    Retorna un resultado por fila (created, existing o error). Requiere permiso 'products.edit'.
+    """
+    check_permission(db, current_user, "products.edit")
+    try:
+        rows = parse_barcode_file(file.filename or "", file.file.read())
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Error al leer el archivo: {str(e)}")
+    if not rows:
+        raise HTTPException(status_code=400, detail="El archivo no contiene códigos")
+    try:
+        return import_barcodes(db, rows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@routerProduct.delete("/barcodes/{code}")
+def delete_barcode_code(
+    code: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Quitar un código de barras de su producto. Requiere permiso 'products.edit'."""
+    check_permission(db, current_user, "products.edit")
+    try:
+        deleted = delete_barcode(db, code)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not deleted:
+        raise HTTPException(404, "Código de barras no registrado")
+    return {"message": "Código de barras eliminado"}
+
+
+@routerProduct.get("/{product_id}/barcodes")
+def list_barcodes(product_id: int, db: Session = Depends(get_db)):
+    """Códigos de barras de un producto (normalizados)"""
+    if not get_product(db, product_id):
+        raise HTTPException(404, "Product not found")
+    return {"product_id": product_id, "codes": get_product_barcodes(db, product_id)}
+
+
 @routerProduct.get("/", response_model=ProductResponse)
 def get(product_id: int, db: Session = Depends(get_db)):
     from sqlalchemy.orm import joinedload
@@ -74,17 +163,6 @@ def get(product_id: int, db: Session = Depends(get_db)):
             latest_batch = max(batches_with_price, key=lambda b: b.id)
             sale_price = float(latest_batch.sale_price)
     
-    # Construir URL completa de la imagen
-    image_url = None
-    if product.image:
-        import os
-        if product.image.startswith('http://') or product.image.startswith('https://'):
-            image_url = product.image
-        else:
-            base_url = os.getenv('API_BASE_URL', 'http://127.0.0.1:8000')
-            image_path = product.image.lstrip('/')
-            image_url = f"{base_url}/{image_path}"
-    
     return ProductResponse(
         id=product.id,
         name=product.name,
@@ -93,7 +171,8 @@ def get(product_id: int, db: Session = Depends(get_db)):
         presentation=product.presentation,
         concentration=product.concentration,
         image=product.image,
-        image_url=image_url,
+        image_url=build_image_url(product.image),
+        thumbnail_url=build_thumbnail_url(product.image),
         status=product.status,
         total_stock=total_stock,
         sale_price=sale_price
@@ -123,18 +202,11 @@ def update(
     image_path = existing.image
 
     if image:
-        folder = "uploads/products"
-        os.makedirs(folder, exist_ok=True)
-
-        extension = image.filename.split(".")[-1]
-        filename = f"{int(time.time())}.{extension}"
-
-        filepath = os.path.join(folder, filename)
-
-        with open(filepath, "wb") as f:
-            f.write(image.file.read())
-
-        image_path = filepath
+        # Se guarda por bloques con nombre = hash del contenido (miniaturas en segundo plano)
+        try:
+            image_path = save_upload(image)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     data = ProductUpdate(
         name=name,
@@ -180,7 +252,7 @@ def update_stock(
     check_permission(db, current_user, "products.stock")
     
     try:
-        update_product_stock(db, product_id, data.stock)
+        update_product_stock(db, product_id, data.stock, current_user.id)
         
         # Obtener el producto actualizado con stock y precio
         from sqlalchemy.orm import joinedload
@@ -198,16 +270,6 @@ def update_stock(
                 latest_batch = max(batches_with_price, key=lambda b: b.id)
                 sale_price = float(latest_batch.sale_price)
         
-        # Construir URL completa de la imagen
-        image_url = None
-        if product.image:
-            if product.image.startswith('http://') or product.image.startswith('https://'):
-                image_url = product.image
-            else:
-                base_url = os.getenv('API_BASE_URL', 'http://127.0.0.1:8000')
-                image_path = product.image.lstrip('/')
-                image_url = f"{base_url}/{image_path}"
-        
         return ProductResponse(
             id=product.id,
             name=product.name,
@@ -216,7 +278,8 @@ def update_stock(
             presentation=product.presentation,
             concentration=product.concentration,
             image=product.image,
-            image_url=image_url,
+            image_url=build_image_url(product.image),
+            thumbnail_url=build_thumbnail_url(product.image),
             status=product.status,
             total_stock=total_stock,
             sale_price=sale_price
@@ -260,16 +323,6 @@ def update_price(
                 latest_batch = max(batches_with_price, key=lambda b: b.id)
                 sale_price = float(latest_batch.sale_price)
         
-        # Construir URL completa de la imagen
-        image_url = None
-        if product.image:
-            if product.image.startswith('http://') or product.image.startswith('https://'):
-                image_url = product.image
-            else:
-                base_url = os.getenv('API_BASE_URL', 'http://127.0.0.1:8000')
-                image_path = product.image.lstrip('/')
-                image_url = f"{base_url}/{image_path}"
-        
         return ProductResponse(
             id=product.id,
             name=product.name,
@@ -278,7 +331,8 @@ def update_price(
             presentation=product.presentation,
             concentration=product.concentration,
             image=product.image,
-            image_url=image_url,
+            image_url=build_image_url(product.image),
+            thumbnail_url=build_thumbnail_url(product.image),
             status=product.status,
             total_stock=total_stock,
             sale_price=sale_price
@@ -287,3 +341,45 @@ def update_price(
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar precio: {str(e)}")
+
+
+@routerProduct.get("/{product_id}/stock/history")
+def stock_history(
+    product_id: int,
+    at: Optional[datetime] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Auditoría de stock de un producto desde el libro de movimientos.
+    - at: stock vendible a esa fecha (último checkpoint + movimientos posteriores); por defecto, ahora
+    - start_date / end_date: rango de movimientos a listar
+    Requiere permiso 'stock.view'.
+    """
+    check_permission(db, current_user, "stock.view")
+    
+    if not get_product(db, product_id):
+        raise HTTPException(404, "Product not found")
+    
+    at = at or datetime.now()
+    movements = get_stock_movements(db, product_id, start_date=start_date, end_date=end_date)
+    return {
+        "product_id": product_id,
+        "at": at,
+        "stock": get_stock_at(db, product_id, at),
+        "movements": [
+            {
+                "id": m.id,
+                "batch_id": m.batch_id,
+                "quantity": m.quantity,
+                "movement_type": m.movement_type,
+                "reference_type": m.reference_type,
+                "reference_id": m.reference_id,
+                "user_id": m.user_id,
+                "created_at": m.created_at
+            }
+            for m in movements
+        ]
+    }
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, Form, File, UploadFile, Header
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import Optional, Dict, Any, List
@@ -7,57 +9,41 @@ from db.schemas import PurchaseCreate, PurchaseResponse, PurchaseDetailCreate
 from crud.purchases import create_purchase, get_purchases, get_purchase
 from utils.auth import get_current_user, get_current_user_optional
 from db.models import User, Purchase, PurchaseDetail
+from utils.images import save_upload, save_base64_image
+from utils.serialization import FastJSONResponse
+from utils.idempotency import (
+    hash_request,
+    begin_idempotent_request,
+    complete_idempotent_request,
+    store_idempotent_response,
+    finish_idempotent_request,
+    release_idempotent_request
+)
 import json
-import base64
-import os
-import uuid
+import csv
+import binascii
+import io
 import shutil
 
 routerPurchase = APIRouter(prefix="/purchases", tags=["Purchases"])
 
 
-def save_image_from_base64(base64_string: str, upload_dir: str = "uploads/products") -> Optional[str]:
+def save_image_from_base64(base64_string: str) -> Optional[str]:
     """
-    Guarda una imagen desde base64 a un archivo
-    Retorna la ruta del archivo guardado
+    Guarda una imagen desde base64 a un archivo (compatibilidad con clientes anteriores)
+    Retorna la ruta del archivo guardado. Preferir enviar la imagen como archivo multipart.
     """
     if not base64_string:
         return None
     
     try:
-        # Detectar si es base64 con prefijo (data:image/png;base64,...)
-        if ',' in base64_string:
-            header, data = base64_string.split(',', 1)
-            # Extraer extensión del header
-            if 'png' in header:
-                extension = 'png'
-            elif 'jpeg' in header or 'jpg' in header:
-                extension = 'jpg'
-            elif 'gif' in header:
-                extension = 'gif'
-            elif 'webp' in header:
-                extension = 'webp'
-            else:
-                extension = 'jpg'
-        else:
-            data = base64_string
-            extension = 'jpg'
-        
-        # Decodificar base64
-        image_data = base64.b64decode(data)
-        
-        # Crear directorio si no existe
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generar nombre de archivo único
-        safe_filename = f"{uuid.uuid4()}.{extension}"
-        file_path = os.path.join(upload_dir, safe_filename)
-        
-        # Guardar archivo
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        
-        return file_path
+        return save_base64_image(base64_string)
+    except binascii.Error as e:
+        print(f"Error al guardar imagen base64: {e}")
+        return None
+    except ValueError:
+        # Imagen más grande que el límite: se rechaza la compra como con las subidas multipart
+        raise
     except Exception as e:
         print(f"Error al guardar imagen base64: {e}")
         return None
@@ -66,7 +52,8 @@ def save_image_from_base64(base64_string: str, upload_dir: str = "uploads/produc
 def enrich_purchase_response(purchase: Purchase) -> Dict[str, Any]:
     """
     Enriquece la respuesta de la compra con información relacionada
-    de proveedor, usuario, productos y lotes
+    de proveedor, usuario, productos y lotes.
+    Montos y fechas quedan como Decimal/date: los convierte el serializador JSON.
     """
     # Información del proveedor
     supplier_name = None
@@ -89,8 +76,8 @@ def enrich_purchase_response(purchase: Purchase) -> Dict[str, Any]:
             "id": detail.id,
             "batch_id": detail.batch_id,
             "quantity": detail.quantity,
-            "unit_price": float(detail.unit_price),
-            "subtotal": float(detail.subtotal),
+            "unit_price": detail.unit_price,
+            "subtotal": detail.subtotal,
             "batch_expiration_date": None,
             "batch_stock": None,
             "batch_purchase_price": None,
@@ -102,10 +89,10 @@ def enrich_purchase_response(purchase: Purchase) -> Dict[str, Any]:
         }
         
         if detail.batch:
-            detail_dict["batch_expiration_date"] = detail.batch.expiration_date.isoformat() if detail.batch.expiration_date else None
+            detail_dict["batch_expiration_date"] = detail.batch.expiration_date
             detail_dict["batch_stock"] = detail.batch.stock
-            detail_dict["batch_purchase_price"] = float(detail.batch.purchase_price) if detail.batch.purchase_price else None
-            detail_dict["batch_sale_price"] = float(detail.batch.sale_price) if detail.batch.sale_price else None
+            detail_dict["batch_purchase_price"] = detail.batch.purchase_price or None
+            detail_dict["batch_sale_price"] = detail.batch.sale_price or None
             
             if detail.batch.product:
                 detail_dict["product_name"] = detail.batch.product.name
@@ -119,9 +106,9 @@ def enrich_purchase_response(purchase: Purchase) -> Dict[str, Any]:
         "id": purchase.id,
         "user_id": purchase.user_id,
         "supplier_id": purchase.supplier_id,
-        "purchase_date": purchase.purchase_date.isoformat() if purchase.purchase_date else None,
+        "purchase_date": purchase.purchase_date,
         "payment_method": purchase.payment_method,
-        "total": float(purchase.total),
+        "total": purchase.total,
         "details": enriched_details,
         "supplier_name": supplier_name,
         "supplier_email": supplier_email,
@@ -130,14 +117,60 @@ def enrich_purchase_response(purchase: Purchase) -> Dict[str, Any]:
     }
 
 
+def parse_expiration_date(value: Any):
+    """Fecha de vencimiento en formato ISO ('2026-01-31' o con hora); otro tipo de valor es una línea inválida"""
+    if not isinstance(value, str):
+        raise ValueError(f"expiration_date debe ser una fecha en texto (AAAA-MM-DD), se recibió {value!r}")
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).date()
+
+
+def build_purchase_detail(detail: Dict[str, Any], image_path: Optional[str] = None) -> PurchaseDetailCreate:
+    """
+    Convierte una línea recibida (JSON del formulario o fila de CSV/JSON importado) en PurchaseDetailCreate.
+    Los valores vacíos se toman como no enviados; si falta el subtotal se calcula.
+    """
+    return PurchaseDetailCreate(
+        batch_id=int(detail['batch_id']) if detail.get('batch_id') else None,
+        product_name=detail.get('product_name') or None,
+        product_description=detail.get('product_description') or None,
+        category_id=int(detail['category_id']) if detail.get('category_id') else None,
+        presentation=detail.get('presentation') or None,
+        concentration=detail.get('concentration') or None,
+        product_image=image_path,  # Ruta del archivo guardado
+        expiration_date=parse_expiration_date(detail['expiration_date']) if detail.get('expiration_date') else None,
+        purchase_price=float(detail.get('purchase_price', 0)) if detail.get('purchase_price') else None,
+        sale_price=float(detail.get('sale_price', 0)) if detail.get('sale_price') else None,
+        unit_price=float(detail['unit_price']),
+        quantity=int(detail['quantity']),
+        subtotal=float(detail['subtotal']) if detail.get('subtotal') else float(detail['unit_price']) * int(detail['quantity'])
+    )
+
+
+def parse_receiving_file(filename: str, content: bytes) -> List[Dict[str, Any]]:
+    """
+    Lee una nota de entrega del proveedor en CSV (con encabezados) o JSON (arreglo de líneas).
+    Columnas: product_name, product_description, category_id, presentation, concentration,
+    expiration_date, purchase_price, sale_price, unit_price, quantity, subtotal (opcional), batch_id (opcional)
+    """
+    text = content.decode('utf-8-sig')
+    if filename.lower().endswith('.json') or text.lstrip().startswith('['):
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError("El archivo JSON debe contener un arreglo de líneas")
+        return rows
+    return list(csv.DictReader(io.StringIO(text)))
+
+
 @routerPurchase.post("/")
 def create(
     supplier_id: int = Form(...),
     payment_method: str = Form(...),
     purchase_date: Optional[datetime] = Form(None),
     details_json: str = Form(...),  # JSON string con los detalles
+    images: List[UploadFile] = File(None),  # Imágenes de productos como archivos multipart
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """
     RF18-RF19: Registrar compras a proveedores y aumentar stock automáticamente
@@ -149,9 +182,13 @@ def create(
     NUEVO: Permite crear productos nuevos durante la compra con imagen.
     En los detalles (JSON), proporciona:
     - product_name, category_id, presentation, concentration (para crear producto nuevo)
-    - product_image (base64 string opcional) - Imagen del producto
+    - product_image_index (opcional) - Posición de la imagen del producto en la lista 'images'
+    - product_image (base64 string opcional) - Imagen del producto (formato anterior, más pesado)
     - expiration_date, purchase_price, sale_price (para crear lote nuevo)
     - unit_price, quantity, subtotal
+    
+    Con la cabecera Idempotency-Key, un reintento con la misma clave devuelve la compra
+    original sin volver a sumar stock ni guardar las imágenes otra vez.
     """
     if current_user is None:
         raise HTTPException(
@@ -159,36 +196,43 @@ def create(
             detail="Se requiere autenticación para registrar compras"
         )
     
+    endpoint = "POST /purchases/"
+    if idempotency_key:
+        request_hash = hash_request(current_user.id, {
+            "supplier_id": supplier_id,
+            "payment_method": payment_method,
+            "purchase_date": purchase_date,
+            "details_json": details_json,
+            "images": [image.filename for image in images or []]
+        })
+        replay = begin_idempotent_request(db, endpoint, idempotency_key, request_hash, current_user.id)
+        if replay is not None:
+            status_code, body = replay
+            return JSONResponse(status_code=status_code, content=body, headers={"Idempotent-Replayed": "true"})
+    
     try:
         # Parsear detalles desde JSON
         details_data = json.loads(details_json)
         
+        # Guardar las imágenes multipart por bloques (la misma foto se guarda una sola vez)
+        image_paths = [save_upload(image) for image in images or []]
+        
         # Procesar imágenes de los detalles
         processed_details = []
         for detail in details_data:
             image_path = None
             
+            image_index = detail.get('product_image_index')
+            if image_index is not None:
+                if not 0 <= int(image_index) < len(image_paths):
+                    raise ValueError(f"product_image_index {image_index} no corresponde a ninguna imagen enviada")
+                image_path = image_paths[int(image_index)]
             # Si hay imagen en base64, guardarla
-            if detail.get('product_image'):
+            elif detail.get('product_image'):
                 image_path = save_image_from_base64(detail['product_image'])
             
             # Crear PurchaseDetailCreate
-            detail_obj = PurchaseDetailCreate(
-                batch_id=detail.get('batch_id'),
-                product_name=detail.get('product_name'),
-                product_description=detail.get('product_description'),
-                category_id=detail.get('category_id'),
-                presentation=detail.get('presentation'),
-                concentration=detail.get('concentration'),
-                product_image=image_path,  # Ruta del archivo guardado
-                expiration_date=datetime.fromisoformat(detail['expiration_date'].replace('Z', '+00:00')).date() if detail.get('expiration_date') else None,
-                purchase_price=float(detail.get('purchase_price', 0)) if detail.get('purchase_price') else None,
-                sale_price=float(detail.get('sale_price', 0)) if detail.get('sale_price') else None,
-                unit_price=float(detail['unit_price']),
-                quantity=int(detail['quantity']),
-                subtotal=float(detail['subtotal'])
-            )
-            processed_details.append(detail_obj)
+            processed_details.append(build_purchase_detail(detail, image_path))
         
         # Crear PurchaseCreate
         purchase_data = PurchaseCreate(
@@ -198,16 +242,80 @@ def create(
             details=processed_details
         )
         
-        purchase = create_purchase(db, purchase_data, current_user.id)
-        return enrich_purchase_response(purchase)
+        # La respuesta idempotente se guarda en la misma transacción que la compra
+        before_commit = None
+        if idempotency_key:
+            before_commit = lambda created: store_idempotent_response(
+                db, endpoint, idempotency_key, 200, enrich_purchase_response(created)
+            )
+        purchase = create_purchase(db, purchase_data, current_user.id, before_commit)
+        purchase_response = enrich_purchase_response(purchase)
+        if idempotency_key:
+            finish_idempotent_request(endpoint, idempotency_key)
+        return purchase_response
     except ValueError as e:
+        if idempotency_key:
+            db.rollback()
+            complete_idempotent_request(db, endpoint, idempotency_key, 400, {"detail": str(e)})
         raise HTTPException(status_code=400, detail=str(e))
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=400, detail=f"Error al parsear JSON de detalles: {str(e)}")
     except Exception as e:
+        if idempotency_key:
+            release_idempotent_request(db, endpoint, idempotency_key)
         raise HTTPException(status_code=500, detail=f"Error al crear la compra: {str(e)}")
 
 
+@routerPurchase.post("/import")
+async def import_receiving(
+    supplier_id: int = Form(...),
+    payment_method: str = Form(...),
+    purchase_date: Optional[datetime] = Form(None),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recepción masiva: registra una compra completa desde la nota de entrega del proveedor (CSV o JSON).
+    Todas las líneas se validan antes de escribir y la compra se registra en una sola transacción
+    (productos y lotes nuevos con INSERT masivos). Si una línea es inválida no se registra nada.
+    """
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Se requiere autenticación para registrar compras"
+        )
+    
+    try:
+        rows = parse_receiving_file(file.filename or "", await file.read())
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Error al leer el archivo: {str(e)}")
+    if not rows:
+        raise HTTPException(status_code=400, detail="El archivo no contiene líneas")
+    
+    details = []
+    for line_number, row in enumerate(rows, 1):
+        try:
+            details.append(build_purchase_detail(row))
+        except (KeyError, ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Línea {line_number} inválida: {str(e)}")
+    
+    purchase_data = PurchaseCreate(
+        supplier_id=supplier_id,
+        payment_method=payment_method,
+        purchase_date=purchase_date or datetime.now(),
+        details=details
+    )
+    
+    try:
+        purchase = await run_in_threadpool(create_purchase, db, purchase_data, current_user.id)
+        return enrich_purchase_response(purchase)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al importar la compra: {str(e)}")
+
+
 @routerPurchase.get("/")
 def list_all(
     supplier_id: Optional[int] = None,
@@ -228,7 +336,7 @@ def list_all(
     
     try:
         purchases = get_purchases(db, supplier_id=supplier_id, user_id=user_id, start_date=start_date, end_date=end_date)
-        return [enrich_purchase_response(purchase) for purchase in purchases]
+        return FastJSONResponse([enrich_purchase_response(purchase) for purchase in purchases])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener compras: {str(e)}")
 
@@ -249,4 +357,4 @@ def get(purchase_id: int, db: Session = Depends(get_db), current_user: Optional[
     purchase = get_purchase(db, purchase_id)
     if not purchase:
         raise HTTPException(404, "Compra no encontrada")
-    return enrich_purchase_response(purchase)
+    return FastJSONResponse(enrich_purchase_response(purchase))
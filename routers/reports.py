@@ -1,22 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import Response
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import Optional
-from db.database import get_db
-from crud.reports import get_sales_report, get_top_products_report
+from db.database import get_report_db
+from crud.finance import get_financial_report
 from utils.auth import get_current_user_optional
-from utils.pdf_generator import generate_sales_report_pdf, generate_top_products_report_pdf
+from utils.permissions import permission_scope
+from utils.report_jobs import (
+    REPORT_TYPES, DONE, ERROR, ReportFile, report_params, get_report, submit_job, get_job
+)
 from db.models import User
+from db.schemas import ReportJobRequest
 
 routerReport = APIRouter(prefix="/reports", tags=["Reports"])
 
 
+def _file_response(report_file: ReportFile, filename: str, media_type: str = "application/pdf") -> FileResponse:
+    """Envía el archivo generado en disco por bloques (no se carga completo en memoria)"""
+    return FileResponse(
+        report_file.path,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-cache"
+        }
+    )
+
+
 @routerReport.get("/sales")
 def sales_report(
     start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
     end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -30,8 +46,11 @@ def sales_report(
         )
     
     try:
-        report = get_sales_report(db, start_date=start_date, end_date=end_date)
-        return report
+        return get_report(
+            db, "sales", report_params("sales", start_date, end_date), permission_scope(db, current_user)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al generar reporte de ventas: {str(e)}")
 
@@ -41,7 +60,7 @@ def top_products_report(
     start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
     end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
     limit: int = Query(10, description="Número de productos a retornar"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -55,18 +74,53 @@ def top_products_report(
         )
     
     try:
-        report = get_top_products_report(db, start_date=start_date, end_date=end_date, limit=limit)
-        return report
+        return get_report(
+            db, "top-products", report_params("top-products", start_date, end_date, limit),
+            permission_scope(db, current_user)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al generar reporte de productos más vendidos: {str(e)}")
 
 
+@routerReport.get("/financial")
+def financial_report(
+    start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
+    end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format, día incluido)"),
+    group_by: str = Query("day", description="Agrupar por 'day' o 'month'"),
+    db: Session = Depends(get_report_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """
+    Ingresos (ventas), gastos (compras) y resultado neto por día o por mes.
+    Se calcula desde los totales precalculados de financial_totals.
+    """
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Se requiere autenticación para ver reportes"
+        )
+    
+    try:
+        return get_financial_report(
+            db,
+            start_date=start_date.date() if start_date else None,
+            end_date=end_date.date() if end_date else None,
+            group_by=group_by
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al generar reporte financiero: {str(e)}")
+
+
 @routerReport.get("/sales/export")
 def export_sales_report_pdf(
     start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
     end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
     format: str = Query("pdf", description="Formato de exportación: 'pdf'"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -80,35 +134,20 @@ def export_sales_report_pdf(
         )
     
     try:
-        report = get_sales_report(db, start_date=start_date, end_date=end_date)
-        
         if format.lower() == "pdf":
-            # Generar PDF real usando reportlab
-            pdf_bytes = generate_sales_report_pdf(report)
-            
-            # Verificar que el PDF sea válido
-            if not pdf_bytes or len(pdf_bytes) == 0:
-                raise HTTPException(status_code=500, detail="Error al generar PDF: archivo vacío")
-            
-            if not pdf_bytes.startswith(b'%PDF'):
-                raise HTTPException(status_code=500, detail="Error al generar PDF: formato inválido")
-            
-            filename = f"reporte_ventas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            
-            return Response(
-                content=pdf_bytes,
-                media_type="application/pdf",
-                headers={
-                    "Content-Type": "application/pdf",
-                    "Content-Disposition": f'attachment; filename="{filename}"',
-                    "Cache-Control": "no-cache"
-                }
+            # PDF completo desde la caché de reportes (se genera en disco y se valida al generarlo)
+            report_file = get_report(
+                db, "sales-pdf", report_params("sales-pdf", start_date, end_date), permission_scope(db, current_user)
             )
+            filename = f"reporte_ventas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            return _file_response(report_file, filename)
         else:
             raise HTTPException(status_code=400, detail="Formato no soportado. Use 'pdf'")
             
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al exportar reporte: {str(e)}")
 
@@ -119,7 +158,7 @@ def export_top_products_report_pdf(
     end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
     limit: int = Query(10, description="Número de productos a retornar"),
     format: str = Query("pdf", description="Formato de exportación: 'pdf'"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -133,201 +172,154 @@ def export_top_products_report_pdf(
         )
     
     try:
-        report = get_top_products_report(db, start_date=start_date, end_date=end_date, limit=limit)
-        
         if format.lower() == "pdf":
-            # Generar PDF real usando reportlab
-            pdf_bytes = generate_top_products_report_pdf(report)
-            
-            # Verificar que el PDF sea válido
-            if not pdf_bytes or len(pdf_bytes) == 0:
-                raise HTTPException(status_code=500, detail="Error al generar PDF: archivo vacío")
-            
-            if not pdf_bytes.startswith(b'%PDF'):
-                raise HTTPException(status_code=500, detail="Error al generar PDF: formato inválido")
-            
-            filename = f"reporte_productos_mas_vendidos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            
-            return Response(
-                content=pdf_bytes,
-                media_type="application/pdf",
-                headers={
-                    "Content-Type": "application/pdf",
-                    "Content-Disposition": f'attachment; filename="{filename}"',
-                    "Cache-Control": "no-cache"
-                }
+            # PDF completo desde la caché de reportes (se genera en disco y se valida al generarlo)
+            report_file = get_report(
+                db, "top-products-pdf", report_params("top-products-pdf", start_date, end_date, limit),
+                permission_scope(db, current_user)
             )
+            filename = f"reporte_productos_mas_vendidos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            return _file_response(report_file, filename)
         else:
             raise HTTPException(status_code=400, detail="Formato no soportado. Use 'pdf'")
             
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al exportar reporte: {str(e)}")
 
 
-from sqlalchemy.orm import Session
-from datetime import datetime
-from typing import Optional
-from db.database import get_db
-from crud.reports import get_sales_report, get_top_products_report
-from utils.auth import get_current_user_optional
-from utils.pdf_generator import generate_sales_report_pdf, generate_top_products_report_pdf
-from db.models import User
-
-routerReport = APIRouter(prefix="/reports", tags=["Reports"])
-
-
-@routerReport.get("/sales")
-def sales_report(
+@routerReport.get("/sales/export.xlsx")
+def export_sales_report_xlsx(
     start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
     end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
-    RF23: Reporte de ventas por fechas
-    Retorna un resumen completo de ventas en el rango de fechas especificado
+    Exportación del reporte de ventas a Excel (hojas Resumen, Ventas por día y Ventas)
+    Todas las ventas del rango, con fechas y montos como celdas con tipo
     """
     if current_user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Se requiere autenticación para ver reportes"
+            detail="Se requiere autenticación para exportar reportes"
         )
     
     try:
-        report = get_sales_report(db, start_date=start_date, end_date=end_date)
-        return report
+        definition = REPORT_TYPES["sales-xlsx"]
+        report_file = get_report(
+            db, "sales-xlsx", report_params("sales-xlsx", start_date, end_date), permission_scope(db, current_user)
+        )
+        filename = f"{definition.filename}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return _file_response(report_file, filename, definition.media_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al generar reporte de ventas: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al exportar reporte: {str(e)}")
 
 
-@routerReport.get("/top-products")
-def top_products_report(
+@routerReport.get("/top-products/export.xlsx")
+def export_top_products_report_xlsx(
     start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
     end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
     limit: int = Query(10, description="Número de productos a retornar"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
-    """
-    RF24: Reporte de productos más vendidos
-    Retorna los productos más vendidos en el rango de fechas especificado
-    """
+    """Exportación del reporte de productos más vendidos a Excel"""
     if current_user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Se requiere autenticación para ver reportes"
+            detail="Se requiere autenticación para exportar reportes"
         )
     
     try:
-        report = get_top_products_report(db, start_date=start_date, end_date=end_date, limit=limit)
-        return report
+        definition = REPORT_TYPES["top-products-xlsx"]
+        report_file = get_report(
+            db, "top-products-xlsx", report_params("top-products-xlsx", start_date, end_date, limit),
+            permission_scope(db, current_user)
+        )
+        filename = f"{definition.filename}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return _file_response(report_file, filename, definition.media_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al generar reporte de productos más vendidos: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al exportar reporte: {str(e)}")
 
 
-@routerReport.get("/sales/export")
-def export_sales_report_pdf(
-    start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
-    end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
-    format: str = Query("pdf", description="Formato de exportación: 'pdf'"),
-    db: Session = Depends(get_db),
+@routerReport.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+def create_report_job(
+    data: ReportJobRequest,
+    db: Session = Depends(get_report_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
-    RF25: Exportación de reporte de ventas a PDF
-    Exporta el reporte de ventas en formato PDF
+    Encola un reporte (sales, top-products y sus variantes -pdf / -xlsx) para calcularlo en segundo plano.
+    Si el resultado está en caché el trabajo se retorna terminado ("status": "done").
+    Consultar el estado en GET /reports/jobs/{job_id} y descargar en GET /reports/jobs/{job_id}/result
     """
     if current_user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Se requiere autenticación para exportar reportes"
+            detail="Se requiere autenticación para ver reportes"
         )
     
     try:
-        report = get_sales_report(db, start_date=start_date, end_date=end_date)
-        
-        if format.lower() == "pdf":
-            # Generar PDF real usando reportlab
-            pdf_bytes = generate_sales_report_pdf(report)
-            
-            # Verificar que el PDF sea válido
-            if not pdf_bytes or len(pdf_bytes) == 0:
-                raise HTTPException(status_code=500, detail="Error al generar PDF: archivo vacío")
-            
-            if not pdf_bytes.startswith(b'%PDF'):
-                raise HTTPException(status_code=500, detail="Error al generar PDF: formato inválido")
-            
-            filename = f"reporte_ventas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            
-            return Response(
-                content=pdf_bytes,
-                media_type="application/pdf",
-                headers={
-                    "Content-Type": "application/pdf",
-                    "Content-Disposition": f'attachment; filename="{filename}"',
-                    "Cache-Control": "no-cache"
-                }
-            )
-        else:
-            raise HTTPException(status_code=400, detail="Formato no soportado. Use 'pdf'")
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al exportar reporte: {str(e)}")
+        params = report_params(data.type, data.start_date, data.end_date, data.limit)
+        return submit_job(
+            db, data.type, params, user_id=current_user.id, scope=permission_scope(db, current_user)
+        ).to_dict()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@routerReport.get("/top-products/export")
-def export_top_products_report_pdf(
-    start_date: Optional[datetime] = Query(None, description="Fecha de inicio (ISO format)"),
-    end_date: Optional[datetime] = Query(None, description="Fecha de fin (ISO format)"),
-    limit: int = Query(10, description="Número de productos a retornar"),
-    format: str = Query("pdf", description="Formato de exportación: 'pdf'"),
-    db: Session = Depends(get_db),
+@routerReport.get("/jobs/{job_id}")
+def get_report_job(
+    job_id: str,
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
-    """
-    RF25: Exportación de reporte de productos más vendidos a PDF
-    Exporta el reporte de productos más vendidos en formato PDF
-    """
+    """Estado de un trabajo de reporte: pending, running, done o error"""
     if current_user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Se requiere autenticación para exportar reportes"
+            detail="Se requiere autenticación para ver reportes"
         )
     
-    try:
-        report = get_top_products_report(db, start_date=start_date, end_date=end_date, limit=limit)
-        
-        if format.lower() == "pdf":
-            # Generar PDF real usando reportlab
-            pdf_bytes = generate_top_products_report_pdf(report)
-            
-            # Verificar que el PDF sea válido
-            if not pdf_bytes or len(pdf_bytes) == 0:
-                raise HTTPException(status_code=500, detail="Error al generar PDF: archivo vacío")
-            
-            if not pdf_bytes.startswith(b'%PDF'):
-                raise HTTPException(status_code=500, detail="Error al generar PDF: formato inválido")
-            
-            filename = f"reporte_productos_mas_vendidos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            
-            return Response(
-                content=pdf_bytes,
-                media_type="application/pdf",
-                headers={
-                    "Content-Type": "application/pdf",
-                    "Content-Disposition": f'attachment; filename="{filename}"',
-                    "Cache-Control": "no-cache"
-                }
-            )
-        else:
-            raise HTTPException(status_code=400, detail="Formato no soportado. Use 'pdf'")
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al exportar reporte: {str(e)}")
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo de reporte no encontrado")
+    return job.to_dict()
 
+
+@routerReport.get("/jobs/{job_id}/result")
+def download_report_job(
+    job_id: str,
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Resultado de un trabajo terminado: JSON para sales/top-products, archivo para los tipos *-pdf y *-xlsx"""
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Se requiere autenticación para ver reportes"
+        )
+    
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo de reporte no encontrado")
+    if job.status == ERROR:
+        raise HTTPException(status_code=500, detail=f"Error al generar reporte: {job.error}")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail="El reporte aún no está listo")
+    
+    definition = REPORT_TYPES[job.type]
+    if definition.extension is None:
+        return job.result
+    
+    if not job.result.exists():
+        # El resultado salió de la caché (vencido o reemplazado): hay que pedir el reporte otra vez
+        raise HTTPException(status_code=410, detail="El archivo del reporte ya no está disponible, vuelva a solicitarlo")
+    filename = f"{definition.filename}_{job.finished_at.strftime('%Y%m%d_%H%M%S')}.{definition.extension}"
+    return _file_response(job.result, filename, definition.media_type)
@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Request, BackgroundTasks
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, joinedload
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from db.database import get_db
+from db.database import get_db, SessionLocal
 from db.schemas import SaleCreate, SaleResponse, SalesDetailResponse
-from crud.sales import create_sale, get_sales, get_sale
+from crud.sales import create_sale, create_sales_bulk, get_sales, get_sale
 from utils.auth import get_current_user, get_current_user_optional
-from db.models import User, Sale, SalesDetail, Client
-from utils.invoice_generator import generate_invoice_pdf
-from utils.whatsapp_sender import send_whatsapp_message
+from db.models import User, Sale, SalesDetail, Client, MedicineBatch
+from utils.serialization import FastJSONResponse
+import json
+from utils.idempotency import (
+    hash_request,
+    begin_idempotent_request,
+    complete_idempotent_request,
+    store_idempotent_response,
+    finish_idempotent_request,
+    release_idempotent_request
+)
 
 routerSale = APIRouter(prefix="/sales", tags=["Sales"])
 
@@ -16,7 +27,8 @@ routerSale = APIRouter(prefix="/sales", tags=["Sales"])
 def enrich_sale_response(sale: Sale) -> Dict[str, Any]:
     """
     Enriquece la respuesta de la venta con información relacionada
-    de cliente, usuario, productos y lotes
+    de cliente, usuario, productos y lotes.
+    Montos y fechas quedan como Decimal/datetime: los convierte el serializador JSON.
     """
     # Información del cliente
     client_name = None
@@ -39,8 +51,8 @@ def enrich_sale_response(sale: Sale) -> Dict[str, Any]:
             "id": detail.id,
             "batch_id": detail.batch_id,
             "quantity": detail.quantity,
-            "unit_price": float(detail.unit_price),
-            "subtotal": float(detail.subtotal),
+            "unit_price": detail.unit_price,
+            "subtotal": detail.subtotal,
             "batch_expiration_date": None,
             "batch_stock": None,
             "product_name": None,
@@ -65,7 +77,7 @@ def enrich_sale_response(sale: Sale) -> Dict[str, Any]:
         "user_id": sale.user_id,
         "sale_date": sale.sale_date,
         "payment_method": sale.payment_method,
-        "total": float(sale.total),
+        "total": sale.total,
         "details": enriched_details,
         "client_name": client_name,
         "client_email": client_email,
@@ -78,6 +90,10 @@ def send_invoice_whatsapp(db: Session, sale: Sale, sale_response: Dict[str, Any]
     """
     Genera la factura en PDF y la envía por WhatsApp al cliente automáticamente
     """
+    # ReportLab y requests se importan al usarse: no cuentan en el arranque del proceso
+    from utils.invoice_generator import generate_invoice_pdf
+    from utils.whatsapp_sender import send_whatsapp_message, normalize_phone_number
+    
     # Obtener datos del cliente
     client = db.query(Client).filter(Client.id == sale.client_id).first()
     if not client or not client.phone:
@@ -161,7 +177,6 @@ Gracias por su compra! 🏥💊
             return
         
         # Normalizar número de teléfono usando la función del módulo
-        from utils.whatsapp_sender import normalize_phone_number
         phone_number = normalize_phone_number(phone_number.strip())
         
         print(f"[VENTA] Enviando factura por WhatsApp a: {phone_number}")
@@ -188,7 +203,12 @@ Gracias por su compra! 🏥💊
 
 
 @routerSale.post("/")
-def create(data: SaleCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create(
+    data: SaleCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
+):
     """
     RF14-RF16: Registrar una venta con cálculo automático de subtotales y control de stock
     Requiere autenticación obligatoria.
@@ -200,6 +220,10 @@ def create(data: SaleCreate, db: Session = Depends(get_db), current_user: User =
     Automáticamente:
     - Genera factura en PDF
     - Envía factura por WhatsApp al cliente (si tiene número de teléfono)
+    
+    Con la cabecera Idempotency-Key, un reintento con la misma clave devuelve la venta
+    original sin volver a descontar stock (si aún está en curso, espera unos segundos y
+    luego responde 409 con Retry-After).
     """
     if current_user is None:
         raise HTTPException(
@@ -207,9 +231,25 @@ def create(data: SaleCreate, db: Session = Depends(get_db), current_user: User =
             detail="Se requiere autenticación para registrar ventas"
         )
     
+    endpoint = "POST /sales/"
+    if idempotency_key:
+        request_hash = hash_request(current_user.id, data.dict())
+        replay = begin_idempotent_request(db, endpoint, idempotency_key, request_hash, current_user.id)
+        if replay is not None:
+            status_code, body = replay
+            return JSONResponse(status_code=status_code, content=body, headers={"Idempotent-Replayed": "true"})
+    
     try:
-        sale = create_sale(db, data, current_user.id)
+        # La respuesta idempotente se guarda en la misma transacción que la venta
+        before_commit = None
+        if idempotency_key:
+            before_commit = lambda created: store_idempotent_response(
+                db, endpoint, idempotency_key, 200, enrich_sale_response(created)
+            )
+        sale = create_sale(db, data, current_user.id, before_commit)
         sale_response = enrich_sale_response(sale)
+        if idempotency_key:
+            finish_idempotent_request(endpoint, idempotency_key)
         
         # Generar y enviar factura por WhatsApp automáticamente
         try:
@@ -220,11 +260,155 @@ def create(data: SaleCreate, db: Session = Depends(get_db), current_user: User =
         
         return sale_response
     except ValueError as e:
+        if idempotency_key:
+            db.rollback()
+            complete_idempotent_request(db, endpoint, idempotency_key, 400, {"detail": str(e)})
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        if idempotency_key:
+            release_idempotent_request(db, endpoint, idempotency_key)
         raise HTTPException(status_code=500, detail=f"Error al crear la venta: {str(e)}")
 
 
+def send_bulk_invoices(sale_ids: List[int]):
+    """
+    Tarea en segundo plano de la carga masiva: genera y envía las facturas
+    con su propia sesión, después de responder a la terminal
+    """
+    db = SessionLocal()
+    try:
+        for i in range(0, len(sale_ids), 200):
+            sales = db.query(Sale).options(
+                joinedload(Sale.details).joinedload(SalesDetail.batch).joinedload(MedicineBatch.product),
+                joinedload(Sale.client)
+            ).filter(Sale.id.in_(sale_ids[i:i + 200])).all()
+            for sale in sales:
+                try:
+                    send_invoice_whatsapp(db, sale, None)
+                except Exception as e:
+                    print(f"Advertencia: No se pudo enviar la factura de la venta {sale.id}: {e}")
+            db.expunge_all()
+    finally:
+        db.close()
+
+
+async def _read_bulk_payload(request: Request) -> List[Any]:
+    """Lee un arreglo JSON o un flujo NDJSON (una venta por línea) sin esperar a un único json.loads gigante"""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type:
+        payload = json.loads(await request.body())
+        if not isinstance(payload, list):
+            raise ValueError("Se esperaba un arreglo JSON de ventas")
+        return payload
+
+    items = []
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        items.extend(json.loads(line) for line in lines if line.strip())
+    if buffer.strip():
+        items.append(json.loads(buffer))
+    return items
+
+
+@routerSale.post("/bulk")
+async def create_bulk(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    send_invoices: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
+):
+    """
+    Carga masiva de ventas para terminales que trabajaron sin conexión.
+    Acepta un arreglo JSON de ventas (mismo formato que POST /sales/) o NDJSON
+    (Content-Type: application/x-ndjson, una venta por línea).
+    
+    Retorna un resultado por venta (created con sale_id, o error con el motivo).
+    Las facturas se generan y envían en segundo plano después de responder.
+    
+    Con la cabecera Idempotency-Key (igual que POST /sales/), reenviar la misma carga tras
+    un corte de red devuelve los resultados originales sin registrar las ventas otra vez.
+    """
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Se requiere autenticación para registrar ventas"
+        )
+    
+    try:
+        items = await _read_bulk_payload(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Error al leer las ventas: {str(e)}")
+    
+    endpoint = "POST /sales/bulk"
+    if idempotency_key:
+        request_hash = hash_request(current_user.id, items)
+        replay = await run_in_threadpool(
+            begin_idempotent_request, db, endpoint, idempotency_key, request_hash, current_user.id
+        )
+        if replay is not None:
+            status_code, body = replay
+            return JSONResponse(status_code=status_code, content=body, headers={"Idempotent-Replayed": "true"})
+    
+    # Validar cada venta por separado para informar errores sin rechazar toda la carga
+    invalid: Dict[int, Dict[str, Any]] = {}
+    sales = []
+    positions = []
+    for index, item in enumerate(items):
+        try:
+            sales.append(SaleCreate(**item))
+            positions.append(index)
+        except (ValidationError, TypeError) as e:
+            invalid[index] = {"index": index, "status": "error", "error": str(e)}
+    
+    def bulk_response(created: List[Dict[str, Any]]) -> Dict[str, Any]:
+        results: List[Optional[Dict[str, Any]]] = [invalid.get(index) for index in range(len(items))]
+        for position, result in zip(positions, created):
+            results[position] = {**result, "index": position}
+        created_count = sum(1 for r in results if r["status"] == "created")
+        return {
+            "total": len(results),
+            "created": created_count,
+            "failed": len(results) - created_count,
+            "results": results
+        }
+    
+    try:
+        if sales:
+            # La respuesta idempotente se guarda en la misma transacción que las ventas
+            before_commit = None
+            if idempotency_key:
+                before_commit = lambda created: store_idempotent_response(
+                    db, endpoint, idempotency_key, 200, bulk_response(created)
+                )
+            created = await run_in_threadpool(create_sales_bulk, db, sales, current_user.id, before_commit)
+            response = bulk_response(created)
+            if idempotency_key:
+                finish_idempotent_request(endpoint, idempotency_key)
+        else:
+            response = bulk_response([])
+            if idempotency_key:
+                await run_in_threadpool(complete_idempotent_request, db, endpoint, idempotency_key, 200, response)
+    except ValueError as e:
+        if idempotency_key:
+            db.rollback()
+            await run_in_threadpool(complete_idempotent_request, db, endpoint, idempotency_key, 400, {"detail": str(e)})
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        if idempotency_key:
+            await run_in_threadpool(release_idempotent_request, db, endpoint, idempotency_key)
+        raise HTTPException(status_code=500, detail=f"Error al registrar las ventas: {str(e)}")
+    
+    sale_ids = [r["sale_id"] for r in response["results"] if r["status"] == "created"]
+    if send_invoices and sale_ids:
+        background_tasks.add_task(send_bulk_invoices, sale_ids)
+    
+    return response
+
+
 @routerSale.get("/")
 def list_all(
     client_id: Optional[int] = None,
@@ -245,7 +429,7 @@ def list_all(
     
     try:
         sales = get_sales(db, client_id=client_id, user_id=user_id, start_date=start_date, end_date=end_date)
-        return [enrich_sale_response(sale) for sale in sales]
+        return FastJSONResponse([enrich_sale_response(sale) for sale in sales])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener ventas: {str(e)}")
 
@@ -266,4 +450,4 @@ def get(sale_id: int, db: Session = Depends(get_db), current_user: Optional[User
     sale = get_sale(db, sale_id)
     if not sale:
         raise HTTPException(404, "Venta no encontrada")
-    return enrich_sale_response(sale)
+    return FastJSONResponse(enrich_sale_response(sale))
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from db.database import get_db
 from db.schemas import SupplierCreate, SupplierUpdate, SupplierResponse
+from utils.http_cache import versioned_json_response
 from crud.suppliers import (
     create_supplier,
     get_suppliers,
@@ -19,9 +20,12 @@ def create(data: SupplierCreate, db: Session = Depends(get_db)):
 
 
 @routerSupplier.get("/all", response_model=list[SupplierResponse])
-def list_all(search: str = None, db: Session = Depends(get_db)):
-    """Listar proveedores con capacidad de búsqueda"""
-    return get_suppliers(db, search=search)
+def list_all(request: Request, search: str = None, db: Session = Depends(get_db)):
+    """Listar proveedores con capacidad de búsqueda (ETag por versión de la tabla: If-None-Match -> 304)"""
+    return versioned_json_response(
+        request, db, "suppliers.all", {"search": search}, ("suppliers",),
+        lambda: [SupplierResponse.model_validate(s).model_dump() for s in get_suppliers(db, search=search)]
+    )
 
 
 @routerSupplier.get("/", response_model=SupplierResponse)
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from db.database import get_db
+from crud.sync import get_catalog_changes, get_catalog_snapshot, SYNC_PAGE_SIZE
+from utils.http_cache import versioned_json_response
+from utils.serialization import FastJSONResponse
+
+routerSync = APIRouter(prefix="/sync", tags=["Sync"])
+
+
+@routerSync.get("/catalog/snapshot")
+def catalog_snapshot(request: Request, db: Session = Depends(get_db)):
+    """
+    Carga inicial del catálogo local de una terminal: productos y lotes activos en formato de columnas
+    y 'seq', la secuencia desde la cual pedir cambios con GET /sync/catalog?since=seq.
+    ETag por versión de las tablas: If-None-Match vigente -> 304
+    """
+    return versioned_json_response(
+        request, db, "sync.snapshot", {}, ("products", "medicine_batches", "product_stock"),
+        lambda: get_catalog_snapshot(db)
+    )
+
+
+@routerSync.get("/catalog")
+def catalog_changes(
+    since: int = Query(..., ge=0, description="Secuencia de la última sincronización ('seq' de la respuesta anterior)"),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=SYNC_PAGE_SIZE, description="Máximo de cambios por respuesta"),
+    db: Session = Depends(get_db)
+):
+    """
+    Productos y lotes (con stock y precio) cambiados desde 'since' y, en 'deleted', los IDs
+    desactivados. Si has_more es true, volver a pedir con since=seq.
+    """
+    try:
+        return FastJSONResponse(get_catalog_changes(db, since, limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
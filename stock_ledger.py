@@ -0,0 +1,58 @@
+"""
+Mantenimiento del libro de stock (stock_movements / product_stock)
+- checkpoint: guarda el stock de cada producto con movimientos nuevos (ejecutar a diario)
+- verify: compara lotes, product_stock y libro de movimientos sin modificar nada
+- rebuild: recalcula product_stock desde los lotes y registra los ajustes en el libro
+Ejecutar: python stock_ledger.py [checkpoint|verify|rebuild]
+"""
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+from db.database import SessionLocal, Base, engine
+from crud.stock import create_stock_checkpoints, rebuild_product_stock
+
+
+def print_differences(differences):
+    if not differences:
+        print("✓ Lotes, product_stock y libro de movimientos coinciden")
+        return
+    print(f"⚠ {len(differences)} productos con diferencias:")
+    for d in differences:
+        print(f"  Producto {d['product_id']}: lotes={d['batches']} product_stock={d['snapshot']} libro={d['ledger']}")
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "checkpoint"
+    if command not in ("checkpoint", "verify", "rebuild"):
+        print(__doc__)
+        return False
+
+    # Crear las tablas del libro si aún no existen
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        if command == "checkpoint":
+            created = create_stock_checkpoints(db)
+            print(f"✓ Checkpoints creados: {created}")
+        elif command == "verify":
+            print_differences(rebuild_product_stock(db, dry_run=True))
+        else:
+            differences = rebuild_product_stock(db)
+            print_differences(differences)
+            if differences:
+                print("✓ product_stock recalculado y ajustes registrados")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"❌ ERROR: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
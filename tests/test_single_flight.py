@@ -0,0 +1,163 @@
+"""
+Single-flight del tablero (utils/single_flight.py) sobre una base SQLite temporal:
+100 llamadas simultáneas e idénticas ejecutan las consultas una sola vez, y las de otro
+alcance de permisos no comparten el cálculo.
+Ejecutar: python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# db.database exige estas variables aunque la prueba no use MySQL
+for key, value in {"MYSQL_USER": "test", "MYSQL_HOST": "localhost", "MYSQL_DB": "test"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from db.database import Base
+from db.models import Category, Product, MedicineBatch, Client, User, Role, Sale, SalesDetail
+from crud.dashboard import get_all_dashboard_data
+from utils import single_flight
+
+CALLS = 100
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    role = Role(name="Cajero")
+    db.add(role)
+    db.flush()
+    db.add_all([
+        User(role_id=role.id, first_name="Test", last_name="User", username="test", email="test@local"),
+        Category(name="Test"),
+        Client(first_name="Cliente", last_name="Test", status=1)
+    ])
+    db.flush()
+    db.execute(insert(Product.__table__), [
+        {"name": f"Producto {i}", "category_id": 1, "presentation": "Caja", "status": 1} for i in range(10)
+    ])
+    db.execute(insert(MedicineBatch.__table__), [
+        {"product_id": i + 1, "stock": 5 * i, "sale_price": 10, "status": 1} for i in range(10)
+    ])
+    now = datetime.now()
+    db.execute(insert(Sale.__table__), [
+        {"client_id": 1, "user_id": 1, "sale_date": now - timedelta(days=i), "payment_method": "efectivo",
+         "total": Decimal("10.00")} for i in range(20)
+    ])
+    db.execute(insert(SalesDetail.__table__), [
+        {"sale_id": i + 1, "batch_id": i % 10 + 1, "quantity": 1, "unit_price": Decimal("10.00"),
+         "subtotal": Decimal("10.00")} for i in range(20)
+    ])
+    db.commit()
+    db.close()
+    yield engine
+    engine.dispose()
+
+
+class StatementCounter:
+    """Cuenta las sentencias del engine; la primera de cada hilo espera a que 'ready' sea verdadero"""
+
+    def __init__(self, engine, ready=None):
+        self.engine = engine
+        self.ready = ready
+        self.statements = 0
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self.count)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, "before_cursor_execute", self.count)
+
+    def count(self, *args):
+        thread = threading.get_ident()
+        with self._lock:
+            self.statements += 1
+            first = thread not in self._threads
+            self._threads.add(thread)
+        if first and self.ready is not None:
+            # Un líder no consulta hasta que todas las demás llamadas estén esperando su resultado
+            deadline = time.monotonic() + 10
+            while not self.ready() and time.monotonic() < deadline:
+                time.sleep(0.001)
+
+
+def call_concurrently(engine, scopes):
+    Session = sessionmaker(bind=engine)
+    barrier = threading.Barrier(len(scopes))
+    results, errors = [], []
+
+    def worker(scope):
+        db = Session()
+        try:
+            barrier.wait()
+            results.append(get_all_dashboard_data(db, scope=scope))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker, args=(scope,)) for scope in scopes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    return results
+
+
+def single_call_statements(engine):
+    db = sessionmaker(bind=engine)()
+    try:
+        with StatementCounter(engine) as counter:
+            get_all_dashboard_data(db, scope=("role", 1, "v"))
+    finally:
+        db.close()
+    return counter.statements
+
+
+def test_identical_concurrent_calls_run_queries_once(engine):
+    expected = single_call_statements(engine)
+    assert expected > 0
+    shared_before = single_flight.flights.snapshot()["shared"]
+
+    def all_waiting():
+        return single_flight.flights.snapshot()["shared"] - shared_before >= CALLS - 1
+
+    with StatementCounter(engine, ready=all_waiting) as counter:
+        results = call_concurrently(engine, [("role", 1, "v")] * CALLS)
+
+    assert len(results) == CALLS
+    assert counter.statements == expected
+    assert all(result is results[0] for result in results)
+
+
+def test_different_scopes_do_not_share(engine):
+    expected = single_call_statements(engine)
+    shared_before = single_flight.flights.snapshot()["shared"]
+    scopes = [("role", 1, "v"), ("role", 2, "v")] * (CALLS // 2)
+
+    def all_waiting():
+        return single_flight.flights.snapshot()["shared"] - shared_before >= CALLS - 2
+
+    with StatementCounter(engine, ready=all_waiting) as counter:
+        results = call_concurrently(engine, scopes)
+
+    assert len(results) == CALLS
+    assert counter.statements == 2 * expected
+    assert len({id(result) for result in results}) == 2
@@ -0,0 +1,246 @@
+"""
+Control de admisión por prioridad (middleware ASGI)
+- Cada ruta pertenece a una clase según método y ruta (ROUTE_CLASSES), de mayor a menor prioridad:
+  checkout (ventas y facturas) > lookups (consultas y el resto de la API) > dashboards (tablero,
+  analítica, alertas y reportes en JSON) > exports (PDF, XLSX e importaciones masivas)
+- Cada clase tiene un límite de peticiones en curso y una cola acotada; por encima de la cola, o si la
+  espera supera su tiempo máximo, se responde 503 con Retry-After sin ocupar un hilo del threadpool
+- Además hay un límite total (por defecto los 40 hilos del threadpool de Starlette): cuando se libera
+  un lugar entra primero quien espera en la clase de mayor prioridad
+- Los límites de las clases de menor prioridad suman menos que el total: siempre quedan lugares
+  para las ventas aunque el tablero y las exportaciones estén saturados
+Todo corre en el event loop (sin locks); las métricas por clase están en GET /metrics/admission.
+Configuración: ADMISSION_ENABLED, ADMISSION_TOTAL_LIMIT y ADMISSION_<CLASE>_LIMIT / _QUEUE / _TIMEOUT.
+"""
+import os
+import re
+import time
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+# Peticiones en curso entre todas las clases
+ADMISSION_TOTAL_LIMIT = int(os.getenv("ADMISSION_TOTAL_LIMIT", "40"))
+
+# Clase: (prioridad, en curso, en cola, segundos máximos en cola, Retry-After)
+CLASS_DEFAULTS = {
+    "checkout": (0, 24, 200, 15.0, 1),
+    "lookups": (1, 12, 48, 5.0, 2),
+    "dashboards": (2, 4, 16, 3.0, 5),
+    "exports": (3, 2, 4, 2.0, 15),
+}
+
+# (método o None para todos, patrón de la ruta, clase); gana la primera coincidencia, el resto es 'lookups'
+ROUTE_CLASSES: List[Tuple[Optional[str], str, str]] = [
+    ("POST", r"^/sales/bulk", "exports"),
+    ("POST", r"^/purchases/import", "exports"),
+    ("POST", r"^/products/barcodes/import", "exports"),
+    (None, r"^/reports/[^/]+/export", "exports"),
+    (None, r"^/reports/jobs/[^/]+/result", "exports"),
+    (None, r"^/(dashboard|analytics|alerts|reports)(/|$)", "dashboards"),
+    ("POST", r"^/sales/?$", "checkout"),
+    (None, r"^/invoices/", "checkout"),
+]
+DEFAULT_CLASS = "lookups"
+
+# Sin control de admisión: métricas, archivos estáticos y documentación
+EXEMPT_PATHS = re.compile(r"^/(metrics|uploads|docs|redoc|openapi\.json)(/|$)")
+
+# Esperas recientes usadas para los percentiles de cada clase
+WAIT_SAMPLES = 1000
+
+
+class AdmissionClass:
+    """Límite, cola y métricas de una clase de prioridad"""
+
+    def __init__(self, name: str, priority: int, limit: int, queue: int, timeout: float, retry_after: int):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue_limit = queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timeouts = 0
+        self.max_in_flight = 0
+        self.max_queued = 0
+
+    @classmethod
+    def from_env(cls, name: str, defaults: Tuple[int, int, int, float, int]) -> "AdmissionClass":
+        priority, limit, queue, timeout, retry_after = defaults
+        prefix = f"ADMISSION_{name.upper()}"
+        return cls(
+            name, priority,
+            int(os.getenv(f"{prefix}_LIMIT", str(limit))),
+            int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+            float(os.getenv(f"{prefix}_TIMEOUT", str(timeout))),
+            retry_after
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        p99 = waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else 0.0
+        return {
+            "priority": self.priority,
+            "limit": self.limit,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self.waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+            "max_in_flight": self.max_in_flight,
+            "max_waiting": self.max_queued,
+            "queue_wait_p99_ms": round(p99 * 1000, 2),
+        }
+
+
+class AdmissionController:
+    """Admite o rechaza peticiones por clase; debe usarse desde el event loop"""
+
+    def __init__(self, classes: List[AdmissionClass], total_limit: int,
+                 rules: List[Tuple[Optional[str], str, str]] = ROUTE_CLASSES, default: str = DEFAULT_CLASS):
+        self.classes = sorted(classes, key=lambda item: item.priority)
+        self.by_name = {item.name: item for item in self.classes}
+        self.total_limit = total_limit
+        self.in_flight = 0
+        self.rules = [(method, re.compile(pattern), self.by_name[name]) for method, pattern, name in rules]
+        self.default = self.by_name[default]
+
+    def classify(self, method: str, path: str) -> Optional[AdmissionClass]:
+        if EXEMPT_PATHS.match(path):
+            return None
+        for rule_method, pattern, admission_class in self.rules:
+            if (rule_method is None or rule_method == method) and pattern.match(path):
+                return admission_class
+        return self.default
+
+    def _can_start(self, admission_class: AdmissionClass) -> bool:
+        return admission_class.in_flight < admission_class.limit and self.in_flight < self.total_limit
+
+    def _start(self, admission_class: AdmissionClass):
+        admission_class.in_flight += 1
+        admission_class.admitted += 1
+        admission_class.max_in_flight = max(admission_class.max_in_flight, admission_class.in_flight)
+        self.in_flight += 1
+
+    def _waiting_ahead(self, admission_class: AdmissionClass) -> bool:
+        """
+        Hay peticiones esperando en esta clase (orden de llegada) o en una de mayor prioridad que
+        solo espera por el límite total (no por el suyo)
+        """
+        if admission_class.waiters:
+            return True
+        return any(
+            item.waiters and item.in_flight < item.limit
+            for item in self.classes if item.priority < admission_class.priority
+        )
+
+    async def acquire(self, admission_class: AdmissionClass) -> bool:
+        """True si la petición puede seguir (hay que llamar a release al terminar); False si se rechaza"""
+        if self._can_start(admission_class) and not self._waiting_ahead(admission_class):
+            self._start(admission_class)
+            return True
+        if len(admission_class.waiters) >= admission_class.queue_limit:
+            admission_class.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        admission_class.waiters.append(waiter)
+        admission_class.queued += 1
+        admission_class.max_queued = max(admission_class.max_queued, len(admission_class.waiters))
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, admission_class.timeout)
+        except asyncio.TimeoutError:
+            admission_class.timeouts += 1
+            return False
+        except asyncio.CancelledError:
+            # El cliente se desconectó justo cuando se le asignó el lugar: se devuelve
+            if waiter.done() and not waiter.cancelled():
+                self.release(admission_class)
+            raise
+        finally:
+            if waiter in admission_class.waiters:
+                admission_class.waiters.remove(waiter)
+        # _dispatch ya contó la petición como en curso
+        admission_class._waits.append(time.perf_counter() - start)
+        return True
+
+    def release(self, admission_class: AdmissionClass):
+        admission_class.in_flight -= 1
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Despierta a los que esperan, de la clase de mayor prioridad a la de menor"""
+        for admission_class in self.classes:
+            while admission_class.waiters and self._can_start(admission_class):
+                waiter = admission_class.waiters.popleft()
+                if waiter.done():
+                    # Venció su espera o el cliente se desconectó
+                    continue
+                self._start(admission_class)
+                waiter.set_result(None)
+            if admission_class.waiters and self.in_flight >= self.total_limit:
+                # Sin lugares libres: las clases de menor prioridad siguen esperando
+                return
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "total_limit": self.total_limit,
+            "in_flight": self.in_flight,
+            "classes": {item.name: item.snapshot() for item in self.classes},
+        }
+
+
+controller = AdmissionController(
+    [AdmissionClass.from_env(name, defaults) for name, defaults in CLASS_DEFAULTS.items()],
+    ADMISSION_TOTAL_LIMIT
+)
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI: la petición ocupa su lugar hasta terminar de enviar la respuesta
+    (incluye la descarga completa de un PDF o XLSX)
+    """
+
+    def __init__(self, app, admission: AdmissionController = None):
+        self.app = app
+        self.admission = admission or controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        admission_class = self.admission.classify(scope["method"], scope["path"])
+        if admission_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.admission.acquire(admission_class):
+            response = JSONResponse(
+                status_code=503,
+                content={
+                    "detail": "Servicio sobrecargado",
+                    "message": "Hay demasiadas solicitudes de este tipo en curso. Intente nuevamente en unos segundos."
+                },
+                headers={"Retry-After": str(admission_class.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(admission_class)
@@ -0,0 +1,49 @@
+"""
+Utilidades para inserciones masivas en una sola transacción
+(carga masiva de ventas y recepción masiva de compras)
+"""
+from typing import Any, Dict, Iterable, List, Sequence
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+
+BULK_CHUNK_SIZE = 1000
+
+
+def chunked(items: Sequence, size: int = BULK_CHUNK_SIZE) -> Iterable[Sequence]:
+    """Divide una lista en bloques de tamaño fijo"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def insert_returning_ids(db: Session, table: Table, rows: List[Dict[str, Any]], verify_columns: Sequence[str]) -> List[int]:
+    """
+    Inserta las filas en bloques y retorna sus IDs en el mismo orden.
+    - Motores con RETURNING en inserciones de varias filas (MariaDB 10.5+, SQLite 3.35+):
+      INSERT ... RETURNING id, y el motor informa los IDs en el orden de las filas.
+    - MySQL (sin RETURNING): INSERT ... VALUES (...), (...) asigna IDs consecutivos y retorna el primero.
+      Los IDs deducidos se comprueban contra 'verify_columns': si otra transacción intercaló IDs
+      se lanza ValueError en lugar de asociar filas equivocadas.
+    """
+    ids = []
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        for chunk in chunked(rows):
+            ids.extend(db.execute(statement, list(chunk)).scalars().all())
+        return ids
+
+    for chunk in chunked(rows):
+        result = db.execute(insert(table).values(list(chunk)))
+        first_id = result.lastrowid
+        chunk_ids = list(range(first_id, first_id + len(chunk)))
+
+        columns = [table.c.id] + [table.c[name] for name in verify_columns]
+        inserted = db.execute(
+            table.select().with_only_columns(*columns)
+            .where(table.c.id.between(chunk_ids[0], chunk_ids[-1]))
+            .order_by(table.c.id)
+        ).all()
+        expected = [(row_id, *(row[name] for name in verify_columns)) for row_id, row in zip(chunk_ids, chunk)]
+        if [tuple(row) for row in inserted] != expected:
+            raise ValueError(f"No se pudieron asignar IDs consecutivos en '{table.name}'. Reintente la operación.")
+        ids.extend(chunk_ids)
+    return ids
@@ -0,0 +1,131 @@
+"""
+Caché HTTP de los listados de catálogo (/categories/all, /products/all, /suppliers/all, /batches/all)
+- El ETag es fuerte y se calcula sin consultar la BD: nombre de la ruta + parámetros + versiones de
+  las tablas que lee (crud.versions, en memoria)
+- If-None-Match con el ETag vigente: 304 sin cuerpo y sin consultas
+- Sin If-None-Match (o con uno viejo): el cuerpo ya serializado sale de una caché LRU en memoria
+  limitada por bytes; si las versiones cambiaron, el ETag es otro y se vuelve a calcular
+- Cache-Control: no-cache obliga al navegador a revalidar siempre (nunca usa una copia sin preguntar)
+Lo que cambia sin escribir en la BD no cambia el ETag: la miniatura de una imagen recién subida
+aparece en el listado con el siguiente cambio de la tabla (mientras tanto se usa la imagen original).
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from crud.versions import get_table_versions
+from utils.serialization import dumps
+from utils.single_flight import flight_key
+
+# Tamaño máximo de los cuerpos guardados (bytes)
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+CACHE_CONTROL = "no-cache"
+
+
+class ResponseCache:
+    """LRU de cuerpos JSON ya serializados: clave -> (etag, cuerpo), limitado por bytes (seguro entre hilos)"""
+
+    def __init__(self, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Any, Tuple[str, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, etag: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (etag, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+
+cache = ResponseCache()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match admite varios ETag separados por coma, '*' y la forma débil W/"..." """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate in ("*", etag) or (candidate.startswith("W/") and candidate[2:] == etag):
+            return True
+    return False
+
+
+def build_etag(name: str, params: Dict[str, Any], versions: Tuple[int, ...]) -> str:
+    digest = hashlib.sha1(repr((flight_key(name, params), versions)).encode("utf-8")).hexdigest()
+    return f'"{digest[:24]}"'
+
+
+def versioned_json_response(
+    request: Request,
+    db: Session,
+    name: str,
+    params: Dict[str, Any],
+    tables: Iterable[str],
+    compute: Callable[[], Any],
+) -> Response:
+    """
+    Respuesta JSON con ETag por versión de tablas: 304 si el cliente ya tiene esa versión, el cuerpo
+    guardado si otro cliente ya la pidió o compute() (que retorna datos serializables) si no.
+    """
+    # Los parámetros no enviados (None) no forman parte de la clave
+    params = {key: value for key, value in params.items() if value is not None}
+    etag = build_etag(name, params, get_table_versions(db, tables))
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        cache.count_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    key = flight_key(name, params)
+    body = cache.get(key, etag)
+    if body is None:
+        body = dumps(compute())
+        cache.set(key, etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
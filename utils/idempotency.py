@@ -0,0 +1,229 @@
+"""
+Soporte de cabecera Idempotency-Key para POST /sales/ y POST /purchases/
+Los reintentos de las terminales con la misma clave reciben la respuesta original
+en lugar de registrar otra venta/compra y descontar stock dos veces.
+"""
+import json
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from db.models import IdempotencyKey
+
+# Tiempo que se conserva una respuesta para reintentos
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# Tiempo máximo que un reintento concurrente ocupa un hilo esperando a la primera petición;
+# después recibe 409 con Retry-After y vuelve a intentar
+WAIT_TIMEOUT_SECONDS = 3
+# Una clave "processing" más antigua que esto se considera abandonada (proceso caído)
+STALE_PROCESSING = timedelta(minutes=2)
+# Frecuencia de la limpieza oportunista de claves vencidas (por proceso)
+PURGE_INTERVAL_SECONDS = 600
+
+# Eventos locales para despertar a los reintentos del mismo proceso sin esperar al sondeo
+_events: Dict[Tuple[str, str], threading.Event] = {}
+_events_lock = threading.Lock()
+_last_purge = 0.0
+
+
+def hash_request(user_id: int, payload: Any) -> str:
+    """Hash estable del cuerpo de la petición (y el usuario) para detectar claves reutilizadas con otros datos"""
+    canonical = json.dumps(jsonable_encoder({"user_id": user_id, "payload": payload}), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _event_for(endpoint: str, key: str) -> threading.Event:
+    with _events_lock:
+        return _events.setdefault((endpoint, key), threading.Event())
+
+
+def _signal(endpoint: str, key: str):
+    with _events_lock:
+        event = _events.pop((endpoint, key), None)
+    if event:
+        event.set()
+
+
+def _get_record(db: Session, endpoint: str, key: str) -> Optional[IdempotencyKey]:
+    return db.query(IdempotencyKey).filter(
+        IdempotencyKey.endpoint == endpoint,
+        IdempotencyKey.idempotency_key == key
+    ).first()
+
+
+def purge_expired_keys(db: Session) -> int:
+    """Elimina las claves vencidas (usa el índice sobre expires_at)"""
+    deleted = db.query(IdempotencyKey).filter(
+        IdempotencyKey.expires_at < datetime.now()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def _maybe_purge(db: Session):
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = now
+    try:
+        purge_expired_keys(db)
+    except Exception as e:
+        db.rollback()
+        print(f"Advertencia: No se pudieron limpiar las claves de idempotencia: {e}")
+
+
+def _replay(record: IdempotencyKey, request_hash: str) -> Tuple[int, Any]:
+    if record.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="La Idempotency-Key ya fue usada con datos distintos"
+        )
+    return record.status_code, json.loads(record.response_body)
+
+
+def begin_idempotent_request(db: Session, endpoint: str, key: str, request_hash: str, user_id: int) -> Optional[Tuple[int, Any]]:
+    """
+    Reserva la clave para esta petición.
+    - Si la clave es nueva, la registra como 'processing' y retorna None (la petición debe ejecutarse)
+    - Si ya terminó, retorna (status_code, body) de la respuesta original
+    - Si otra petición con la misma clave está en curso, espera su resultado hasta WAIT_TIMEOUT_SECONDS
+      (después 409 con Retry-After)
+    """
+    _maybe_purge(db)
+    now = datetime.now()
+
+    record = IdempotencyKey(
+        endpoint=endpoint,
+        idempotency_key=key,
+        user_id=user_id,
+        request_hash=request_hash,
+        state="processing",
+        created_at=now,
+        expires_at=now + IDEMPOTENCY_TTL
+    )
+    db.add(record)
+    try:
+        db.commit()
+        return None
+    except IntegrityError:
+        db.rollback()
+
+    existing = _get_record(db, endpoint, key)
+    if existing is None:
+        # Fue eliminada entre el INSERT y la lectura (vencida o liberada): reintentar una vez
+        return begin_idempotent_request(db, endpoint, key, request_hash, user_id)
+
+    if existing.expires_at < now or (existing.state == "processing" and existing.created_at < now - STALE_PROCESSING):
+        # Clave vencida o abandonada: tomarla para esta petición con un UPDATE condicionado a lo leído.
+        # Si dos reintentos la ven a la vez, solo uno cambia la fila; el otro espera su resultado.
+        table = IdempotencyKey.__table__
+        taken = db.execute(
+            update(table).where(
+                table.c.id == existing.id,
+                table.c.state == existing.state,
+                table.c.created_at == existing.created_at
+            ).values(
+                request_hash=request_hash,
+                user_id=user_id,
+                state="processing",
+                status_code=None,
+                response_body=None,
+                created_at=now,
+                expires_at=now + IDEMPOTENCY_TTL
+            )
+        ).rowcount
+        db.commit()
+        if taken == 1:
+            return None
+        return _wait_for_result(db, endpoint, key, request_hash)
+
+    if existing.state == "completed":
+        return _replay(existing, request_hash)
+
+    if existing.request_hash != request_hash:
+        _replay(existing, request_hash)
+
+    return _wait_for_result(db, endpoint, key, request_hash)
+
+
+def _wait_for_result(db: Session, endpoint: str, key: str, request_hash: str) -> Tuple[int, Any]:
+    """Espera a que la petición original termine (evento local o sondeo a la BD para otros procesos)"""
+    event = _event_for(endpoint, key)
+    deadline = time.monotonic() + WAIT_TIMEOUT_SECONDS
+    delay = 0.05
+    while time.monotonic() < deadline:
+        event.wait(delay)
+        # Terminar la transacción actual para ver lo que confirmó la otra petición
+        db.rollback()
+        record = _get_record(db, endpoint, key)
+        if record is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="La petición original con esta Idempotency-Key falló. Reintente."
+            )
+        if record.state == "completed":
+            _signal(endpoint, key)
+            return _replay(record, request_hash)
+        delay = min(delay * 2, 0.5)
+
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Hay una petición en curso con esta Idempotency-Key. Reintente en unos segundos.",
+        headers={"Retry-After": "2"}
+    )
+
+
+def store_idempotent_response(db: Session, endpoint: str, key: str, status_code: int, body: Any):
+    """
+    Marca la clave como completada con la respuesta final, sin confirmar.
+    Se llama dentro de la transacción de la venta/compra: si el proceso cae después del commit,
+    la clave ya tiene la respuesta y el reintento no registra la operación dos veces.
+    """
+    record = _get_record(db, endpoint, key)
+    if record:
+        record.state = "completed"
+        record.status_code = status_code
+        record.response_body = json.dumps(jsonable_encoder(body))
+
+
+def finish_idempotent_request(endpoint: str, key: str):
+    """Despierta a los reintentos que esperan la clave (tras confirmar la respuesta)"""
+    _signal(endpoint, key)
+
+
+def complete_idempotent_request(db: Session, endpoint: str, key: str, status_code: int, body: Any):
+    """Guarda y confirma la respuesta final (p. ej. un error 400) para que los reintentos la reciban tal cual"""
+    try:
+        store_idempotent_response(db, endpoint, key, status_code, body)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Advertencia: No se pudo guardar la respuesta idempotente: {e}")
+    finally:
+        _signal(endpoint, key)
+
+
+def release_idempotent_request(db: Session, endpoint: str, key: str):
+    """Libera la clave tras un error inesperado para que el cliente pueda reintentar"""
+    try:
+        db.rollback()
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.endpoint == endpoint,
+            IdempotencyKey.idempotency_key == key,
+            IdempotencyKey.state == "processing"
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Advertencia: No se pudo liberar la Idempotency-Key: {e}")
+    finally:
+        _signal(endpoint, key)
@@ -0,0 +1,192 @@
+"""
+Almacenamiento de imágenes de productos
+- Las subidas multipart se leen por bloques (sin cargar el archivo completo en memoria)
+- Los archivos se guardan con el hash SHA-256 del contenido: la misma foto se guarda una sola vez
+  y los nombres no colisionan con subidas concurrentes
+- Las miniaturas y variantes WebP se generan en un hilo de fondo
+"""
+import os
+import uuid
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, BinaryIO
+
+from utils.static_files import versioned_path
+
+UPLOAD_DIR = "uploads/products"
+THUMBNAIL_DIR = os.path.join(UPLOAD_DIR, "thumbs")
+THUMBNAIL_SIZE = (240, 240)
+WEBP_QUALITY = 80
+CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_BYTES = 10 * 1024 * 1024  # 10 MB
+
+ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
+
+# Pool pequeño: el redimensionado es CPU y no debe competir con las peticiones
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-variants")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _extension_from(filename: Optional[str], content_type: Optional[str]) -> str:
+    if filename and "." in filename:
+        extension = filename.rsplit(".", 1)[-1].lower()
+        if extension in ALLOWED_EXTENSIONS:
+            return "jpg" if extension == "jpeg" else extension
+    if content_type:
+        for extension in ("png", "gif", "webp"):
+            if extension in content_type:
+                return extension
+    return "jpg"
+
+
+def _store(temp_path: str, digest: str, extension: str) -> str:
+    """Mueve el archivo temporal a su nombre definitivo (o lo descarta si la imagen ya existe)"""
+    final_path = os.path.join(UPLOAD_DIR, f"{digest}.{extension}")
+    if os.path.exists(final_path):
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, final_path)
+    schedule_variants(final_path)
+    return final_path.replace(os.sep, "/")
+
+
+def _too_large() -> ValueError:
+    return ValueError(f"La imagen supera el tamaño máximo de {MAX_IMAGE_BYTES // (1024 * 1024)} MB")
+
+
+def save_image_stream(stream: BinaryIO, filename: Optional[str] = None, content_type: Optional[str] = None) -> str:
+    """
+    Guarda una imagen leyendo el flujo por bloques y calculando el hash al mismo tiempo.
+    Retorna la ruta relativa ("uploads/products/<sha256>.<ext>").
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    extension = _extension_from(filename, content_type)
+    temp_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4()}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise _too_large()
+                digest.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise ValueError("La imagen está vacía")
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return _store(temp_path, digest.hexdigest(), extension)
+
+
+def save_upload(upload) -> str:
+    """Guarda un UploadFile de FastAPI (Starlette ya lo mantiene en un archivo temporal)"""
+    return save_image_stream(upload.file, upload.filename, upload.content_type)
+
+
+def save_base64_image(base64_string: str) -> Optional[str]:
+    """
+    Compatibilidad con clientes que aún envían la imagen en base64 (data:image/png;base64,...)
+    Se guarda con el mismo esquema de nombres por hash.
+    """
+    if not base64_string:
+        return None
+    content_type = None
+    data = base64_string
+    if "," in base64_string:
+        content_type, data = base64_string.split(",", 1)
+    # Mismo límite que las subidas multipart, comprobado antes de decodificar (4 caracteres = 3 bytes)
+    if len(data) * 3 // 4 > MAX_IMAGE_BYTES:
+        raise _too_large()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    image_data = base64.b64decode(data)
+    digest = hashlib.sha256(image_data).hexdigest()
+    extension = _extension_from(None, content_type)
+    temp_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4()}.part")
+    with open(temp_path, "wb") as f:
+        f.write(image_data)
+    return _store(temp_path, digest, extension)
+
+
+def _variant_paths(image_path: str):
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return (
+        os.path.join(THUMBNAIL_DIR, f"{stem}.webp"),
+        os.path.join(UPLOAD_DIR, f"{stem}.webp")
+    )
+
+
+def _generate_variants(image_path: str):
+    """Genera la miniatura WebP y la versión WebP a tamaño completo"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Advertencia: Pillow no está instalado, no se generan miniaturas")
+        return
+    thumbnail_path, webp_path = _variant_paths(image_path)
+    try:
+        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+        with Image.open(image_path) as image:
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+            if not os.path.exists(webp_path) and not image_path.endswith(".webp"):
+                image.save(webp_path + ".part", "WEBP", quality=WEBP_QUALITY)
+                os.replace(webp_path + ".part", webp_path)
+            if not os.path.exists(thumbnail_path):
+                image.thumbnail(THUMBNAIL_SIZE)
+                image.save(thumbnail_path + ".part", "WEBP", quality=WEBP_QUALITY)
+                os.replace(thumbnail_path + ".part", thumbnail_path)
+    except Exception as e:
+        print(f"Advertencia: No se pudieron generar las variantes de {image_path}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(image_path)
+
+
+def schedule_variants(image_path: str):
+    """Encola la generación de variantes si aún no existen (no bloquea la petición)"""
+    if not image_path or image_path.startswith(("http://", "https://")):
+        return
+    thumbnail_path, _ = _variant_paths(image_path)
+    if os.path.exists(thumbnail_path) or not os.path.exists(image_path):
+        return
+    with _pending_lock:
+        if image_path in _pending:
+            return
+        _pending.add(image_path)
+    _executor.submit(_generate_variants, image_path)
+
+
+def build_image_url(image_path: Optional[str]) -> Optional[str]:
+    """Construye la URL completa de una ruta relativa de uploads"""
+    if not image_path:
+        return None
+    # Si la imagen ya tiene http://, usarla tal cual
+    if image_path.startswith('http://') or image_path.startswith('https://'):
+        return image_path
+    # Base URL del servidor (puede configurarse desde variable de entorno)
+    base_url = os.getenv('API_BASE_URL', 'http://127.0.0.1:8000')
+    # Asegurar que la ruta no tenga barras duplicadas; la URL lleva la versión del archivo
+    # para que /uploads pueda responder con Cache-Control immutable
+    return f"{base_url}/{versioned_path(image_path.lstrip('/'))}"
+
+
+def build_thumbnail_url(image_path: Optional[str]) -> Optional[str]:
+    """
+    URL de la miniatura para vistas de listado. Si todavía no existe (imagen antigua o en proceso),
+    se encola su generación y se retorna la URL de la imagen original.
+    """
+    if not image_path or image_path.startswith(('http://', 'https://')):
+        return build_image_url(image_path)
+    thumbnail_path, _ = _variant_paths(image_path)
+    if os.path.exists(thumbnail_path):
+        return build_image_url(thumbnail_path.replace(os.sep, "/"))
+    schedule_variants(image_path.lstrip('/'))
+    return build_image_url(image_path)
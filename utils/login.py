@@ -0,0 +1,190 @@
+"""
+Inicio de sesión sin bloquear el resto de la API
+- bcrypt se ejecuta en un pool de hilos propio y acotado (bcrypt libera el GIL), con un límite
+  de peticiones en cola: una ráfaga de logins no ocupa los hilos que atienden ventas
+- Límite de intentos fallidos por usuario y por IP en una ventana deslizante; el almacenamiento
+  es intercambiable (en memoria por defecto, un backend compartido debe implementar ThrottleStore)
+- Si cambia BCRYPT_ROUNDS, el hash se regenera con el nuevo costo al iniciar sesión
+"""
+import os
+import time
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Optional
+
+from utils.security import verify_password, get_password_hash, password_needs_rehash
+
+# Hilos dedicados a bcrypt: la mitad de los núcleos deja CPU libre para las peticiones
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Verificaciones en curso + en espera; por encima se responde 503 en lugar de encolar sin límite
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "32"))
+
+# Intentos fallidos permitidos dentro de la ventana
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "5"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "20"))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password-hash")
+_slots = threading.BoundedSemaphore(PASSWORD_QUEUE_LIMIT)
+
+# Hash de referencia para usuarios inexistentes: la respuesta tarda lo mismo que con un usuario real
+_dummy_hash: Optional[str] = None
+
+
+class LoginBusy(Exception):
+    """El pool de bcrypt está lleno: el cliente debe reintentar más tarde"""
+
+
+class ThrottleStore(ABC):
+    """
+    Almacenamiento de intentos fallidos por clave ("user:<nombre>" / "ip:<dirección>").
+    Las marcas de tiempo son time.time() para que un backend compartido entre procesos sea posible.
+    Un backend que no implemente todos los métodos falla al instanciarse, no en el primer login.
+    """
+
+    @abstractmethod
+    def add(self, key: str, timestamp: float, window: float) -> int:
+        """Registra un intento y retorna cuántos hay dentro de la ventana"""
+
+    @abstractmethod
+    def oldest(self, key: str, now: float, window: float) -> Optional[float]:
+        """Intento más antiguo dentro de la ventana (None si no hay)"""
+
+    @abstractmethod
+    def count(self, key: str, now: float, window: float) -> int:
+        """Intentos dentro de la ventana"""
+
+    @abstractmethod
+    def reset(self, key: str):
+        """Olvida los intentos de la clave (login correcto)"""
+
+
+class MemoryThrottleStore(ThrottleStore):
+    """Ventana deslizante en memoria del proceso (una cola de marcas de tiempo por clave)"""
+
+    # Cada cuántas escrituras se eliminan las claves sin intentos recientes
+    PURGE_EVERY = 1000
+
+    def __init__(self):
+        self._attempts: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _prune(self, key: str, now: float, window: float) -> Optional[Deque[float]]:
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - window:
+            attempts.popleft()
+        if not attempts:
+            del self._attempts[key]
+            return None
+        return attempts
+
+    def add(self, key: str, timestamp: float, window: float) -> int:
+        with self._lock:
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                for stale in list(self._attempts):
+                    self._prune(stale, timestamp, window)
+            attempts = self._prune(key, timestamp, window)
+            if attempts is None:
+                attempts = self._attempts[key] = deque()
+            attempts.append(timestamp)
+            return len(attempts)
+
+    def oldest(self, key: str, now: float, window: float) -> Optional[float]:
+        with self._lock:
+            attempts = self._prune(key, now, window)
+            return attempts[0] if attempts else None
+
+    def count(self, key: str, now: float, window: float) -> int:
+        with self._lock:
+            attempts = self._prune(key, now, window)
+            return len(attempts) if attempts else 0
+
+    def reset(self, key: str):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+
+class LoginThrottle:
+    """Bloquea temporalmente un usuario o una IP tras demasiados intentos fallidos"""
+
+    def __init__(self, store: ThrottleStore = None, window: int = LOGIN_WINDOW_SECONDS,
+                 max_per_user: int = LOGIN_MAX_FAILURES_PER_USER, max_per_ip: int = LOGIN_MAX_FAILURES_PER_IP):
+        self.store = store or MemoryThrottleStore()
+        self.window = window
+        self.max_per_user = max_per_user
+        self.max_per_ip = max_per_ip
+
+    def _keys(self, username: str, ip: Optional[str]):
+        keys = [(f"user:{username.strip().lower()}", self.max_per_user)]
+        if ip:
+            keys.append((f"ip:{ip}", self.max_per_ip))
+        return keys
+
+    def retry_after(self, username: str, ip: Optional[str]) -> Optional[int]:
+        """Segundos hasta poder reintentar, o None si el intento está permitido"""
+        now = time.time()
+        wait = 0.0
+        for key, limit in self._keys(username, ip):
+            if self.store.count(key, now, self.window) >= limit:
+                oldest = self.store.oldest(key, now, self.window)
+                wait = max(wait, (oldest or now) + self.window - now)
+        return max(1, int(wait + 0.999)) if wait else None
+
+    def failure(self, username: str, ip: Optional[str]):
+        now = time.time()
+        for key, _ in self._keys(username, ip):
+            self.store.add(key, now, self.window)
+
+    def success(self, username: str):
+        """Un login correcto limpia los fallos del usuario (no los de la IP)"""
+        self.store.reset(self._keys(username, None)[0][0])
+
+
+login_throttle = LoginThrottle()
+
+
+def set_throttle_store(store: ThrottleStore):
+    """Cambia el almacenamiento de intentos (p. ej. uno compartido entre procesos)"""
+    login_throttle.store = store
+
+
+async def _run_in_pool(function, *args):
+    if not _slots.acquire(blocking=False):
+        raise LoginBusy()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, function, *args)
+    finally:
+        _slots.release()
+
+
+async def check_password(plain_password: str, hashed_password: Optional[str]) -> bool:
+    """
+    Verifica la contraseña en el pool de bcrypt sin ocupar un hilo de peticiones.
+    Sin hash (usuario inexistente) se verifica contra un hash de referencia y retorna False.
+    Lanza LoginBusy si la cola está llena.
+    """
+    global _dummy_hash
+    if not hashed_password:
+        if _dummy_hash is None:
+            _dummy_hash = await _run_in_pool(get_password_hash, "usuario-inexistente")
+        await _run_in_pool(verify_password, plain_password, _dummy_hash)
+        return False
+    return await _run_in_pool(verify_password, plain_password, hashed_password)
+
+
+async def rehash_if_needed(plain_password: str, hashed_password: str) -> Optional[str]:
+    """Nuevo hash si el actual usa otro costo; None si no hace falta o el pool está lleno"""
+    if not password_needs_rehash(hashed_password):
+        return None
+    try:
+        return await _run_in_pool(get_password_hash, plain_password)
+    except LoginBusy:
+        # Se regenerará en el próximo inicio de sesión
+        return None
@@ -1,29 +1,99 @@
 """
 Generador de PDFs usando reportlab
 Genera PDFs con formato tipo Excel/tabla
+- Las tablas largas (detalle de ventas, ventas por día, ranking de productos) se dibujan con
+  StreamedTable: en cada página se toman del generador solo las filas que caben y se dibujan como
+  una tabla de una página con la fila de encabezado. No se arma ni se divide una tabla gigante,
+  así un reporte de 100 000 filas se genera con memoria acotada
+- write_*_report_pdf escriben en un archivo abierto (ver utils.report_jobs) y retornan las páginas;
+  generate_*_report_pdf retornan los bytes para reportes chicos
 """
 from io import BytesIO
+from collections import deque
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Flowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterable, BinaryIO
 
+# Alto fijo de filas en las tablas largas: las filas por página se calculan sin medir cada celda
+HEADER_ROW_HEIGHT = 22
+ROW_HEIGHT = 14
 
-def generate_sales_report_pdf(report_data: Dict[str, Any]) -> bytes:
+
+class StreamedTable(Flowable):
     """
-    Genera un PDF del reporte de ventas con formato tipo Excel/tabla
+    Tabla larga alimentada por un generador de filas.
+    Si las filas restantes no caben, split() entrega una tabla con las que caben en la página
+    (más el encabezado) y se vuelve a encolar a sí misma para la página siguiente.
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    
-    # Contenedor para elementos del PDF
-    elements = []
+
+    def __init__(self, header: List[str], rows: Iterable[List[str]], col_widths: List[float], style: TableStyle,
+                 header_height: float = HEADER_ROW_HEIGHT, row_height: float = ROW_HEIGHT):
+        Flowable.__init__(self)
+        self.header = header
+        self.col_widths = col_widths
+        self.style = style
+        self.header_height = header_height
+        self.row_height = row_height
+        self.hAlign = 'CENTER'
+        self._rows = iter(rows)
+        self._pending = deque()
+        self._exhausted = False
+
+    def _fill(self, count: int):
+        while len(self._pending) < count and not self._exhausted:
+            try:
+                self._pending.append(next(self._rows))
+            except StopIteration:
+                self._exhausted = True
+
+    def _capacity(self, available_height: float) -> int:
+        return max(0, int((available_height - self.header_height) // self.row_height))
+
+    def _page_table(self, count: int) -> Table:
+        rows = [self._pending.popleft() for _ in range(min(count, len(self._pending)))]
+        table = Table(
+            [self.header] + rows,
+            colWidths=self.col_widths,
+            rowHeights=[self.header_height] + [self.row_height] * len(rows)
+        )
+        table.setStyle(self.style)
+        return table
+
+    def wrap(self, availWidth, availHeight):
+        capacity = self._capacity(availHeight)
+        # Una fila extra indica si quedan más de las que caben
+        self._fill(capacity + 1)
+        self.width = sum(self.col_widths)
+        if len(self._pending) <= capacity:
+            self.height = self.header_height + self.row_height * len(self._pending)
+        else:
+            # No cabe completa: el frame llama a split()
+            self.height = availHeight + 1
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        capacity = self._capacity(availHeight)
+        if capacity == 0:
+            return []
+        self.__dict__.pop('_postponed', None)
+        self._fill(capacity)
+        return [self._page_table(capacity), self]
+
+    def draw(self):
+        table = self._page_table(len(self._pending))
+        table.wrapOn(self.canv, self.width, self.height)
+        table.drawOn(self.canv, 0, 0)
+
+
+def _title_elements(title: str, report_data: Dict[str, Any]) -> List[Any]:
+    """Título, período y fecha de generación"""
     styles = getSampleStyleSheet()
-    
+
     # Estilo para título
     title_style = ParagraphStyle(
         'CustomTitle',
@@ -33,7 +103,7 @@ def generate_sales_report_pdf(report_data: Dict[str, Any]) -> bytes:
         spaceAfter=30,
         alignment=TA_CENTER
     )
-    
+
     # Estilo para subtítulos
     subtitle_style = ParagraphStyle(
         'CustomSubtitle',
@@ -42,10 +112,7 @@ def generate_sales_report_pdf(report_data: Dict[str, Any]) -> bytes:
         textColor=colors.HexColor('#666666'),
         alignment=TA_CENTER
     )
-    
-    # Título del reporte
-    elements.append(Paragraph("REPORTE DE VENTAS", title_style))
-    
+
     # Información del período
     period_text = ""
     if report_data.get('start_date'):
@@ -56,20 +123,16 @@ def generate_sales_report_pdf(report_data: Dict[str, Any]) -> bytes:
         period_text += f"Hasta: {report_data['end_date']}"
     if not period_text:
         period_text = "Período: Todos los registros"
-    
-    elements.append(Paragraph(period_text, subtitle_style))
-    elements.append(Paragraph(f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", subtitle_style))
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Tabla de resumen
-    summary_data = [
-        ['RESUMEN GENERAL', ''],
-        ['Total de Ventas', str(report_data.get('total_sales', 0))],
-        ['Total Vendido', f"${report_data.get('total_amount', 0):,.2f}"],
-        ['Total de Items', str(report_data.get('total_items', 0))],
-        ['Promedio por Venta', f"${report_data.get('average_sale', 0):,.2f}"]
+
+    return [
+        Paragraph(title, title_style),
+        Paragraph(period_text, subtitle_style),
+        Paragraph(f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", subtitle_style),
+        Spacer(1, 0.3*inch)
     ]
-    
+
+
+def _summary_table(summary_data: List[List[str]]) -> Table:
     summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
     summary_table.setStyle(TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
@@ -83,10 +146,84 @@ def generate_sales_report_pdf(report_data: Dict[str, Any]) -> bytes:
         ('FONTSIZE', (0, 1), (-1, -1), 10),
         ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#E7E6E6')])
     ]))
-    
-    elements.append(summary_table)
+    return summary_table
+
+
+def _list_style(header_color: str, body_color: str, header_text=colors.whitesmoke, extra=()) -> TableStyle:
+    """Estilo de las tablas largas (filas de alto fijo, encabezado en la primera fila de cada página)"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(header_color)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), header_text),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor(body_color)),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('TOPPADDING', (0, 1), (-1, -1), 2),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')]),
+        *extra
+    ])
+
+
+def _build(output: BinaryIO, elements: List[Any]) -> int:
+    """Construye el PDF en 'output' y retorna la cantidad de páginas"""
+    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    doc.build(elements)
+    return doc.page
+
+
+def _to_bytes(write, *args) -> bytes:
+    buffer = BytesIO()
+    write(buffer, *args)
+    pdf_bytes = buffer.getvalue()
+    buffer.close()
+
+    # Verificar que el PDF tenga la signatura correcta
+    if not pdf_bytes.startswith(b'%PDF'):
+        raise ValueError("El PDF generado no tiene la signatura correcta")
+
+    return pdf_bytes
+
+
+def _sale_rows(sales: Iterable[Dict[str, Any]]):
+    for sale in sales:
+        yield [
+            str(sale.get('id', '')),
+            sale.get('date', '').split('T')[0] if sale.get('date') else '',
+            sale.get('client_name', '')[:20] if sale.get('client_name') else '',
+            sale.get('payment_method', ''),
+            str(sale.get('items_count', 0)),
+            f"${sale.get('total', 0):,.2f}"
+        ]
+
+
+def _daily_rows(daily_sales: Dict[str, Dict[str, Any]]):
+    for date, data in daily_sales.items():
+        yield [date, str(data.get('count', 0)), f"${data.get('total', 0):,.2f}"]
+
+
+def write_sales_report_pdf(output: BinaryIO, report_data: Dict[str, Any], sales: Iterable[Dict[str, Any]]) -> int:
+    """
+    Escribe el PDF del reporte de ventas (completo, sin recortar días ni ventas).
+    report_data trae el resumen (get_sales_report o get_sales_report_summary) y 'sales' puede ser
+    un generador sobre el cursor de la base de datos. Retorna la cantidad de páginas.
+    """
+    styles = getSampleStyleSheet()
+    elements = _title_elements("REPORTE DE VENTAS", report_data)
+
+    # Tabla de resumen
+    elements.append(_summary_table([
+        ['RESUMEN GENERAL', ''],
+        ['Total de Ventas', str(report_data.get('total_sales', 0))],
+        ['Total Vendido', f"${report_data.get('total_amount', 0):,.2f}"],
+        ['Total de Items', str(report_data.get('total_items', 0))],
+        ['Promedio por Venta', f"${report_data.get('average_sale', 0):,.2f}"]
+    ]))
     elements.append(Spacer(1, 0.3*inch))
-    
+
     # Tabla de métodos de pago
     if report_data.get('payment_methods'):
         payment_data = [['MÉTODO DE PAGO', 'CANTIDAD', 'TOTAL']]
@@ -96,7 +233,7 @@ def generate_sales_report_pdf(report_data: Dict[str, Any]) -> bytes:
                 str(data.get('count', 0)),
                 f"${data.get('total', 0):,.2f}"
             ])
-        
+
         payment_table = Table(payment_data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch])
         payment_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#70AD47')),
@@ -110,213 +247,95 @@ def generate_sales_report_pdf(report_data: Dict[str, Any]) -> bytes:
             ('FONTSIZE', (0, 1), (-1, -1), 10),
             ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')])
         ]))
-        
+
         elements.append(Paragraph("Métodos de Pago", styles['Heading2']))
         elements.append(Spacer(1, 0.1*inch))
         elements.append(payment_table)
         elements.append(Spacer(1, 0.3*inch))
-    
-    # Tabla de ventas diarias
+
+    # Tabla de ventas diarias (todos los días del período)
     if report_data.get('daily_sales'):
-        daily_data = [['FECHA', 'CANTIDAD', 'TOTAL']]
-        for date, data in list(report_data['daily_sales'].items())[:30]:  # Limitar a 30 días
-            daily_data.append([
-                date,
-                str(data.get('count', 0)),
-                f"${data.get('total', 0):,.2f}"
-            ])
-        
-        daily_table = Table(daily_data, colWidths=[2*inch, 1.5*inch, 1.5*inch])
-        daily_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#FFC000')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#FFF2CC')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')])
-        ]))
-        
         elements.append(Paragraph("Ventas por Día", styles['Heading2']))
         elements.append(Spacer(1, 0.1*inch))
-        elements.append(daily_table)
+        elements.append(StreamedTable(
+            ['FECHA', 'CANTIDAD', 'TOTAL'],
+            _daily_rows(report_data['daily_sales']),
+            [2*inch, 1.5*inch, 1.5*inch],
+            _list_style('#FFC000', '#FFF2CC', header_text=colors.black)
+        ))
         elements.append(Spacer(1, 0.3*inch))
-    
-    # Tabla detallada de ventas (primeras 50)
-    if report_data.get('sales'):
-        sales_data = [['ID', 'FECHA', 'CLIENTE', 'MÉTODO', 'ITEMS', 'TOTAL']]
-        for sale in report_data['sales'][:50]:  # Limitar a 50 ventas
-            sales_data.append([
-                str(sale.get('id', '')),
-                sale.get('date', '').split('T')[0] if sale.get('date') else '',
-                sale.get('client_name', '')[:20] if sale.get('client_name') else '',
-                sale.get('payment_method', ''),
-                str(sale.get('items_count', 0)),
-                f"${sale.get('total', 0):,.2f}"
-            ])
-        
-        sales_table = Table(sales_data, colWidths=[0.5*inch, 1*inch, 1.5*inch, 1*inch, 0.7*inch, 1*inch])
-        sales_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#7030A0')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#E7E6E6')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')]),
-            ('ALIGN', (0, 1), (0, -1), 'LEFT'),  # ID alineado a la izquierda
-            ('ALIGN', (5, 1), (5, -1), 'RIGHT'),  # Total alineado a la derecha
-        ]))
-        
+
+    # Tabla detallada de ventas (todas, leídas del generador página por página)
+    if report_data.get('total_sales'):
         elements.append(Paragraph("Detalle de Ventas", styles['Heading2']))
         elements.append(Spacer(1, 0.1*inch))
-        elements.append(sales_table)
-    
-    # Construir PDF
-    doc.build(elements)
-    
-    # Obtener bytes del PDF
-    buffer.seek(0)
-    pdf_bytes = buffer.getvalue()
-    buffer.close()
-    
-    # Verificar que el PDF tenga la signatura correcta
-    if not pdf_bytes.startswith(b'%PDF'):
-        raise ValueError("El PDF generado no tiene la signatura correcta")
-    
-    return pdf_bytes
+        elements.append(StreamedTable(
+            ['ID', 'FECHA', 'CLIENTE', 'MÉTODO', 'ITEMS', 'TOTAL'],
+            _sale_rows(sales),
+            [0.7*inch, 1*inch, 1.6*inch, 1*inch, 0.7*inch, 1*inch],
+            _list_style('#7030A0', '#E7E6E6', extra=(
+                ('ALIGN', (0, 1), (0, -1), 'LEFT'),  # ID alineado a la izquierda
+                ('ALIGN', (5, 1), (5, -1), 'RIGHT'),  # Total alineado a la derecha
+            ))
+        ))
 
+    return _build(output, elements)
 
-def generate_top_products_report_pdf(report_data: Dict[str, Any]) -> bytes:
+
+def generate_sales_report_pdf(report_data: Dict[str, Any]) -> bytes:
     """
-    Genera un PDF del reporte de productos más vendidos con formato tipo Excel/tabla
+    Genera un PDF del reporte de ventas con formato tipo Excel/tabla
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    
-    elements = []
+    return _to_bytes(write_sales_report_pdf, report_data, report_data.get('sales') or [])
+
+
+def _product_rows(products: Iterable[Dict[str, Any]]):
+    for idx, product in enumerate(products, 1):
+        yield [
+            str(idx),
+            product.get('product_name', '')[:25],
+            (product.get('presentation') or '')[:15],
+            str(product.get('total_quantity_sold', 0)),
+            f"${product.get('total_revenue', 0):,.2f}",
+            str(product.get('sales_count', 0)),
+            f"${product.get('average_per_sale', 0):,.2f}"
+        ]
+
+
+def write_top_products_report_pdf(output: BinaryIO, report_data: Dict[str, Any],
+                                  products: Iterable[Dict[str, Any]]) -> int:
+    """Escribe el PDF del reporte de productos más vendidos y retorna la cantidad de páginas"""
     styles = getSampleStyleSheet()
-    
-    # Estilo para título
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#1a1a1a'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    # Estilo para subtítulos
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor('#666666'),
-        alignment=TA_CENTER
-    )
-    
-    # Título del reporte
-    elements.append(Paragraph("PRODUCTOS MÁS VENDIDOS", title_style))
-    
-    # Información del período
-    period_text = ""
-    if report_data.get('start_date'):
-        period_text += f"Desde: {report_data['start_date']}"
-    if report_data.get('end_date'):
-        if period_text:
-            period_text += " | "
-        period_text += f"Hasta: {report_data['end_date']}"
-    if not period_text:
-        period_text = "Período: Todos los registros"
-    
-    elements.append(Paragraph(period_text, subtitle_style))
-    elements.append(Paragraph(f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", subtitle_style))
-    elements.append(Spacer(1, 0.3*inch))
-    
+    elements = _title_elements("PRODUCTOS MÁS VENDIDOS", report_data)
+
     # Tabla de resumen
-    summary_data = [
+    elements.append(_summary_table([
         ['RESUMEN', ''],
         ['Total de Productos', str(report_data.get('total_products', 0))],
         ['Límite Mostrado', str(report_data.get('limit', 0))]
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#D9E1F2')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#E7E6E6')])
     ]))
-    
-    elements.append(summary_table)
     elements.append(Spacer(1, 0.3*inch))
-    
+
     # Tabla de productos
-    if report_data.get('products'):
-        products_data = [
-            ['#', 'PRODUCTO', 'PRESENTACIÓN', 'CANTIDAD VENDIDA', 'INGRESOS', 'VENTAS', 'PROMEDIO']
-        ]
-        
-        for idx, product in enumerate(report_data['products'], 1):
-            products_data.append([
-                str(idx),
-                product.get('product_name', '')[:25],
-                product.get('presentation', '')[:15],
-                str(product.get('total_quantity_sold', 0)),
-                f"${product.get('total_revenue', 0):,.2f}",
-                str(product.get('sales_count', 0)),
-                f"${product.get('average_per_sale', 0):,.2f}"
-            ])
-        
-        products_table = Table(
-            products_data,
-            colWidths=[0.4*inch, 1.8*inch, 1*inch, 1*inch, 1*inch, 0.7*inch, 1*inch]
-        )
-        products_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#70AD47')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#E2EFDA')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')]),
-            ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Número
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),    # Producto alineado a la izquierda
-            ('ALIGN', (4, 1), (4, -1), 'RIGHT'),   # Ingresos alineado a la derecha
-            ('ALIGN', (6, 1), (6, -1), 'RIGHT'),  # Promedio alineado a la derecha
-        ]))
-        
+    if report_data.get('total_products'):
         elements.append(Paragraph("Ranking de Productos", styles['Heading2']))
         elements.append(Spacer(1, 0.1*inch))
-        elements.append(products_table)
-    
-    # Construir PDF
-    doc.build(elements)
-    
-    # Obtener bytes del PDF
-    buffer.seek(0)
-    pdf_bytes = buffer.getvalue()
-    buffer.close()
-    
-    # Verificar que el PDF tenga la signatura correcta
-    if not pdf_bytes.startswith(b'%PDF'):
-        raise ValueError("El PDF generado no tiene la signatura correcta")
-    
-    return pdf_bytes
+        elements.append(StreamedTable(
+            ['#', 'PRODUCTO', 'PRESENTACIÓN', 'CANTIDAD VENDIDA', 'INGRESOS', 'VENTAS', 'PROMEDIO'],
+            _product_rows(products),
+            [0.4*inch, 1.8*inch, 1*inch, 1.1*inch, 1*inch, 0.7*inch, 1*inch],
+            _list_style('#70AD47', '#E2EFDA', extra=(
+                ('ALIGN', (1, 1), (1, -1), 'LEFT'),    # Producto alineado a la izquierda
+                ('ALIGN', (4, 1), (4, -1), 'RIGHT'),   # Ingresos alineado a la derecha
+                ('ALIGN', (6, 1), (6, -1), 'RIGHT'),  # Promedio alineado a la derecha
+            ))
+        ))
+
+    return _build(output, elements)
 
+
+def generate_top_products_report_pdf(report_data: Dict[str, Any]) -> bytes:
+    """
+    Genera un PDF del reporte de productos más vendidos con formato tipo Excel/tabla
+    """
+    return _to_bytes(write_top_products_report_pdf, report_data, report_data.get('products') or [])
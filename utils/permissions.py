@@ -5,7 +5,8 @@ Verifica permisos según el rol del usuario
 from fastapi import HTTPException, status
 from db.models import User, Role, Permission
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Hashable, List
+from utils.tokens import TokenUser, get_role_info
 
 
 # Definición de permisos del sistema
@@ -71,17 +72,15 @@ def get_user_permissions(db: Session, user: User) -> List[str]:
     """
     Obtiene la lista de permisos del usuario basado en su rol
     """
-    if not user or not user.role:
+    if not user or not user.role_id:
         return []
     
-    # Cargar permisos del rol
-    role = db.query(Role).filter(Role.id == user.role_id).first()
+    # Permisos del rol desde la memoria (utils.tokens), sin consultar la BD en cada petición
+    role = get_role_info(db, user.role_id)
     if not role:
         return []
     
-    # Obtener nombres de permisos
-    permissions = [perm.name for perm in role.permissions if perm.status == 1]
-    return permissions
+    return sorted(role.permissions)
 
 
 def has_permission(db: Session, user: User, permission_name: str) -> bool:
@@ -91,12 +90,15 @@ def has_permission(db: Session, user: User, permission_name: str) -> bool:
     if not user:
         return False
     
+    role = get_role_info(db, user.role_id)
+    if not role:
+        return False
+    
     # Administrador tiene todos los permisos
-    if user.role and user.role.name.lower() == "administrador":
+    if role.name and role.name.lower() == "administrador":
         return True
     
-    permissions = get_user_permissions(db, user)
-    return permission_name in permissions
+    return permission_name in role.permissions
 
 
 def require_permission(permission_name: str):
@@ -110,13 +112,13 @@ def require_permission(permission_name: str):
             db = None
             
             for arg in args:
-                if isinstance(arg, User):
+                if isinstance(arg, (User, TokenUser)):
                     current_user = arg
                 elif hasattr(arg, 'query'):  # Es una Session de SQLAlchemy
                     db = arg
             
             for key, value in kwargs.items():
-                if isinstance(value, User):
+                if isinstance(value, (User, TokenUser)):
                     current_user = value
                 elif hasattr(value, 'query'):
                     db = value
@@ -143,6 +145,17 @@ def require_permission(permission_name: str):
     return decorator
 
 
+def permission_scope(db: Session, user: User) -> Hashable:
+    """
+    Alcance de un cálculo compartido (single-flight): solo se comparten resultados entre usuarios
+    del mismo rol con la misma versión de permisos
+    """
+    role = get_role_info(db, user.role_id) if user else None
+    if not role:
+        return ("anonymous",)
+    return ("role", role.id, role.version)
+
+
 def check_permission(db: Session, user: User, permission_name: str):
     """
     Verifica permiso y lanza excepción si no lo tiene
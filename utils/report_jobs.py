@@ -0,0 +1,392 @@
+"""
+Reportes en segundo plano con resultados en caché
+- POST /reports/jobs encola un reporte (tipo + parámetros); un pool de hilos propio lo calcula y el
+  cliente consulta el estado (GET /reports/jobs/{id}) y descarga el resultado (.../result)
+- Los resultados se guardan por tipo y parámetros:
+  - período cerrado (fecha de fin anterior a hoy): sin vencimiento, mientras no cambie la versión
+    de esos días en financial_totals (por ejemplo, una venta cargada con fecha atrasada)
+  - período abierto (sin fecha de fin o que incluye hoy), o financial_totals sin inicializar:
+    REPORT_OPEN_TTL_SECONDS
+- Un reporte pedido mientras ya se está calculando se une al trabajo en curso
+- GET /reports/sales, /reports/top-products y sus /export usan la misma caché (calculan en línea si falta)
+- Los PDF y XLSX se escriben en un archivo temporal del proceso (ReportFile) y se envían con
+  FileResponse; el archivo se borra cuando su resultado sale de la caché
+Los trabajos usan su propio pool de conexiones ('jobs', db.database.JobsSessionLocal) y las rutas
+el de reportes: ninguno de los dos toma conexiones del pool de ventas.
+Los trabajos y la caché viven en memoria del proceso.
+"""
+import os
+import time
+import uuid
+import atexit
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from db import database
+from utils.single_flight import flights, flight_key, current_scope, run_in_scope
+
+# Hilos que calculan reportes: pocos, para no competir con las peticiones de venta
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Vigencia de un resultado de un período abierto
+REPORT_OPEN_TTL_SECONDS = int(os.getenv("REPORT_OPEN_TTL_SECONDS", "60"))
+# Resultados guardados (se descartan los menos usados)
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "256"))
+# Tiempo que se conserva un trabajo terminado para consultarlo o descargarlo
+REPORT_JOB_TTL_SECONDS = int(os.getenv("REPORT_JOB_TTL_SECONDS", "3600"))
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report-jobs")
+
+# Directorio propio del proceso para los PDF generados (se elimina al terminar)
+REPORT_FILES_DIR = tempfile.mkdtemp(prefix="reportes-")
+atexit.register(shutil.rmtree, REPORT_FILES_DIR, True)
+
+
+class ReportType:
+    """Cómo se calcula un tipo de reporte y cómo se entrega su resultado"""
+
+    def __init__(self, compute: Callable[[Session, Dict[str, Any]], Any], media_type: str, filename: str,
+                 uses_limit: bool = False, extension: Optional[str] = None):
+        self.compute = compute
+        self.media_type = media_type
+        self.filename = filename
+        self.uses_limit = uses_limit
+        # Extensión del archivo generado (None: el resultado es JSON)
+        self.extension = extension
+
+
+def _sales_report(db: Session, params: Dict[str, Any]):
+    from crud.reports import get_sales_report
+    return get_sales_report(db, start_date=params["start_date"], end_date=params["end_date"])
+
+
+def _top_products_report(db: Session, params: Dict[str, Any]):
+    from crud.reports import get_top_products_report
+    return get_top_products_report(
+        db, start_date=params["start_date"], end_date=params["end_date"], limit=params["limit"]
+    )
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Primeros bytes esperados por extensión (un XLSX es un ZIP)
+FILE_SIGNATURES = {"pdf": b"%PDF", "xlsx": b"PK\x03\x04"}
+
+
+class ReportFile:
+    """Archivo generado en disco (lo borra la caché al descartar el resultado)"""
+
+    def __init__(self, path: str, count: int):
+        self.path = path
+        # Páginas (PDF) o filas de datos (XLSX)
+        self.count = count
+        self.size = os.path.getsize(path)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _render_file(extension: str, write: Callable[[Any], int]) -> ReportFile:
+    """Escribe el reporte directo a un archivo temporal (memoria acotada) y verifica el resultado"""
+    label = extension.upper()
+    handle = tempfile.NamedTemporaryFile(dir=REPORT_FILES_DIR, suffix=f".{extension}", delete=False)
+    try:
+        with handle:
+            count = write(handle)
+        with open(handle.name, "rb") as output:
+            signature = output.read(4)
+        if not signature:
+            raise RuntimeError(f"Error al generar {label}: archivo vacío")
+        if signature != FILE_SIGNATURES[extension]:
+            raise RuntimeError(f"Error al generar {label}: formato inválido")
+        return ReportFile(handle.name, count)
+    except BaseException:
+        os.remove(handle.name)
+        raise
+
+
+def _sales_file(db: Session, params: Dict[str, Any], extension: str) -> ReportFile:
+    # Resumen con agregados y ventas leídas del cursor a medida que se escriben
+    from crud.reports import get_sales_report_summary, iter_sales_rows, iter_sales_report_rows
+    start_date, end_date = params["start_date"], params["end_date"]
+    summary = get_sales_report_summary(db, start_date=start_date, end_date=end_date)
+    if extension == "pdf":
+        # ReportLab se importa con el primer reporte
+        from utils.pdf_generator import write_sales_report_pdf
+        return _render_file("pdf", lambda output: write_sales_report_pdf(
+            output, summary, iter_sales_report_rows(db, start_date=start_date, end_date=end_date)
+        ))
+    from utils.xlsx_export import write_sales_report_xlsx
+    return _render_file("xlsx", lambda output: write_sales_report_xlsx(
+        output, summary, iter_sales_rows(db, start_date=start_date, end_date=end_date)
+    ))
+
+
+def _top_products_file(db: Session, params: Dict[str, Any], extension: str) -> ReportFile:
+    report = get_report(db, "top-products", {name: params[name] for name in ("start_date", "end_date", "limit")})
+    if extension == "pdf":
+        from utils.pdf_generator import write_top_products_report_pdf
+        return _render_file("pdf", lambda output: write_top_products_report_pdf(output, report, report["products"]))
+    from utils.xlsx_export import write_top_products_report_xlsx
+    return _render_file("xlsx", lambda output: write_top_products_report_xlsx(output, report, report["products"]))
+
+
+REPORT_TYPES: Dict[str, ReportType] = {
+    "sales": ReportType(_sales_report, "application/json", "reporte_ventas"),
+    "top-products": ReportType(_top_products_report, "application/json", "reporte_productos_mas_vendidos",
+                               uses_limit=True),
+    "sales-pdf": ReportType(lambda db, params: _sales_file(db, params, "pdf"), "application/pdf",
+                            "reporte_ventas", extension="pdf"),
+    "top-products-pdf": ReportType(lambda db, params: _top_products_file(db, params, "pdf"), "application/pdf",
+                                   "reporte_productos_mas_vendidos", uses_limit=True, extension="pdf"),
+    "sales-xlsx": ReportType(lambda db, params: _sales_file(db, params, "xlsx"), XLSX_MEDIA_TYPE,
+                             "reporte_ventas", extension="xlsx"),
+    "top-products-xlsx": ReportType(lambda db, params: _top_products_file(db, params, "xlsx"), XLSX_MEDIA_TYPE,
+                                    "reporte_productos_mas_vendidos", uses_limit=True, extension="xlsx"),
+}
+
+
+def report_params(report_type: str, start_date: datetime = None, end_date: datetime = None,
+                  limit: int = 10) -> Dict[str, Any]:
+    """Valida el tipo y arma los parámetros normalizados del reporte"""
+    definition = REPORT_TYPES.get(report_type)
+    if definition is None:
+        raise ValueError(f"Tipo de reporte inválido: {report_type}. Use uno de: {', '.join(REPORT_TYPES)}")
+    if start_date and end_date and start_date > end_date:
+        raise ValueError("La fecha de inicio no puede ser posterior a la fecha de fin")
+    params = {"start_date": start_date, "end_date": end_date}
+    if definition.uses_limit:
+        if limit < 1:
+            raise ValueError("El límite debe ser mayor a 0")
+        params["limit"] = limit
+    return params
+
+
+def _cache_key(report_type: str, params: Dict[str, Any]) -> Tuple:
+    return (report_type,) + tuple(
+        (name, value.isoformat() if isinstance(value, (date, datetime)) else value)
+        for name, value in sorted(params.items())
+    )
+
+
+def _is_closed(params: Dict[str, Any]) -> bool:
+    """Período cerrado: tiene fecha de fin y termina antes de hoy"""
+    end_date = params.get("end_date")
+    return end_date is not None and end_date.date() < date.today()
+
+
+def _watermark(db: Session, params: Dict[str, Any]):
+    from crud.finance import get_period_watermark
+    start_date, end_date = params.get("start_date"), params.get("end_date")
+    return get_period_watermark(
+        db, start_date.date() if start_date else None, end_date.date() if end_date else None
+    )
+
+
+class CachedReport:
+    def __init__(self, content: Any, closed: bool, watermark, computed_at: float):
+        self.content = content
+        self.closed = closed
+        self.watermark = watermark
+        self.computed_at = computed_at
+
+
+class ReportCache:
+    """Resultados por (tipo, parámetros) con descarte de los menos usados"""
+
+    def __init__(self, max_entries: int = REPORT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, CachedReport]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, key: Tuple, params: Dict[str, Any]) -> Optional[CachedReport]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.closed:
+            # Sin vencimiento: solo se invalida si cambió la versión de los días del período
+            valid = _watermark(db, params) == entry.watermark
+        else:
+            valid = time.monotonic() - entry.computed_at < REPORT_OPEN_TTL_SECONDS
+        with self._lock:
+            if valid:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                return entry
+            if self._entries.get(key) is not entry:
+                return None
+            del self._entries[key]
+        _discard(entry)
+        return None
+
+    def put(self, key: Tuple, entry: CachedReport):
+        discarded = []
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous is not entry:
+                discarded.append(previous)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                discarded.append(self._entries.popitem(last=False)[1])
+        for old in discarded:
+            _discard(old)
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            _discard(entry)
+
+
+def _discard(entry: CachedReport):
+    if isinstance(entry.content, ReportFile):
+        entry.content.remove()
+
+
+cache = ReportCache()
+
+
+def _compute_report(db: Session, report_type: str, params: Dict[str, Any], key: Tuple) -> Any:
+    # La marca se lee antes de calcular: una venta registrada durante el cálculo invalida el resultado.
+    # Sin marca (financial_totals sin inicializar) el resultado vence como el de un período abierto
+    watermark = _watermark(db, params) if _is_closed(params) else None
+    closed = watermark is not None
+    content = REPORT_TYPES[report_type].compute(db, params)
+    cache.put(key, CachedReport(content, closed, watermark, time.monotonic()))
+    return content
+
+
+def get_report(db: Session, report_type: str, params: Dict[str, Any], scope: Hashable = None) -> Any:
+    """
+    Resultado del reporte desde la caché o calculado en línea (y guardado).
+    Las peticiones idénticas con el mismo alcance de permisos (utils.permissions.permission_scope)
+    que llegan mientras se calcula esperan ese mismo cálculo (single-flight).
+    """
+    if scope is None:
+        scope = current_scope()
+    key = _cache_key(report_type, params)
+    entry = cache.get(db, key, params)
+    if entry is not None:
+        return entry.content
+    return flights.do(
+        flight_key("report", {"key": key}, scope),
+        lambda: run_in_scope(scope, lambda: _compute_report(db, report_type, params, key)),
+        on_wait=None if flights.leading() else db.close
+    )
+
+
+class ReportJob:
+    def __init__(self, report_type: str, params: Dict[str, Any], user_id: Optional[int], scope: Hashable = None):
+        self.id = uuid.uuid4().hex
+        self.type = report_type
+        self.params = params
+        self.user_id = user_id
+        self.scope = scope
+        self.key = _cache_key(report_type, params)
+        self.status = PENDING
+        self.cached = False
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+
+    def finish(self, result: Any = None, error: Optional[str] = None):
+        self.result = result
+        self.error = error
+        self.status = ERROR if error else DONE
+        self.finished_at = datetime.now()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "type": self.type,
+            "params": {
+                name: value.isoformat() if isinstance(value, datetime) else value
+                for name, value in self.params.items()
+            },
+            "status": self.status,
+            "cached": self.cached,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result_url": f"/reports/jobs/{self.id}/result" if self.status == DONE else None
+        }
+
+
+_jobs: Dict[str, ReportJob] = {}
+# Trabajos pendientes o en curso por ((tipo, parámetros), alcance)
+_in_flight: Dict[Tuple, ReportJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def _purge_jobs(now: datetime):
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job.finished_at and (now - job.finished_at).total_seconds() > REPORT_JOB_TTL_SECONDS
+    ]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def _run_job(job: ReportJob):
+    with _jobs_lock:
+        job.status = RUNNING
+    db = database.JobsSessionLocal()
+    try:
+        result, error = get_report(db, job.type, job.params, job.scope), None
+    except Exception as e:
+        result, error = None, str(e)
+    finally:
+        db.close()
+    with _jobs_lock:
+        job.finish(result, error)
+        if _in_flight.get((job.key, job.scope)) is job:
+            del _in_flight[(job.key, job.scope)]
+
+
+def submit_job(db: Session, report_type: str, params: Dict[str, Any], user_id: Optional[int] = None,
+               scope: Hashable = None) -> ReportJob:
+    """
+    Crea un trabajo de reporte. Si el resultado está en caché, el trabajo nace terminado;
+    si el mismo reporte ya se está calculando con el mismo alcance de permisos, retorna ese trabajo.
+    """
+    job = ReportJob(report_type, params, user_id, scope)
+    entry = cache.get(db, job.key, params)
+    with _jobs_lock:
+        _purge_jobs(job.created_at)
+        if entry is not None:
+            job.cached = True
+            job.finish(entry.content)
+            _jobs[job.id] = job
+            return job
+        running = _in_flight.get((job.key, job.scope))
+        if running is not None:
+            return running
+        _jobs[job.id] = job
+        _in_flight[(job.key, job.scope)] = job
+    _executor.submit(_run_job, job)
+    return job
+
+
+def get_job(job_id: str) -> Optional[ReportJob]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
@@ -1,3 +1,8 @@
+import os
+
+# Costo de bcrypt para hashes nuevos; los hashes con otro costo se actualizan al iniciar sesión
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 try:
     # Intentar usar bcrypt directamente (más compatible)
     import bcrypt
@@ -11,30 +16,19 @@ try:
     
     def get_password_hash(password: str) -> str:
         """Generar hash de contraseña usando bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    
-except ImportError:
-    # Fallback a passlib si bcrypt no está disponible
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        """Verificar contraseña usando passlib"""
-        return pwd_context.verify(plain_password, hashed_password)
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
     
-    def get_password_hash(password: str) -> str:
-        """Generar hash de contraseña usando passlib"""
-        return pwd_context.hash(password)
-
-    
-    def get_password_hash(password: str) -> str:
-        """Generar hash de contraseña usando bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    def password_needs_rehash(hashed_password: str) -> bool:
+        """True si el hash se generó con un costo distinto de BCRYPT_ROUNDS ($2b$<costo>$...)"""
+        try:
+            return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+        except (AttributeError, IndexError, ValueError):
+            return True
     
 except ImportError:
     # Fallback a passlib si bcrypt no está disponible
     from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
     
     def verify_password(plain_password: str, hashed_password: str) -> bool:
         """Verificar contraseña usando passlib"""
@@ -43,3 +37,7 @@ except ImportError:
     def get_password_hash(password: str) -> str:
         """Generar hash de contraseña usando passlib"""
         return pwd_context.hash(password)
+    
+    def password_needs_rehash(hashed_password: str) -> bool:
+        """True si el hash se generó con otros parámetros que los configurados"""
+        return pwd_context.needs_update(hashed_password)
@@ -0,0 +1,46 @@
+"""
+Serialización JSON de respuestas
+- FastJSONResponse usa orjson (fechas nativas; Decimal se convierte a float) y, si no está
+  instalado, json de la biblioteca estándar con la misma conversión
+- Es la clase de respuesta por defecto de la app (main.py)
+- Las rutas de listados retornan FastJSONResponse con los diccionarios ya armados: FastAPI no
+  vuelve a validarlos con el response_model ni a recorrerlos con jsonable_encoder
+  (el response_model se conserva solo para la documentación)
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_default(obj: Any):
+    """Tipos que el serializador no conoce: Decimal (Numeric de SQLAlchemy) y, sin orjson, fechas"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+if orjson is not None:
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(
+            content, default=json_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse que serializa en una sola pasada (orjson si está disponible)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
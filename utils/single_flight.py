@@ -0,0 +1,150 @@
+"""
+Single-flight: llamadas idénticas y simultáneas comparten un solo cálculo
+- Cuando entra una venta, todas las pestañas del tablero y los reportes abiertos piden lo mismo al
+  mismo tiempo: la primera llamada (líder) ejecuta las consultas y las demás esperan su resultado
+- La clave es (nombre, parámetros normalizados, alcance): el alcance separa resultados que dependen
+  de los permisos de quien consulta; los reportes y el tablero de hoy son iguales para todos
+- Los que esperan devuelven antes su conexión al pool (db.close()): no ocupan conexiones sin usarlas
+- No es una caché: al terminar el líder la clave se libera y la siguiente llamada vuelve a calcular
+El resultado es el mismo objeto para todos: las funciones envueltas no deben modificarlo después.
+"""
+import os
+import functools
+import threading
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Hashable, Optional
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Grupo de cálculos en curso por clave (seguro entre hilos)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._local = threading.local()
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+
+    def leading(self) -> bool:
+        """True si el hilo actual está calculando como líder (llamadas anidadas)"""
+        return getattr(self._local, "depth", 0) > 0
+
+    def do(self, key: Hashable, compute: Callable[[], Any], on_wait: Callable[[], Any] = None) -> Any:
+        """
+        Ejecuta 'compute' o espera al líder que ya lo está ejecutando con la misma clave.
+        'on_wait' se llama antes de esperar (por ejemplo, para liberar la conexión de la sesión).
+        Si el líder falla, todos reciben la misma excepción.
+        """
+        if not SINGLE_FLIGHT_ENABLED:
+            return compute()
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.shared += 1
+
+        if not leader:
+            if on_wait is not None:
+                on_wait()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._local.depth -= 1
+            with self._lock:
+                del self._flights[key]
+                self.executions += 1
+            flight.done.set()
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "enabled": SINGLE_FLIGHT_ENABLED,
+                "calls": self.calls,
+                "executions": self.executions,
+                "shared": self.shared,
+                "in_flight": len(self._flights),
+            }
+
+
+flights = SingleFlight()
+
+
+def _normalize(value: Any) -> Hashable:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return tuple(sorted((name, _normalize(item)) for name, item in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_normalize(item) for item in value]
+        return tuple(sorted(items, key=repr)) if isinstance(value, (set, frozenset)) else tuple(items)
+    return value
+
+
+def flight_key(name: str, params: Dict[str, Any] = None, scope: Hashable = None) -> Hashable:
+    """Clave de single-flight: nombre de la ruta o función + parámetros normalizados + alcance"""
+    return (name, _normalize(params or {}), scope)
+
+
+# Alcance del cálculo que ejecuta el hilo actual (lo heredan las llamadas anidadas)
+_context = threading.local()
+
+
+def current_scope() -> Hashable:
+    """Alcance del cálculo compartido en curso en este hilo (None fuera de uno)"""
+    return getattr(_context, "scope", None)
+
+
+def run_in_scope(scope: Hashable, compute: Callable[[], Any]) -> Any:
+    """Ejecuta 'compute' con 'scope' como alcance heredado por las llamadas anidadas"""
+    previous = current_scope()
+    _context.scope = scope
+    try:
+        return compute()
+    finally:
+        _context.scope = previous
+
+
+def coalesce(name: str, group: SingleFlight = None):
+    """
+    Decorador para funciones CRUD de solo lectura con firma func(db, *args, **kwargs):
+    las llamadas simultáneas con los mismos argumentos (sin contar db) y el mismo alcance comparten
+    un cálculo. El alcance se pasa como scope=... (utils.permissions.permission_scope) y no llega
+    a la función; sin él, una llamada anidada usa el de la llamada que la contiene.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(db, *args, scope: Hashable = None, **kwargs):
+            flight_group = group or flights
+            if scope is None:
+                scope = current_scope()
+            key = flight_key(name, {"args": args, "kwargs": kwargs}, scope)
+            # Dentro de otro cálculo la sesión es la del líder: no se cierra mientras espera
+            on_wait = None if flight_group.leading() else db.close
+            return flight_group.do(
+                key, lambda: run_in_scope(scope, lambda: func(db, *args, **kwargs)), on_wait=on_wait
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,81 @@
+"""
+Arranque del proceso
+- Importar main.py ya no toca la base de datos: el esquema se aplica como paso explícito
+  (python manage_db.py create); con AUTO_CREATE_TABLES=1 se crea al iniciar, útil en desarrollo
+- lifespan: configura los mapeos del ORM y abre la primera conexión de cada pool antes de aceptar
+  peticiones; después importa en un hilo aparte los módulos pesados (ReportLab, NumPy, requests)
+  que las rutas cargan recién al usarlos y carga el índice de códigos de barras (crud/barcodes.py)
+"""
+import os
+import time
+import importlib
+import threading
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from starlette.concurrency import run_in_threadpool
+
+from db import database
+
+AUTO_CREATE_TABLES = os.getenv("AUTO_CREATE_TABLES", "0") == "1"
+# Precarga de módulos pesados después del arranque (0 = solo al primer uso)
+WARMUP_PRELOAD = os.getenv("WARMUP_PRELOAD", "1") == "1"
+
+# Módulos que las rutas importan al usarse
+HEAVY_MODULES = (
+    "utils.pdf_generator",
+    "utils.invoice_generator",
+    "utils.whatsapp_sender",
+    "crud.analytics",
+    "crud.forecast",
+)
+
+
+def create_schema():
+    """Crea las tablas que faltan (no modifica las existentes)"""
+    import db.models  # Registra todos los modelos en Base.metadata
+    database.Base.metadata.create_all(bind=database.engine)
+
+
+def warm_database():
+    """Configura los mapeos del ORM y deja una conexión abierta en cada pool"""
+    configure_mappers()
+    for engine in database.engines.values():
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+
+def preload_modules():
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Advertencia: No se pudo precargar {name}: {e}")
+
+
+def warm_caches():
+    from crud.barcodes import warm_barcode_index
+    try:
+        warm_barcode_index()
+    except Exception as e:
+        print(f"Advertencia: No se pudo cargar el índice de códigos de barras: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    start = time.perf_counter()
+    try:
+        if AUTO_CREATE_TABLES:
+            await run_in_threadpool(create_schema)
+        await run_in_threadpool(warm_database)
+    except Exception as e:
+        # La API arranca igual: las rutas responden 503 mientras la base de datos no esté disponible
+        print(f"Advertencia: No se pudo conectar a la base de datos al iniciar: {e}")
+        print("Asegúrate de que MySQL esté corriendo y que la base de datos exista.")
+    print(f"[INICIO] Listo en {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    if WARMUP_PRELOAD:
+        threading.Thread(target=preload_modules, name="warmup-imports", daemon=True).start()
+    threading.Thread(target=warm_caches, name="warmup-barcodes", daemon=True).start()
+    yield
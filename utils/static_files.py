@@ -0,0 +1,192 @@
+"""
+Servicio de /uploads con caché HTTP
+- Archivos con nombre = hash del contenido (o URL con ?v=versión): Cache-Control immutable por un año
+- Resto de archivos: el navegador revalida con ETag y recibe 304 si no cambió
+- ETag fuerte basado en el contenido (SHA-256)
+- Si existe una variante precomprimida (.br / .gz) y el cliente la acepta (Accept-Encoding con q > 0),
+  se sirve esa
+- El hash y las variantes se resuelven en lookup_path, que Starlette ejecuta en un hilo:
+  file_response (en el event loop) no lee archivos
+"""
+import os
+import re
+import stat
+import hashlib
+import mimetypes
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Nombres generados por utils/images.py: <sha256>.<ext>
+_CONTENT_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+# Variantes precomprimidas en orden de preferencia
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Hash de archivos sin nombre por contenido: ruta -> ((mtime, tamaño), hash)
+_digest_cache: Dict[str, Tuple[Tuple[float, int], str]] = {}
+# Variantes precomprimidas encontradas en la última búsqueda: ruta -> [(codificación, ruta, stat)]
+_variants_cache: Dict[str, List[Tuple[str, str, os.stat_result]]] = {}
+_digest_lock = threading.Lock()
+
+
+def content_hash_from_name(path: str) -> Optional[str]:
+    """Retorna el hash si el nombre del archivo ya es el hash de su contenido"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem if _CONTENT_HASH_NAME.match(stem) else None
+
+
+def file_version(stat_result: os.stat_result) -> str:
+    """Versión corta de un archivo para URLs (?v=...)"""
+    return f"{int(stat_result.st_mtime)}-{stat_result.st_size}"
+
+
+def versioned_path(image_path: str) -> str:
+    """
+    Agrega ?v=<versión> a archivos cuyo nombre no es un hash de contenido (imágenes antiguas),
+    para que también puedan cachearse como inmutables.
+    """
+    if content_hash_from_name(image_path):
+        return image_path
+    try:
+        return f"{image_path}?v={file_version(os.stat(image_path))}"
+    except OSError:
+        return image_path
+
+
+def _cached_digest(path: str, stat_result: os.stat_result) -> Optional[str]:
+    digest = content_hash_from_name(path)
+    if digest:
+        return digest
+    with _digest_lock:
+        cached = _digest_cache.get(path)
+    if cached and cached[0] == (stat_result.st_mtime, stat_result.st_size):
+        return cached[1]
+    return None
+
+
+def _file_digest(path: str, stat_result: os.stat_result) -> str:
+    """Hash SHA-256 del contenido (lee el archivo si no está en caché: llamar fuera del event loop)"""
+    digest = _cached_digest(path, stat_result)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    with _digest_lock:
+        _digest_cache[path] = ((stat_result.st_mtime, stat_result.st_size), digest)
+    return digest
+
+
+def _find_variants(path: str) -> List[Tuple[str, str, os.stat_result]]:
+    variants = []
+    for name, suffix in _ENCODINGS:
+        try:
+            variant_stat = os.stat(path + suffix)
+        except OSError:
+            continue
+        if stat.S_ISREG(variant_stat.st_mode):
+            variants.append((name, path + suffix, variant_stat))
+    return variants
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """
+    Interpreta Accept-Encoding: codificación -> q. Compara tokens completos (no subcadenas)
+    y respeta q=0 como rechazo explícito.
+    """
+    accepted = {}
+    for part in header.split(","):
+        token, *params = [item.strip() for item in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token.lower()] = q
+    return accepted
+
+
+def _choose_variant(variants, accept_encoding: str):
+    """La variante con mayor q aceptada por el cliente (a igual q, en el orden de _ENCODINGS)"""
+    accepted = accepted_encodings(accept_encoding)
+    best, best_q = None, 0.0
+    for variant in variants:
+        q = accepted.get(variant[0], accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = variant, q
+    return best
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles con Cache-Control, ETag fuerte por contenido y variantes precomprimidas"""
+
+    def lookup_path(self, path: str):
+        # Starlette llama a lookup_path en un hilo: aquí se lee el archivo para el hash
+        # y se buscan las variantes, así file_response no bloquea el event loop
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result and stat.S_ISREG(stat_result.st_mode):
+            full_path = str(full_path)
+            _file_digest(full_path, stat_result)
+            variants = _find_variants(full_path)
+            with _digest_lock:
+                _variants_cache[full_path] = variants
+        return full_path, stat_result
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        path = str(full_path)
+
+        # Elegir variante precomprimida si existe y el cliente la acepta
+        with _digest_lock:
+            variants = _variants_cache.get(path, [])
+        serve_path, serve_stat, encoding = path, stat_result, None
+        chosen = _choose_variant(variants, request_headers.get("accept-encoding", ""))
+        if chosen:
+            encoding, serve_path, serve_stat = chosen
+
+        # El tipo es el del archivo original, no el de la variante .br/.gz
+        response = FileResponse(
+            serve_path,
+            status_code=status_code,
+            stat_result=serve_stat,
+            method=scope["method"],
+            media_type=mimetypes.guess_type(path)[0] or "text/plain",
+        )
+
+        etag = _cached_digest(path, stat_result)
+        if etag:
+            response.headers["etag"] = f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+        if encoding:
+            response.headers["content-encoding"] = encoding
+        if variants:
+            response.headers["vary"] = "Accept-Encoding"
+
+        version = QueryParams(scope.get("query_string", b"")).get("v")
+        if content_hash_from_name(path) or version == file_version(stat_result):
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["cache-control"] = REVALIDATE_CACHE_CONTROL
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
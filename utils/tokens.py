@@ -0,0 +1,253 @@
+"""
+Tokens de acceso y de refresco
+- El token de acceso dura poco (ACCESS_TOKEN_EXPIRE_MINUTES) y lleva id de usuario, rol y la
+  versión de permisos del rol: se valida sin consultar la BD en cada petición
+- Los permisos de cada rol se mantienen en memoria (se recargan cada ROLE_CACHE_SECONDS o al cambiar);
+  si la versión del token no coincide con la actual, el cliente debe renovar el token
+- El token de refresco es opaco, dura REFRESH_TOKEN_EXPIRE_DAYS y se rota en cada uso (sin bcrypt)
+- La lista de revocación en memoria invalida los tokens de acceso emitidos antes de revocar a un usuario;
+  solo guarda usuarios revocados durante la vigencia de un token de acceso
+"""
+import os
+import time
+import uuid
+import hashlib
+import secrets
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from jose import jwt
+from sqlalchemy.orm import Session
+
+from db.models import User, Role, RefreshToken
+
+# Configuración JWT
+SECRET_KEY = os.getenv("SECRET_KEY", "your_super_secret_key")  # Mejor cargar desde .env
+ALGORITHM = "HS256"
+
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# Tiempo máximo que otro proceso puede tardar en ver un cambio de permisos de un rol
+ROLE_CACHE_SECONDS = int(os.getenv("ROLE_CACHE_SECONDS", "60"))
+
+
+class TokenError(Exception):
+    """Token inválido, vencido o revocado"""
+
+
+class RoleInfo:
+    """Permisos vigentes de un rol y su versión (hash de nombre, estado y permisos)"""
+
+    def __init__(self, role_id: int, name: Optional[str], permissions: FrozenSet[str], version: str):
+        self.id = role_id
+        self.name = name
+        self.permissions = permissions
+        self.version = version
+
+
+class TokenUser:
+    """
+    Usuario autenticado construido desde los claims del token de acceso (sin consultar la BD).
+    Expone los atributos que usan las rutas y utils.permissions: id, username, role_id y role.
+    """
+
+    def __init__(self, user_id: int, username: Optional[str], role: Optional[RoleInfo]):
+        self.id = user_id
+        self.username = username
+        self.role = role
+        self.role_id = role.id if role else None
+
+
+# ========================
+# PERMISOS POR ROL (EN MEMORIA)
+# ========================
+_roles: Dict[int, Tuple[float, RoleInfo]] = {}
+_roles_lock = threading.Lock()
+
+
+def _load_role(db: Session, role_id: int) -> Optional[RoleInfo]:
+    role = db.query(Role).filter(Role.id == role_id).first()
+    if role is None:
+        return None
+    permissions = frozenset(perm.name for perm in role.permissions if perm.status == 1)
+    fingerprint = "|".join([role.name or "", str(role.status)] + sorted(permissions))
+    version = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:12]
+    return RoleInfo(role.id, role.name, permissions, version)
+
+
+def get_role_info(db: Session, role_id: Optional[int]) -> Optional[RoleInfo]:
+    """Permisos del rol desde la memoria; se consultan a la BD como máximo cada ROLE_CACHE_SECONDS"""
+    if role_id is None:
+        return None
+    now = time.monotonic()
+    with _roles_lock:
+        cached = _roles.get(role_id)
+    if cached and now - cached[0] < ROLE_CACHE_SECONDS:
+        return cached[1]
+    info = _load_role(db, role_id)
+    if info is not None:
+        with _roles_lock:
+            _roles[role_id] = (now, info)
+    return info
+
+
+def invalidate_role(role_id: int):
+    """Llamar después de cambiar un rol o sus permisos: los tokens con la versión anterior dejan de valer"""
+    with _roles_lock:
+        _roles.pop(role_id, None)
+
+
+# ========================
+# LISTA DE REVOCACIÓN (EN MEMORIA)
+# ========================
+_revoked_users: Dict[int, int] = {}
+_revoked_lock = threading.Lock()
+
+
+def revoke_user_access(user_id: int):
+    """Invalida los tokens de acceso ya emitidos al usuario (los nuevos logins siguen funcionando)"""
+    now = int(time.time())
+    horizon = now - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    with _revoked_lock:
+        # Las entradas más antiguas que la vigencia de un token de acceso ya no hacen falta
+        for stale in [uid for uid, revoked_at in _revoked_users.items() if revoked_at < horizon]:
+            del _revoked_users[stale]
+        _revoked_users[user_id] = now
+
+
+def _is_revoked(user_id: int, issued_at: int) -> bool:
+    with _revoked_lock:
+        revoked_at = _revoked_users.get(user_id)
+    # iat tiene resolución de segundos: un token del mismo segundo que la revocación también se rechaza
+    return revoked_at is not None and issued_at <= revoked_at
+
+
+# ========================
+# TOKEN DE ACCESO
+# ========================
+def create_access_token(user: User, role: Optional[RoleInfo], expires_delta: timedelta = None) -> str:
+    now = datetime.utcnow()
+    claims = {
+        "sub": str(user.id),
+        "username": user.username,
+        "role": role.name if role else None,
+        "role_id": user.role_id,
+        "pv": role.version if role else None,
+        "typ": "access",
+        "iat": int(time.time()),
+        "exp": now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_access_token(db: Session, token: str) -> TokenUser:
+    """
+    Valida firma, vencimiento, revocación y versión de permisos.
+    Solo toca la BD si los permisos del rol no están en memoria.
+    Lanza TokenError (o JWTError) si el token no es válido.
+    """
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    user_id = int(payload["sub"])
+    # Los tokens emitidos antes de este esquema no traen 'typ' ni 'pv': se piden de nuevo
+    if payload.get("typ") != "access":
+        raise TokenError("Tipo de token inválido")
+    if _is_revoked(user_id, int(payload.get("iat", 0))):
+        raise TokenError("Token revocado")
+    role = get_role_info(db, payload.get("role_id"))
+    if (role.version if role else None) != payload.get("pv"):
+        raise TokenError("Los permisos del usuario cambiaron. Renueve el token.")
+    return TokenUser(user_id, payload.get("username"), role)
+
+
+# ========================
+# TOKEN DE REFRESCO
+# ========================
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _issue_refresh_token(db: Session, user_id: int, family: str = None) -> str:
+    token = secrets.token_urlsafe(32)
+    now = datetime.now()
+    db.add(RefreshToken(
+        token_hash=_hash_token(token),
+        user_id=user_id,
+        family=family or uuid.uuid4().hex,
+        created_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+
+def issue_tokens(db: Session, user: User, family: str = None) -> Dict[str, object]:
+    """Emite el par de tokens (confirma la transacción para guardar el token de refresco)"""
+    role = get_role_info(db, user.role_id)
+    access_token = create_access_token(user, role)
+    refresh_token = _issue_refresh_token(db, user.id, family)
+    db.commit()
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "role": role.name if role else None
+    }
+
+
+def _revoke_family(db: Session, family: str):
+    db.query(RefreshToken).filter(
+        RefreshToken.family == family,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.now()}, synchronize_session=False)
+
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[User, Dict[str, object]]:
+    """
+    Cambia un token de refresco válido por un par nuevo. Un token ya usado revoca toda su familia.
+    Lanza TokenError si el token no sirve.
+    """
+    record = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == _hash_token(token)
+    ).with_for_update().first()
+    if record is None or record.revoked_at is not None:
+        db.rollback()
+        raise TokenError("Token de refresco inválido")
+    if record.used_at is not None:
+        _revoke_family(db, record.family)
+        db.commit()
+        raise TokenError("Token de refresco reutilizado: se cerró la sesión")
+    if record.expires_at < datetime.now():
+        db.rollback()
+        raise TokenError("Token de refresco vencido")
+
+    user = db.query(User).filter(User.id == record.user_id).first()
+    if user is None or user.status != 1:
+        _revoke_family(db, record.family)
+        db.commit()
+        raise TokenError("Usuario inactivo")
+
+    record.used_at = datetime.now()
+    return user, issue_tokens(db, user, record.family)
+
+
+def revoke_refresh_token(db: Session, token: str) -> bool:
+    """Cierra la sesión del token de refresco (toda su familia)"""
+    record = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(token)).first()
+    if record is None:
+        return False
+    _revoke_family(db, record.family)
+    db.commit()
+    return True
+
+
+def revoke_user_tokens(db: Session, user_id: int):
+    """
+    Cierra todas las sesiones de un usuario: revoca sus tokens de refresco (sin confirmar)
+    e invalida en memoria sus tokens de acceso vigentes
+    """
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.now()}, synchronize_session=False)
+    revoke_user_access(user_id)
@@ -0,0 +1,148 @@
+"""
+Exportación de reportes a Excel (XLSX) para contabilidad
+- Libro de openpyxl en modo write_only: cada fila se escribe al agregarla y no se guarda el libro
+  en memoria, así un reporte de 500 000 ventas usa memoria constante
+- Las filas llegan de un generador sobre el cursor (crud.reports.iter_sales_rows)
+- Celdas con tipo: fechas como fecha de Excel y montos como número con formato de moneda
+openpyxl se importa al generar el primer archivo.
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, BinaryIO, Dict, Iterable, Union
+
+MONEY_FORMAT = '"$"#,##0.00'
+DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+DATE_FORMAT = "yyyy-mm-dd"
+
+
+class _CellFactory:
+    """Celdas con formato para hojas write_only (una celda por valor, sin estilos nombrados)"""
+
+    def __init__(self, sheet):
+        from openpyxl.cell import WriteOnlyCell
+        self._cell = WriteOnlyCell
+        self._sheet = sheet
+
+    def money(self, value):
+        cell = self._cell(self._sheet, value=Decimal(str(value or 0)))
+        cell.number_format = MONEY_FORMAT
+        return cell
+
+    def datetime(self, value, number_format: str = DATETIME_FORMAT):
+        cell = self._cell(self._sheet, value=value)
+        cell.number_format = number_format
+        return cell
+
+    def header(self, value: str):
+        from openpyxl.styles import Font
+        cell = self._cell(self._sheet, value=value)
+        cell.font = Font(bold=True)
+        return cell
+
+
+def _new_workbook():
+    from openpyxl import Workbook
+    return Workbook(write_only=True)
+
+
+def _as_datetime(value):
+    """Los reportes JSON traen fechas ISO: se guardan como fecha de Excel"""
+    if isinstance(value, str) and value:
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _period_rows(sheet, cells: _CellFactory, report_data: Dict[str, Any]):
+    start_date = _as_datetime(report_data.get("start_date"))
+    end_date = _as_datetime(report_data.get("end_date"))
+    sheet.append([cells.header("Desde"), cells.datetime(start_date) if start_date else "Todos los registros"])
+    sheet.append([cells.header("Hasta"), cells.datetime(end_date) if end_date else "Todos los registros"])
+    sheet.append([cells.header("Generado"), cells.datetime(datetime.now())])
+    sheet.append([])
+
+
+def write_sales_report_xlsx(output: Union[str, BinaryIO], summary: Dict[str, Any],
+                            sales: Iterable[Dict[str, Any]]) -> int:
+    """
+    Escribe el reporte de ventas en 'output' (ruta o archivo abierto) con tres hojas: Resumen (totales y métodos de pago),
+    Ventas por día y Ventas (una fila por venta desde el generador). Retorna las ventas escritas.
+    """
+    workbook = _new_workbook()
+
+    sheet = workbook.create_sheet("Resumen")
+    cells = _CellFactory(sheet)
+    sheet.column_dimensions["A"].width = 22
+    sheet.column_dimensions["B"].width = 20
+    sheet.column_dimensions["C"].width = 16
+    _period_rows(sheet, cells, summary)
+    sheet.append([cells.header("Total de Ventas"), summary.get("total_sales", 0)])
+    sheet.append([cells.header("Total Vendido"), cells.money(summary.get("total_amount", 0))])
+    sheet.append([cells.header("Total de Items"), summary.get("total_items", 0)])
+    sheet.append([cells.header("Promedio por Venta"), cells.money(summary.get("average_sale", 0))])
+    sheet.append([])
+    sheet.append([cells.header("Método de Pago"), cells.header("Cantidad"), cells.header("Total")])
+    for method, data in (summary.get("payment_methods") or {}).items():
+        sheet.append([method, data.get("count", 0), cells.money(data.get("total", 0))])
+
+    sheet = workbook.create_sheet("Ventas por día")
+    cells = _CellFactory(sheet)
+    sheet.column_dimensions["A"].width = 14
+    sheet.append([cells.header("Fecha"), cells.header("Cantidad"), cells.header("Total")])
+    for day, data in (summary.get("daily_sales") or {}).items():
+        sheet.append([
+            cells.datetime(datetime.fromisoformat(day), DATE_FORMAT), data.get("count", 0), cells.money(data.get("total", 0))
+        ])
+
+    sheet = workbook.create_sheet("Ventas")
+    cells = _CellFactory(sheet)
+    for column, width in zip("ABCDEFG", (10, 20, 30, 30, 16, 8, 14)):
+        sheet.column_dimensions[column].width = width
+    # Encabezado fijo al desplazarse
+    sheet.freeze_panes = "A2"
+    sheet.append([cells.header(title) for title in ("ID", "Fecha", "Cliente", "Usuario", "Método", "Items", "Total")])
+    # En write_only cada fila se serializa dentro de append(): las celdas con formato se reutilizan
+    date_cell = cells.datetime(None)
+    total_cell = cells.money(0)
+    count = 0
+    for sale in sales:
+        date_cell.value = sale["sale_date"]
+        total_cell.value = sale["total"]
+        sheet.append([
+            sale["id"], date_cell, sale["client_name"], sale["user_name"],
+            sale["payment_method"], sale["items_count"], total_cell
+        ])
+        count += 1
+
+    workbook.save(output)
+    return count
+
+
+def write_top_products_report_xlsx(output: Union[str, BinaryIO], report_data: Dict[str, Any],
+                                   products: Iterable[Dict[str, Any]]) -> int:
+    """Escribe el reporte de productos más vendidos en 'output' y retorna los productos escritos"""
+    workbook = _new_workbook()
+    sheet = workbook.create_sheet("Productos más vendidos")
+    cells = _CellFactory(sheet)
+    for column, width in zip("ABCDEFGHI", (6, 10, 30, 16, 14, 14, 14, 10, 14)):
+        sheet.column_dimensions[column].width = width
+    _period_rows(sheet, cells, report_data)
+    sheet.append([cells.header(title) for title in (
+        "#", "ID", "Producto", "Presentación", "Concentración", "Cantidad Vendida", "Ingresos", "Ventas", "Promedio"
+    )])
+    count = 0
+    for idx, product in enumerate(products, 1):
+        sheet.append([
+            idx,
+            product["product_id"],
+            product["product_name"],
+            product.get("presentation"),
+            product.get("concentration"),
+            product["total_quantity_sold"],
+            cells.money(product["total_revenue"]),
+            product["sales_count"],
+            cells.money(product["average_per_sale"])
+        ])
+        count = idx
+
+    workbook.save(output)
+    return count